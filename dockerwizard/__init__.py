@@ -1,3 +1,30 @@
-from .entrypoint import main
-from .commands import AbstractCommand
-from .errors import CommandError
+"""
+The dockerwizard package. The public names are imported lazily on first access so that importing the package, e.g. to
+run the tool with python -m dockerwizard, does not import modules that the command line does not need
+"""
+import importlib
+
+# the public names of the package and the module each is imported from
+_EXPORTS = {
+    'main': '.entrypoint',
+    'AbstractCommand': '.commands',
+    'CommandError': '.errors'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+
+    if module is None:
+        raise AttributeError(f'module {__name__} has no attribute {name}')
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -5,11 +5,24 @@ from typing import List
 from abc import ABC, abstractmethod
 import argparse
 
-from .builtincommands import BuiltinsHelpAction
 from .const import DOCKER_WIZARD_CMD_NAME
 from .versioning import VersionAction
 
 
+class BuiltinsHelpAction(argparse.Action):
+    """
+    An action to print builtin commands help and exit. The builtin commands are only imported if the flag is passed,
+    so parsing the arguments of a build stays cheap
+    """
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from .builtincommands import print_builtins_help
+        print_builtins_help()
+        parser.exit()
+
+
 class Argument:
     """
     The argument interface. Each implementation determines the arguments it requires
@@ -111,6 +124,21 @@ ARGUMENTS: List[Argument] = [
                                                               'Overrides default custom-commands.yaml file '
                                                               'found in the project root directory',
                  default=None, required=False),
+    FlagArgument(name='-s', long_name='--stream', description='Parse the steps of the build file as they are executed '
+                                                              'rather than before the build starts, for very large '
+                                                              'build files',
+                 required=False, action='store_true', default=False),
+    FlagArgument(name='-r', long_name='--resume', description='Continue the build from the step after the last '
+                                                              'checkpoint recorded by a previous run of the build',
+                 required=False, action='store_true', default=False),
+    FlagArgument(name='-f', long_name='--from-step', description='Continue the build from the build step with this '
+                                                                 'number, starting at 1, using the checkpoint of the '
+                                                                 'step before it',
+                 default=None, required=False),
+    FlagArgument(name='-o', long_name='--only', description='Execute only the build steps with these numbers, e.g. '
+                                                            '1,3-5, using the checkpoint of the step before the first '
+                                                            'of them. The Docker image is not built',
+                 default=None, required=False),
     FlagArgument(name='-v', long_name='--version', description='Print the version of the tool and immediately exit',
                  required=False, action=VersionAction),
     FlagArgument(name='-b', long_name='--builtins', description='Print help information of all builtin commands and '
@@ -130,3 +158,80 @@ def parse() -> argparse.Namespace:
         arg.add_to_parser(parser)
 
     return parser.parse_args()
+
+
+# the name of the subcommand that checks build files without building them
+CHECK_COMMAND = 'check'
+
+
+def _get_check_parser() -> argparse.ArgumentParser:
+    name = f'{DOCKER_WIZARD_CMD_NAME} {CHECK_COMMAND}'
+
+    return argparse.ArgumentParser(name, description='Validate build files and their custom commands without '
+                                                     'building them or using Docker')
+
+
+CHECK_ARGUMENTS: List[Argument] = [
+    PositionalArgument(name='files', description='The build files to check or glob patterns matching them, where ** '
+                                                 'matches any number of directories, e.g. builds/**/build.yaml',
+                       nargs='+'),
+    FlagArgument(name='-c', long_name='--custom', description='A path to a custom commands YAML definition file used '
+                                                              'by every build file instead of the custom-commands.yaml '
+                                                              'file found next to each build file',
+                 default=None, required=False),
+    FlagArgument(name='-j', long_name='--jobs', description='The number of processes to check the build files with. '
+                                                            'Defaults to the number of CPUs',
+                 default=None, required=False)
+]
+
+
+def parse_check(args: List[str]) -> argparse.Namespace:
+    """
+    Parse the arguments of the check subcommand
+    :param args: the arguments following the subcommand
+    :return: the parsed arguments
+    """
+    parser = _get_check_parser()
+
+    for arg in CHECK_ARGUMENTS:
+        arg.add_to_parser(parser)
+
+    return parser.parse_args(args)
+
+
+# the name of the subcommand that runs the benchmarks of the tool
+BENCH_COMMAND = 'bench'
+
+
+def _get_bench_parser() -> argparse.ArgumentParser:
+    name = f'{DOCKER_WIZARD_CMD_NAME} {BENCH_COMMAND}'
+
+    return argparse.ArgumentParser(name, description='Run the benchmarks of the tool and report their results as JSON')
+
+
+BENCH_ARGUMENTS: List[Argument] = [
+    FlagArgument(name='-s', long_name='--suite', description='A comma separated list of the benchmarks to run out of '
+                                                             'parse, staging, dispatch, execution, custom and '
+                                                             'load. Defaults to all of them',
+                 default=None, required=False),
+    FlagArgument(name='-q', long_name='--quick', description='Run the benchmarks with small sizes only',
+                 required=False, action='store_true', default=False),
+    FlagArgument(name='-o', long_name='--output', description='A path to write the results to instead of stdout',
+                 default=None, required=False),
+    FlagArgument(name='-r', long_name='--repeat', description='The number of times each benchmark is repeated',
+                 default='3', required=False)
+]
+
+
+def parse_bench(args: List[str]) -> argparse.Namespace:
+    """
+    Parse the arguments of the bench subcommand
+    :param args: the arguments following the subcommand
+    :return: the parsed arguments
+    """
+    parser = _get_bench_parser()
+
+    for arg in BENCH_ARGUMENTS:
+        arg.add_to_parser(parser)
+
+    return parser.parse_args(args)
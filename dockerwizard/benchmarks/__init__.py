@@ -0,0 +1,27 @@
+"""
+Benchmarks of the performance critical parts of the tool. Each module can be run with python -m
+"""
+import contextlib
+import os
+from typing import Dict
+
+
+@contextlib.contextmanager
+def environment(variables: Dict[str, str]):
+    """
+    A context manager setting the environment variables of the tool while a benchmark runs, such as the cache root, and
+    restoring their previous values when the context exits
+    :param variables: the variables to set
+    :return: the context manager
+    """
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
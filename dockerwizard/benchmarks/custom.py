@@ -0,0 +1,133 @@
+"""
+Benchmarks loading custom commands from a generated custom commands file, without the bytecode of the command modules
+cached, with it cached by a previous run and with the modules already loaded in the process. Run with
+python -m dockerwizard.benchmarks.custom [-c COMMANDS] [-r REPEAT]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from . import environment
+from .. import commands, customcommands
+from ..const import DOCKER_WIZARD_CACHE_VAR
+
+
+def generate_commands(directory: str, count: int) -> str:
+    """
+    Writes a custom commands file declaring the given number of commands, each in its own module
+    :param directory: the directory to write the files to
+    :param count: the number of commands
+    :return: the path to the custom commands file
+    """
+    commands_file = os.path.join(directory, 'custom-commands.yaml')
+
+    with open(commands_file, 'w') as f:
+        f.write('commands:\n')
+
+        for i in range(count):
+            f.write(f'  - name: benchmark-custom-{i}\n'
+                    f'    file: command_{i}.py\n'
+                    f'    class: Command{i}\n')
+
+            with open(os.path.join(directory, f'command_{i}.py'), 'w') as module:
+                module.write('from dockerwizard.commands import AbstractCommand\n'
+                             '\n'
+                             '\n'
+                             f'class Command{i}(AbstractCommand):\n'
+                             '    def __init__(self):\n'
+                             f'        super().__init__("benchmark-custom-{i}", 0, at_least=True)\n'
+                             '\n'
+                             '    def default_name(self):\n'
+                             f'        return "Command {i}"\n'
+                             '\n'
+                             '    def _execute(self, args):\n'
+                             '        pass\n')
+
+    return commands_file
+
+
+def _forget_modules(directory: str):
+    """
+    Forgets the command modules in the directory loaded in this process, so they are loaded again
+    """
+    with customcommands._modules_lock:
+        for path in list(customcommands._LOADED_MODULES):
+            if os.path.dirname(path) == directory:
+                del customcommands._LOADED_MODULES[path]
+
+
+def _load(commands_file: str, count: int, forget: bool) -> float:
+    """
+    Loads the commands and creates each of them, returning the time taken. If forget, the modules loaded by previous
+    loads are loaded again
+    """
+    if forget:
+        _forget_modules(os.path.dirname(commands_file))
+
+    with commands.registry.scope():
+        start = time.perf_counter()
+        customcommands.load_custom(commands_file)
+
+        for i in range(count):
+            commands.registry.get_command(f'benchmark-custom-{i}')
+
+        return time.perf_counter() - start
+
+
+def benchmark(count: int, repeat: int = 3) -> Dict[str, float]:
+    """
+    Benchmarks loading the given number of custom commands
+    :param count: the number of commands
+    :param repeat: the number of times the commands are loaded in each way, the fastest time is reported
+    :return: the results keyed by name. Times are in seconds
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        commands_file = generate_commands(directory, count)
+        cold = []
+
+        for i in range(repeat):
+            with environment({DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, f'cache-{i}')}):
+                cold.append(_load(commands_file, count, True))
+
+        with environment({DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, 'cache-0')}):
+            cached = [_load(commands_file, count, True) for _ in range(repeat)]
+            loaded = [_load(commands_file, count, False) for _ in range(repeat)]
+
+        _forget_modules(directory)
+
+    return {
+        'cold': min(cold),
+        'cold_per_command': min(cold) / count,
+        'bytecode_cached': min(cached),
+        'loaded': min(loaded)
+    }
+
+
+def print_results(count: int, results: Dict[str, float]):
+    """
+    Prints the results of the benchmark
+    :param count: the number of commands that were loaded
+    :param results: the results returned by benchmark
+    :return: None
+    """
+    print(f'Loaded {count} custom commands')
+    print(f'  cold:            {results["cold"] * 1000:.1f} ms ({results["cold_per_command"] * 1000000:.1f} us per '
+          f'command)')
+    print(f'  bytecode cached: {results["bytecode_cached"] * 1000:.1f} ms')
+    print(f'  already loaded:  {results["loaded"] * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks loading custom commands')
+    parser.add_argument('-c', '--commands', type=int, nargs='+', default=[100], help='The numbers of commands to load')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times the commands are loaded')
+    args = parser.parse_args()
+
+    for count in args.commands:
+        print_results(count, benchmark(count, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
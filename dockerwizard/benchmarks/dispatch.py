@@ -0,0 +1,136 @@
+"""
+Benchmarks the overhead of the builder executing steps, using steps with a command that does nothing and a process
+backend that executes nothing, so only the time spent by the tool is measured. Run with
+python -m dockerwizard.benchmarks.dispatch [-s STEPS] [-r REPEAT]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, Union
+
+from . import environment
+from .. import cli, commands, process
+from ..builder import Builder
+from ..commands import AbstractCommand
+from ..const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_CHECKPOINTS_VAR
+from ..models import DockerBuild, BuildStep
+
+# the name of the command the steps of the benchmark execute
+NOOP_COMMAND = 'benchmark-noop'
+
+
+class NoopCommand(AbstractCommand):
+    """
+    A command that does nothing
+    """
+    def __init__(self):
+        super().__init__(NOOP_COMMAND, 0, at_least=True)
+
+    def default_name(self):
+        return 'No-op'
+
+    def _execute(self, args: list):
+        pass
+
+
+class SucceedingBackend(process.ExecutionBackend):
+    """
+    A process backend that executes nothing and succeeds immediately, e.g. for the Docker build
+    """
+    def start(self, command: str, env: Union[Dict[str, str], None], cwd: Union[str, None]):
+        return lambda: process.ExecutionResult(0, '', '')
+
+
+def generate_build(directory: str, steps: int) -> DockerBuild:
+    """
+    Creates a build in the directory with the given number of steps executing the no-op command
+    :param directory: the directory of the build
+    :param steps: the number of steps
+    :return: the build
+    """
+    with open(os.path.join(directory, 'Dockerfile'), 'w') as f:
+        f.write('FROM scratch\n')
+
+    build = DockerBuild()
+    build.directory = directory
+    build.image = 'benchmark'
+    build.dockerfile.path = 'Dockerfile'
+    build.dockerfile.relative_to_library = False
+    build.files = []
+    build.steps = []
+    build.post_steps = []
+
+    for i in range(steps):
+        step = BuildStep()
+        step.name = f'Step {i}'
+        step.command = NOOP_COMMAND
+        step.arguments = [str(i)]
+        build.steps.append(step)
+
+    return build
+
+
+def benchmark(steps: int, repeat: int = 3, checkpoints: bool = False) -> Dict[str, float]:
+    """
+    Benchmarks building a build with the given number of no-op steps
+    :param steps: the number of steps
+    :param repeat: the number of builds, the fastest time is reported
+    :param checkpoints: true to record a checkpoint after each step
+    :return: the results keyed by name. Times are in seconds
+    """
+    with tempfile.TemporaryDirectory() as directory, \
+            environment({DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, 'cache'),
+                                    DOCKER_WIZARD_CHECKPOINTS_VAR: str(checkpoints).lower()}), \
+            commands.registry.scope():
+        NoopCommand()
+        build = generate_build(directory, steps)
+        backend = process.get_backend()
+        process.set_backend(SucceedingBackend())
+        cli.disable()
+        times = []
+
+        try:
+            for _ in range(repeat):
+                builder = Builder(build)
+                start = time.perf_counter()
+
+                if not builder.build():
+                    raise RuntimeError('The benchmark build failed')
+
+                times.append(time.perf_counter() - start)
+        finally:
+            cli.enable()
+            process.set_backend(backend)
+
+    return {
+        'build': min(times),
+        'build_per_step': min(times) / steps
+    }
+
+
+def print_results(steps: int, results: Dict[str, float], checkpoints: bool = False):
+    """
+    Prints the results of the benchmark
+    :param steps: the number of steps that were executed
+    :param results: the results returned by benchmark
+    :param checkpoints: true if checkpoints were recorded
+    :return: None
+    """
+    print(f'Built a build with {steps} no-op steps{" recording checkpoints" if checkpoints else ""}')
+    print(f'  build: {results["build"] * 1000:.1f} ms ({results["build_per_step"] * 1000000:.1f} us per step)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the overhead of executing build steps')
+    parser.add_argument('-s', '--steps', type=int, nargs='+', default=[1000], help='The numbers of steps to execute')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times each build is built')
+    parser.add_argument('-c', '--checkpoints', action='store_true', help='Record a checkpoint after each step')
+    args = parser.parse_args()
+
+    for steps in args.steps:
+        print_results(steps, benchmark(steps, args.repeat, args.checkpoints), args.checkpoints)
+
+
+if __name__ == '__main__':
+    main()
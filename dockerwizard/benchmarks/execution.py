@@ -0,0 +1,132 @@
+"""
+Benchmarks executing processes, comparing the latency of spawning a process through a shell, as Execution does, with
+spawning it directly, and measuring the throughput of reading large outputs. Run with
+python -m dockerwizard.benchmarks.execution [-s SIZE] [-r REPEAT]
+"""
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from .. import process
+from ..system import isWindows
+
+# a command that exits immediately without doing anything
+NOOP = ['cmd', '/c', 'exit', '0'] if isWindows() else ['true']
+
+
+def _command(args: List[str]) -> str:
+    """
+    Joins the arguments into a command line for the shell of the platform
+    """
+    return subprocess.list2cmdline(args) if isWindows() else ' '.join(shlex.quote(arg) for arg in args)
+
+
+def spawn(repeat: int = 20) -> Dict[str, float]:
+    """
+    Benchmarks the latency of executing a command that does nothing through the shell with Execution and directly with
+    subprocess
+    :param repeat: the number of times the command is executed in each way, the median time is reported
+    :return: the results keyed by name. Times are in seconds
+    """
+    backend = process.get_backend()
+    process.set_backend(process.SubprocessBackend())
+    shell = []
+    direct = []
+
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process.Execution(NOOP).execute()
+            shell.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            subprocess.Popen(NOOP, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).communicate()
+            direct.append(time.perf_counter() - start)
+    finally:
+        process.set_backend(backend)
+
+    return {
+        'shell': statistics.median(shell),
+        'direct': statistics.median(direct),
+        'shell_overhead': statistics.median(shell) - statistics.median(direct)
+    }
+
+
+def output(size: int, repeat: int = 3) -> Dict[str, float]:
+    """
+    Benchmarks executing a process writing the given number of bytes to stdout with Execution. The time of executing
+    the same process writing nothing is subtracted, so the throughput excludes starting the process
+    :param size: the number of bytes written
+    :param repeat: the number of times the process is executed, the fastest time is reported
+    :return: the results keyed by name. Times are in seconds and the throughput is in bytes per second
+    """
+    backend = process.get_backend()
+    process.set_backend(process.SubprocessBackend())
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, 'output.py')
+
+        with open(script, 'w') as f:
+            f.write('import sys\n'
+                    'size = int(sys.argv[1])\n'
+                    'chunk = "x" * 65535 + "\\n"\n'
+                    'for _ in range(size // len(chunk)):\n'
+                    '    sys.stdout.write(chunk)\n'
+                    'sys.stdout.write("x" * (size % len(chunk)))\n')
+
+        def execute(bytes_written: int) -> float:
+            start = time.perf_counter()
+            result = process.Execution(_command([sys.executable, script, str(bytes_written)])).execute()
+
+            if len(result.stdout) != bytes_written:
+                raise RuntimeError(f'Expected {bytes_written} bytes of output but read {len(result.stdout)}')
+
+            return time.perf_counter() - start
+
+        try:
+            baseline = min(execute(0) for _ in range(repeat))
+            duration = min(execute(size) for _ in range(repeat))
+        finally:
+            process.set_backend(backend)
+
+    return {
+        'output': duration,
+        'startup': baseline,
+        'throughput': size / max(duration - baseline, 1e-9)
+    }
+
+
+def print_results(spawn_results: Dict[str, float], size: int, output_results: Dict[str, float]):
+    """
+    Prints the results of the benchmarks
+    :param spawn_results: the results returned by spawn
+    :param size: the size of the output that was read
+    :param output_results: the results returned by output
+    :return: None
+    """
+    print('Spawned a process that does nothing')
+    print(f'  through the shell: {spawn_results["shell"] * 1000:.2f} ms')
+    print(f'  directly:          {spawn_results["direct"] * 1000:.2f} ms')
+    print(f'Read {size} bytes of output')
+    print(f'  output:     {output_results["output"] * 1000:.1f} ms '
+          f'(process startup {output_results["startup"] * 1000:.1f} ms)')
+    print(f'  throughput: {output_results["throughput"] / 1024 ** 2:.1f} MiB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks executing processes')
+    parser.add_argument('-s', '--size', type=int, default=64 * 1024 ** 2, help='The size of the output to read')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='The number of processes spawned')
+    args = parser.parse_args()
+
+    print_results(spawn(args.repeat), args.size, output(args.size, max(1, args.repeat // 5)))
+
+
+if __name__ == '__main__':
+    main()
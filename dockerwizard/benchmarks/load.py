@@ -0,0 +1,255 @@
+"""
+Load tests the tool by running many builds of generated build files concurrently, each in its own process as on a build
+agent, with a fake docker program that takes a configurable time to build an image. For each level of concurrency, the
+throughput in builds per minute, the percentiles of the latency of a build from start to end and the CPU time and
+memory used by each build are reported. With --engine, the builds use the fake docker program of
+dockerwizard.fakedocker and share a fake engine, as builds on an agent share its Docker engine. Run with
+python -m dockerwizard.benchmarks.load [-c CONCURRENCY] [-b BUILDS] [-s STEPS] [-l LATENCY] [-e]
+"""
+import argparse
+import math
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
+
+from ..const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_HOME_VAR
+from ..fakedocker.client import DOCKER_HOST_VAR
+from ..fakedocker.engine import FakeEngine
+from ..fakedocker.program import write_program
+from ..system import isWindows
+
+# the root of the project, which contains the dockerwizard package
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the name of the environment variable holding the seconds the fake docker program takes to build an image
+LATENCY_VAR = 'DOCKER_WIZARD_LOAD_LATENCY'
+
+# a docker program that builds nothing, taking the time in LATENCY_VAR to build an image
+FAKE_DOCKER = f'''import os
+import sys
+import time
+
+args = sys.argv[1:]
+
+if args[:1] == ['--version']:
+    print('Docker version 0.0.0, build load')
+elif args[:1] == ['build']:
+    time.sleep(float(os.environ.get('{LATENCY_VAR}', '0')))
+    print('Successfully built ' + args[args.index('--tag') + 1])
+elif args[:1] == ['run']:
+    print('0' * 64)
+'''
+
+
+def write_fake_docker(directory: str) -> str:
+    """
+    Writes the fake docker program into the directory, which can then be put first on the PATH
+    :param directory: the directory to create and write the program to
+    :return: the directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    script = os.path.join(directory, 'docker.py')
+
+    with open(script, 'w') as f:
+        f.write(FAKE_DOCKER)
+
+    if isWindows():
+        with open(os.path.join(directory, 'docker.cmd'), 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        executable = os.path.join(directory, 'docker')
+
+        with open(executable, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+
+        os.chmod(executable, os.stat(executable).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    return directory
+
+
+def generate_build(directory: str, name: str, steps: int) -> str:
+    """
+    Writes a build file with the given number of steps, a Dockerfile and a file to copy into the directory
+    :param directory: the directory to write the build to
+    :param name: the name of the image of the build
+    :param steps: the number of steps
+    :return: the path to the build file
+    """
+    os.makedirs(directory)
+
+    with open(os.path.join(directory, 'Dockerfile'), 'w') as f:
+        f.write('FROM scratch\nCOPY file.txt /\n')
+
+    with open(os.path.join(directory, 'file.txt'), 'w') as f:
+        f.write(f'{name}\n')
+
+    build_file = os.path.join(directory, 'build.yaml')
+
+    with open(build_file, 'w') as f:
+        f.write('build:\n'
+                f'  image: {name}\n'
+                '  dockerfile:\n'
+                '    path: Dockerfile\n'
+                '    relative_to_library: false\n'
+                '  files:\n'
+                '    - path: file.txt\n'
+                '      relative_to_library: false\n'
+                '  steps:\n')
+
+        for step in range(steps):
+            f.write(f'    - name: Step {step}\n'
+                    '      command: execute-shell\n'
+                    f'      arguments: [echo, step-{step}]\n')
+
+    return build_file
+
+
+def _max_rss(usage) -> int:
+    """
+    Returns the maximum resident set size in the resource usage in bytes, which Linux reports in KiB
+    """
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def run_build(build_file: str, env: Dict[str, str]) -> Dict[str, Union[float, int, None]]:
+    """
+    Runs the build in a new process of the tool, waiting for it to end
+    :param build_file: the build file to build
+    :param env: the environment of the process
+    :return: the exit code, the latency of the build in seconds, and the CPU time in seconds and maximum resident set
+    size in bytes of the process and the processes it executed, which are None where not supported
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'dockerwizard', build_file], env=env,
+                               cwd=os.path.dirname(build_file), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    if hasattr(os, 'wait4'):
+        # wait4 reports the resources used by the build process and the processes it waited for
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        cpu, memory = usage.ru_utime + usage.ru_stime, _max_rss(usage)
+    else:
+        process.wait()
+        cpu, memory = None, None
+
+    return {
+        'code': process.returncode,
+        'latency': time.perf_counter() - start,
+        'cpu': cpu,
+        'memory': memory
+    }
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Returns the percentile of the values using the nearest rank
+    :param values: the values, which must not be empty
+    :param percent: the percentile between 0 and 100
+    :return: the smallest value that the given percent of the values are less than or equal to
+    """
+    ordered = sorted(values)
+
+    return ordered[max(1, math.ceil(len(ordered) * percent / 100)) - 1]
+
+
+def _mean(values: List[Union[float, None]]) -> Union[float, None]:
+    return None if not values or None in values else sum(values) / len(values)
+
+
+def benchmark(concurrency: int, builds: int, steps: int = 10, latency: float = 0.1,
+              engine: bool = False) -> Dict[str, float]:
+    """
+    Benchmarks running the given number of builds with at most the given number running at the same time
+    :param concurrency: the number of builds running at the same time
+    :param builds: the total number of builds to run
+    :param steps: the number of steps of each build
+    :param latency: the seconds the fake docker program takes to build an image
+    :param engine: true to build the images with a fake engine shared by the builds
+    :return: the results keyed by name. Times are in seconds and memory is in bytes
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        fake_engine = FakeEngine(os.path.join(directory, 'engine.sock'), {'build': latency}) if engine else None
+        path = (write_program if engine else write_fake_docker)(os.path.join(directory, 'bin'))
+        env = {
+            **os.environ,
+            'PATH': os.pathsep.join([path, os.environ.get('PATH', '')]),
+            'PYTHONPATH': os.pathsep.join([PROJECT_ROOT, *filter(None, [os.environ.get('PYTHONPATH')])]),
+            DOCKER_WIZARD_HOME_VAR: os.environ.get(DOCKER_WIZARD_HOME_VAR, PROJECT_ROOT),
+            DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, 'cache'),
+            LATENCY_VAR: str(latency),
+            **({DOCKER_HOST_VAR: fake_engine.docker_host} if engine else {})
+        }
+        # each build has its own directory and image so builds do not share checkpoints
+        build_files = [generate_build(os.path.join(directory, f'build-{i}'), f'load-{i}', steps)
+                       for i in range(builds)]
+
+        if fake_engine:
+            fake_engine.start()
+
+        try:
+            start = time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(lambda build_file: run_build(build_file, env), build_files))
+
+            duration = time.perf_counter() - start
+        finally:
+            if fake_engine:
+                fake_engine.stop()
+
+    latencies = [result['latency'] for result in results]
+
+    return {
+        'duration': duration,
+        'builds_per_minute': builds / duration * 60,
+        'failed': sum(1 for result in results if result['code'] != 0),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'cpu_per_build': _mean([result['cpu'] for result in results]),
+        'memory_per_build': _mean([result['memory'] for result in results])
+    }
+
+
+def print_results(concurrency: int, builds: int, results: Dict[str, float]):
+    """
+    Prints the results of the benchmark
+    :param concurrency: the number of builds that were running at the same time
+    :param builds: the total number of builds that were run
+    :param results: the results returned by benchmark
+    :return: None
+    """
+    print(f'Ran {builds} builds with {concurrency} at a time ({results["failed"]} failed)')
+    print(f'  throughput:       {results["builds_per_minute"]:.1f} builds per minute')
+    print(f'  latency:          p50 {results["p50"] * 1000:.0f} ms, p95 {results["p95"] * 1000:.0f} ms, '
+          f'p99 {results["p99"] * 1000:.0f} ms')
+
+    if results['cpu_per_build'] is not None:
+        print(f'  CPU per build:    {results["cpu_per_build"] * 1000:.0f} ms')
+        print(f'  memory per build: {results["memory_per_build"] / 1024 ** 2:.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load tests the tool with concurrent builds')
+    parser.add_argument('-c', '--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='The numbers of builds running at the same time')
+    parser.add_argument('-b', '--builds', type=int, default=None,
+                        help='The number of builds to run at each concurrency. Defaults to 4 times the concurrency')
+    parser.add_argument('-s', '--steps', type=int, default=10, help='The number of steps of each build')
+    parser.add_argument('-l', '--latency', type=float, default=0.1,
+                        help='The seconds the fake docker program takes to build an image')
+    parser.add_argument('-e', '--engine', action='store_true', help='Build the images with a shared fake engine')
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        builds = args.builds or concurrency * 4
+        print_results(concurrency, builds, benchmark(concurrency, builds, args.steps, args.latency, args.engine))
+
+
+if __name__ == '__main__':
+    main()
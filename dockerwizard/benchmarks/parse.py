@@ -0,0 +1,187 @@
+"""
+Benchmarks parsing generated build files with many steps, reporting the cost per step and the memory used by the
+parsed build. Run with python -m dockerwizard.benchmarks.parse [-s STEPS] [-r REPEAT]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Dict
+
+from . import environment
+from .. import cli
+from ..const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_PLAN_CACHE_VAR
+from .. import buildparser
+from ..models import DockerBuild
+
+
+def generate_build_file(path: str, steps: int):
+    """
+    Writes a build file with the given number of steps to the path
+    :param path: the path of the build file to write
+    :param steps: the number of steps in the build file
+    :return: None
+    """
+    with open(path, 'w') as f:
+        f.write('build:\n'
+                '  image: benchmark\n'
+                '  dockerfile:\n'
+                '    path: Dockerfile\n'
+                '  files:\n'
+                '    - path: file.txt\n'
+                '  steps:\n')
+
+        for step in range(steps):
+            f.write(f'    - name: Step {step}\n'
+                    f'      command: execute-shell\n'
+                    f'      arguments:\n'
+                    f'        - echo\n'
+                    f'        - step-{step}\n'
+                    f'      named:\n'
+                    f'        index: {step}\n'
+                    f'      environment:\n'
+                    f'        STEP: step-{step}\n')
+
+
+def _parse(file: str, stream: bool = False):
+    cli.disable()
+
+    try:
+        return buildparser.get_build_parser(stream=stream).parse(file)
+    finally:
+        cli.enable()
+
+
+def _stream(file: str):
+    """
+    Streams the build file, returning the time until the first step was read and the time to read all the steps
+    """
+    start = time.perf_counter()
+    first = None
+
+    for _ in _parse(file, stream=True).steps:
+        first = time.perf_counter() - start if first is None else first
+
+    return first, time.perf_counter() - start
+
+
+def benchmark(steps: int, repeat: int = 3) -> Dict[str, float]:
+    """
+    Benchmarks parsing a generated build file with the given number of steps
+    :param steps: the number of steps in the build file
+    :param repeat: the number of times to parse the file, the fastest time is reported
+    :return: the results keyed by name. Times are in seconds and memory is in bytes
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, 'build.yaml')
+        generate_build_file(file, steps)
+
+        with environment({DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, 'cache'),
+                                     DOCKER_WIZARD_PLAN_CACHE_VAR: 'false'}):
+            parse_times = []
+            load_times = []
+            initialise_times = []
+
+            with open(file, 'rb') as f:
+                content = f.read()
+
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _parse(file)
+                parse_times.append(time.perf_counter() - start)
+
+                # time loading the YAML and initialising the models separately
+                start = time.perf_counter()
+                data = buildparser.yaml.load(content, Loader=buildparser._Loader)
+                loaded = time.perf_counter()
+                build = DockerBuild()
+                build.directory = directory
+                build.initialise(buildparser.convert_dict_to_build_data(data['build']))
+                initialise_times.append(time.perf_counter() - loaded)
+                load_times.append(loaded - start)
+
+            gc.collect()
+            tracemalloc.start()
+
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                build = _parse(file)
+                retained, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            del build
+
+            stream_times = [_stream(file) for _ in range(repeat)]
+            gc.collect()
+            tracemalloc.start()
+
+            try:
+                before_stream = tracemalloc.get_traced_memory()[0]
+                _stream(file)
+                stream_peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        with environment({DOCKER_WIZARD_CACHE_VAR: os.path.join(directory, 'cache')}):
+            _parse(file)
+            cached_times = []
+
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _parse(file)
+                cached_times.append(time.perf_counter() - start)
+
+    return {
+        'parse': min(parse_times),
+        'parse_per_step': min(parse_times) / steps,
+        'load': min(load_times),
+        'initialise': min(initialise_times),
+        'initialise_per_step': min(initialise_times) / steps,
+        'cached_parse': min(cached_times),
+        'stream_first_step': min(t[0] for t in stream_times),
+        'stream': min(t[1] for t in stream_times),
+        'stream_peak_memory': stream_peak - before_stream,
+        'peak_memory': peak - before,
+        'build_memory': retained - before,
+        'build_memory_per_step': (retained - before) / steps
+    }
+
+
+def print_results(steps: int, results: Dict[str, float]):
+    """
+    Prints the results of the benchmark
+    :param steps: the number of steps that were parsed
+    :param results: the results returned by benchmark
+    :return: None
+    """
+    print(f'Parsed a build file with {steps} steps')
+    print(f'  parse:              {results["parse"] * 1000:.1f} ms '
+          f'({results["parse_per_step"] * 1000000:.1f} us per step)')
+    print(f'    load yaml:        {results["load"] * 1000:.1f} ms')
+    print(f'    initialise:       {results["initialise"] * 1000:.1f} ms '
+          f'({results["initialise_per_step"] * 1000000:.1f} us per step)')
+    print(f'  parse from plan:    {results["cached_parse"] * 1000:.1f} ms')
+    print(f'  stream:             {results["stream"] * 1000:.1f} ms '
+          f'(first step after {results["stream_first_step"] * 1000:.1f} ms)')
+    print(f'  peak memory:        {results["peak_memory"] / 1024 ** 2:.1f} MiB')
+    print(f'  stream peak memory: {results["stream_peak_memory"] / 1024 ** 2:.1f} MiB')
+    print(f'  parsed build:       {results["build_memory"] / 1024 ** 2:.1f} MiB '
+          f'({results["build_memory_per_step"]:.0f} bytes per step)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks parsing build files with many steps')
+    parser.add_argument('-s', '--steps', type=int, nargs='+', default=[10000],
+                        help='The numbers of steps of the generated build files')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times each file is parsed')
+    args = parser.parse_args()
+
+    for steps in args.steps:
+        print_results(steps, benchmark(steps, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmarks staging the Dockerfile and files required by a build into the build directory, for different numbers and
+sizes of files. Run with python -m dockerwizard.benchmarks.staging [-c COUNT] [-s SIZE] [-r REPEAT]
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from .. import cli
+from ..builder import Builder
+from ..models import DockerBuild, File
+
+
+def generate_files(directory: str, count: int, size: int) -> DockerBuild:
+    """
+    Writes a Dockerfile and the given number of files of the given size into the library of a build in the directory
+    :param directory: the directory of the build
+    :param count: the number of files
+    :param size: the size of each file in bytes
+    :return: the build requiring the files
+    """
+    library = os.path.join(directory, 'library')
+    os.makedirs(library)
+    content = os.urandom(min(size, 1024 ** 2))
+
+    with open(os.path.join(library, 'Dockerfile'), 'w') as f:
+        f.write('FROM scratch\n')
+
+    build = DockerBuild()
+    build.directory = directory
+    build.library = 'library'
+    build.dockerfile.path = 'Dockerfile'
+    build.files = []
+
+    for i in range(count):
+        file = File()
+        file.path = f'file-{i}.bin'
+        build.files.append(file)
+
+        with open(os.path.join(library, file.path), 'wb') as f:
+            remaining = size
+
+            while remaining > 0:
+                remaining -= f.write(content[:remaining])
+
+    return build
+
+
+def benchmark(count: int, size: int, repeat: int = 3) -> Dict[str, float]:
+    """
+    Benchmarks copying the given number of files of the given size into the build directory
+    :param count: the number of files
+    :param size: the size of each file in bytes
+    :param repeat: the number of times the files are staged, the fastest time is reported
+    :return: the results keyed by name. Times are in seconds and the throughput is in bytes per second
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        build = generate_files(directory, count, size)
+        times = []
+        cli.disable()
+
+        try:
+            for _ in range(repeat):
+                builder = Builder(build)
+                start = time.perf_counter()
+                builder._copy_files()
+                times.append(time.perf_counter() - start)
+                builder._clean_build_directory()
+        finally:
+            cli.enable()
+
+    return {
+        'stage': min(times),
+        'stage_per_file': min(times) / (count + 1),
+        'throughput': count * size / min(times)
+    }
+
+
+def print_results(count: int, size: int, results: Dict[str, float]):
+    """
+    Prints the results of the benchmark
+    :param count: the number of files that were staged
+    :param size: the size of each file
+    :param results: the results returned by benchmark
+    :return: None
+    """
+    print(f'Staged {count} files of {size} bytes')
+    print(f'  stage:      {results["stage"] * 1000:.1f} ms ({results["stage_per_file"] * 1000000:.1f} us per file)')
+    print(f'  throughput: {results["throughput"] / 1024 ** 2:.1f} MiB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks staging the files required by a build')
+    parser.add_argument('-c', '--count', type=int, nargs='+', default=[100], help='The numbers of files to stage')
+    parser.add_argument('-s', '--size', type=int, default=4096, help='The size of each file in bytes')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='The number of times the files are staged')
+    args = parser.parse_args()
+
+    for count in args.count:
+        print_results(count, args.size, benchmark(count, args.size, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
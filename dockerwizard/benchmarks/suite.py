@@ -0,0 +1,137 @@
+"""
+Runs the benchmarks of the tool as a suite and reports their results as JSON, so runs on different versions or machines
+can be compared. Run with docker-wizard bench [-s SUITES] [-q] [-o OUTPUT] [-r REPEAT]
+"""
+import datetime
+import json
+import platform
+from typing import Callable, Dict, List, Union
+
+from . import custom, dispatch, execution, load, parse, staging
+from .. import cli
+from ..argparser import parse_bench
+from ..const import VERSION
+
+
+def _parse(quick: bool, repeat: int) -> List[dict]:
+    sizes = [10, 100, 1000] if quick else [10, 100, 1000, 10000, 100000]
+
+    return [{'steps': steps, **parse.benchmark(steps, repeat)} for steps in sizes]
+
+
+def _staging(quick: bool, repeat: int) -> List[dict]:
+    sizes = [(10, 4096)] if quick else [(100, 4096), (1000, 4096), (10, 16 * 1024 ** 2)]
+
+    return [{'count': count, 'size': size, **staging.benchmark(count, size, repeat)} for count, size in sizes]
+
+
+def _dispatch(quick: bool, repeat: int) -> List[dict]:
+    sizes = [(100, False), (10, True)] if quick else [(1000, False), (10000, False), (100, True), (1000, True)]
+
+    return [{'steps': steps, 'checkpoints': checkpoints, **dispatch.benchmark(steps, repeat, checkpoints)}
+            for steps, checkpoints in sizes]
+
+
+def _execution(quick: bool, repeat: int) -> List[dict]:
+    size = 1024 ** 2 if quick else 64 * 1024 ** 2
+
+    return [{**execution.spawn(repeat * 5), 'size': size, **execution.output(size, repeat)}]
+
+
+def _custom(quick: bool, repeat: int) -> List[dict]:
+    sizes = [10] if quick else [10, 100]
+
+    return [{'commands': count, **custom.benchmark(count, repeat)} for count in sizes]
+
+
+def _load(quick: bool, repeat: int) -> List[dict]:
+    # each level of concurrency runs several builds, so the benchmark is not repeated
+    levels = [1, 2] if quick else [1, 2, 4, 8]
+    steps = 5 if quick else 10
+
+    return [{'concurrency': concurrency, 'builds': concurrency * 4, 'steps': steps,
+             **load.benchmark(concurrency, concurrency * 4, steps)} for concurrency in levels]
+
+
+# the benchmarks of the suite by name, each taking whether to run quickly with small sizes and the number of repeats
+SUITES: Dict[str, Callable[[bool, int], List[dict]]] = {
+    'parse': _parse,
+    'staging': _staging,
+    'dispatch': _dispatch,
+    'execution': _execution,
+    'custom': _custom,
+    'load': _load
+}
+
+
+def run_suite(names: List[str], quick: bool = False, repeat: int = 3) -> dict:
+    """
+    Runs the benchmarks with the given names
+    :param names: the names of the benchmarks to run, keys of SUITES
+    :param quick: true to run the benchmarks with small sizes only
+    :param repeat: the number of times each benchmark is repeated
+    :return: the report of the run with the results of each benchmark keyed by its name
+    """
+    results = {}
+
+    for name in names:
+        # stdout is the report, so progress is printed to stderr
+        cli.info(f'Running the {name} benchmarks', use_stderr=True)
+        results[name] = SUITES[name](quick, repeat)
+
+    return {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'quick': quick,
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def _suites(value: Union[str, None]) -> List[str]:
+    """
+    Parses the comma separated names of the benchmarks to run, defaulting to all of them
+    """
+    if value is None:
+        return list(SUITES)
+
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SUITES]
+
+    if not names or unknown:
+        raise ValueError(f'Unknown benchmarks {", ".join(unknown) or value}, choose from {", ".join(SUITES)}')
+
+    return names
+
+
+def main(args: List[str]) -> int:
+    """
+    The entrypoint of the bench subcommand, which writes the report of the benchmarks as JSON to stdout or a file
+    :param args: the arguments following the subcommand
+    :return: the exit code, 0 if the benchmarks ran and 2 if the arguments are invalid
+    """
+    args = parse_bench(args)
+
+    try:
+        names = _suites(args.suite)
+        repeat = int(args.repeat)
+
+        if repeat < 1:
+            raise ValueError(f'The number of repeats must be a positive integer, not {args.repeat}')
+    except ValueError as e:
+        cli.error(str(e))
+        return 2
+
+    report = json.dumps(run_suite(names, args.quick, repeat), indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+        cli.info(f'Wrote the results of the benchmarks to {args.output}')
+    else:
+        print(report)
+
+    return 0
@@ -2,31 +2,48 @@
 This module holds the classes required for building the docker images
 """
 import shutil
-import os
+from typing import List
 
 from .docker import DockerClient
 from .models import DockerBuild, File, BuildStep
-from .workdir import create_temp_directory, change_directory, change_back
-from .cli import info, error
+from .workdir import create_temp_directory
+from .cli import info, warn, error
 from .commands import registry
-from .customcommands import change_and_load_custom
+from .customcommands import load_custom
 from .errors import CommandError, BuildFailedError, BuildConfigurationError
-from .context import initialise, teardown
+from .context import initialise, activate, teardown
+from .stepcache import CacheMount, platform_key
+from .plan import compile_plan, PlanError
+from .buildparser import StepStream
+from .checkpoint import Checkpoints, checkpoints_enabled, build_fingerprint, step_fingerprint
+from .const import DOCKER_WIZARD_CHECKPOINTS_VAR
+from .process import add_placeholder, remove_placeholder
 
 
 class Builder:
     """
     The class that holds the responsibility of building the docker images
     """
-    def __init__(self, config: DockerBuild):
+    def __init__(self, config: DockerBuild, resume: bool = False, from_step: int = None, only: List[int] = None):
         """
-        Initialise the builder with the configuration it is intended to build
+        Initialise the builder with the configuration it is intended to build. By default, every step is executed. If
+        checkpoints are enabled, a checkpoint is recorded after each build step, which resume, from_step and only can
+        continue the build from. Only one of them should be given
         :param config: the config this builder is going to build
+        :param resume: continue the build from the step after the last checkpoint
+        :param from_step: continue the build from the build step with this index, starting at 1
+        :param only: execute only the build steps with these indices and not the Docker build or post-build steps
         """
         self.config = config
         self._working_directory = create_temp_directory()
         self._context = initialise()
         self._context.config = config
+        self._resume = resume
+        self._only = only
+        self._start = min(only) if only else (from_step if from_step else 1)
+        self._checkpoints = None
+        self._record = False
+        self._restored = False
 
     def _copy_file(self, file: File, dockerfile: bool = False):
         """
@@ -38,12 +55,10 @@ class Builder:
 
         if file.relative_to_library:
             info(f'Copying {file_type} {file.path} from library to build directory')
-            full_path = os.path.join(self.config.library, file.path)
         else:
             info(f'Copying {file_type} {file.path} to build directory')
-            full_path = file.path
 
-        shutil.copy(full_path, self._working_directory.name)
+        shutil.copy(self.config.file_path(file), self._working_directory.name)
 
     def _copy_files(self):
         """
@@ -61,6 +76,55 @@ class Builder:
 
         info('Dockerfile and required files successfully copied to build directory')
 
+    def _mount_caches(self, step: BuildStep, name: str) -> list:
+        """
+        Mounts the caches declared by the step in the build directory, unmounting any already mounted if one fails
+        :param step: the step being executed
+        :param name: the name of the step
+        :return: the list of mounted caches
+        """
+        variables = {
+            'image': self.config.image,
+            'step': name,
+            'platform': platform_key()
+        }
+        environment = self._context.process_environment()
+        mounts = []
+
+        try:
+            for cache in step.cache:
+                mount = CacheMount(cache, self._working_directory.name, variables, environment)
+                mount.mount()
+                mounts.append(mount)
+        except (CommandError, OSError, ValueError) as e:
+            for mount in reversed(mounts):
+                mount.unmount(False)
+
+            raise e if isinstance(e, CommandError) else CommandError(f'Failed to mount step cache: {e}')
+
+        return mounts
+
+    def _execute_with_caches(self, command, step: BuildStep, name: str):
+        """
+        Execute the command of the step with the caches the step declares mounted, persisting them if it succeeds
+        :param command: the command implementation to execute
+        :param step: the step being executed
+        :param name: the name of the step
+        :return: None
+        """
+        mounts = self._mount_caches(step, name)
+        succeeded = False
+
+        try:
+            command.execute(step.arguments)
+            succeeded = True
+        finally:
+            for mount in reversed(mounts):
+                try:
+                    mount.unmount(succeeded)
+                except OSError as e:
+                    error(f'Failed to persist step cache {mount.cache.name}: {e}')
+
     def _execute_step(self, index: int, step: BuildStep, post_step: bool = False):
         """
         Execute the build step
@@ -76,31 +140,105 @@ class Builder:
 
             try:
                 command_implementation = registry.get_command(command)
-                name = name if name else command_implementation.default_name()
-                step_type = 'build' if not post_step else 'post-build'
-                info(f'Executing {step_type} step {index} - {name}')
-
-                command_implementation.execute(args)
             except ValueError:
                 raise BuildConfigurationError(f'Unknown command {command} in configuration build step'
                                               f' {index}')
+
+            name = name if name else command_implementation.default_name()
+            step_type = 'build' if not post_step else 'post-build'
+            info(f'Executing {step_type} step {index} - {name}')
+
+            self._execute_with_caches(command_implementation, step, name)
         except CommandError as e:
             error(f'Failed to execute build step {index} - {step.name} with error: {e.message}')
             raise BuildFailedError()
         finally:
             self._context.current_step = None
 
+    def _record_checkpoint(self, index: int, fingerprint: str):
+        """
+        Records the checkpoint of the build step. Failing to record it does not fail the build but no more checkpoints
+        are recorded
+        """
+        try:
+            environment = self._context.environment
+            self._checkpoints.save(index, fingerprint, self._working_directory.name,
+                                   environment.changed(secrets=False), environment.secrets())
+        except OSError as e:
+            warn(f'Failed to record the checkpoint of build step {index}, no more checkpoints will be recorded: {e}')
+            self._record = False
+
+    def _restore_checkpoint(self, fingerprint: str):
+        """
+        Restores the build directory and environment from the checkpoint of the step before the first step to execute
+        """
+        index = self._start - 1
+        info(f'Restoring the build from the checkpoint of build step {index}')
+
+        try:
+            variables = self._checkpoints.restore(index, fingerprint, self._working_directory.name,
+                                                  self._context.environment)
+        except BuildConfigurationError as e:
+            error(e.message)
+            raise BuildFailedError()
+        except OSError as e:
+            error(f'Failed to restore the checkpoint of build step {index}: {e}')
+            raise BuildFailedError()
+
+        self._context.environment.update(variables)
+        self._restored = True
+
+    def _execute_build_steps(self):
+        """
+        Execute the build steps from the first step to execute, restoring the checkpoint of the step before it first.
+        The fingerprint of every step is computed, including the skipped steps, so a checkpoint is only restored if the
+        build up to it has not changed
+        :return: None
+        """
+        info('Executing build steps')
+        fingerprint = build_fingerprint(self.config) if self._checkpoints else None
+
+        for i, step in enumerate(self.config.steps):
+            index = i + 1
+            previous = fingerprint
+            fingerprint = step_fingerprint(previous, step) if self._checkpoints else None
+
+            if index < self._start:
+                continue
+            elif not self._restored and self._start > 1:
+                self._restore_checkpoint(previous)
+
+            if self._only and index not in self._only:
+                info(f'Skipping build step {index}')
+                continue
+
+            # every step starts in the build directory regardless of the directory the previous step changed to
+            self._context.working_directory = self._working_directory.name
+            self._execute_step(index, step)
+
+            if self._record:
+                self._record_checkpoint(index, fingerprint)
+
+        if not self._restored and self._start > 1:
+            # every step is before the first step to execute, so only the checkpoint of the last step is restored
+            self._restore_checkpoint(fingerprint)
+
     def _execute_steps(self, post_steps: bool = False):
         """
         Execute the build or post-build steps
         :param post_steps: if true, execute post steps if any
         :return: None
         """
-        info('Executing build steps' if not post_steps else 'Executing post-build steps')
+        if not post_steps:
+            self._execute_build_steps()
+            return
 
-        for i, val in enumerate(self.config.steps if not post_steps else self.config.post_steps):
+        info('Executing post-build steps')
+
+        for i, val in enumerate(self.config.post_steps):
+            # every step starts in the build directory regardless of the directory the previous step changed to
+            self._context.working_directory = self._working_directory.name
             self._execute_step(i + 1, val, post_steps)
-            change_directory(self._working_directory.name, not_store=True)
 
     def _build_docker_image(self):
         """
@@ -109,7 +247,8 @@ class Builder:
         """
         info()
         info(f'Building Docker image with tag {self.config.image}')
-        execution = DockerClient.build_docker_image(self.config.image)
+        execution = DockerClient.build_docker_image(self.config.image, env=self._context.process_environment(),
+                                                    cwd=self._working_directory.name)
 
         if not execution.is_healthy():
             error(f'Failed to build Docker image with error {execution.stderr} and exit code {execution.exit_code}')
@@ -132,41 +271,129 @@ class Builder:
         except OSError:
             pass
 
+    def _close_steps(self):
+        """
+        Closes the build file the steps are streamed from, as the build may stop before reading all of them
+        """
+        for steps in [self.config.steps, self.config.post_steps]:
+            if isinstance(steps, StepStream):
+                steps.close()
+
     def _setup_custom_commands(self):
         """
         If the build specifies its own custom commands file, they are added to the existing ones
         """
         if self.config.custom_commands:
             info(f'Build specified custom commands file {self.config.custom_commands}. Loading commands into build')
-            change_and_load_custom(self.config.custom_commands)
+            load_custom(self.config.custom_commands)
+
+    def _compile_plan(self):
+        """
+        Compiles the build plan to validate the whole build before any work is done
+        :return: None
+        """
+        info('Validating build plan')
+
+        try:
+            compile_plan(self.config)
+        except PlanError as e:
+            error('The build is invalid with the following errors:')
+
+            for message in e.errors:
+                error(f'\t{message}')
+
+            raise BuildFailedError()
+
+    def _setup_checkpoints(self):
+        """
+        Determines the first step to execute and whether checkpoints are recorded, copying the files required by the
+        build if the build starts from the first step
+        :return: None
+        """
+        steps = self.config.steps
+
+        if isinstance(steps, list) and (self._start > len(steps) + 1 or (self._only and max(self._only) > len(steps))):
+            error(f'The build only has {len(steps)} build steps')
+            raise BuildFailedError()
+
+        continuing = self._resume or self._start > 1
+        checkpoints = Checkpoints(self.config) if checkpoints_enabled() else None
+
+        if checkpoints is None:
+            if continuing:
+                error('Checkpoints are disabled, so the build cannot be continued from a checkpoint. Set '
+                      f'{DOCKER_WIZARD_CHECKPOINTS_VAR} to true to record checkpoints')
+                raise BuildFailedError()
+        elif not checkpoints.lock():
+            if continuing:
+                error('Another run of the build is using its checkpoints, so the build cannot be continued from a '
+                      'checkpoint')
+                raise BuildFailedError()
+
+            warn('Another run of the build is using its checkpoints, so no checkpoints are recorded')
+        else:
+            self._checkpoints = checkpoints
+            # a build executing only some steps does not leave the build directory as the steps before it would
+            self._record = not self._only
+
+        if self._resume:
+            self._start = self._checkpoints.latest() + 1
+
+            if self._start == 1:
+                warn('There are no checkpoints of the build to resume from, so the build starts from the first step')
+            else:
+                info(f'Resuming the build from build step {self._start}')
+
+        if self._start == 1:
+            if self._record:
+                self._checkpoints.clear()
+
+            self._copy_files()
 
     def build(self):
         """
-        Builds the docker image identified by the provided config
+        Builds the docker image identified by the provided config. Builders can build at the same time in different
+        threads as each build executes with its own context
         :return: True if build succeeded, false if not
         """
         failed = False
+        activate(self._context)
+        # the build directory is different on every run, so it is recorded as a placeholder
+        add_placeholder(self._working_directory.name, 'build')
 
         try:
-            self._copy_files()
             self._setup_custom_commands()
+            self._compile_plan()
+            self._setup_checkpoints()
 
-            info('Changing working directory to build directory')
-            change_directory(self._working_directory.name)
+            info('Using build directory as the working directory of the build')
+            self._context.working_directory = self._working_directory.name
 
             self._execute_steps()
-            self._build_docker_image()
-            self._execute_steps(post_steps=True)
 
-            info('Build finished, changing back to working directory')
+            if not self._only:
+                self._build_docker_image()
+                self._execute_steps(post_steps=True)
+
+                if self._record:
+                    self._checkpoints.clear()
+
+            info('Build finished')
         except BuildFailedError:
             error('See logs to see why the build failed')
             failed = True
+
+            if self._record and self._checkpoints.latest() > 0:
+                info('Run the build again with --resume to continue from the step after the last checkpoint')
         finally:
-            teardown()
+            if self._checkpoints:
+                self._checkpoints.unlock()
+
+            remove_placeholder(self._working_directory.name)
+            self._close_steps()
+            teardown(self._context)
             self._context = None
 
-        change_back()
         self._clean_build_directory()
 
         return not failed
@@ -1,16 +1,48 @@
 """
 A module that holds classes that can parse a build file
 """
+import hashlib
+import json
+import os
+import re
+import threading
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Tuple, Union
 
 import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import (StreamStartEvent, DocumentStartEvent, MappingStartEvent, MappingEndEvent, SequenceStartEvent,
+                         SequenceEndEvent)
+from yaml.resolver import Resolver
 
-from .models import DockerBuild, throw_property_error, BuildFileData
+from .cache import cache_directory, hash_string
+from .const import VERSION, DOCKER_WIZARD_PLAN_CACHE_VAR
+from .models import DockerBuild, BuildStep, throw_property_error, BuildFileData
 from .cli import info
 
 
 __all__ = ['BuildParser', 'get_build_parser']
 
+# the libyaml loader is several times faster than the pure python loader, so use it if pyyaml was built with libyaml
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+if hasattr(yaml, 'CSafeLoader'):
+    from yaml.cyaml import CParser
+
+    class _StreamingLoader(CParser, Composer, SafeConstructor, Resolver):
+        """
+        A safe loader that parses events with libyaml but composes nodes with the python composer, as the libyaml
+        loader can only compose whole documents
+        """
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    _StreamingLoader = yaml.SafeLoader
+
 
 class BuildParser(ABC):
     """
@@ -40,29 +72,561 @@ def convert_dict_to_build_data(data: dict) -> BuildFileData:
     return BuildFileData(converted)
 
 
+def _file_digest(path: str) -> Union[str, None]:
+    """
+    Gets the hash of the contents of the file, or None if it cannot be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+# the included build file fragments loaded by absolute path with the hash of the content they were loaded from, so a
+# fragment shared by many builds is only parsed again when it changes
+_FRAGMENTS: Dict[str, Tuple[str, dict]] = {}
+_fragments_lock = threading.Lock()
+
+
+def _load_fragment(path: str) -> Tuple[str, dict]:
+    """
+    Loads the included build file fragment at the absolute path, reusing the fragment loaded previously if the file has
+    not changed
+    :param path: the absolute path to the fragment
+    :return: the hash of the fragment and its contents
+    """
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except OSError:
+        throw_property_error(f'Included build file {path} does not exist')
+
+    digest = hashlib.sha256(content).hexdigest()
+
+    with _fragments_lock:
+        loaded = _FRAGMENTS.get(path)
+
+    if loaded is not None and loaded[0] == digest:
+        return loaded
+
+    try:
+        fragment = yaml.load(content, Loader=_Loader)
+    except yaml.YAMLError as e:
+        throw_property_error(f'Failed to parse included build file {path}: {e}')
+
+    fragment = {} if fragment is None else fragment
+
+    if not isinstance(fragment, dict) or any(key not in ['include', 'templates'] for key in fragment):
+        throw_property_error(f'Included build file {path} can only contain include and templates')
+
+    with _fragments_lock:
+        _FRAGMENTS[path] = (digest, fragment)
+
+    return digest, fragment
+
+
+def _validate_template(name: str, template, source: str):
+    if not isinstance(template, dict) or not isinstance(template.get('steps'), list) or \
+            any(key not in ['parameters', 'steps'] for key in template):
+        throw_property_error(f'Template {name} in {source} must be a mapping with a list of steps and optional '
+                             f'parameters')
+
+    parameters = template.get('parameters')
+
+    if parameters is not None and not isinstance(parameters, (list, dict)):
+        throw_property_error(f'The parameters of template {name} in {source} must be a list of names or a mapping of '
+                             f'names to default values')
+
+
+def resolve_templates(build: dict, directory: str, includes: Dict[str, str]) -> Dict[str, dict]:
+    """
+    Resolves the step templates defined by the build and the files it includes. Included files can include other files
+    and paths are relative to the file that includes them
+    :param build: the data of the build tag of the build file
+    :param directory: the directory of the build file
+    :param includes: populated with the hash of each included file by absolute path
+    :return: the templates by name
+    """
+    templates = {}
+
+    def add(source_templates, source: str):
+        if source_templates is None:
+            return
+        elif not isinstance(source_templates, dict):
+            throw_property_error(f'templates in {source} must be a mapping of template names to templates')
+
+        for name, template in source_templates.items():
+            if name in templates:
+                throw_property_error(f'Template {name} in {source} is already defined')
+
+            _validate_template(name, template, source)
+            templates[name] = template
+
+    def include(paths, from_directory: str, stack: List[str]):
+        if paths is None:
+            return
+
+        paths = [paths] if isinstance(paths, str) else paths
+
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            throw_property_error('include must be a path or a list of paths to build files')
+
+        for path in paths:
+            path = os.path.abspath(os.path.join(from_directory, path))
+
+            if path in stack:
+                throw_property_error(f'Build file {path} includes itself through {stack[-1]}')
+            elif path in includes:
+                continue
+
+            digest, fragment = _load_fragment(path)
+            includes[path] = digest
+            include(fragment.get('include'), os.path.dirname(path), stack + [path])
+            add(fragment.get('templates'), path)
+
+    include(build.get('include'), directory, [])
+    add(build.get('templates'), 'the build file')
+
+    return templates
+
+
+# a ${parameter} reference in the strings of a template
+_PARAMETER_REFERENCE = re.compile(r'\$\{([^}]*)}')
+
+
+def _substitute(value, parameters: Dict[str, Any]):
+    """
+    Substitutes the ${parameter} references in the strings of the value. A string that is only a reference is replaced
+    by the value of the parameter, keeping its type, e.g. an integer. References to names that are not parameters, such
+    as the variables of cache keys, and any other use of $ are left as they are
+    """
+    if isinstance(value, str):
+        if '$' not in value:
+            return value
+
+        reference = _PARAMETER_REFERENCE.fullmatch(value)
+
+        if reference and reference.group(1) in parameters:
+            return parameters[reference.group(1)]
+
+        return _PARAMETER_REFERENCE.sub(lambda match: str(parameters[match.group(1)]) if match.group(1) in parameters
+                                        else match.group(0), value)
+    elif isinstance(value, dict):
+        return {k: _substitute(v, parameters) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_substitute(v, parameters) for v in value]
+    else:
+        return value
+
+
+def _template_parameters(name: str, template: dict, given) -> Dict[str, Any]:
+    """
+    Gets the values of the parameters of the template, using the defaults of those that are not given
+    """
+    declared = template.get('parameters')
+    declared = {} if declared is None else declared
+    declared = {p: None for p in declared} if isinstance(declared, list) else declared
+    given = {} if given is None else given
+
+    if not isinstance(given, dict):
+        throw_property_error(f'The parameters of template {name} must be a mapping of names to values')
+
+    unknown = [p for p in given if p not in declared]
+
+    if unknown:
+        throw_property_error(f'Template {name} does not have parameters {unknown}')
+
+    values = {**declared, **given}
+    missing = [p for p, v in values.items() if v is None]
+
+    if missing:
+        throw_property_error(f'Template {name} requires parameters {missing}')
+
+    return values
+
+
+def expand_step(step, templates: Dict[str, dict], stack: Tuple[str, ...] = ()) -> Iterator:
+    """
+    Expands the step if it uses a template to the steps of the template with its parameters substituted. Steps that
+    do not use a template are returned as they are
+    :param step: the data of the step
+    :param templates: the templates by name
+    :param stack: the names of the templates being expanded that the step is from
+    :return: an iterator of the data of the expanded steps
+    """
+    if not isinstance(step, dict) or 'template' not in step:
+        yield step
+        return
+
+    name = step['template']
+
+    if any(key not in ['template', 'parameters'] for key in step):
+        throw_property_error(f'A step using template {name} can only have template and parameters')
+    elif name not in templates:
+        throw_property_error(f'Unknown template {name}')
+    elif name in stack:
+        throw_property_error(f'Template {name} uses itself through template {stack[-1]}')
+
+    template = templates[name]
+    parameters = _template_parameters(name, template, step.get('parameters'))
+
+    for template_step in template['steps']:
+        yield from expand_step(_substitute(template_step, parameters), templates, stack + (name,))
+
+
+def expand_steps(build: dict, templates: Dict[str, dict]):
+    """
+    Expands the steps and post-build steps of the build that use templates
+    :param build: the data of the build tag of the build file
+    :param templates: the templates by name
+    :return: None
+    """
+    for key in ['steps', 'post']:
+        steps = build.get(key)
+
+        if isinstance(steps, list):
+            build[key] = [expanded for step in steps for expanded in expand_step(step, templates)]
+
+
+def plan_cache_enabled() -> bool:
+    """
+    Returns true if parsed builds should be cached, which is the case unless DOCKER_WIZARD_PLAN_CACHE is false
+    """
+    return os.environ.get(DOCKER_WIZARD_PLAN_CACHE_VAR, 'true').lower() not in ['false', '0', 'no']
+
+
+def _plan_file(file: str, content: bytes) -> str:
+    """
+    Gets the path of the cached plan for the build file with the given content. The key includes the tool version so
+    plans are never loaded by a different version of the tool
+    """
+    key = hash_string(f'{os.path.abspath(file)}:{hashlib.sha256(content).hexdigest()}:{VERSION}')
+
+    return os.path.join(cache_directory('plans'), f'{key}.json')
+
+
+def load_plan(file: str, content: bytes) -> Union[dict, None]:
+    """
+    Loads the build data cached for the build file with the given content, which is the data of the build tag with its
+    templates expanded. Cached data is only returned if the files it included have not changed since it was cached. The
+    plan is plain JSON, so loading it cannot execute code, and the models are built from it as from the build file
+    :param file: the path to the build file
+    :param content: the content of the build file
+    :return: the cached build data or None if there is no valid cached build data
+    """
+    try:
+        with open(_plan_file(file, content), 'r') as f:
+            plan = json.load(f)
+
+        includes: Dict[str, str] = plan['includes']
+        build_data = plan['build']
+
+        if not isinstance(build_data, dict) or \
+                any(_file_digest(path) != digest for path, digest in includes.items()):
+            return None
+
+        return build_data
+    except Exception:
+        # a missing, corrupt or incompatible plan is parsed again from the build file
+        return None
+
+
+def save_plan(file: str, content: bytes, build_data: dict, includes: Dict[str, str] = None):
+    """
+    Caches the build data parsed from the build file with the given content. Data that JSON cannot represent exactly,
+    such as dates or mappings with keys that are not strings, is not cached
+    :param file: the path to the build file
+    :param content: the content of the build file
+    :param build_data: the data of the build tag with its templates expanded
+    :param includes: the hashes of other files the build was parsed from keyed by their path
+    :return: None
+    """
+    try:
+        serialised = json.dumps({'includes': includes if includes else {}, 'build': build_data})
+
+        if json.loads(serialised)['build'] != build_data:
+            return
+
+        plan_file = _plan_file(file, content)
+        temporary = f'{plan_file}.tmp-{os.getpid()}'
+
+        with open(temporary, 'w') as f:
+            f.write(serialised)
+
+        os.replace(temporary, plan_file)
+    except (OSError, TypeError, ValueError):
+        pass  # the cache is an optimisation, so failing to write it is not an error
+
+
 class YamlBuildParser(BuildParser):
     """
-    Allows parsing of a build from a YAML file
+    Allows parsing of a build from a YAML file. The parsed build data is cached against the content of the file, so an
+    unchanged build file is not parsed again
     """
     def parse(self, file: str) -> DockerBuild:
         info(f'Parsing build file {file}')
         try:
-            with open(file, 'r') as stream:
-                data = yaml.safe_load(stream)
+            with open(file, 'rb') as stream:
+                content = stream.read()
+
+            use_cache = plan_cache_enabled()
+            directory = os.path.dirname(os.path.abspath(file))
+            build_data = load_plan(file, content) if use_cache else None
+            includes = None
 
-            if 'build' not in data:
-                throw_property_error(f'{file} is an invalid build configuration file as it does not contain a build tag')
+            if build_data is not None:
+                info(f'Using cached plan of build file {file}')
+            else:
+                data = yaml.load(content, Loader=_Loader)
 
-            config_data = convert_dict_to_build_data(data['build'])
+                if not isinstance(data, dict) or 'build' not in data:
+                    throw_property_error(f'{file} is an invalid build configuration file as it does not contain a '
+                                         'build tag')
 
-            return DockerBuild().initialise(config_data)
+                build_data = data['build']
+                includes = {}
+
+                if isinstance(build_data, dict):
+                    expand_steps(build_data, resolve_templates(build_data, directory, includes))
+                    build_data.pop('include', None)
+                    build_data.pop('templates', None)
+
+            config_data = convert_dict_to_build_data(build_data)
+            build = DockerBuild()
+            build.directory = directory
+            build = build.initialise(config_data)
+
+            if use_cache and includes is not None:
+                save_plan(file, content, build_data, includes)
+
+            return build
         except FileNotFoundError:
             throw_property_error(f'Build Configuration File {file} does not exist')
 
 
-def get_build_parser() -> BuildParser:
+class _BuildStream:
+    """
+    Reads a build file one node at a time. The properties of the build before its steps are read up front and the
+    steps are then read as they are iterated, so only one step is held in memory at a time
+    """
+    def __init__(self, file: str):
+        self.file = file
+        self._stream = open(file, 'rb')
+        self._loader = _StreamingLoader(self._stream)
+        # the key of the list of steps being read, None once the build has been read
+        self.section = None
+        # the templates the steps can use
+        self.templates = {}
+
+    def close(self):
+        self.section = None
+        self._stream.close()
+
+    def _error(self, e: str):
+        self.close()
+        throw_property_error(e)
+
+    def _construct(self):
+        """
+        Composes and constructs the next node of the file
+        """
+        node = self._loader.compose_node(None, None)
+        value = self._loader.construct_object(node, deep=True)
+        # the constructed objects are only needed while the node is constructed, so they are cleared to keep the memory
+        # used proportional to the node rather than the whole file
+        self._loader.constructed_objects = {}
+
+        return value
+
+    def _expect(self, event, e: str):
+        if not self._loader.check_event(event):
+            self._error(e)
+
+        self._loader.get_event()
+
+    def _finish(self):
+        """
+        Reads the end of the build and skips anything after it in the file
+        """
+        self._loader.get_event()
+
+        while not self._loader.check_event(MappingEndEvent):
+            self._construct()
+
+        self.close()
+
+    def read_header(self) -> dict:
+        """
+        Reads the properties of the build up to its steps. If the steps are a list, the section is set to steps so
+        they can be read with read_steps
+        :return: the properties of the build read
+        """
+        try:
+            invalid = f'{self.file} is an invalid build configuration file as it does not contain a build tag'
+            self._expect(StreamStartEvent, invalid)
+            self._expect(DocumentStartEvent, invalid)
+            self._expect(MappingStartEvent, invalid)
+
+            while not self._loader.check_event(MappingEndEvent):
+                if self._construct() == 'build':
+                    break
+
+                self._construct()
+            else:
+                self._error(invalid)
+
+            self._expect(MappingStartEvent, f'The build tag of {self.file} must be a mapping')
+            header = {}
+
+            while not self._loader.check_event(MappingEndEvent):
+                key = self._construct()
+
+                if key == 'steps' and self._loader.check_event(SequenceStartEvent):
+                    self._loader.get_event()
+                    self.section = key
+
+                    return header
+
+                header[key] = self._construct()
+
+            self._finish()
+
+            return header
+        except yaml.YAMLError as e:
+            self._error(f'Failed to parse build file {self.file}: {e}')
+
+    def _next_section(self):
+        """
+        Reads the rest of the build after a list of steps, which may only be the post-build steps
+        """
+        while not self._loader.check_event(MappingEndEvent):
+            key = self._construct()
+
+            if key == 'post' and self.section == 'steps':
+                if self._loader.check_event(SequenceStartEvent):
+                    self._loader.get_event()
+                    self.section = key
+
+                    return
+                elif self._construct() is None:
+                    continue
+
+                self._error(f'post must be a list of steps in build file {self.file}')
+
+            self._error(f'{key} must be defined before the steps of build file {self.file} for it to be streamed')
+
+        self._finish()
+
+    def read_steps(self, section: str) -> Iterator[BuildStep]:
+        """
+        Reads and initialises the steps of the section one at a time
+        :param section: steps or post
+        :return: an iterator of the steps
+        """
+        index = 0
+
+        try:
+            while self.section == section:
+                if self._loader.check_event(SequenceEndEvent):
+                    self._loader.get_event()
+                    self._next_section()
+                else:
+                    index += 1
+                    data = self._construct()
+
+                    if not isinstance(data, dict):
+                        self._error(f'Step {index} of {section} in build file {self.file} must be a mapping')
+
+                    for step in expand_step(data, self.templates):
+                        yield BuildStep().initialise(convert_dict_to_build_data(step))
+        except yaml.YAMLError as e:
+            self._error(f'Failed to parse build file {self.file}: {e}')
+        finally:
+            # the build stopped iterating before the end of the section, e.g. because a step failed, so the rest of
+            # the file is never read
+            if self.section == section:
+                self.close()
+
+
+class StepStream:
+    """
+    The steps of a streamed build, which are read from the build file as they are iterated. The steps can only be
+    iterated once and the steps must be iterated before the post-build steps
+    """
+    def __init__(self, stream: _BuildStream, section: str):
+        self._stream = stream
+        self._section = section
+        self._iterated = False
+
+    def __iter__(self) -> Iterator[BuildStep]:
+        if self._iterated:
+            throw_property_error(f'The {self._section} of streamed build file {self._stream.file} have already been '
+                                 f'read')
+
+        self._iterated = True
+
+        if self._section == 'post' and self._stream.section == 'steps':
+            throw_property_error(f'The steps of streamed build file {self._stream.file} must be read before the '
+                                 f'post-build steps')
+
+        return self._stream.read_steps(self._section)
+
+    def close(self):
+        """
+        Closes the build file, after which no more steps can be read
+        :return: None
+        """
+        self._stream.close()
+
+
+class StreamingYamlBuildParser(BuildParser):
+    """
+    Parses a build from a YAML file incrementally. The properties of the build are parsed and validated up front, but
+    the steps are parsed and validated as the build executes them, so a build can start before a very large build file
+    has been parsed and only one step is held in memory at a time. All properties of the build other than the
+    post-build steps must be defined before the steps. Streamed builds are not cached
+    """
+    def parse(self, file: str) -> DockerBuild:
+        info(f'Streaming build file {file}')
+
+        try:
+            stream = _BuildStream(file)
+        except FileNotFoundError:
+            throw_property_error(f'Build Configuration File {file} does not exist')
+
+        header = stream.read_header()
+        streamed = stream.section == 'steps'
+
+        if streamed:
+            header['steps'] = []
+
+        build = DockerBuild()
+        build.directory = os.path.dirname(os.path.abspath(file))
+
+        try:
+            stream.templates = resolve_templates(header, build.directory, {})
+            expand_steps(header, stream.templates)
+            header.pop('include', None)
+            header.pop('templates', None)
+            build.initialise(convert_dict_to_build_data(header))
+        except Exception:
+            stream.close()
+            raise
+
+        if streamed:
+            build.steps = StepStream(stream, 'steps')
+
+            if 'post' not in header:
+                build.post_steps = StepStream(stream, 'post')
+
+        return build
+
+
+def get_build_parser(stream: bool = False) -> BuildParser:
     """
     Get the implementation of the build parser
+    :param stream: true to get a parser that parses the steps of the build as they are executed
     :return: current implementation of the build parser
     """
-    return YamlBuildParser()
+    return StreamingYamlBuildParser() if stream else YamlBuildParser()
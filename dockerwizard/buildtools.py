@@ -0,0 +1,598 @@
+"""
+This module holds the build tools that can be run by the run-build-tool command
+"""
+import json
+import os
+import platform
+import shutil
+from abc import ABC, abstractmethod
+from typing import List, Tuple, Dict, Union
+
+from .cache import cache_directory, hash_string, hash_files, link_tree, save_tree, CacheLock, LINK_MODES
+from .cli import info
+from .errors import CommandError
+from .process import ExecutionResult
+
+
+class BuildTool(ABC):
+    """
+    A base class for a build tool supported by the run-build-tool command
+    """
+    def __init__(self, name: str, named_args: List[Tuple[str, bool]]):
+        """
+        Initialise the build tool
+        :param name: the name of the tool used as the positional argument of run-build-tool
+        :param named_args: a list of (name, required) tuples defining the named arguments of the tool
+        """
+        self.name = name
+        self.named_args = named_args
+
+    def validate_named_args(self, named: dict):
+        """
+        Validate that the required named arguments are provided, throwing a CommandError if not
+        :param named: the named arguments of the build step
+        :return: None
+        """
+        for definition in self.named_args:
+            name = definition[0]
+            required = False if len(definition) < 2 else definition[1]
+            value = named.get(name)
+
+            if not value and required:
+                raise CommandError(f'Named argument {name} not provided')
+
+    @abstractmethod
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        """
+        Get the command line to execute the tool with from the named arguments
+        :param named: the named arguments of the build step
+        :param cwd: the directory the tool is executed in
+        :return: the list of command line arguments
+        """
+        pass
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        """
+        Get the environment variables to add to the environment of the tool's execution
+        :param named: the named arguments of the build step
+        :return: the environment variables or None if the tool needs none
+        """
+        return None
+
+    def before_execution(self, named: dict, cwd: str = '.') -> dict:
+        """
+        A hook called before the tool is executed
+        :param named: the named arguments of the build step
+        :param cwd: the directory the tool is executed in
+        :return: a dictionary of state that is passed into after_execution. If the state contains skip set to true, the
+        tool is not executed as the hook has already produced its result
+        """
+        return {}
+
+    def after_execution(self, named: dict, state: dict, result: ExecutionResult, duration: float, cwd: str = '.'):
+        """
+        A hook called after the tool has executed successfully
+        :param named: the named arguments of the build step
+        :param state: the state returned by before_execution
+        :param result: the result of the execution
+        :param duration: the time in seconds the execution took
+        :param cwd: the directory the tool was executed in
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def print_help(self):
+        """
+        Print the help of the named arguments for this tool
+        """
+        pass
+
+
+class MavenTool(BuildTool):
+    """
+    Runs Maven builds. A persistent local repository can be kept in the cache directory so that dependencies are only
+    resolved once across builds
+    """
+    def __init__(self, name: str = 'maven', executable: str = 'mvn', named_args: List[Tuple[str, bool]] = None):
+        named_args = named_args if named_args else []
+        super().__init__(name, [('goals', True), ('arguments', False), ('cache', False), ('offline', False),
+                                ('threads', False), ('batch', False)] + named_args)
+        self.executable = executable
+
+    @staticmethod
+    def repository_path() -> str:
+        """
+        Get the path to the local repository Maven uses when the cache named argument is true
+        """
+        return cache_directory('maven', 'repository')
+
+    @staticmethod
+    def _stats_path() -> str:
+        return os.path.join(cache_directory('maven'), 'stats.json')
+
+    @staticmethod
+    def _load_stats(path: str) -> dict:
+        """
+        Loads the uncached durations of builds by their stats key. Must be called with the stats locked
+        """
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+
+        return {}
+
+    @staticmethod
+    def _stats_key(named: dict, cwd: str) -> str:
+        """
+        Builds with the same goals, arguments and pom.xml are comparable, so the uncached duration is stored per key
+        """
+        key = f'{named.get("goals")}:{named.get("arguments")}'
+        pom = os.path.join(cwd, 'pom.xml')
+
+        if os.path.isfile(pom):
+            with open(pom, 'r') as f:
+                key = f'{key}:{f.read()}'
+
+        return hash_string(key)
+
+    def _get_executable_args(self, named: dict) -> list:
+        """
+        Get the executable and any arguments that must come before the maven arguments
+        """
+        return [self.executable]
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        args = self._get_executable_args(named)
+
+        if named.get('batch'):
+            args.append('-B')
+
+        if named.get('offline'):
+            args.append('-o')
+
+        threads = named.get('threads')
+
+        if threads:
+            args.extend(['-T', str(threads)])
+
+        if named.get('cache'):
+            args.append(f'-Dmaven.repo.local={MavenTool.repository_path()}')
+
+        arguments = named.get('arguments')
+
+        if arguments:
+            args.extend(arguments)
+
+        args.extend(named['goals'])
+
+        return args
+
+    def before_execution(self, named: dict, cwd: str = '.') -> dict:
+        if not named.get('cache'):
+            return {}
+
+        path = MavenTool._stats_path()
+        # the key is taken before the build, which may modify the pom.xml
+        key = MavenTool._stats_key(named, cwd)
+
+        with CacheLock(path):
+            stats = MavenTool._load_stats(path)
+
+        # the repository is shared between projects, so a build is cold until it has a baseline of its own
+        return {'key': key, 'cold': key not in stats}
+
+    def after_execution(self, named: dict, state: dict, result: ExecutionResult, duration: float,
+                        cwd: str = '.'):
+        if not named.get('cache'):
+            return
+
+        path = MavenTool._stats_path()
+        key = state['key']
+        cold = state['cold'] and result.is_healthy()
+
+        with CacheLock(path):
+            stats = MavenTool._load_stats(path)
+            uncached = stats.get(key)
+
+            if cold and uncached is None:
+                # only the first successful build of the project is a baseline to compare cached builds against
+                stats[key] = duration
+
+                with open(path, 'w') as f:
+                    json.dump(stats, f)
+
+        if cold:
+            info(f'Maven repository cache populated in {duration:.2f}s. Subsequent builds will resolve dependencies '
+                 'from the cache')
+        elif uncached is not None:
+            info(f'Maven repository cache saved approximately {max(uncached - duration, 0):.2f}s of dependency '
+                 f'resolution ({uncached:.2f}s uncached, {duration:.2f}s cached)')
+
+    def print_help(self):
+        info('\t\tmaven: Maven supports goals named arguments identifying a list of Maven goals (required). '
+             'Also supports a list of arguments to pass to the maven command line')
+        info('\t\t\tcache: true to use a persistent local repository in the cache directory (-Dmaven.repo.local) '
+             'and report the resolution time saved by it')
+        info('\t\t\toffline: true to run Maven in offline mode (-o)')
+        info('\t\t\tthreads: the number of threads to build with, e.g. 4 or 1C (-T)')
+        info('\t\t\tbatch: true to run Maven in batch mode (-B)')
+
+
+def _idle_timeout_seconds(named: dict) -> Union[int, None]:
+    """
+    Get the idle_timeout named argument of a daemon tool in seconds, throwing a CommandError if it is invalid
+    """
+    timeout = named.get('idle_timeout')
+
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, int) or timeout < 1):
+        raise CommandError(f'Named argument idle_timeout must be a positive number of seconds but was {timeout}')
+
+    return timeout
+
+
+def _daemon_directory(tool: str, named: dict) -> Union[str, None]:
+    """
+    Get the directory daemons of the tool are registered in if the isolation named argument is given. Daemons are only
+    reused by builds with the same isolation
+    """
+    isolation = named.get('isolation')
+
+    return cache_directory(tool, 'daemons', str(isolation)) if isolation else None
+
+
+class MvndTool(MavenTool):
+    """
+    Runs Maven builds with the Maven Daemon (mvnd) which keeps warm JVMs alive between steps and builds, avoiding the
+    JVM start up and JIT warm-up of each mvn invocation. Supports the same named arguments as maven
+    """
+    def __init__(self):
+        super().__init__('mvnd', 'mvnd', [('daemon', False), ('idle_timeout', False), ('isolation', False)])
+
+    def validate_named_args(self, named: dict):
+        super().validate_named_args(named)
+        _idle_timeout_seconds(named)
+
+    def _get_executable_args(self, named: dict) -> list:
+        args = [self.executable]
+
+        if named.get('daemon', True) is False:
+            args.append('-Dmvnd.noDaemon=true')
+
+        timeout = _idle_timeout_seconds(named)
+
+        if timeout:
+            args.append(f'-Dmvnd.idleTimeout={timeout}s')
+
+        storage = _daemon_directory(self.name, named)
+
+        if storage:
+            args.append(f'-Dmvnd.daemonStorage={storage}')
+
+        return args
+
+    def print_help(self):
+        info('\t\tmvnd: runs Maven with the Maven Daemon and supports the same named arguments as maven')
+        info('\t\t\tdaemon: false to run the build without a daemon (default true)')
+        info('\t\t\tidle_timeout: the number of seconds an idle daemon is kept alive for')
+        info('\t\t\tisolation: a name for a separate pool of daemons, only reused by builds with the same isolation')
+
+
+class GradleTool(BuildTool):
+    """
+    Runs Gradle builds with the Gradle Daemon enabled so that warm daemons are reused between steps and builds
+    """
+    def __init__(self):
+        super().__init__('gradle', [('tasks', True), ('arguments', False), ('wrapper', False), ('daemon', False),
+                                    ('idle_timeout', False), ('isolation', False)])
+
+    def validate_named_args(self, named: dict):
+        super().validate_named_args(named)
+        _idle_timeout_seconds(named)
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        args = [os.path.join('.', 'gradlew') if named.get('wrapper') else 'gradle']
+        args.append('--daemon' if named.get('daemon', True) is not False else '--no-daemon')
+        timeout = _idle_timeout_seconds(named)
+
+        if timeout:
+            args.append(f'-Dorg.gradle.daemon.idletimeout={timeout * 1000}')
+
+        arguments = named.get('arguments')
+
+        if arguments:
+            args.extend(arguments)
+
+        args.extend(named['tasks'])
+
+        return args
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        # daemons are only shared by builds with the same Gradle user home
+        home = _daemon_directory(self.name, named)
+
+        return {'GRADLE_USER_HOME': home} if home else None
+
+    def print_help(self):
+        info('\t\tgradle: tasks is a list of Gradle tasks to execute (required). Also supports a list of arguments to '
+             'pass to the gradle command line')
+        info('\t\t\twrapper: true to run the build with the Gradle wrapper (gradlew) of the project')
+        info('\t\t\tdaemon: false to run the build without a daemon (default true)')
+        info('\t\t\tidle_timeout: the number of seconds an idle daemon is kept alive for')
+        info('\t\t\tisolation: a name for a separate Gradle user home in the cache directory, so that only builds '
+             'with the same isolation share daemons')
+
+
+def _lock_file_key(lock_files: List[str], extra: str = '') -> str:
+    """
+    Get a cache key from the contents of the lock files and the platform, as installed dependencies can be platform
+    specific
+    """
+    return hash_files(lock_files, f'{platform.system()}:{platform.machine()}{extra}')
+
+
+def _validate_link(named: dict, default: str):
+    """
+    Validate the link named argument of a tool that restores snapshots
+    """
+    link = named.get('link', default)
+
+    if link not in LINK_MODES:
+        raise CommandError(f'Named argument link must be one of {LINK_MODES} but was {link}')
+
+
+def _restore_snapshot(cwd: str, directory: str, snapshot: str, link: str) -> bool:
+    """
+    Restore the directory relative to cwd from the snapshot if the snapshot exists and the directory does not
+    :return: true if the directory was restored
+    """
+    path = os.path.join(cwd, directory)
+
+    with CacheLock(snapshot):
+        if os.path.isdir(snapshot) and not os.path.exists(path):
+            info(f'Restoring {directory} from snapshot {os.path.basename(snapshot)}')
+            link_tree(snapshot, path, link)
+
+            return True
+
+    return False
+
+
+def _save_snapshot(cwd: str, directory: str, snapshot: str):
+    """
+    Save the directory relative to cwd to the snapshot if the directory exists and the snapshot does not
+    """
+    path = os.path.join(cwd, directory)
+
+    if os.path.isdir(path):
+        with CacheLock(snapshot):
+            if not os.path.isdir(snapshot):
+                info(f'Saving {directory} to snapshot {os.path.basename(snapshot)}')
+                save_tree(path, snapshot)
+
+
+class NpmTool(BuildTool):
+    """
+    Runs npm commands. The npm cache can be shared between builds and node_modules can be restored from snapshots keyed
+    by the hash of package-lock.json (or package.json if there is no lock file), skipping installs that have been done
+    before
+    """
+    _INSTALL_COMMANDS = ['ci', 'install', 'i']
+
+    def __init__(self):
+        super().__init__('npm', [('arguments', True), ('cache', False), ('snapshot', False), ('link', False)])
+
+    @staticmethod
+    def _is_install(named: dict) -> bool:
+        """
+        Returns true if the arguments install all the dependencies of the project and nothing else
+        """
+        arguments = named['arguments']
+
+        return arguments[0] in NpmTool._INSTALL_COMMANDS and all(arg.startswith('-') for arg in arguments[1:])
+
+    @staticmethod
+    def _snapshot_path(cwd: str) -> str:
+        lock_file = os.path.join(cwd, 'package-lock.json')
+        lock_file = lock_file if os.path.isfile(lock_file) else os.path.join(cwd, 'package.json')
+
+        return os.path.join(cache_directory('npm', 'node_modules'), _lock_file_key([lock_file]))
+
+    def validate_named_args(self, named: dict):
+        super().validate_named_args(named)
+        _validate_link(named, 'hardlink')
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        args = ['npm']
+        args.extend(named['arguments'])
+
+        return args
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        if named.get('cache'):
+            return {'npm_config_cache': cache_directory('npm', 'cache')}
+
+        return None
+
+    def before_execution(self, named: dict, cwd: str = '.') -> dict:
+        if not named.get('snapshot') or not NpmTool._is_install(named):
+            return {}
+
+        snapshot = NpmTool._snapshot_path(cwd)
+
+        if _restore_snapshot(cwd, 'node_modules', snapshot, named.get('link', 'hardlink')):
+            info(f'node_modules restored, skipping npm {" ".join(named["arguments"])}')
+
+            return {'skip': True}
+
+        return {'snapshot': snapshot}
+
+    def after_execution(self, named: dict, state: dict, result: ExecutionResult, duration: float,
+                        cwd: str = '.'):
+        snapshot = state.get('snapshot')
+
+        if snapshot:
+            _save_snapshot(cwd, 'node_modules', snapshot)
+
+    def print_help(self):
+        info('\t\tnpm: supports a list of arguments to pass to the npm command line')
+        info('\t\t\tcache: true to share the npm cache between builds using npm_config_cache')
+        info('\t\t\tsnapshot: true to restore node_modules from a snapshot matching the hash of package-lock.json '
+             'and skip the install, or else save a snapshot after the install succeeds')
+        info(f'\t\t\tlink: how node_modules is restored from the snapshot, one of {LINK_MODES} (default hardlink)')
+
+
+class PipTool(BuildTool):
+    """
+    Runs pip commands. With the cache named argument, pip's HTTP and wheel cache is shared between builds and wheels
+    built by pip wheel are kept in a wheelhouse keyed by the hash of the requirements files, which pip finds links to so
+    wheels are not built again
+    """
+    _WHEEL_DIR_FLAGS = ['-w', '--wheel-dir']
+
+    def __init__(self):
+        super().__init__('pip', [('arguments', True), ('cache', False), ('requirements', False)])
+
+    @staticmethod
+    def _requirements(named: dict, cwd: str) -> list:
+        requirements = named.get('requirements', ['requirements.txt'])
+        requirements = [requirements] if isinstance(requirements, str) else requirements
+
+        return [os.path.join(cwd, r) for r in requirements]
+
+    @staticmethod
+    def _wheelhouse_path(named: dict, cwd: str) -> str:
+        key = _lock_file_key(PipTool._requirements(named, cwd), f':{platform.python_version()}')
+
+        return cache_directory('pip', 'wheelhouse', key)
+
+    @staticmethod
+    def _wheel_dir(arguments: list) -> str:
+        """
+        Get the directory pip wheel outputs wheels to from the arguments
+        """
+        for i, arg in enumerate(arguments):
+            if arg in PipTool._WHEEL_DIR_FLAGS and i + 1 < len(arguments):
+                return arguments[i + 1]
+            elif arg.startswith('--wheel-dir='):
+                return arg[len('--wheel-dir='):]
+
+        return '.'
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        arguments = named['arguments']
+        args = ['pip', arguments[0]]
+
+        if named.get('cache'):
+            args.extend(['--find-links', PipTool._wheelhouse_path(named, cwd)])
+
+        args.extend(arguments[1:])
+
+        return args
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        if named.get('cache'):
+            return {'PIP_CACHE_DIR': cache_directory('pip', 'cache')}
+
+        return None
+
+    def after_execution(self, named: dict, state: dict, result: ExecutionResult, duration: float,
+                        cwd: str = '.'):
+        arguments = named['arguments']
+
+        if named.get('cache') and arguments[0] == 'wheel':
+            wheelhouse = PipTool._wheelhouse_path(named, cwd)
+            wheel_dir = os.path.join(cwd, PipTool._wheel_dir(arguments))
+
+            with CacheLock(wheelhouse):
+                for wheel in [f for f in os.listdir(wheel_dir) if f.endswith('.whl')]:
+                    if not os.path.isfile(os.path.join(wheelhouse, wheel)):
+                        shutil.copy2(os.path.join(wheel_dir, wheel), wheelhouse)
+
+    def print_help(self):
+        info('\t\tpip: supports a list of arguments to pass to the pip command line')
+        info('\t\t\tcache: true to share PIP_CACHE_DIR between builds and keep the wheels built by pip wheel in a '
+             'wheelhouse that pip finds links to')
+        info('\t\t\trequirements: the requirements files the wheelhouse is keyed by (default requirements.txt)')
+
+
+class GoTool(BuildTool):
+    """
+    Runs go commands. With the cache named argument, the build cache (GOCACHE) and module cache (GOMODCACHE) are shared
+    between builds. Both caches are content addressed by Go, so they are safe to share between projects and versions of
+    go.sum
+    """
+    def __init__(self):
+        super().__init__('go', [('arguments', True), ('cache', False)])
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        args = ['go']
+        args.extend(named['arguments'])
+
+        return args
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        if named.get('cache'):
+            return {
+                'GOCACHE': cache_directory('go', 'build'),
+                'GOMODCACHE': cache_directory('go', 'mod')
+            }
+
+        return None
+
+    def print_help(self):
+        info('\t\tgo: supports a list of arguments to pass to the go command line')
+        info('\t\t\tcache: true to share GOCACHE and GOMODCACHE between builds')
+
+
+class CargoTool(BuildTool):
+    """
+    Runs cargo commands. With the cache named argument, CARGO_HOME is shared between builds so crates are downloaded
+    once, and the target directory can be restored from snapshots keyed by the hash of Cargo.lock so that dependencies
+    are not compiled again
+    """
+    def __init__(self):
+        super().__init__('cargo', [('arguments', True), ('cache', False), ('snapshot', False), ('link', False)])
+
+    @staticmethod
+    def _snapshot_path(cwd: str) -> str:
+        return os.path.join(cache_directory('cargo', 'target'), _lock_file_key([os.path.join(cwd, 'Cargo.lock')]))
+
+    def validate_named_args(self, named: dict):
+        super().validate_named_args(named)
+        _validate_link(named, 'reflink')
+
+    def get_args(self, named: dict, cwd: str = '.') -> list:
+        args = ['cargo']
+        args.extend(named['arguments'])
+
+        return args
+
+    def get_env(self, named: dict) -> Union[Dict[str, str], None]:
+        if named.get('cache'):
+            return {'CARGO_HOME': cache_directory('cargo', 'home')}
+
+        return None
+
+    def before_execution(self, named: dict, cwd: str = '.') -> dict:
+        if not named.get('snapshot'):
+            return {}
+
+        snapshot = CargoTool._snapshot_path(cwd)
+        _restore_snapshot(cwd, 'target', snapshot, named.get('link', 'reflink'))
+
+        return {'snapshot': snapshot}
+
+    def after_execution(self, named: dict, state: dict, result: ExecutionResult, duration: float,
+                        cwd: str = '.'):
+        snapshot = state.get('snapshot')
+
+        if snapshot:
+            _save_snapshot(cwd, 'target', snapshot)
+
+    def print_help(self):
+        info('\t\tcargo: supports a list of arguments to pass to the cargo command line')
+        info('\t\t\tcache: true to share CARGO_HOME between builds')
+        info('\t\t\tsnapshot: true to restore the target directory from a snapshot matching the hash of Cargo.lock, '
+             'or else save a snapshot after the command succeeds')
+        info(f'\t\t\tlink: how target is restored from the snapshot, one of {LINK_MODES} (default reflink)')
@@ -1,19 +1,26 @@
 """
 This module holds all the builtin commands
 """
-import argparse
+import functools
 import os
 import re
 import shutil
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 
 from . import commands
 from .commands import AbstractCommand, CommandRegistry
+from .context import propagate
 from .docker import DockerClient
-from .errors import CommandError
+from .environment import BuildEnvironment
+from .errors import CommandError, BuildContextError
+from .git import GitClient, repository_name
+from .buildtools import MavenTool, MvndTool, GradleTool, NpmTool, PipTool, GoTool, CargoTool
 from .process import Execution, ExecutionResult
-from .cli import info, warn
-from .system import isWindows
+from .cli import info, warn, error
+from .system import isWindows, BUILTIN_COMMANDS
 from .const import DOCKER_WIZARD_BASH_PATH
 
 
@@ -45,8 +52,8 @@ class CopyCommand(AbstractCommand, BuiltinCommand):
         shutil.copy(from_arg, to_arg, follow_symlinks=True)
 
     def _execute(self, args: list):
-        from_arg = args[0]
-        to_arg = args[1]
+        from_arg = self.resolve_path(args[0])
+        to_arg = self.resolve_path(args[1])
 
         if os.path.isdir(from_arg):
             CopyCommand._call_copy_tree(from_arg, to_arg)
@@ -64,6 +71,19 @@ class CopyCommand(AbstractCommand, BuiltinCommand):
         info('\t\t2. Destination')
 
 
+def _current_named_args(command: AbstractCommand) -> dict:
+    """
+    Returns the named arguments of the build step the command is being executed in. If the command is not being
+    executed in a build step, an empty dictionary is returned
+    """
+    try:
+        step = command.build_context.current_step
+    except BuildContextError:
+        return {}
+
+    return step.named if step is not None and step.named else {}
+
+
 class _GenericOutputHandler:
     """
     A handler for common generic command output handling
@@ -124,7 +144,7 @@ class ExecuteSystemCommand(AbstractCommand, BuiltinCommand):
 
     def _execute(self, args: list):
         bash_resolved = self._resolve_bash(args)
-        execution = Execution(args).execute()
+        execution = Execution(args, env=self.process_environment(), cwd=self.working_directory).execute()
 
         if bash_resolved and isWindows():
             # restore color after executing bash as it can reset the colors
@@ -146,22 +166,22 @@ class ExecuteSystemCommand(AbstractCommand, BuiltinCommand):
 
 class SetVariableCommand(AbstractCommand, BuiltinCommand):
     """
-    A command that allows you to set an environment variable
+    A command that allows you to set an environment variable in the build environment
     """
     def __init__(self, secret: bool = False):
         self.secret = secret
         super().__init__('set-secret' if secret else 'set-variable', 2)
 
     def _execute(self, args: list):
-        self._do_set(args[0], args[1], os.environ)
+        self._do_set(args[0], args[1], self.build_context.environment)
 
-    def _do_set(self, name: str, value: str, environs):
+    def _do_set(self, name: str, value: str, environment: BuildEnvironment):
         if self.secret:
             info(f'Setting secret variable {name}')
         else:
             info(f'Setting variable {name} with value {value}')
 
-        environs[name] = value
+        environment.set(name, value, self.secret)
 
     def default_name(self):
         return 'Set Variable'
@@ -185,7 +205,10 @@ class SetVariablesCommand(AbstractCommand, BuiltinCommand):
     def __init__(self):
         super().__init__('set-variables', 1, True)
 
-    def _execute(self, args: list):
+    @staticmethod
+    def _parse_variables(args: list) -> dict:
+        variables = {}
+
         for arg in args:
             split = arg.split("=")
 
@@ -199,41 +222,106 @@ class SetVariablesCommand(AbstractCommand, BuiltinCommand):
                 if len(name.split(' ')) > 1:
                     raise CommandError('Names of variables cannot contain spaces')
                 else:
-                    os.environ[name] = value
+                    variables[name] = value
+
+        return variables
+
+    def _validate(self, args: list, named: dict):
+        SetVariablesCommand._parse_variables(args)
+
+    def _execute(self, args: list):
+        variables = SetVariablesCommand._parse_variables(args)
+        self.build_context.environment.update(variables)
 
     def print_help(self):
         info(f'Command: {self.name}')
-        info('Provides the ability to set multiple environment variables by supplying key=value pairs')
+        info('Provides the ability to set multiple environment variables in the build environment by supplying '
+             'key=value pairs')
         info('\tArguments: 1 or more arguments')
 
 
 class GitCloneCommand(AbstractCommand, BuiltinCommand):
     """
-    A command that allows a git repository to be cloned
+    A command that allows a git repository to be cloned.
+    Supports the named arguments branch, depth, filter, sparse and mirror to speed up clones of large repositories
     """
     def __init__(self):
         super().__init__('git-clone', 1, True, 2)
 
-    def _execute(self, args: list):
-        repo = args[0]
-        name = args[1] if len(args) == 2 else None
-        args = ['git', 'clone', repo]
+    @staticmethod
+    def _validate_named_args(named: dict):
+        depth = named.get('depth')
+
+        if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 1):
+            raise CommandError(f'Named argument depth must be a positive integer but was {depth}')
+
+        sparse = named.get('sparse')
+
+        if sparse is not None and not isinstance(sparse, (bool, str, list)):
+            raise CommandError('Named argument sparse must be true or a list of paths to check out')
+
+    @staticmethod
+    def _raise_git_error(result: ExecutionResult, action: str):
+        stderr = result.stderr if result.stderr else result.stdout
+        raise CommandError(f'Failed to perform {action} with error {stderr} and exit code {result.exit_code}')
+
+    @staticmethod
+    def _update_mirror(repo: str, env: Dict[str, str] = None, cwd: str = None):
+        """
+        Update the cached mirror of the repository and return its path to be used as a clone reference
+        """
+        info(f'Updating cached mirror of Git repository {repo}')
+        result = GitClient.update_mirror(repo, env=env, cwd=cwd)
+
+        if result.exit_code != 0:
+            GitCloneCommand._raise_git_error(result, 'git mirror update')
+
+        return GitClient.mirror_path(repo)
+
+    @staticmethod
+    def clone(repo: str, name: str = None, options: dict = None, env: Dict[str, str] = None, cwd: str = None):
+        """
+        Clone the repository into the optional target directory name using the given clone options, which are the
+        same as the named arguments of the command, and environment. The target is relative to cwd, the working
+        directory of this process if not provided. Raises a CommandError if the clone fails
+        """
+        options = options if options else {}
+        GitCloneCommand._validate_named_args(options)
+        sparse = options.get('sparse')
+        reference = GitCloneCommand._update_mirror(repo, env, cwd) if options.get('mirror') else None
 
         msg = f'Cloning Git repository {repo}'
 
         if name is not None:
-            args.append(name)
             msg = f'{msg} into {name}'
 
         info(msg)
 
-        result = Execution(args).execute()
+        result = GitClient.clone(repo, name, branch=options.get('branch'), depth=options.get('depth'),
+                                 filter_spec=options.get('filter'), sparse=bool(sparse), reference=reference,
+                                 submodules=bool(options.get('submodules')), jobs=options.get('submodule_jobs'),
+                                 env=env, cwd=cwd)
 
         if result.exit_code != 0:
-            stderr = result.stderr if result.stderr else result.stdout
-            raise CommandError(f'Failed to perform git clone with error {stderr} and exit code {result.exit_code}')
-        else:
-            info(f'Git clone completed successfully')
+            GitCloneCommand._raise_git_error(result, 'git clone')
+
+        if sparse and not isinstance(sparse, bool):
+            directory = name if name else repository_name(repo)
+            info(f'Setting sparse checkout of {directory} to {sparse}')
+            result = GitClient.sparse_checkout(directory, sparse, env=env, cwd=cwd)
+
+            if result.exit_code != 0:
+                GitCloneCommand._raise_git_error(result, 'git sparse-checkout')
+
+    def _validate(self, args: list, named: dict):
+        GitCloneCommand._validate_named_args(named)
+
+    def _execute(self, args: list):
+        repo = args[0]
+        name = args[1] if len(args) == 2 else None
+        GitCloneCommand.clone(repo, name, _current_named_args(self), self.process_environment(), self.working_directory)
+
+        info(f'Git clone completed successfully')
 
     def default_name(self):
         return 'Git Clone'
@@ -244,6 +332,128 @@ class GitCloneCommand(AbstractCommand, BuiltinCommand):
         info('\tArguments: At least 1 argument, with optional 2nd argument')
         info('\t\t1. URL of git repository')
         info('\t\t2. Optional name of target directory to clone into')
+        info('\tNamed Arguments (all optional):')
+        info('\t\tbranch: the branch or tag to clone')
+        info('\t\tdepth: create a shallow clone truncated to this number of commits')
+        info('\t\tfilter: a partial clone filter, e.g. blob:none')
+        info('\t\tsparse: true to only check out top level files, or a list of paths to check out')
+        info('\t\tmirror: true to keep a bare mirror of the repository in the cache directory which is fetched into '
+             'and used as a reference for the clone')
+        info('\t\tsubmodules: true to clone submodules recursively')
+        info('\t\tsubmodule_jobs: the number of submodules to fetch in parallel')
+
+
+class GitCloneManyCommand(AbstractCommand, BuiltinCommand):
+    """
+    A command that clones multiple git repositories concurrently.
+    Repositories are passed in as positional URLs and/or in the repositories named argument, where each repository can
+    specify its own target directory and the clone options supported by git-clone
+    """
+    _DEFAULT_JOBS = 4
+
+    def __init__(self):
+        super().__init__('git-clone-many', 0, at_least=True)
+
+    def _get_repositories(self, args: list, named: dict) -> list:
+        """
+        Get the list of repositories to clone as (url, target, options) tuples. Options not given for a repository are
+        inherited from the top level named arguments
+        """
+        defaults = {key: value for key, value in named.items() if key not in ['repositories', 'jobs']}
+        repositories = [(url, None, defaults) for url in args]
+
+        for repository in named.get('repositories') or []:
+            if isinstance(repository, str):
+                repositories.append((repository, None, defaults))
+            elif isinstance(repository, dict) and repository.get('url'):
+                options = defaults.copy()
+                options.update({key: value for key, value in repository.items() if key not in ['url', 'target']})
+                repositories.append((repository['url'], repository.get('target'), options))
+            else:
+                raise CommandError(f'Repository {repository} must be a URL or contain a url named argument')
+
+        if len(repositories) == 0:
+            raise CommandError(f'The {self.name} command requires at least 1 repository')
+
+        return repositories
+
+    @staticmethod
+    def _get_jobs(named: dict) -> int:
+        jobs = named.get('jobs', GitCloneManyCommand._DEFAULT_JOBS)
+
+        if isinstance(jobs, bool) or not isinstance(jobs, int) or jobs < 1:
+            raise CommandError(f'Named argument jobs must be a positive integer but was {jobs}')
+
+        return jobs
+
+    @staticmethod
+    def _clone(repository: tuple, env: Dict[str, str] = None, cwd: str = None):
+        """
+        Clone the repository returning a tuple of the error message (None if successful) and duration in seconds
+        """
+        url, target, options = repository
+        start = time.perf_counter()
+
+        try:
+            GitCloneCommand.clone(url, target, options, env, cwd)
+            message = None
+        except CommandError as e:
+            message = e.message
+
+        return message, time.perf_counter() - start
+
+    def _validate(self, args: list, named: dict):
+        for _, _, options in self._get_repositories(args, named):
+            GitCloneCommand._validate_named_args(options)
+
+        self._get_jobs(named)
+
+    def _execute(self, args: list):
+        named = _current_named_args(self)
+        repositories = self._get_repositories(args, named)
+        jobs = self._get_jobs(named)
+        env = self.process_environment()
+        cwd = self.working_directory
+
+        info(f'Cloning {len(repositories)} Git repositories with up to {jobs} concurrent clones')
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            clone = propagate(lambda repository: GitCloneManyCommand._clone(repository, env, cwd))
+            results = list(executor.map(clone, repositories))
+
+        duration = time.perf_counter() - start
+        failed = []
+        info('Git clone summary:')
+
+        for repository, result in zip(repositories, results):
+            url = repository[0]
+            message, repository_duration = result
+
+            if message is None:
+                info(f'\tSUCCESS {url} ({repository_duration:.2f}s)')
+            else:
+                failed.append(url)
+                error(f'\tFAILURE {url} ({repository_duration:.2f}s): {message}')
+
+        succeeded = len(repositories) - len(failed)
+        info(f'{succeeded} of {len(repositories)} Git repositories cloned successfully in {duration:.2f}s')
+
+        if len(failed) > 0:
+            raise CommandError(f'Failed to clone Git repositories: {", ".join(failed)}')
+
+    def default_name(self):
+        return 'Git Clone Many'
+
+    def print_help(self):
+        info(f'Command: {self.name}')
+        info('Clones multiple git repositories into the build directory concurrently')
+        info('\tArguments: 0 or more URLs of git repositories to clone')
+        info('\tNamed Arguments:')
+        info('\t\trepositories: a list of repositories to clone. Each can be a URL or contain a url, an optional '
+             'target directory and any of the named arguments of git-clone')
+        info('\t\tjobs: the maximum number of repositories to clone concurrently (default 4)')
+        info('\t\tAny other git-clone named arguments are used as defaults for every repository')
 
 
 class ScriptExecutorCommand(AbstractCommand, BuiltinCommand):
@@ -275,12 +485,15 @@ class ScriptExecutorCommand(AbstractCommand, BuiltinCommand):
     def _interpreter_capitalised(self):
         return f'{self._interpreter[:1].upper()}{self._interpreter[1:]}'
 
+    def _validate(self, args: list, named: dict):
+        self._verify_script_passed([self._interpreter, *args])
+
     def _execute(self, args: list):
         process_args = [self._interpreter]
         process_args.extend(args)
         self._verify_script_passed(process_args)
 
-        execution = Execution(process_args).execute()
+        execution = Execution(process_args, env=self.process_environment(), cwd=self.working_directory).execute()
 
         _GenericOutputHandler.handle_output(execution, process_args, f'{self._interpreter_capitalised()} interpreter')
 
@@ -308,7 +521,8 @@ class CreateContainerCommand(AbstractCommand, BuiltinCommand):
         name = args[0]
         image = args[1]
         extra = args[2:] if len(args) > 2 else []
-        execution = DockerClient.create_docker_container(image, name, extra)
+        execution = DockerClient.create_docker_container(image, name, extra, env=self.process_environment(),
+                                                         cwd=self.working_directory)
 
         if execution.is_healthy():
             info(f'Container {name} created successfully from image {image} with hash {execution.stdout.strip()}')
@@ -336,85 +550,68 @@ class RunBuildCommand(AbstractCommand, BuiltinCommand):
     """
     def __init__(self):
         super().__init__('run-build-tool', 1)
-        self._tool_args = {}  # a dictionary of tool to list of required name args
-        self._tool_args_getters = {}  # a dictionary to return args for the tool
-        self._register_tools()
-
-    def _register_tools(self):
-        self._tool_args['maven'] = [('goals', True), ('arguments', False)]
-        self._tool_args_getters['maven'] = RunBuildCommand._get_maven_args
-        self._tool_args['npm'] = [('arguments', True)]
-        self._tool_args_getters['npm'] = RunBuildCommand._get_npm_args
-
-    def _validate_named_args(self, tool_name: str, named: dict):
-        args_definition = self._tool_args[tool_name]
+        self._tools = None  # a dictionary of tool name to the BuildTool that runs it, created on first use
 
-        for definition in args_definition:
-            name = definition[0]
-            required = False if len(definition) < 2 else definition[1]
-            value = named.get(name)
-
-            if not value and required:
-                raise CommandError(f'Named argument {name} not provided')
-
-    @staticmethod
-    def _get_maven_args(named: dict) -> list:
-        args = ['mvn']
-        arguments = named.get('arguments')
+    @property
+    def tools(self) -> dict:
+        """
+        The supported tools by name, which are only created when the command is first used
+        """
+        if self._tools is None:
+            self._tools = {tool.name: tool for tool in [MavenTool(), MvndTool(), GradleTool(), NpmTool(), PipTool(),
+                                                       GoTool(), CargoTool()]}
 
-        if arguments:
-            args.extend(arguments)
+        return self._tools
 
-        args.extend(named['goals'])
+    def _tool(self, tool_name: str):
+        tool = self.tools.get(tool_name)
 
-        return args
+        if tool is None:
+            raise CommandError(f'Build tool {tool_name} not currently supported by the {self.name} command')
 
-    @staticmethod
-    def _get_npm_args(named: dict) -> list:
-        args = ['npm']
-        args.extend(named['arguments'])
+        return tool
 
-        return args
+    def _validate(self, args: list, named: dict):
+        self._tool(args[0]).validate_named_args(named)
 
     def _execute(self, args: list):
-        tool = args[0]
-
-        if tool not in self._tool_args and tool not in self._tool_args_getters:
-            raise CommandError(f'Build tool {tool} not currently supported by the {self.name} command')
-        else:
-            named = self.build_context.current_step.named
-            self._validate_named_args(tool, named)
-            command_args = self._tool_args_getters[tool](named)
-            execution = Execution(command_args).execute()
-            _GenericOutputHandler.handle_output(execution, command_args, f'Run {tool} build')
+        tool_name = args[0]
+        tool = self._tool(tool_name)
+        named = self.build_context.current_step.named
+        cwd = self.working_directory
+        tool.validate_named_args(named)
+        state = tool.before_execution(named, cwd)
+
+        if state.get('skip'):
+            return
+
+        command_args = tool.get_args(named, cwd)
+        env = self.process_environment(tool.get_env(named))
+        start = time.perf_counter()
+        execution = Execution(command_args, env=env, cwd=cwd).execute()
+        duration = time.perf_counter() - start
+        _GenericOutputHandler.handle_output(execution, command_args, f'Run {tool_name} build')
+        tool.after_execution(named, state, execution, duration, cwd)
 
     def default_name(self):
         return 'Run Build Tool'
 
     def print_help(self):
         info(f'Command: {self.name}')
-        info('Run a supported build tool. Currently Maven (maven in args) and npm are supported')
-        info('\tArguments: 1 positional argument identifying the build tool (maven | npm)')
+        info(f'Run a supported build tool. Currently {", ".join(self.tools.keys())} are supported')
+        info(f'\tArguments: 1 positional argument identifying the build tool ({" | ".join(self.tools.keys())})')
         info('\tNamed Arguments:')
-        info('\t\tmaven: Maven supports goals named arguments identifying a list of Maven goals (required). '
-             'Also supports a list of arguments to pass to the maven command line')
-        info('\t\tnpm: supports a list of arguments to pass to the nom command line')
+
+        for tool in self.tools.values():
+            tool.print_help()
 
 
-def register_builtins():
+def builtin_factories() -> dict:
     """
-    Registers the builtin commands
-    :return: None
+    Returns the factories of the builtin commands declared in system.BUILTIN_COMMANDS by command name
     """
-    # commands that are already instantiated like below are left out of below list
-    SetVariableCommand(False)
-    SetVariableCommand(True)
-    ScriptExecutorCommand('groovy')
-    ScriptExecutorCommand('python')
-
-    for command in [CopyCommand, ExecuteSystemCommand, SetVariablesCommand, GitCloneCommand, CreateContainerCommand,
-                    RunBuildCommand]:
-        command()
+    return {name: functools.partial(globals()[class_name], *args)
+            for name, (class_name, *args) in BUILTIN_COMMANDS.items()}
 
 
 def print_builtins_help():
@@ -422,23 +619,9 @@ def print_builtins_help():
     Print the help of all builtin commands
     """
     commands.registry = CommandRegistry()
-    register_builtins()
     info('The following are all the commands that are built-in to DockerWizard. The command tag, description and '
          'arguments information is offered')
 
-    for value in commands.registry.commands.values():
-        if isinstance(value, BuiltinCommand):
-            value.print_help()
-            info()
-
-
-class BuiltinsHelpAction(argparse.Action):
-    """
-    An action to print builtin commands help and exit
-    """
-    def __init__(self, option_strings, dest, **kwargs):
-        super().__init__(option_strings, dest, nargs=0, **kwargs)
-
-    def __call__(self, parser, namespace, values, option_string=None):
-        print_builtins_help()
-        parser.exit()
+    for factory in builtin_factories().values():
+        factory().print_help()
+        info()
@@ -0,0 +1,290 @@
+"""
+A module for managing the persistent caches the tool keeps between builds, for example, git mirrors
+"""
+import errno
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import List
+
+from .const import DOCKER_WIZARD_CACHE_VAR
+from .system import isWindows, isMac
+
+if isWindows():
+    import msvcrt
+else:
+    import fcntl
+
+
+def cache_root() -> str:
+    """
+    Gets the root directory of all caches. This is the value of DOCKER_WIZARD_CACHE if set, or else
+    .docker-wizard/cache in the user's home directory
+    :return: the root cache directory
+    """
+    root = os.environ.get(DOCKER_WIZARD_CACHE_VAR)
+
+    return root if root else os.path.join(os.path.expanduser('~'), '.docker-wizard', 'cache')
+
+
+def cache_directory(*parts: str, create: bool = True) -> str:
+    """
+    Gets the path of a cache directory identified by the given parts relative to the cache root
+    :param parts: the path components of the directory relative to the cache root
+    :param create: if true, the directory is created if it does not exist
+    :return: the path to the cache directory
+    """
+    path = os.path.join(cache_root(), *parts)
+
+    if create:
+        os.makedirs(path, exist_ok=True)
+
+    return path
+
+
+def hash_string(value: str) -> str:
+    """
+    Hashes the given string into a key that is safe to use as a cache directory name
+    :param value: the value to hash
+    :return: the hex digest of the value
+    """
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def hash_files(paths: List[str], extra: str = '') -> str:
+    """
+    Hashes the names and contents of the given files into a cache key. Files that do not exist are part of the key as
+    missing so that creating them changes the key
+    :param paths: the paths of the files to hash
+    :param extra: an extra value to include in the key, e.g. the platform
+    :return: the hex digest of the files
+    """
+    digest = hashlib.sha256(extra.encode('utf-8'))
+
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+        else:
+            digest.update(b'<missing>')
+
+    return digest.hexdigest()
+
+
+# the errors msvcrt.locking raises when the lock is held elsewhere, which LK_LOCK raises after retrying for 10 seconds
+_LOCK_CONFLICT_ERRORS = {errno.EDEADLOCK, errno.EACCES}
+# the longest time to wait before retrying LK_LOCK after it gives up
+_MAX_LOCK_BACKOFF = 1.0
+
+_SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(size) -> int:
+    """
+    Parses a size in bytes, given either as an integer or a string with an optional K, M, G or T suffix, e.g. 500M
+    :param size: the size to parse
+    :return: the size in bytes
+    """
+    if isinstance(size, bool):
+        raise ValueError(f'{size} is not a valid size')
+    elif isinstance(size, int):
+        value = size
+    else:
+        number = str(size).strip().upper().rstrip('B')
+        multiplier = _SIZE_UNITS.get(number[-1:], 1)
+        number = number[:-1] if number[-1:] in _SIZE_UNITS else number
+
+        try:
+            value = int(float(number) * multiplier)
+        except ValueError:
+            raise ValueError(f'{size} is not a valid size')
+
+    if value <= 0:
+        raise ValueError(f'{size} is not a valid size')
+
+    return value
+
+
+def directory_size(path: str) -> int:
+    """
+    Gets the total size in bytes of the files in the directory tree at path, without following symbolic links
+    :param path: the directory to measure
+    :return: the size of the directory
+    """
+    total = 0
+
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+
+    return total
+
+
+# the modes a cached directory tree can be restored with
+LINK_MODES = ['hardlink', 'reflink', 'copy']
+
+
+def _hardlink(source: str, destination: str):
+    """
+    Hard link the file falling back to a copy if the file is on a different file system or links are not supported
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def run_quietly(args: List[str]) -> bool:
+    """
+    Runs a command the tool uses to manage the file system, e.g. cp or mount, directly rather than through the execution
+    backend, so it is never replayed or recorded like the commands of a build
+    :param args: the command and its arguments
+    :return: true if the command succeeded, false if it failed or does not exist
+    """
+    try:
+        return subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+
+def _reflink_tree(source: str, destination: str) -> bool:
+    """
+    Attempt to copy the tree with copy-on-write clones of the files, returning false if the file system does not support
+    it so a normal copy can be made instead
+    """
+    if isWindows():
+        return False
+
+    args = ['cp', '-c', '-R', source, destination] if isMac() else ['cp', '-R', '--reflink=always', source,
+                                                                     destination]
+
+    if run_quietly(args):
+        return True
+
+    shutil.rmtree(destination, ignore_errors=True)
+
+    return False
+
+
+def link_tree(source: str, destination: str, mode: str = 'hardlink'):
+    """
+    Restores the directory tree at source to destination, which must not exist. Hard links and reflinks avoid copying
+    file contents, so restoring large trees such as node_modules is cheap. Hard linked files share their contents with
+    the cache, so they should not be modified in place
+    :param source: the directory to restore from
+    :param destination: the directory to restore to
+    :param mode: one of LINK_MODES
+    :return: None
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f'Link mode {mode} is not one of {LINK_MODES}')
+
+    if mode == 'reflink' and _reflink_tree(source, destination):
+        return
+
+    shutil.copytree(source, destination, symlinks=True,
+                    copy_function=_hardlink if mode == 'hardlink' else shutil.copy2)
+
+
+def save_tree(source: str, destination: str):
+    """
+    Saves a copy of the directory tree at source into the cache at destination, replacing any existing tree. The copy is
+    made to a temporary directory first and then renamed so a partially saved tree is never visible
+    :param source: the directory to save
+    :param destination: the cache directory to save to
+    :return: None
+    """
+    temporary = f'{destination}.tmp-{os.getpid()}-{threading.get_ident()}'
+    shutil.rmtree(temporary, ignore_errors=True)
+    shutil.copytree(source, temporary, symlinks=True)
+
+    if os.path.isdir(destination):
+        shutil.rmtree(destination)
+
+    os.replace(temporary, destination)
+
+
+class CacheLock:
+    """
+    An exclusive lock over a cache entry that is shared between threads and processes. The lock is held on a lock file
+    alongside the cache entry and is intended to be used as a context manager
+    """
+    def __init__(self, path: str):
+        """
+        Create the lock for the cache entry identified by path
+        :param path: the path of the cache entry to lock
+        """
+        self.path = f'{path}.lock'
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Acquires the lock
+        :param blocking: if true, block until the lock is available, or else return immediately if it is held elsewhere
+        :return: true if the lock was acquired. If blocking, the lock is always acquired and an OSError is raised if
+        the lock file cannot be locked, so the caller never continues without the lock
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a+')
+
+        try:
+            if isWindows():
+                self._file.seek(0)
+                backoff = 0.05
+
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError as e:
+                        # LK_LOCK gives up after 10 seconds so keep retrying until the holder releases the lock, but
+                        # raise any other error rather than retrying something that will never succeed
+                        if not blocking or e.errno not in _LOCK_CONFLICT_ERRORS:
+                            raise
+
+                        time.sleep(backoff)
+                        backoff = min(backoff * 2, _MAX_LOCK_BACKOFF)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            self._file.close()
+            self._file = None
+
+            if blocking:
+                raise OSError(e.errno, f'Failed to lock cache entry: {e.strerror}', self.path) from e
+
+            return False
+
+        return True
+
+    def release(self):
+        """
+        Releases the lock if it is held
+        :return: None
+        """
+        if self._file is not None:
+            if isWindows():
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,189 @@
+"""
+A module to check build files without building them. Each build file is parsed, its custom commands loaded and its
+steps compiled into a plan, so every problem a build would report before doing any work is found without Docker. The
+build files are checked in parallel across processes, and each process shares the includes it parses and the custom
+commands it loads between the build files it checks
+"""
+import functools
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Union
+
+from . import cli, commands
+from .argparser import parse_check
+from .buildparser import YamlBuildParser
+from .customcommands import load_custom, custom_command_path_validator
+from .entrypoint import _find_custom_command_path
+from .errors import BuildConfigurationError, BuildError
+from .plan import PlanError, compile_plan
+from .system import docker_wizard_home, initialise_system
+from .workdir import resolve_path
+
+
+def find_build_files(patterns: List[str]) -> List[str]:
+    """
+    Expands the patterns into the sorted absolute paths of the build files they match. A pattern is either the path to
+    a build file or a glob pattern, where ** matches any number of directories. A path that is not a glob pattern is
+    kept even if it does not exist, so it is reported as missing
+    :param patterns: the paths and glob patterns relative to the working directory
+    :return: the paths of the build files without duplicates
+    """
+    files = set()
+
+    for pattern in patterns:
+        path = resolve_path(pattern)
+
+        if glob.escape(path) == path:
+            files.add(path)
+        else:
+            files.update(os.path.abspath(match) for match in glob.iglob(path, recursive=True) if os.path.isfile(match))
+
+    return sorted(files)
+
+
+def _load_commands(commands_file: Union[str, None]):
+    """
+    Validates and loads the custom commands file if there is one
+    """
+    if commands_file:
+        validation_error = custom_command_path_validator(commands_file)
+
+        if validation_error:
+            raise BuildConfigurationError(validation_error)
+
+        load_custom(commands_file)
+
+
+def _check(file: str, custom: Union[str, None]):
+    """
+    Checks the build file, loading the custom commands it uses the same way a build of the file would
+    """
+    if not os.path.isfile(file):
+        raise BuildConfigurationError(f'Build file {file} does not exist')
+
+    _load_commands(_find_custom_command_path(custom, os.path.dirname(file), docker_wizard_home()))
+    build = YamlBuildParser().parse(file)
+    _load_commands(build.custom_commands)
+    compile_plan(build)
+
+
+def check_file(file: str, custom: str = None) -> dict:
+    """
+    Checks the build file. The custom commands the build file loads are removed again afterwards so they do not
+    affect other build files checked by the same process
+    :param file: the absolute path to the build file
+    :param custom: the absolute path to the custom commands file used instead of the one found next to the build file
+    :return: the result of the check with the file, whether it is valid, the errors found and the duration in seconds
+    """
+    start = time.perf_counter()
+
+    try:
+        with commands.registry.scope():
+            _check(file, custom)
+
+        errors = []
+    except PlanError as e:
+        errors = e.errors
+    except BuildError as e:
+        errors = [str(e)]
+    except Exception as e:
+        errors = [f'{type(e).__name__}: {e}']
+
+    return {
+        'file': file,
+        'valid': not errors,
+        'errors': errors,
+        'duration': round(time.perf_counter() - start, 6)
+    }
+
+
+def _initialise_worker():
+    """
+    Initialises a process that checks build files
+    """
+    cli.disable()
+    initialise_system()
+
+
+def check_files(files: List[str], custom: str = None, jobs: int = 1) -> List[dict]:
+    """
+    Checks the build files across the given number of processes. The build files are given to each process in
+    chunks of neighbouring files, which are the most likely to share includes and custom commands
+    :param files: the absolute paths to the build files
+    :param custom: the absolute path to the custom commands file used instead of the one found next to each build file
+    :param jobs: the maximum number of processes to use. If 1, the files are checked in this process
+    :return: the result of checking each file in the order of the files
+    """
+    check = functools.partial(check_file, custom=custom)
+    jobs = min(jobs, len(files))
+
+    if jobs <= 1:
+        return [check(file) for file in files]
+
+    chunksize = max(1, len(files) // (jobs * 4))
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initialise_worker) as executor:
+        return list(executor.map(check, files, chunksize=chunksize))
+
+
+def _jobs(value: Union[str, None]) -> int:
+    """
+    Parses the number of jobs, defaulting to the number of CPUs
+    """
+    if value is None:
+        return os.cpu_count() or 1
+
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+
+    if jobs < 1:
+        raise BuildConfigurationError(f'The number of jobs must be a positive integer, not {value}')
+
+    return jobs
+
+
+def main(args: List[str]) -> int:
+    """
+    The entrypoint of the check subcommand, which prints the result of the check as JSON
+    :param args: the arguments following the subcommand
+    :return: the exit code, 0 if every build file is valid, 1 if not and 2 if the arguments are invalid
+    """
+    args = parse_check(args)
+
+    try:
+        jobs = _jobs(args.jobs)
+    except BuildConfigurationError as e:
+        cli.error(e.message)
+        return 2
+
+    custom = resolve_path(args.custom) if args.custom else None
+    files = find_build_files(args.files)
+
+    if not files:
+        cli.error(f'No build files match {" ".join(args.files)}')
+
+    start = time.perf_counter()
+    cli.disable()
+
+    try:
+        results = check_files(files, custom, jobs)
+    finally:
+        cli.enable()
+
+    invalid = sum(1 for result in results if not result['valid'])
+    output = {
+        'valid': bool(results) and not invalid,
+        'checked': len(results),
+        'invalid': invalid,
+        'duration': round(time.perf_counter() - start, 6),
+        'files': results
+    }
+
+    print(json.dumps(output, indent=2))
+
+    return 0 if output['valid'] else 1
@@ -0,0 +1,296 @@
+"""
+A module for recording checkpoints of a build after each of its steps, so a failed build can be resumed from the step
+that failed instead of running every step again. A checkpoint holds a snapshot of the build directory and the variables
+set in the build environment, except secrets, of which only the names are recorded. Each snapshot hard links the
+files that are unchanged since the snapshot of the previous step, so only the files a step changes are copied
+"""
+import json
+import os
+import shutil
+from typing import Collection, Dict, List, Union
+
+from .cache import cache_directory, hash_string, hash_files, link_tree, CacheLock
+from .const import DOCKER_WIZARD_CHECKPOINTS_VAR
+from .errors import BuildConfigurationError
+from .models import DockerBuild, BuildStep, StepCache
+
+# the name of the file holding the record of a checkpoint
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# the name of the directory holding the snapshot of the build directory in a checkpoint
+SNAPSHOT_DIRECTORY = 'files'
+
+
+def checkpoints_enabled() -> bool:
+    """
+    Returns true if a checkpoint should be recorded after each build step, which is only the case if
+    DOCKER_WIZARD_CHECKPOINTS is true, since each checkpoint snapshots the build directory
+    """
+    return os.environ.get(DOCKER_WIZARD_CHECKPOINTS_VAR, 'false').lower() in ['true', '1', 'yes']
+
+
+def parse_steps(value: str) -> List[int]:
+    """
+    Parses a comma separated list of step numbers and inclusive ranges of step numbers, e.g. 1,3-5
+    :param value: the value to parse
+    :return: the sorted step numbers without duplicates
+    """
+    steps = set()
+
+    for part in value.split(','):
+        bounds = part.strip().split('-')
+
+        try:
+            first, last = int(bounds[0]), int(bounds[-1])
+        except ValueError:
+            first, last = 0, 0
+
+        if len(bounds) > 2 or first < 1 or last < first:
+            raise BuildConfigurationError(f'{value} is not a list of step numbers or ranges, e.g. 1,3-5')
+
+        steps.update(range(first, last + 1))
+
+    return sorted(steps)
+
+
+def build_fingerprint(build: DockerBuild) -> str:
+    """
+    Fingerprints the inputs of the build before any step executes, which are the image and the files copied to the
+    build directory
+    :param build: the build to fingerprint
+    :return: the fingerprint
+    """
+    return hash_files([build.file_path(file) for file in [build.dockerfile, *build.files]], build.image)
+
+
+def step_fingerprint(previous: str, step: BuildStep) -> str:
+    """
+    Fingerprints the step chained to the fingerprint of the build up to the previous step, so the fingerprint of a
+    checkpoint changes if the step or any step before it changes
+    :param previous: the fingerprint of the build up to the previous step
+    :param step: the step to fingerprint
+    :return: the fingerprint of the build up to and including the step
+    """
+    caches = [[getattr(cache, name) for name in StepCache.__slots__] for cache in step.cache]
+    definition = [step.name, step.command, step.arguments, step.named, step.environment, caches]
+
+    return hash_string(f'{previous}:{json.dumps(definition, sort_keys=True, default=str)}')
+
+
+def _snapshot(source: str, destination: str, previous: Union[str, None]):
+    """
+    Copies the tree at source to destination, hard linking files that are unchanged from the snapshot at previous.
+    Files are copied with their modification time, so a file is unchanged if its size and modification time equal the
+    file in the previous snapshot. The build directory itself is never linked, so steps modifying files in place do not
+    modify the snapshots
+    """
+    for root, directories, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        target = os.path.normpath(os.path.join(destination, relative))
+        os.makedirs(target, exist_ok=True)
+
+        for name in [*directories, *files]:
+            path = os.path.join(root, name)
+
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target, name))
+            elif name in files:
+                linked = os.path.normpath(os.path.join(previous, relative, name)) if previous else None
+                stat = os.stat(path)
+
+                try:
+                    linked_stat = os.lstat(linked) if linked else None
+                except OSError:
+                    linked_stat = None
+
+                if linked_stat and linked_stat.st_size == stat.st_size and \
+                        linked_stat.st_mtime_ns == stat.st_mtime_ns:
+                    try:
+                        os.link(linked, os.path.join(target, name))
+                        continue
+                    except OSError:
+                        pass
+
+                shutil.copy2(path, os.path.join(target, name))
+
+        # symbolic links to directories were recreated above and are not walked into
+        directories[:] = [d for d in directories if not os.path.islink(os.path.join(root, d))]
+
+
+class Checkpoint:
+    """
+    The record of a checkpoint taken after a build step succeeded
+    """
+    def __init__(self, index: int, fingerprint: str, environment: Dict[str, str], snapshot: str,
+                 secrets: List[str] = None):
+        """
+        Create the checkpoint
+        :param index: the index of the step starting at 1
+        :param fingerprint: the fingerprint of the build up to and including the step
+        :param environment: the variables set in the build environment by the build, without secrets
+        :param snapshot: the path to the snapshot of the build directory
+        :param secrets: the names of the secrets set in the build environment by the build, whose values are not saved
+        """
+        self.index = index
+        self.fingerprint = fingerprint
+        self.environment = environment
+        self.snapshot = snapshot
+        self.secrets = secrets if secrets else []
+
+
+class Checkpoints:
+    """
+    The checkpoints of a build, kept in the checkpoints directory of the cache for the build directory and image. Only
+    the checkpoints of the latest run of the build are kept, so a run must hold the lock of the checkpoints while it
+    uses them
+    """
+    def __init__(self, build: DockerBuild):
+        """
+        Create the checkpoints of the build
+        :param build: the build the checkpoints are taken of
+        """
+        key = hash_string(f'{os.path.abspath(build.directory)}:{build.image}')
+        self.directory = cache_directory('checkpoints', key, create=False)
+        self._run_lock = CacheLock(f'{self.directory}.run')
+        # the index of the checkpoint last saved, after which there are no checkpoints, so saving the checkpoint of the
+        # next step does not need to look for checkpoints to remove
+        self._last_saved = None
+
+    def lock(self) -> bool:
+        """
+        Takes the lock of the checkpoints for the whole run of the build without waiting for it, so runs of the same
+        build at the same time do not remove or restore each other's checkpoints
+        :return: true if the lock was taken, false if another run of the build holds it
+        """
+        return self._run_lock.acquire(blocking=False)
+
+    def unlock(self):
+        """
+        Releases the lock of the checkpoints taken by lock
+        :return: None
+        """
+        self._run_lock.release()
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, str(index))
+
+    def indices(self) -> List[int]:
+        """
+        Returns the sorted indices of the steps there are checkpoints of
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        return sorted(int(name) for name in os.listdir(self.directory)
+                      if name.isdigit() and os.path.isfile(os.path.join(self._path(int(name)), CHECKPOINT_FILE)))
+
+    def latest(self) -> int:
+        """
+        Returns the index of the last step there is a checkpoint of, or 0 if there are none
+        """
+        indices = self.indices()
+
+        return indices[-1] if indices else 0
+
+    def load(self, index: int) -> Union[Checkpoint, None]:
+        """
+        Loads the checkpoint of the step with the given index
+        :param index: the index of the step starting at 1
+        :return: the checkpoint or None if there is no checkpoint of the step
+        """
+        path = self._path(index)
+
+        try:
+            with open(os.path.join(path, CHECKPOINT_FILE), 'r') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return Checkpoint(index, record['fingerprint'], record['environment'], os.path.join(path, SNAPSHOT_DIRECTORY),
+                          record.get('secrets'))
+
+    def save(self, index: int, fingerprint: str, build_directory: str, environment: Dict[str, str],
+             secrets: List[str] = None):
+        """
+        Saves the checkpoint of the step, replacing any existing checkpoint of the step and the checkpoints of any
+        steps after it, since they were taken from a different run of the build
+        :param index: the index of the step starting at 1
+        :param fingerprint: the fingerprint of the build up to and including the step
+        :param build_directory: the build directory to snapshot
+        :param environment: the variables set in the build environment by the build, which must not include secrets
+        :param secrets: the names of the secrets set in the build environment by the build. Their values are never
+        written to disk, so they have to be set again to restore the checkpoint
+        :return: None
+        """
+        with CacheLock(self.directory):
+            previous = self.load(index - 1)
+            path = self._path(index)
+            temporary = f'{path}.tmp-{os.getpid()}'
+            shutil.rmtree(temporary, ignore_errors=True)
+
+            try:
+                _snapshot(build_directory, os.path.join(temporary, SNAPSHOT_DIRECTORY),
+                          previous.snapshot if previous else None)
+
+                with open(os.path.join(temporary, CHECKPOINT_FILE), 'w') as f:
+                    json.dump({'fingerprint': fingerprint, 'environment': environment, 'secrets': secrets or []}, f)
+
+                if self._last_saved is None or index != self._last_saved + 1:
+                    self._remove(lambda i: i >= index)
+
+                os.replace(temporary, path)
+                self._last_saved = index
+            finally:
+                shutil.rmtree(temporary, ignore_errors=True)
+
+    def restore(self, index: int, fingerprint: str, build_directory: str,
+                environment: Collection[str] = ()) -> Dict[str, str]:
+        """
+        Restores the build directory from the checkpoint of the step. The build directory must be empty
+        :param index: the index of the step starting at 1
+        :param fingerprint: the fingerprint the build up to and including the step has now, which must match the
+        checkpoint, or else the build changed since the checkpoint was taken
+        :param build_directory: the build directory to restore the snapshot to
+        :param environment: the names of the variables set in the build environment before the checkpoint is restored,
+        which must include the secrets the build set up to the step, since their values are not saved
+        :return: the variables to set in the build environment
+        """
+        with CacheLock(self.directory):
+            checkpoint = self.load(index)
+
+            if checkpoint is None:
+                raise BuildConfigurationError(f'There is no checkpoint of build step {index} to continue the build '
+                                              'from')
+            elif checkpoint.fingerprint != fingerprint:
+                raise BuildConfigurationError(f'The checkpoint of build step {index} is out of date as the build '
+                                              'file, its files or a step up to it changed since it was taken')
+
+            missing = [name for name in checkpoint.secrets if name not in environment]
+
+            if missing:
+                raise BuildConfigurationError(f'The build set the secrets {", ".join(missing)} before build step '
+                                              f'{index + 1}, which are not saved in checkpoints. Set them in the '
+                                              'environment to continue the build from the checkpoint')
+
+            os.rmdir(build_directory)
+            # the build modifies the restored files so they are cloned where supported rather than hard linked
+            link_tree(checkpoint.snapshot, build_directory, 'reflink')
+
+            return checkpoint.environment
+
+    def _remove(self, predicate):
+        """
+        Removes the checkpoints of the steps whose index matches the predicate
+        """
+        for index in self.indices():
+            if predicate(index):
+                shutil.rmtree(self._path(index), ignore_errors=True)
+
+    def clear(self):
+        """
+        Removes all the checkpoints of the build
+        :return: None
+        """
+        if os.path.isdir(self.directory):
+            with CacheLock(self.directory):
+                self._remove(lambda i: True)
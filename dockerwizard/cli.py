@@ -60,13 +60,14 @@ def _print(msg: str, use_stderr: bool = False):
             print(msg, file=sys.stderr)
 
 
-def info(message: str = None):
+def info(message: str = None, use_stderr: bool = False):
     """
     Print an info message
     :param message: the info message to print
+    :param use_stderr: true to print the message to stderr, e.g. when stdout is the output of a command
     :return: None
     """
-    _print(_create_message(_GREEN, message, _INFO))
+    _print(_create_message(_GREEN, message, _INFO), use_stderr)
 
 
 def warn(message: str):
@@ -1,9 +1,17 @@
 """
 Module to define all the commands supported by the framework
 """
+import contextlib
+import os
+import threading
 from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Union
 
-from .errors import CommandError
+from .errors import BuildError, CommandError, BuildContextError
+from .workdir import resolve_path
+
+# the entry point group installed packages register their commands in
+ENTRY_POINT_GROUP = 'dockerwizard.commands'
 
 
 class Command(ABC):
@@ -22,6 +30,17 @@ class Command(ABC):
         """
         pass
 
+    def validate(self, args: list, named: dict):
+        """
+        Validates the arguments of a build step using the command before the build starts, so an invalid step fails
+        the build before any work is done rather than when the step is reached. Only checks that do not depend on
+        the state of the build should be made. Should throw errors.CommandError if the arguments are invalid
+        :param args: the list of args to the command
+        :param named: the named arguments of the build step
+        :return: None
+        """
+        pass
+
     def default_name(self):
         """
         Return the default name to use if a name is not provided in the build file
@@ -32,11 +51,15 @@ class Command(ABC):
 
 class CommandRegistry:
     """
-    A registry of all commands
+    A registry of all commands. Commands can be registered as instantiated commands or as factories that create the
+    command the first time it is retrieved, so commands that a build does not use are never created
     """
 
     def __init__(self):
         self.commands = {}
+        self._factories: Dict[str, Callable[[], Command]] = {}
+        self._entry_points_loaded = False
+        self._lock = threading.RLock()
 
     def register(self, name: str, command: Command):
         """
@@ -45,16 +68,114 @@ class CommandRegistry:
         :param command: the command to register
         :return: None
         """
+        with self._lock:
+            self.commands[name] = command
+            self._factories.pop(name, None)
+
+    def register_factory(self, name: str, factory: Callable[[], Command]):
+        """
+        Register a factory that creates the command with the given name the first time it is retrieved
+        :param name: the name of the command
+        :param factory: a callable taking no arguments that returns the command, e.g. the command class
+        :return: None
+        """
+        with self._lock:
+            self.commands.pop(name, None)
+            self._factories[name] = factory
+
+    def load_entry_points(self):
+        """
+        Registers a factory for each command installed by a package in the dockerwizard.commands entry point group.
+        The name of the entry point is the name of the command and it refers to the command class, for example, in
+        pyproject.toml:
+            [project.entry-points."dockerwizard.commands"]
+            my-command = "my_package.commands:MyCommand"
+        Commands that are already registered are not replaced. The entry points are only looked up once
+        :return: None
+        """
+        with self._lock:
+            if self._entry_points_loaded:
+                return
+
+            self._entry_points_loaded = True
+
+            from importlib.metadata import entry_points
+
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                if entry_point.name not in self.commands and entry_point.name not in self._factories:
+                    self._factories[entry_point.name] = lambda e=entry_point: e.load()()
+
+    def _create(self, name: str) -> Union[Command, None]:
+        """
+        Creates the command from its factory if one is registered and registers the created command
+        """
+        factory = self._factories.pop(name, None)
+
+        if factory is None:
+            return None
+
+        try:
+            command = factory()
+        except BuildError:
+            raise
+        except Exception as e:
+            raise CommandError(f'Failed to create command {name}: {e}')
+
         self.commands[name] = command
 
+        return command
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of all the registered commands including those that have not been created yet
+        """
+        with self._lock:
+            self.load_entry_points()
+
+            return list(self.commands.keys()) + [name for name in self._factories if name not in self.commands]
+
+    @contextlib.contextmanager
+    def scope(self):
+        """
+        A context manager that restores the registry to its state on entry when the context exits, so commands
+        registered within the context, for example, the custom commands of one build, do not leak into other builds
+        checked in the same process
+        :return: the context manager yielding the registry
+        """
+        with self._lock:
+            commands = dict(self.commands)
+            factories = dict(self._factories)
+
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.commands = commands
+                self._factories = factories
+
     def get_command(self, name: str) -> Command:
         """
-        Get the command with the given name or throw value error if not found
+        Get the command with the given name or throw value error if not found. A command registered as a factory is
+        created the first time it is retrieved. Installed entry points are only looked up if the command is not
+        registered
         :param name: the name of the command to retrieve
         :return: the retrieved command
         """
         command = self.commands.get(name)
 
+        if command is not None:
+            return command
+
+        with self._lock:
+            command = self.commands.get(name)
+
+            if command is None:
+                command = self._create(name)
+
+            if command is None and not self._entry_points_loaded:
+                self.load_entry_points()
+                command = self._create(name)
+
         if command is None:
             raise ValueError(name)
         else:
@@ -127,6 +248,57 @@ class AbstractCommand(Command, ABC):
         from .context import BuildContext  # prevent circular import
         return BuildContext.context()
 
+    @property
+    def working_directory(self) -> str:
+        """
+        Returns the directory the command should resolve relative paths against and execute processes in, which is the
+        working directory of the build context, or the working directory of this process if not executed in a build
+        context
+        """
+        try:
+            return self.build_context.working_directory
+        except BuildContextError:
+            return os.getcwd()
+
+    def resolve_path(self, path: str) -> str:
+        """
+        Resolves the path relative to the working directory of the command
+        :param path: the path to resolve
+        :return: the absolute path
+        """
+        return resolve_path(path, self.working_directory)
+
+    def process_environment(self, extra: Dict[str, str] = None) -> Union[Dict[str, str], None]:
+        """
+        Returns the environment variables to pass to the env argument of any Execution the command runs. This is the
+        environment of the build and current step with the extra variables. If not executed in a build context, None
+        is returned (or os.environ with the extra variables) so the process inherits the environment of this process
+        :param extra: extra variables for the process
+        :return: the environment of the process
+        """
+        try:
+            context = self.build_context
+        except BuildContextError:
+            return {**os.environ, **extra} if extra else None
+
+        return context.process_environment(extra)
+
+    def validate(self, args: list, named: dict):
+        """
+        Validates the number of args passed in and then calls the _validate hook
+        :param args: the args to validate
+        :param named: the named arguments of the build step
+        :return: None
+        """
+        self._validate_num_args(args)
+        self._validate(args, named)
+
+    def _validate(self, args: list, named: dict):
+        """
+        Hook called by validate after arg validation to validate the arguments further before the build starts
+        """
+        pass
+
     def execute(self, args: list):
         """
         Executes, validating the number of args passed in and then calls the _execute hook
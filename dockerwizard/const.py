@@ -27,3 +27,20 @@ CUSTOM_COMMANDS = 'custom-commands.yaml'
 # name of environment variable flag to identify if testing is in progress
 DOCKER_WIZARD_TESTING_NAME = 'DOCKER_WIZARD_TESTING'
 
+# name of environment variable pointing to the directory persistent caches shared between builds are stored in
+DOCKER_WIZARD_CACHE_VAR = 'DOCKER_WIZARD_CACHE'
+
+# name of environment variable which disables the cache of parsed build files if set to false
+DOCKER_WIZARD_PLAN_CACHE_VAR = 'DOCKER_WIZARD_PLAN_CACHE'
+
+# name of environment variable which enables recording a checkpoint of the build after each step if set to true
+DOCKER_WIZARD_CHECKPOINTS_VAR = 'DOCKER_WIZARD_CHECKPOINTS'
+
+# name of environment variable pointing to a cassette file every executed process is recorded into
+DOCKER_WIZARD_RECORD_VAR = 'DOCKER_WIZARD_RECORD'
+
+# name of environment variable pointing to a cassette file the results of executed processes are replayed from
+DOCKER_WIZARD_REPLAY_VAR = 'DOCKER_WIZARD_REPLAY'
+
+# name of environment variable which makes replayed processes take as long as they took when recorded if set to true
+DOCKER_WIZARD_REPLAY_TIMING_VAR = 'DOCKER_WIZARD_REPLAY_TIMING'
@@ -3,22 +3,35 @@ This module represents build contexts
 """
 from __future__ import annotations
 
-from typing import Union
+import os
+import threading
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, List, Union
 
+from .environment import BuildEnvironment
 from .models import DockerBuild, BuildStep
 from .errors import BuildContextError
 
+# the context of the build running in the current thread or asyncio task
+_context_var: ContextVar[Union[BuildContext, None]] = ContextVar('docker_wizard_build_context', default=None)
+# the context and step being executed in the current thread or asyncio task
+_step_var: ContextVar[Union[tuple, None]] = ContextVar('docker_wizard_build_step', default=None)
+# the contexts of all the builds running in this process, see activate
+_active_contexts: List[BuildContext] = []
+_active_lock = threading.Lock()
+
 
 class BuildContext:
     """
-    Represents the context of the current build
+    Represents the context of the current build. The current context is held in a context variable rather than a
+    global, so builds running at the same time in different threads or asyncio tasks each see their own context
     """
-
-    _INSTANCE = None
-
     def __init__(self):
         self._config = None
         self._current_step = None
+        self._environment = BuildEnvironment()
+        self._working_directory = os.getcwd()
+        self._previous_directories = []
 
     @property
     def config(self) -> DockerBuild:
@@ -37,8 +50,14 @@ class BuildContext:
     @property
     def current_step(self) -> BuildStep:
         """
-        Returns the current build step being executed. If None, no step is being executed
+        Returns the current build step being executed. If None, no step is being executed. Steps executed in parallel
+        each see their own step if executed in a copy of the context, see propagate
         """
+        current = _step_var.get()
+
+        if current is not None and current[0] is self:
+            return current[1]
+
         return self._current_step
 
     @current_step.setter
@@ -47,33 +66,145 @@ class BuildContext:
         Sets the current build step
         """
         self._current_step = current_step
+        _step_var.set((self, current_step))
+
+    @property
+    def working_directory(self) -> str:
+        """
+        Gets the working directory of the build, which relative paths are resolved against and processes are executed
+        in. This is separate to the working directory of the process
+        """
+        return self._working_directory
+
+    @working_directory.setter
+    def working_directory(self, working_directory: str):
+        """
+        Sets the working directory of the build
+        """
+        self._working_directory = os.path.abspath(working_directory)
+
+    def change_directory(self, directory: str, not_store: bool = False):
+        """
+        Changes the working directory of the build, resolving the directory relative to the current working directory
+        :param directory: the new working directory
+        :param not_store: if true, the current working directory isn't added to the stack of previous directories
+        :return: None
+        """
+        if not not_store:
+            self._previous_directories.append(self._working_directory)
+
+        self._working_directory = self.resolve_path(directory)
+
+    def change_back(self):
+        """
+        Changes the working directory of the build back to the directory before the last call to change_directory
+        :return: None
+        """
+        if len(self._previous_directories) != 0:
+            self._working_directory = self._previous_directories.pop()
+
+    def resolve_path(self, path: str) -> str:
+        """
+        Resolves the path relative to the working directory of the build
+        :param path: the path to resolve
+        :return: the absolute path
+        """
+        return os.path.normpath(os.path.join(self._working_directory, path))
+
+    @property
+    def environment(self) -> BuildEnvironment:
+        """
+        Gets the environment variables of the build
+        """
+        return self._environment
+
+    def process_environment(self, extra: Dict[str, str] = None) -> Dict[str, str]:
+        """
+        Gets the environment variables a process executed by the current step should be given, which is the build
+        environment overlaid with the environment of the current step and then the extra variables
+        :param extra: extra variables for the process
+        :return: the environment of the process
+        """
+        step = self.current_step
+        overlay = dict(step.environment) if step is not None and step.environment else {}
+
+        if extra:
+            overlay.update(extra)
+
+        return self._environment.to_dict(overlay)
 
     @classmethod
     def context(cls) -> BuildContext:
         """
         Gets the current context.
+        A thread that was not started in a copy of the build's context, for example a thread started by a custom
+        command, gets the context of the running build if only one build is running, see activate.
         If not in a build context, an error is raised
         """
-        if not cls._INSTANCE:
+        context = _context_var.get()
+
+        if context is None:
+            with _active_lock:
+                if len(_active_contexts) == 1:
+                    context = _active_contexts[0]
+
+        if context is None:
             raise BuildContextError()
 
-        return cls._INSTANCE
+        return context
 
 
 def initialise():
     """
-    Initialises the context
+    Initialises a new context and makes it the current context
     """
-    BuildContext._INSTANCE = BuildContext()
+    context = BuildContext()
+    _context_var.set(context)
 
-    return BuildContext.context()
+    return context
 
 
-def teardown():
+def activate(context: BuildContext):
+    """
+    Makes the context the current context of the calling thread or asyncio task and marks its build as running until
+    it is torn down. The build is executed with it active as it may be executed in a different thread to the one it
+    was initialised in
+    """
+    with _active_lock:
+        if context not in _active_contexts:
+            _active_contexts.append(context)
+
+    _context_var.set(context)
+
+
+def propagate(function: Callable) -> Callable:
+    """
+    Wraps the function so that it executes in a copy of the calling thread's context when called from another thread,
+    e.g. a task submitted to a ThreadPoolExecutor. Each call gets its own copy, so a current step set by one call is
+    not seen by the others
+    :param function: the function to wrap
+    :return: the wrapped function
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
+
+
+def teardown(context: BuildContext = None):
     """
     Delete the build context
+    :param context: the context to delete, the current context if not provided
     """
-    try:
-        BuildContext._INSTANCE = None
-    except BuildContextError:
-        pass
+    current = _context_var.get()
+    context = context if context is not None else current
+
+    if context is not None:
+        with _active_lock:
+            if context in _active_contexts:
+                _active_contexts.remove(context)
+
+        if current is context:
+            _context_var.set(None)
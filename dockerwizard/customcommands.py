@@ -1,71 +1,187 @@
 """
 A module for loading custom commands
 """
-import importlib
+import hashlib
+import marshal
+import threading
+import types
+from importlib.util import MAGIC_NUMBER
+from typing import Dict, Tuple
+
 import yaml
 import sys
 import os
 
+from . import commands
+from .cache import cache_directory, hash_string
 from .commands import AbstractCommand
 from .errors import BuildConfigurationError
-from .workdir import get_working_directory, change_directory, change_back
+from .workdir import get_working_directory, resolve_path
+
 
+# the loaded custom command modules by absolute path with the (mtime, size) and content hash of the file they were
+# loaded from, so a module is only executed again when its file changes
+_LOADED_MODULES: Dict[str, Tuple[tuple, str, types.ModuleType]] = {}
+_modules_lock = threading.RLock()
 
-def _load_module(path: str):
+
+def _compile_module(path: str, source: bytes, digest: str) -> types.CodeType:
     """
-    Loads the module from the given path by using the directory of the path as the module (adding the directory path
-    to sys.path if not there as the first element and removing it after import to avoid conflicts) and imports the
-    module
+    Compiles the source of the module at path, reusing the bytecode cached for the same path and content by a previous
+    run if there is one. If the cache cannot be used, the source is compiled without it
     """
-    if os.path.isfile(path) and path.endswith('.py'):
-        path = path if os.path.isabs(path) else os.path.join(get_working_directory(), path)
-        module_dir = os.path.dirname(path)
-        module_file = os.path.basename(path)
-        module = module_file[0:module_file.index('.py')]
-        inserted = False
+    try:
+        bytecode = os.path.join(cache_directory('custom-commands'),
+                                f'{hash_string(f"{path}:{digest}:{MAGIC_NUMBER.hex()}")}.pyc')
+    except OSError:
+        return compile(source, path, 'exec')
 
-        if module_dir not in sys.path:
-            # insert as first in path to avoid conflicts with other modules
-            sys.path.insert(0, module_dir)
-            inserted = True  # mark that we inserted the module directory and not someone else so we can remove it
+    try:
+        with open(bytecode, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
 
-        loaded_module = importlib.import_module(module)
+    code = compile(source, path, 'exec')
 
-        if inserted:
-            # we had to insert the module path ourselves, so remove it to avoid conflicts with modules of the same name
-            sys.path.pop(0)
+    try:
+        temporary = f'{bytecode}.tmp-{os.getpid()}-{threading.get_ident()}'
 
-        return loaded_module, module
-    else:
-        raise BuildConfigurationError(f'Custom command file {path} is either not a file or Python (.py) file')
+        with open(temporary, 'wb') as f:
+            marshal.dump(code, f)
+
+        os.replace(temporary, bytecode)
+    except OSError:
+        pass  # the cache is an optimisation, so failing to write it does not fail the build
 
+    return code
 
-def _load_custom(command: dict):
+
+def _execute_module(path: str, code: types.CodeType) -> types.ModuleType:
     """
-    Load the custom command from the command dictionary
+    Executes the module code with the directory of the module first in sys.path, so it can import modules alongside it,
+    and the module in sys.modules, both only while it executes to avoid conflicts with other modules of the same name
     """
-    path = command['file']
-    class_name = command['class']
+    module_dir = os.path.dirname(path)
+    module_file = os.path.basename(path)
+    name = module_file[0:module_file.index('.py')]
+    module = types.ModuleType(name)
+    module.__file__ = path
+    inserted = False
+    previous = sys.modules.get(name)
+
+    if module_dir not in sys.path:
+        # insert as first in path to avoid conflicts with other modules
+        sys.path.insert(0, module_dir)
+        inserted = True  # mark that we inserted the module directory and not someone else so we can remove it
 
-    module, name = _load_module(path)
+    sys.modules[name] = module
 
     try:
-        class_def = getattr(module, class_name)
+        exec(code, module.__dict__)
+    finally:
+        if inserted:
+            sys.path.remove(module_dir)
 
-        if issubclass(class_def, AbstractCommand):
-            class_def()
+        if previous is not None:
+            sys.modules[name] = previous
         else:
-            raise BuildConfigurationError(f'Command {class_name} from {path} does not extend AbstractCommand')
+            del sys.modules[name]
+
+    return module
+
+
+def _load_module(path: str, directory: str = None) -> types.ModuleType:
+    """
+    Loads the module from the given path. A relative path is relative to directory, or the working directory if not
+    provided. Modules are cached by absolute path, so commands files referencing the same module share one load, and
+    the module is only loaded again if the contents of the file change
+    """
+    path = resolve_path(path, directory)
+
+    if not os.path.isfile(path) or not path.endswith('.py'):
+        raise BuildConfigurationError(f'Custom command file {path} is either not a file or Python (.py) file')
+
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _modules_lock:
+        loaded = _LOADED_MODULES.get(path)
+
+        if loaded is not None and loaded[0] == signature:
+            return loaded[2]
+
+        with open(path, 'rb') as f:
+            source = f.read()
+
+        digest = hashlib.sha256(source).hexdigest()
+
+        if loaded is not None and loaded[1] == digest:
+            # the file was touched but not changed
+            module = loaded[2]
+        else:
+            module = _execute_module(path, _compile_module(path, source, digest))
+
+        _LOADED_MODULES[path] = (signature, digest, module)
+
+        return module
+
+
+def _create_custom(path: str, class_name: str, directory: str = None) -> AbstractCommand:
+    """
+    Imports the command class from the file at path, relative to directory, and creates the command
+    """
+    module = _load_module(path, directory)
+
+    try:
+        class_def = getattr(module, class_name)
     except AttributeError:
         raise BuildConfigurationError(f'Class {class_name} does not exist within {path}')
-    finally:
-        del sys.modules[name]
+
+    if isinstance(class_def, type) and issubclass(class_def, AbstractCommand):
+        return class_def()
+    else:
+        raise BuildConfigurationError(f'Command {class_name} from {path} does not extend AbstractCommand')
+
+
+def _lazy_custom(name: str, path: str, class_name: str, directory: str):
+    """
+    Returns a factory that imports and creates the command the first time a build uses it
+    """
+    def factory():
+        command = _create_custom(path, class_name, directory)
+
+        if command.name != name:
+            raise BuildConfigurationError(f'Command {class_name} from {path} has the name {command.name} but is '
+                                          f'declared with the name {name}')
+
+        return command
+
+    return factory
+
+
+def _load_custom(command: dict, directory: str = None):
+    """
+    Load the custom command from the command dictionary, where the file is relative to directory. If the command
+    declares its name, it is only imported when a build first uses it
+    """
+    path = command['file']
+    class_name = command['class']
+    name = command.get('name')
+
+    if name:
+        commands.registry.register_factory(name, _lazy_custom(name, resolve_path(path, directory), class_name, directory))
+    else:
+        _create_custom(path, class_name, directory)
 
 
 def load_custom(commands_file: str):
     """
-    Loads the custom commands into the system from the path to the commands file
+    Loads the custom commands into the system from the path to the commands file. The files of the commands are
+    relative to the directory of the commands file
     """
+    commands_file = resolve_path(commands_file)
+
     with open(commands_file, 'r') as stream:
         data = yaml.safe_load(stream)
 
@@ -73,17 +189,15 @@ def load_custom(commands_file: str):
         commands = data['commands']
 
         for command in commands:
-            _load_custom(command)
+            _load_custom(command, os.path.dirname(commands_file))
 
 
 def change_and_load_custom(commands_file: str):
     """
-    Changes to the working directory of the commands file and then after the load_custom function is called, the
-    working directory is changed back to the previous
+    Kept for compatibility, load_custom resolves the files of the commands relative to the commands file without
+    changing the working directory
     """
-    change_directory(os.path.dirname(commands_file))
-    load_custom(os.path.basename(commands_file))
-    change_back()
+    load_custom(commands_file)
 
 
 def custom_command_path_validator(path: str):
@@ -1,6 +1,12 @@
 """
 A module to encapsulate Docker behaviour
 """
+import json
+import os
+import shutil
+from typing import Dict, Union
+
+from .cache import cache_directory
 from .process import Execution
 
 
@@ -10,16 +16,18 @@ class DockerClient:
     the given docker command and returning the result
     """
     @staticmethod
-    def build_docker_image(tag: str, workdir: str = '.'):
+    def build_docker_image(tag: str, workdir: str = '.', env: Dict[str, str] = None, cwd: str = None):
         """
-        Build the docker image using the provided tag and workdir for the docker build context
+        Build the docker image using the provided tag and workdir for the docker build context, which is relative to
+        the directory the build is executed in
         """
         args = ['docker', 'build', '--tag', tag, workdir]
 
-        return Execution(args).execute()
+        return Execution(args, env=env, cwd=cwd).execute()
 
     @staticmethod
-    def create_docker_container(tag: str, name: str, extra_args: list):
+    def create_docker_container(tag: str, name: str, extra_args: list, env: Dict[str, str] = None,
+                                cwd: str = None):
         """
         Create the docker container using docker run. All containers are run in detached mode (-d)
         """
@@ -30,4 +38,55 @@ class DockerClient:
 
         args.append(tag)
 
-        return Execution(args).execute()
+        return Execution(args, env=env, cwd=cwd).execute()
+
+    @staticmethod
+    def version() -> Union[str, None]:
+        """
+        Gets the output of docker --version, or None if Docker is not installed. The output is cached against the path
+        and modification time of the docker executable, so Docker is only executed again when it is reinstalled or
+        upgraded. If the cache cannot be used, Docker is executed without it
+        """
+        executable = shutil.which('docker')
+
+        if executable is None:
+            return None
+
+        mtime = os.stat(executable).st_mtime_ns
+
+        try:
+            cache_file = os.path.join(cache_directory('docker'), 'version.json')
+        except OSError:
+            cache_file = None
+
+        if cache_file is not None:
+            try:
+                with open(cache_file, 'r') as f:
+                    cached = json.load(f)
+
+                if cached.get('executable') == executable and cached.get('mtime') == mtime:
+                    return cached.get('version')
+            except (OSError, ValueError, AttributeError):
+                pass
+
+        result = Execution(['docker', '--version']).execute()
+
+        if not result.is_healthy():
+            return None
+
+        version = result.stdout.strip()
+
+        if cache_file is None:
+            return version
+
+        try:
+            temporary = f'{cache_file}.tmp-{os.getpid()}'
+
+            with open(temporary, 'w') as f:
+                json.dump({'executable': executable, 'mtime': mtime, 'version': version}, f)
+
+            os.replace(temporary, cache_file)
+        except OSError:
+            pass  # the cache is an optimisation, so failing to write it is not an error
+
+        return version
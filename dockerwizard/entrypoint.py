@@ -7,10 +7,7 @@ import sys
 from .const import CUSTOM_COMMANDS, DOCKER_WIZARD_HOME_VAR
 from .workdir import get_working_directory, change_directory, change_back
 from . import cli
-from .argparser import parse
-from .builder import Builder
-from .buildparser import get_build_parser
-from .customcommands import load_custom, custom_command_path_validator
+from .argparser import parse, CHECK_COMMAND, BENCH_COMMAND
 from .system import initialise_system, docker_wizard_home
 from .errors import BuildConfigurationError
 from . import timing
@@ -93,6 +90,8 @@ def _load_custom_commands(custom_command_path: str):
     :param custom_command_path: the path to the custom commands definition file
     :return: None
     """
+    from .customcommands import load_custom, custom_command_path_validator
+
     if custom_command_path and not os.path.isabs(custom_command_path):
         custom_command_path = os.path.join(get_working_directory(), custom_command_path)
 
@@ -126,12 +125,44 @@ def _handle_workdir(args):
     return file
 
 
+def _step_selection(args) -> dict:
+    """
+    Validates the arguments selecting the steps of the build to execute
+    :param args: the parsed arguments
+    :return: the keyword arguments of the builder selecting the steps
+    """
+    from .checkpoint import parse_steps
+
+    if sum(1 for selected in [args.resume, args.from_step, args.only] if selected) > 1:
+        cli.error('Only one of --resume, --from-step and --only can be given')
+        sys.exit(2)
+
+    try:
+        if args.from_step:
+            if not args.from_step.isdigit() or int(args.from_step) < 1:
+                raise BuildConfigurationError(f'{args.from_step} is not a step number')
+
+            return {'from_step': int(args.from_step)}
+        elif args.only:
+            return {'only': parse_steps(args.only)}
+    except BuildConfigurationError as e:
+        cli.error(e.message)
+        sys.exit(2)
+
+    return {'resume': args.resume}
+
+
 def _build(args):
+    # the modules needed to build are imported here so running the tool only to print information does not import them
+    from .builder import Builder
+    from .buildparser import get_build_parser
+
+    selection = _step_selection(args)
     file = _handle_workdir(args)
 
-    parser = get_build_parser()
+    parser = get_build_parser(stream=args.stream)
     parsed = parser.parse(file)
-    builder_obj = Builder(parsed)
+    builder_obj = Builder(parsed, **selection)
 
     return builder_obj.build()
 
@@ -142,6 +173,14 @@ def main():
     :return: None
     """
     initialise_system()
+
+    if len(sys.argv) > 1 and sys.argv[1] == CHECK_COMMAND:
+        from .check import main as check
+        sys.exit(check(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == BENCH_COMMAND:
+        from .benchmarks.suite import main as bench
+        sys.exit(bench(sys.argv[2:]))
+
     args = parse()
 
     timing.start()
@@ -0,0 +1,80 @@
+"""
+This module holds the environment of a build
+"""
+import os
+from typing import Dict, List
+
+
+class BuildEnvironment:
+    """
+    The environment variables of a build. The environment starts as a copy of os.environ when the build starts and
+    variables set during the build are only set here, so they do not leak into the process or other builds. Processes
+    executed by the build should be passed the environment through the env argument of Execution
+    """
+    def __init__(self, base: Dict[str, str] = None):
+        """
+        Create the environment
+        :param base: the variables the environment starts with, a copy of os.environ if not provided
+        """
+        self._variables = dict(os.environ if base is None else base)
+        self._changed: Dict[str, str] = {}
+        self._secrets = set()
+
+    def get(self, name: str, default: str = None) -> str:
+        """
+        Get the value of the variable or default if it is not set
+        """
+        return self._variables.get(name, default)
+
+    def set(self, name: str, value: str, secret: bool = False):
+        """
+        Set the variable with the value
+        :param name: the name of the variable
+        :param value: the value of the variable
+        :param secret: true if the value is a secret, which is left out of changed unless secrets are requested
+        """
+        self._variables[name] = str(value)
+        self._changed[name] = self._variables[name]
+
+        if secret:
+            self._secrets.add(name)
+        else:
+            self._secrets.discard(name)
+
+    def update(self, variables: Dict[str, str]):
+        """
+        Set all the given variables
+        """
+        for name, value in variables.items():
+            self.set(name, value)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._variables
+
+    def changed(self, secrets: bool = True) -> Dict[str, str]:
+        """
+        Returns the variables set since the environment was created
+        :param secrets: false to leave out the variables set as secrets
+        :return: a copy of the variables that were set
+        """
+        return {name: value for name, value in self._changed.items() if secrets or name not in self._secrets}
+
+    def secrets(self) -> List[str]:
+        """
+        Returns the sorted names of the variables set as secrets
+        """
+        return sorted(self._secrets)
+
+    def to_dict(self, overlay: Dict[str, str] = None) -> Dict[str, str]:
+        """
+        Returns the variables as a dictionary that can be passed to Execution
+        :param overlay: optional variables that override the variables of the environment in the returned dictionary
+        without modifying the environment
+        :return: a copy of the variables with the overlay applied
+        """
+        variables = self._variables.copy()
+
+        if overlay:
+            variables.update({name: str(value) for name, value in overlay.items()})
+
+        return variables
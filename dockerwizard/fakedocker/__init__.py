@@ -0,0 +1,5 @@
+"""
+A fake Docker engine for testing and benchmarking the tool without Docker. The engine serves the subset of the Docker
+Engine API the tool relies on over a Unix socket, and a fake docker program translates the docker commands the tool
+executes into requests to it. Start an engine with python -m dockerwizard.fakedocker
+"""
@@ -0,0 +1,56 @@
+"""
+Starts a fake Docker engine listening on a Unix socket until interrupted. Run with
+python -m dockerwizard.fakedocker [-s SOCKET] [-l OPERATION=SECONDS] [-f OPERATION=RATE] [--seed SEED]
+"""
+import argparse
+import os
+import tempfile
+import threading
+from typing import Dict, List
+
+from .engine import FakeEngine, OPERATIONS
+
+
+def _parse_values(values: List[str]) -> Dict[str, float]:
+    parsed = {}
+
+    for value in values:
+        operation, _, number = value.partition('=')
+
+        try:
+            parsed[operation] = float(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'{value} is not OPERATION=NUMBER')
+
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Starts a fake Docker engine')
+    parser.add_argument('-s', '--socket', default=os.path.join(tempfile.gettempdir(), 'docker-wizard-fake.sock'),
+                        help='The path of the Unix socket to listen on')
+    parser.add_argument('-l', '--latency', nargs='*', default=[],
+                        help=f'The seconds an operation takes as OPERATION=SECONDS, where OPERATION is one of '
+                             f'{", ".join(OPERATIONS)}')
+    parser.add_argument('-f', '--fail', nargs='*', default=[],
+                        help='The rate between 0 and 1 at which an operation fails as OPERATION=RATE')
+    parser.add_argument('--seed', type=int, default=None, help='The seed of the random failures')
+    args = parser.parse_args()
+
+    try:
+        engine = FakeEngine(args.socket, _parse_values(args.latency), _parse_values(args.fail), args.seed)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+
+    with engine:
+        print(f'Listening on {engine.docker_host}, set DOCKER_HOST to it and put a fake docker program written by '
+              f'dockerwizard.fakedocker.program.write_program first on the PATH', flush=True)
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+A client of the Docker Engine API over a Unix socket, used by the fake docker program and by tests to talk to a fake
+engine
+"""
+import http.client
+import io
+import json
+import os
+import socket
+import tarfile
+from typing import Dict, Iterator, List, Union
+from urllib.parse import quote, urlencode
+
+# the name of the environment variable docker clients read the address of the engine from
+DOCKER_HOST_VAR = 'DOCKER_HOST'
+
+
+class EngineError(Exception):
+    """
+    Raised when the engine responds to a request with an error
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    """
+    A HTTP connection over a Unix socket
+    """
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+
+        self.sock.connect(self.socket_path)
+
+
+def context_archive(directory: str) -> bytes:
+    """
+    Archives the directory as a build context
+    :param directory: the directory to archive
+    :return: the tar archive of the directory
+    """
+    data = io.BytesIO()
+
+    with tarfile.open(fileobj=data, mode='w') as archive:
+        for name in sorted(os.listdir(directory)):
+            archive.add(os.path.join(directory, name), arcname=name)
+
+    return data.getvalue()
+
+
+class EngineClient:
+    """
+    A client of an engine listening on a Unix socket
+    """
+    def __init__(self, socket_path: str, timeout: float = None):
+        """
+        Create the client
+        :param socket_path: the path of the Unix socket of the engine
+        :param timeout: the timeout of requests in seconds, or None to wait forever
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @staticmethod
+    def from_environment() -> 'EngineClient':
+        """
+        Creates a client of the engine at the unix:// address in DOCKER_HOST
+        :return: the client
+        """
+        host = os.environ.get(DOCKER_HOST_VAR, '')
+
+        if not host.startswith('unix://'):
+            raise EngineError(0, f'{DOCKER_HOST_VAR} must be set to the unix:// address of the engine, not '
+                                 f'{host or "nothing"}')
+
+        return EngineClient(host[len('unix://'):])
+
+    def _request(self, method: str, path: str, query: Union[dict, list] = None, body: bytes = None,
+                 content_type: str = 'application/json') -> http.client.HTTPResponse:
+        """
+        Sends a request, raising EngineError if the engine responds with an error
+        """
+        connection = _UnixConnection(self.socket_path, self.timeout)
+        url = f'{path}?{urlencode(query)}' if query else path
+        headers = {'Content-Type': content_type} if body is not None else {}
+
+        try:
+            connection.request(method, url, body=body, headers=headers)
+            response = connection.getresponse()
+        except OSError as e:
+            connection.close()
+            raise EngineError(0, f'Cannot connect to the engine at {self.socket_path}: {e}')
+
+        if response.status >= 400:
+            content = response.read()
+            connection.close()
+
+            try:
+                message = json.loads(content)['message']
+            except (ValueError, KeyError, TypeError):
+                message = content.decode('utf-8', 'replace')
+
+            raise EngineError(response.status, message)
+
+        return response
+
+    def _json(self, method: str, path: str, query: Union[dict, list] = None, body=None):
+        response = self._request(method, path, query, None if body is None else json.dumps(body).encode())
+        content = response.read()
+
+        return json.loads(content) if content and response.getheader('Content-Type') == 'application/json' else None
+
+    @staticmethod
+    def _stream(response: http.client.HTTPResponse) -> Iterator[dict]:
+        try:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            response.close()
+
+    def ping(self) -> bool:
+        """
+        Returns true if the engine responds
+        """
+        try:
+            return self._request('GET', '/_ping').read() == b'OK'
+        except EngineError:
+            return False
+
+    def version(self) -> dict:
+        """
+        Returns the version of the engine
+        """
+        return self._json('GET', '/version')
+
+    def build(self, context: Union[str, bytes], tags: List[str], dockerfile: str = 'Dockerfile') -> Iterator[dict]:
+        """
+        Builds an image, yielding the progress of the build as the engine streams it. A message with an error key
+        means the build failed
+        :param context: the directory of the build context or its tar archive
+        :param tags: the tags of the image
+        :param dockerfile: the path of the Dockerfile in the build context
+        :return: an iterator of the progress messages
+        """
+        archive = context if isinstance(context, bytes) else context_archive(context)
+        query = [('t', tag) for tag in tags] + [('dockerfile', dockerfile)]
+
+        return self._stream(self._request('POST', '/build', query, archive, 'application/x-tar'))
+
+    def create_container(self, image: str, name: str = None, command: List[str] = None,
+                         env: Dict[str, str] = None) -> str:
+        """
+        Creates a container
+        :param image: the image of the container
+        :param name: the name of the container
+        :param command: the command of the container
+        :param env: the environment variables of the container
+        :return: the ID of the container
+        """
+        config = {'Image': image, 'Cmd': command or [], 'Env': [f'{key}={value}' for key, value in (env or {}).items()]}
+
+        return self._json('POST', '/containers/create', {'name': name} if name else None, config)['Id']
+
+    def start_container(self, container: str):
+        """
+        Starts a container
+        :param container: the ID or name of the container
+        :return: None
+        """
+        self._json('POST', f'/containers/{quote(container, safe="")}/start')
+
+    def inspect_container(self, container: str) -> dict:
+        """
+        Returns the details of a container
+        :param container: the ID or name of the container
+        """
+        return self._json('GET', f'/containers/{quote(container, safe="")}/json')
+
+    def inspect_image(self, image: str) -> dict:
+        """
+        Returns the details of an image
+        :param image: the ID or tag of the image
+        """
+        return self._json('GET', f'/images/{quote(image, safe="")}/json')
+
+    def images(self) -> List[dict]:
+        """
+        Returns the images of the engine
+        """
+        return self._json('GET', '/images/json')
+
+    def tag(self, image: str, repository: str, tag: str = None):
+        """
+        Tags an image
+        :param image: the ID or tag of the image
+        :param repository: the repository of the new tag
+        :param tag: the tag in the repository, defaulting to latest
+        :return: None
+        """
+        query = {'repo': repository, **({'tag': tag} if tag else {})}
+        self._json('POST', f'/images/{quote(image, safe="")}/tag', query)
+
+    def events(self, since: float = None, until: float = None) -> Iterator[dict]:
+        """
+        Yields the events of the engine between since and until, which are Unix timestamps. Without until, the events
+        are yielded as they happen until the engine stops
+        :param since: the time of the first event
+        :param until: the time of the last event
+        :return: an iterator of the events
+        """
+        query = {key: value for key, value in [('since', since), ('until', until)] if value is not None}
+
+        return self._stream(self._request('GET', '/events', query))
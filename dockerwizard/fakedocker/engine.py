@@ -0,0 +1,603 @@
+"""
+The fake Docker engine, which keeps its images, containers and events in memory and serves them with the Docker Engine
+API over a Unix socket. Each operation can be given a latency and a rate of failure, so slow or unreliable engines can
+be simulated. An image is identified by the digest of its build context, so building an unchanged context uses the
+cached image without the latency of a build
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import shlex
+import socketserver
+import tarfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Union
+from urllib.parse import urlparse, parse_qs, unquote
+
+# the version of the Engine API the engine reports
+API_VERSION = '1.43'
+
+# the operations that latency and failures can be injected into
+OPERATIONS = ['build', 'create', 'start', 'inspect', 'tag', 'images', 'events']
+
+
+def parse_dockerfile(content: str) -> List[str]:
+    """
+    Parses the instructions of a Dockerfile, joining lines continued with a backslash and skipping comments
+    :param content: the content of the Dockerfile
+    :return: the instructions
+    """
+    instructions = []
+    current = ''
+
+    for line in content.splitlines():
+        stripped = line.strip()
+
+        if not current and (not stripped or stripped.startswith('#')):
+            continue
+
+        if stripped.endswith('\\'):
+            current += stripped[:-1].strip() + ' '
+        else:
+            instructions.append((current + stripped).strip())
+            current = ''
+
+    if current.strip():
+        instructions.append(current.strip())
+
+    return instructions
+
+
+def _copy_sources(instruction: str) -> List[str]:
+    """
+    Returns the sources in the build context of a COPY or ADD instruction, excluding URLs, patterns and copies from
+    other stages
+    """
+    arguments = instruction.split(None, 1)[1] if ' ' in instruction else ''
+
+    if arguments.startswith('['):
+        try:
+            parts = json.loads(arguments)
+        except ValueError:
+            return []
+    else:
+        parts = shlex.split(arguments)
+
+    if any(part.startswith('--from') for part in parts):
+        return []
+
+    sources = [part for part in parts if not part.startswith('--')][:-1]
+
+    return [source for source in sources if '://' not in source and not any(c in source for c in '*?[')]
+
+
+def _normalise_tag(tag: str) -> str:
+    return tag if ':' in tag.rsplit('/', 1)[-1] else f'{tag}:latest'
+
+
+class EngineFailure(Exception):
+    """
+    Raised when handling a request fails with the HTTP status and the message of the failure
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Image:
+    """
+    An image built by the engine
+    """
+    def __init__(self, image_id: str, size: int):
+        self.id = image_id
+        self.tags: List[str] = []
+        self.created = int(time.time())
+        self.size = size
+
+    def to_dict(self) -> dict:
+        return {'Id': self.id, 'RepoTags': list(self.tags), 'Created': self.created, 'Size': self.size}
+
+
+class Container:
+    """
+    A container created by the engine. Containers do not run anything, starting one only changes its state
+    """
+    def __init__(self, container_id: str, name: str, image: Image, config: dict):
+        self.id = container_id
+        self.name = name
+        self.image = image
+        self.config = config
+        self.created = int(time.time())
+        self.running = False
+
+    def to_dict(self) -> dict:
+        return {
+            'Id': self.id,
+            'Name': f'/{self.name}',
+            'Image': self.image.id,
+            'Created': self.created,
+            'Config': self.config,
+            'State': {'Status': 'running' if self.running else 'created', 'Running': self.running}
+        }
+
+
+class FakeEngine:
+    """
+    A fake Docker engine listening on a Unix socket. Use it as a context manager or call start and stop to serve
+    requests in a background thread
+    """
+    def __init__(self, socket_path: str, latency: Dict[str, float] = None, failures: Dict[str, float] = None,
+                 seed: int = None):
+        """
+        Create the engine
+        :param socket_path: the path of the Unix socket to listen on
+        :param latency: the seconds each operation in OPERATIONS takes. The latency of a build is spread over the
+        instructions of its Dockerfile
+        :param failures: the rate between 0 and 1 at which each operation in OPERATIONS fails
+        :param seed: the seed of the random failures, so a run can be reproduced
+        """
+        self.socket_path = socket_path
+        self.latency = dict(latency or {})
+        self.failures = dict(failures or {})
+        self.images: Dict[str, Image] = {}
+        self.containers: Dict[str, Container] = {}
+        self.events: List[dict] = []
+        self._random = random.Random(seed)
+        self._fail_next: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._server = None
+        self._thread = None
+        self._stopped = False
+
+        for name in [*self.latency, *self.failures]:
+            if name not in OPERATIONS:
+                raise ValueError(f'Unknown operation {name}, choose from {", ".join(OPERATIONS)}')
+
+    @property
+    def docker_host(self) -> str:
+        """
+        The value of DOCKER_HOST for clients of the engine
+        """
+        return f'unix://{self.socket_path}'
+
+    def fail_next(self, operation: str, count: int = 1):
+        """
+        Makes the next requests of the operation fail, regardless of the rate of failures
+        :param operation: the operation from OPERATIONS
+        :param count: the number of requests to fail
+        :return: None
+        """
+        with self._condition:
+            self._fail_next[operation] = self._fail_next.get(operation, 0) + count
+
+    def _should_fail(self, operation: str) -> bool:
+        with self._condition:
+            if self._fail_next.get(operation, 0) > 0:
+                self._fail_next[operation] -= 1
+                return True
+
+            return self._random.random() < self.failures.get(operation, 0)
+
+    def _operation(self, operation: str):
+        """
+        Waits for the latency of the operation and fails it if a failure is injected
+        """
+        time.sleep(self.latency.get(operation, 0))
+
+        if self._should_fail(operation):
+            raise EngineFailure(500, f'injected failure of {operation}')
+
+    def _event(self, event_type: str, action: str, actor_id: str, attributes: Dict[str, str]):
+        now = time.time_ns()
+
+        with self._condition:
+            self.events.append({
+                'Type': event_type,
+                'Action': action,
+                'Actor': {'ID': actor_id, 'Attributes': attributes},
+                'time': now // 1000000000,
+                'timeNano': now
+            })
+            self._condition.notify_all()
+
+    def find_image(self, reference: str) -> Union[Image, None]:
+        """
+        Finds an image by its ID, a prefix of its ID of at least 12 characters or one of its tags
+        :param reference: the reference to the image
+        :return: the image or None if there is no such image
+        """
+        with self._condition:
+            tag = _normalise_tag(reference)
+
+            for image in self.images.values():
+                short = image.id.split(':')[-1]
+
+                if tag in image.tags or reference == image.id or (len(reference) >= 12 and short.startswith(reference)):
+                    return image
+
+        return None
+
+    def find_container(self, reference: str) -> Union[Container, None]:
+        """
+        Finds a container by its ID, a prefix of its ID of at least 12 characters or its name
+        :param reference: the reference to the container
+        :return: the container or None if there is no such container
+        """
+        with self._condition:
+            for container in self.containers.values():
+                if reference in [container.name, container.id] or \
+                        (len(reference) >= 12 and container.id.startswith(reference)):
+                    return container
+
+        return None
+
+    def _tag(self, image: Image, tag: str):
+        tag = _normalise_tag(tag)
+
+        with self._condition:
+            for other in self.images.values():
+                if tag in other.tags:
+                    other.tags.remove(tag)
+
+            image.tags.append(tag)
+
+        self._event('image', 'tag', image.id, {'name': tag})
+
+    def build(self, context: bytes, tags: List[str], dockerfile: str = 'Dockerfile'):
+        """
+        Builds an image from the build context, yielding the progress as the Engine API streams it
+        :param context: the build context as a tar archive
+        :param tags: the tags of the image
+        :param dockerfile: the path of the Dockerfile in the build context
+        :return: a generator of the progress messages
+        """
+        files = {}
+
+        try:
+            with tarfile.open(fileobj=io.BytesIO(context)) as archive:
+                for member in archive.getmembers():
+                    name = os.path.normpath(member.name).replace(os.sep, '/')
+                    content = archive.extractfile(member).read() if member.isfile() else b''
+                    files[name] = content
+        except tarfile.TarError as e:
+            raise EngineFailure(400, f'the build context is not a tar archive: {e}')
+
+        if dockerfile not in files:
+            raise EngineFailure(500, f'Cannot locate specified Dockerfile: {dockerfile}')
+
+        instructions = parse_dockerfile(files[dockerfile].decode('utf-8', 'replace'))
+
+        if not instructions or instructions[0].split()[0].upper() not in ['FROM', 'ARG']:
+            yield {'errorDetail': {'message': 'the Dockerfile must begin with FROM'},
+                   'error': 'the Dockerfile must begin with FROM'}
+            return
+
+        digest = hashlib.sha256()
+
+        for name in sorted(files):
+            digest.update(name.encode())
+            digest.update(hashlib.sha256(files[name]).digest())
+
+        image_id = f'sha256:{digest.hexdigest()}'
+        cached = image_id in self.images
+        fail = self._should_fail('build')
+        step_latency = 0 if cached else self.latency.get('build', 0) / len(instructions)
+
+        for index, instruction in enumerate(instructions, start=1):
+            yield {'stream': f'Step {index}/{len(instructions)} : {instruction}\n'}
+            time.sleep(step_latency)
+
+            if fail:
+                message = f'injected failure of build at step {index}'
+                yield {'errorDetail': {'message': message}, 'error': message}
+                return
+
+            missing = [source for source in _copy_sources(instruction)
+                       if os.path.normpath(source).lstrip('/') not in files
+                       and os.path.normpath(source) not in ['.', '/']]
+
+            if missing:
+                message = f'COPY failed: file not found in build context: {missing[0]}'
+                yield {'errorDetail': {'message': message}, 'error': message}
+                return
+
+            step_id = hashlib.sha256(f'{image_id}:{index}'.encode()).hexdigest()[:12]
+            if cached:
+                yield {'stream': ' ---> Using cache\n'}
+
+            yield {'stream': f' ---> {step_id}\n'}
+
+        with self._condition:
+            image = self.images.setdefault(image_id, Image(image_id, sum(len(content) for content in files.values())))
+
+        for tag in tags:
+            self._tag(image, tag)
+
+        yield {'aux': {'ID': image_id}}
+        yield {'stream': f'Successfully built {image_id.split(":")[-1][:12]}\n'}
+
+        for tag in tags:
+            yield {'stream': f'Successfully tagged {_normalise_tag(tag)}\n'}
+
+    def create_container(self, name: Union[str, None], config: dict) -> Container:
+        """
+        Creates a container
+        :param name: the name of the container, or None to generate one
+        :param config: the configuration of the container, with the image in Image
+        :return: the container
+        """
+        self._operation('create')
+        image = self.find_image(config.get('Image', ''))
+
+        if image is None:
+            raise EngineFailure(404, f'No such image: {config.get("Image")}')
+
+        with self._condition:
+            name = name or f'fake_{uuid.uuid4().hex[:8]}'
+
+            if any(container.name == name for container in self.containers.values()):
+                raise EngineFailure(409, f'Conflict. The container name "/{name}" is already in use')
+
+            container = Container(uuid.uuid4().hex + uuid.uuid4().hex, name, image, config)
+            self.containers[container.id] = container
+
+        self._event('container', 'create', container.id, {'name': name, 'image': config['Image']})
+
+        return container
+
+    def start_container(self, reference: str):
+        """
+        Starts a container
+        :param reference: the ID or name of the container
+        :return: None
+        """
+        self._operation('start')
+        container = self.find_container(reference)
+
+        if container is None:
+            raise EngineFailure(404, f'No such container: {reference}')
+
+        container.running = True
+        self._event('container', 'start', container.id, {'name': container.name})
+
+    def tag(self, reference: str, repository: str, tag: str = None):
+        """
+        Tags an image
+        :param reference: the image to tag
+        :param repository: the repository of the new tag
+        :param tag: the tag in the repository, defaulting to latest
+        :return: None
+        """
+        self._operation('tag')
+        image = self.find_image(reference)
+
+        if image is None:
+            raise EngineFailure(404, f'No such image: {reference}')
+
+        self._tag(image, f'{repository}:{tag or "latest"}')
+
+    def start(self):
+        """
+        Starts serving requests in a background thread
+        :return: the engine
+        """
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self._stopped = False
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.engine = self
+        # a short poll interval so stopping the engine does not wait long for the server to notice
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """
+        Stops serving requests and removes the socket
+        :return: None
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    engine: FakeEngine = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the Engine API, which may be prefixed with the version of the API, e.g. /v1.43/images/json
+    """
+    server: _Server
+    ROUTES = [
+        ('GET', r'/_ping', '_ping'),
+        ('GET', r'/version', '_version'),
+        ('POST', r'/build', '_build'),
+        ('GET', r'/images/json', '_images'),
+        ('GET', r'/images/(?P<name>.+)/json', '_inspect_image'),
+        ('POST', r'/images/(?P<name>.+)/tag', '_tag'),
+        ('POST', r'/containers/create', '_create'),
+        ('POST', r'/containers/(?P<name>[^/]+)/start', '_start'),
+        ('GET', r'/containers/(?P<name>[^/]+)/json', '_inspect_container'),
+        ('GET', r'/events', '_events')
+    ]
+
+    @property
+    def engine(self) -> FakeEngine:
+        return self.server.engine
+
+    def log_message(self, format, *args):
+        pass  # requests are not logged, as the client address of a Unix socket cannot be formatted
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        path = re.sub(r'^/v[0-9.]+(?=/)', '', url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+
+            if route_method == method and match:
+                parameters = {key: unquote(value) for key, value in match.groupdict().items()}
+
+                try:
+                    getattr(self, name)(query=query, **parameters)
+                except EngineFailure as e:
+                    self._json(e.status, {'message': e.message})
+
+                return
+
+        self._json(404, {'message': f'page not found: {method} {url.path}'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def _body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+
+                if size == 0:
+                    return b''.join(chunks)
+
+                chunks.append(chunk)
+
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _json(self, status: int, body, content_type: str = 'application/json'):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Api-Version', API_VERSION)
+        self.end_headers()
+
+        if data:
+            self.wfile.write(data)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Api-Version', API_VERSION)
+        self.end_headers()
+
+    def _send(self, message: dict):
+        self.wfile.write(json.dumps(message).encode() + b'\n')
+        self.wfile.flush()
+
+    def _ping(self, query):
+        self._json(200, 'OK', 'text/plain')
+
+    def _version(self, query):
+        self._json(200, {'Version': '24.0.0-fake', 'ApiVersion': API_VERSION, 'Os': 'linux', 'Arch': 'amd64'})
+
+    def _build(self, query):
+        context = self._body()
+        tags = parse_qs(urlparse(self.path).query).get('t', [])
+        progress = self.engine.build(context, tags, query.get('dockerfile', 'Dockerfile'))
+        first = next(progress)
+        self._start_stream()
+
+        for message in [first, *progress]:
+            self._send(message)
+
+    def _images(self, query):
+        self.engine._operation('images')
+
+        with self.engine._condition:
+            images = [image.to_dict() for image in self.engine.images.values()]
+
+        self._json(200, images)
+
+    def _inspect_image(self, query, name):
+        self.engine._operation('inspect')
+        image = self.engine.find_image(name)
+
+        if image is None:
+            raise EngineFailure(404, f'No such image: {name}')
+
+        self._json(200, image.to_dict())
+
+    def _tag(self, query, name):
+        self.engine.tag(name, query.get('repo', ''), query.get('tag'))
+        self._json(201, '', 'text/plain')
+
+    def _create(self, query):
+        container = self.engine.create_container(query.get('name'), json.loads(self._body() or b'{}'))
+        self._json(201, {'Id': container.id, 'Warnings': []})
+
+    def _start(self, query, name):
+        self.engine.start_container(name)
+        self._json(204, '', 'text/plain')
+
+    def _inspect_container(self, query, name):
+        self.engine._operation('inspect')
+        container = self.engine.find_container(name)
+
+        if container is None:
+            raise EngineFailure(404, f'No such container: {name}')
+
+        self._json(200, container.to_dict())
+
+    def _events(self, query):
+        """
+        Streams the events between since and until, which are Unix timestamps. Without until, events are streamed as
+        they happen until the client disconnects or the engine stops
+        """
+        self.engine._operation('events')
+        since = float(query.get('since', 0))
+        until = float(query['until']) if 'until' in query else None
+        condition = self.engine._condition
+        position = 0
+        self._start_stream()
+
+        try:
+            while True:
+                with condition:
+                    if position >= len(self.engine.events) and not self.engine._stopped:
+                        condition.wait(0.1)
+
+                    events = self.engine.events[position:]
+                    position += len(events)
+                    stopped = self.engine._stopped
+
+                for event in events:
+                    if since <= event['timeNano'] / 1e9 and (until is None or event['timeNano'] / 1e9 <= until):
+                        self._send(event)
+
+                if stopped or (until is not None and time.time() > until):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped listening
@@ -0,0 +1,215 @@
+"""
+A fake docker program, which translates the docker commands the tool executes into requests to the fake engine at the
+unix:// address in DOCKER_HOST. write_program writes a docker executable running it into a directory, which can be put
+first on the PATH of a build. Run with python -m dockerwizard.fakedocker.program COMMAND [ARGS]
+"""
+import argparse
+import json
+import os
+import stat
+import sys
+import time
+from typing import List
+
+from .client import EngineClient, EngineError
+from ..system import isWindows
+
+# the version the program prints for docker --version
+VERSION = 'Docker version 24.0.0-fake, build fakedocker'
+
+# the options of docker run that take a value, so the image can be found after them
+_RUN_OPTIONS_WITH_VALUES = ['--name', '-e', '--env', '-p', '--publish', '-v', '--volume', '--network', '-w',
+                            '--workdir', '--entrypoint', '-u', '--user', '-l', '--label', '--mount', '-h', '--hostname',
+                            '--platform', '--restart', '-m', '--memory', '--cpus', '--env-file', '--add-host']
+
+# the root of the project, which contains the dockerwizard package
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_program(directory: str) -> str:
+    """
+    Writes a docker executable running the fake docker program into the directory
+    :param directory: the directory to create and write the executable to
+    :return: the directory, to put first on the PATH
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    if isWindows():
+        with open(os.path.join(directory, 'docker.cmd'), 'w') as f:
+            f.write(f'@set "PYTHONPATH={_PROJECT_ROOT};%PYTHONPATH%"\n'
+                    f'@"{sys.executable}" -m dockerwizard.fakedocker.program %*\n')
+    else:
+        executable = os.path.join(directory, 'docker')
+
+        with open(executable, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    f'PYTHONPATH="{_PROJECT_ROOT}${{PYTHONPATH:+:$PYTHONPATH}}" exec "{sys.executable}" -m '
+                    'dockerwizard.fakedocker.program "$@"\n')
+
+        os.chmod(executable, os.stat(executable).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    return directory
+
+
+def _build(client: EngineClient, args: List[str]) -> int:
+    parser = argparse.ArgumentParser('docker build')
+    parser.add_argument('-t', '--tag', action='append', default=[])
+    parser.add_argument('-f', '--file', default='Dockerfile')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    parser.add_argument('path')
+    parsed = parser.parse_args(args)
+    image = None
+
+    for message in client.build(parsed.path, parsed.tag, parsed.file):
+        if 'error' in message:
+            print(message['error'], file=sys.stderr)
+            return 1
+        elif 'aux' in message:
+            image = message['aux']['ID']
+        elif not parsed.quiet:
+            print(message.get('stream', ''), end='', flush=True)
+
+    if parsed.quiet:
+        print(image)
+
+    return 0
+
+
+def _run(client: EngineClient, args: List[str]) -> int:
+    name = None
+    detach = False
+    env = {}
+    index = 0
+
+    while index < len(args) and args[index].startswith('-'):
+        option, _, value = args[index].partition('=')
+
+        if option in _RUN_OPTIONS_WITH_VALUES and not value:
+            index += 1
+            value = args[index] if index < len(args) else ''
+
+        if option == '--name':
+            name = value
+        elif option in ['-e', '--env']:
+            key, separator, env_value = value.partition('=')
+            env[key] = env_value if separator else os.environ.get(key, '')
+        elif option in ['-d', '--detach']:
+            detach = True
+
+        index += 1
+
+    if index >= len(args):
+        print('"docker run" requires at least 1 argument.', file=sys.stderr)
+        return 125
+
+    container = client.create_container(args[index], name, args[index + 1:], env)
+    client.start_container(container)
+
+    if detach:
+        print(container)
+
+    return 0
+
+
+def _inspect(client: EngineClient, args: List[str]) -> int:
+    details = []
+
+    for reference in args:
+        try:
+            details.append(client.inspect_container(reference))
+        except EngineError:
+            try:
+                details.append(client.inspect_image(reference))
+            except EngineError:
+                print(json.dumps(details, indent=4))
+                print(f'Error: No such object: {reference}', file=sys.stderr)
+                return 1
+
+    print(json.dumps(details, indent=4))
+
+    return 0
+
+
+def _tag(client: EngineClient, args: List[str]) -> int:
+    if len(args) != 2:
+        print('"docker tag" requires exactly 2 arguments.', file=sys.stderr)
+        return 1
+
+    repository, _, tag = args[1].rpartition(':') if ':' in args[1].rsplit('/', 1)[-1] else (args[1], '', None)
+    client.tag(args[0], repository, tag)
+
+    return 0
+
+
+def _images(client: EngineClient, args: List[str]) -> int:
+    quiet = '-q' in args or '--quiet' in args
+    images = sorted(client.images(), key=lambda image: -image['Created'])
+
+    if not quiet:
+        print(f'{"REPOSITORY":<40}{"TAG":<20}{"IMAGE ID":<16}{"CREATED":<12}SIZE')
+
+    for image in images:
+        short = image['Id'].split(':')[-1][:12]
+
+        if quiet:
+            print(short)
+            continue
+
+        for tag in image['RepoTags'] or ['<none>:<none>']:
+            repository, _, name = tag.rpartition(':')
+            print(f'{repository:<40}{name:<20}{short:<16}{image["Created"]:<12}{image["Size"]}B')
+
+    return 0
+
+
+def _events(client: EngineClient, args: List[str]) -> int:
+    parser = argparse.ArgumentParser('docker events')
+    parser.add_argument('--since', type=float, default=None)
+    parser.add_argument('--until', type=float, default=None)
+    parser.add_argument('--format', default=None)
+    parsed = parser.parse_args(args)
+
+    for event in client.events(parsed.since, parsed.until):
+        if parsed.format:
+            print(json.dumps(event), flush=True)
+        else:
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(event['time']))
+            print(f'{timestamp} {event["Type"]} {event["Action"]} {event["Actor"]["ID"]}', flush=True)
+
+    return 0
+
+
+# the commands of the program by name
+COMMANDS = {
+    'build': _build,
+    'run': _run,
+    'inspect': _inspect,
+    'tag': _tag,
+    'images': _images,
+    'events': _events
+}
+
+
+def main(args: List[str]) -> int:
+    """
+    Executes the docker command
+    :param args: the arguments of the program
+    :return: the exit code
+    """
+    if args[:1] in [['--version'], ['version']]:
+        print(VERSION)
+        return 0
+    elif not args or args[0] not in COMMANDS:
+        print(f'docker: \'{args[0] if args else ""}\' is not a docker command.', file=sys.stderr)
+        return 1
+
+    try:
+        return COMMANDS[args[0]](EngineClient.from_environment(), args[1:])
+    except EngineError as e:
+        # errors without a status are failures to connect rather than responses of the engine
+        print(f'docker: {"Error response from daemon: " if e.status else ""}{e.message}', file=sys.stderr)
+        return 125 if args[0] == 'run' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
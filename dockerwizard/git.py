@@ -0,0 +1,115 @@
+"""
+A module to encapsulate Git behaviour
+"""
+import os
+from typing import Dict, List, Union
+
+from .cache import cache_directory, hash_string, CacheLock
+from .process import Execution, ExecutionResult
+
+
+def repository_name(url: str) -> str:
+    """
+    Gets the name of the directory git would clone the repository identified by url into if a target directory is not
+    provided
+    :param url: the url of the repository
+    :return: the default directory name of the clone
+    """
+    name = url.rstrip('/').rstrip('\\')
+    name = name.split('/')[-1].split('\\')[-1].split(':')[-1]
+
+    return name[:-len('.git')] if name.endswith('.git') else name
+
+
+class GitClient:
+    """
+    A client for interacting with Git. Like the DockerClient, the methods are wrappers around setting up the Execution
+    required for the git command and returning the result
+    """
+    @staticmethod
+    def mirror_path(url: str) -> str:
+        """
+        Get the path of the bare mirror cache for the repository identified by url
+        """
+        return os.path.join(cache_directory('git', 'mirrors'), hash_string(url))
+
+    @staticmethod
+    def update_mirror(url: str, env: Dict[str, str] = None, cwd: str = None) -> ExecutionResult:
+        """
+        Creates the bare mirror of the repository in the cache if it does not exist, or else fetches any new objects
+        into the existing mirror. The mirror is locked while it is updated so concurrent builds share it safely
+        """
+        path = GitClient.mirror_path(url)
+
+        with CacheLock(path):
+            if os.path.isfile(os.path.join(path, 'HEAD')):
+                args = ['git', '-C', path, 'fetch', '--prune', '--quiet', 'origin']
+            else:
+                args = ['git', 'clone', '--mirror', '--quiet', url, path]
+
+            return Execution(args, env=env, cwd=cwd).execute()
+
+    @staticmethod
+    def clone(url: str, target: str = None, branch: str = None, depth: int = None, filter_spec: str = None,
+              sparse: bool = False, reference: str = None, submodules: bool = False,
+              jobs: int = None, env: Dict[str, str] = None, cwd: str = None) -> ExecutionResult:
+        """
+        Clone the repository identified by url
+        :param url: the url of the repository to clone
+        :param target: an optional name of the directory to clone into
+        :param branch: an optional branch or tag to check out instead of the remote HEAD
+        :param depth: if provided, a shallow clone with history truncated to this number of commits is made
+        :param filter_spec: an optional partial clone filter, e.g. blob:none
+        :param sparse: if true, the clone is initialised with a sparse checkout of only the top level files
+        :param reference: the path to a local repository to borrow objects from. The clone is dissociated from the
+        reference after cloning so the reference can be updated or removed without affecting the clone
+        :param submodules: if true, submodules are cloned recursively
+        :param jobs: the number of submodules to fetch in parallel
+        :param env: the environment to execute git with
+        :param cwd: the directory to execute git in, which relative targets are relative to
+        :return: the result of the clone execution
+        """
+        args = ['git', 'clone']
+
+        if branch:
+            args.extend(['--branch', branch])
+
+        if depth:
+            args.extend(['--depth', str(depth)])
+
+        if filter_spec:
+            args.append(f'--filter={filter_spec}')
+
+        if sparse:
+            args.append('--sparse')
+
+        if reference:
+            args.extend(['--reference', reference, '--dissociate'])
+
+        if submodules:
+            args.append('--recurse-submodules')
+
+            if depth:
+                args.append('--shallow-submodules')
+
+        if jobs:
+            args.extend(['--jobs', str(jobs)])
+
+        args.append(url)
+
+        if target:
+            args.append(target)
+
+        return Execution(args, env=env, cwd=cwd).execute()
+
+    @staticmethod
+    def sparse_checkout(directory: str, paths: Union[str, List[str]], env: Dict[str, str] = None,
+                        cwd: str = None) -> ExecutionResult:
+        """
+        Restrict the checkout of the cloned repository in directory to the given paths
+        """
+        paths = [paths] if isinstance(paths, str) else paths
+        args = ['git', '-C', directory, 'sparse-checkout', 'set']
+        args.extend(paths)
+
+        return Execution(args, env=env, cwd=cwd).execute()
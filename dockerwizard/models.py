@@ -3,10 +3,12 @@ This file exports models that are used throughout the dockerwizard module
 """
 import os.path
 from abc import ABC, abstractmethod
-from typing import Callable, List
+from types import MappingProxyType
+from typing import Callable, List, Mapping
 
+from .cache import parse_size
 from .errors import BuildConfigurationError
-from .workdir import get_working_directory
+from .workdir import get_working_directory, resolve_path
 from .customcommands import custom_command_path_validator
 
 
@@ -14,19 +16,36 @@ class BuildFileData:
     """
     A class that allows abstract access to properties in a build file
     """
+    __slots__ = ('_data',)
+
     def __init__(self, data: dict):
         self._data = data
 
     @property
-    def data(self) -> dict:
+    def data(self) -> Mapping:
         """
-        Returns raw data dictionary as a copy
+        Returns a read-only view of the raw data dictionary
         """
-        return self._data.copy()
+        return MappingProxyType(self._data)
 
     def get_property(self, key: str):
         return self._data.get(key)
 
+    def to_dict(self) -> dict:
+        """
+        Returns the data as a plain dictionary, recursively converting any nested build file data, including build
+        file data nested in lists
+        """
+        def convert(value):
+            if isinstance(value, BuildFileData):
+                return value.to_dict()
+            elif isinstance(value, list):
+                return [convert(v) for v in value]
+            else:
+                return value
+
+        return {key: convert(value) for key, value in self._data.items()}
+
     def set_properties(self, setters: List, target):
         """
         Call process on all the PropertySetters in the given list
@@ -42,6 +61,8 @@ class BuildFileObject(ABC):
     """
     A base object representing an object nested in a build file
     """
+    __slots__ = ('tag_name',)
+
     def __init__(self, tag_name: str = None):
         """
         Create a base object with the given tag_name in the file
@@ -78,6 +99,8 @@ class PropertySetter:
     """
     A class that pulls a property from build data and then passes it into the provided lambda function
     """
+    __slots__ = ('name', 'required', 'validate', 'on_error')
+
     def __init__(self, name: str, required: bool = False, validate: Callable = None, on_error: Callable = None):
         """
         Initialise a property processor
@@ -125,10 +148,66 @@ def throw_property_error(e: str):
     raise BuildConfigurationError(e)
 
 
+class Schema:
+    """
+    The property setters of a build file object class compiled once for the class. Applying the schema gives the same
+    result as processing each setter, but the property names are only checked against the target class the first time
+    the schema is applied, rather than on every property of every object, and no setters are created per object
+    """
+    __slots__ = ('_properties', '_checked')
+
+    def __init__(self, setters: List[PropertySetter]):
+        """
+        Compile the schema
+        :param setters: the setters of the properties of the class. Their validate functions must not depend on the
+        object being initialised
+        """
+        self._properties = tuple((s.name, s.required, s.validate, s.on_error) for s in setters)
+        self._checked = False
+
+    def apply(self, data: BuildFileData, target: BuildFileObject):
+        """
+        Sets the properties of the target from the data
+        :param data: the data to set the properties from
+        :param target: the object to initialise
+        :return: None
+        """
+        if not self._checked:
+            for name, _, _, _ in self._properties:
+                if not hasattr(target, name):
+                    raise ValueError(f'Property {name} is not valid')
+
+            self._checked = True
+
+        values = data._data
+
+        for name, required, validate, on_error in self._properties:
+            value = values.get(name)
+
+            if value is None:
+                if required and on_error is not None:
+                    on_error(f'{name} not found')
+
+                continue
+            elif required and not value:
+                error = f'{name} not found'
+            else:
+                error = validate(value) if validate is not None else None
+
+                if error is None:
+                    setattr(target, name, value)
+                    continue
+
+            if on_error is not None:
+                on_error(error)
+
+
 class BaseFileObject(BuildFileObject):
     """
     A base build file object which provides the recommended implementation of initialise which returns self
     """
+    __slots__ = ()
+
     def __init__(self, tag_name: str = None):
         super().__init__(tag_name=tag_name)
 
@@ -156,18 +235,20 @@ class File(BaseFileObject):
     """
     A file required by the build step
     """
+    __slots__ = ('path', 'relative_to_library')
+
+    schema = Schema([
+        PropertySetter('path', required=True, on_error=throw_property_error),
+        PropertySetter('relative_to_library')
+    ])
+
     def __init__(self):
         super().__init__()
         self.path: str = ''
         self.relative_to_library: bool = True
 
     def do_initialise(self, data: BuildFileData):
-        setters = [
-            PropertySetter('path', required=True, on_error=throw_property_error),
-            PropertySetter('relative_to_library')
-        ]
-
-        data.set_properties(setters, self)
+        File.schema.apply(data, self)
 
 
 class Files(BaseFileObject):
@@ -187,10 +268,76 @@ class Files(BaseFileObject):
         self.files = [File().initialise(f) for f in files_list]
 
 
+# the ways a step cache can be made available in the build directory
+CACHE_MOUNT_MODES = ['symlink', 'bind', 'hardlink', 'reflink', 'copy']
+
+
+def _validate_cache_path(path: str):
+    if os.path.isabs(path) or '..' in os.path.normpath(path).split(os.sep):
+        return f'Cache path {path} must be relative to the build directory'
+
+
+def _validate_cache_max_size(size):
+    try:
+        parse_size(size)
+    except ValueError as e:
+        return str(e)
+
+
+def _validate_cache_mode(mode: str):
+    if mode not in CACHE_MOUNT_MODES:
+        return f'Cache mode must be one of {CACHE_MOUNT_MODES} but was {mode}'
+
+
+class StepCache(BaseFileObject):
+    """
+    A named persistent cache directory made available to a build step
+    """
+    __slots__ = ('name', 'path', 'key', 'max_size', 'mode')
+
+    schema = Schema([
+        PropertySetter('name', required=True, on_error=throw_property_error),
+        PropertySetter('path', required=True, validate=_validate_cache_path, on_error=throw_property_error),
+        PropertySetter('key', on_error=throw_property_error),
+        PropertySetter('max_size', validate=_validate_cache_max_size, on_error=throw_property_error),
+        PropertySetter('mode', validate=_validate_cache_mode, on_error=throw_property_error)
+    ])
+
+    def __init__(self):
+        super().__init__()
+        self.name: str = ''
+        self.path: str = ''
+        self.key: str = '${name}'
+        self.max_size = None
+        self.mode: str = 'symlink'
+
+    def do_initialise(self, data: BuildFileData):
+        StepCache.schema.apply(data, self)
+
+        if self.max_size is not None:
+            self.max_size = parse_size(self.max_size)
+
+
+def _validate_environment(environment):
+    if not isinstance(environment, BuildFileData) or \
+            any(isinstance(v, (BuildFileData, list)) for v in environment.data.values()):
+        return 'environment must be a mapping of variable names to values'
+
+
 class BuildStep(BaseFileObject):
     """
     Represents the build step object
     """
+    __slots__ = ('name', 'command', 'arguments', 'named', 'cache', 'environment')
+
+    schema = Schema([
+        PropertySetter('name', on_error=throw_property_error),
+        PropertySetter('command', required=True, on_error=throw_property_error),
+        PropertySetter('arguments', on_error=throw_property_error),
+        PropertySetter('named', on_error=throw_property_error),
+        PropertySetter('environment', validate=_validate_environment, on_error=throw_property_error)
+    ])
+
     def __init__(self):
         super().__init__()
         self.name = None
@@ -200,18 +347,29 @@ class BuildStep(BaseFileObject):
         # but can be accessed in build context current_step
         # not converted to BuildFileData, kept as simple dict
         self.named: dict = {}
+        # persistent cache directories made available in the build directory while the step executes
+        self.cache: List[StepCache] = []
+        # environment variables overlaid on the build environment for processes executed by this step only
+        self.environment: dict = {}
 
     def do_initialise(self, data: BuildFileData):
-        setters = [
-            PropertySetter('name', on_error=throw_property_error),
-            PropertySetter('command', required=True, on_error=throw_property_error),
-            PropertySetter('arguments', on_error=throw_property_error),
-            PropertySetter('named', on_error=throw_property_error)
-        ]
+        BuildStep.schema.apply(data, self)
 
-        data.set_properties(setters, self)
+        self.named = self.named.to_dict() if isinstance(self.named, BuildFileData) else self.named
+        self.environment = self.environment.to_dict() if isinstance(self.environment, BuildFileData) \
+            else self.environment
 
-        self.named = self.named.data if isinstance(self.named, BuildFileData) else self.named
+        caches = data.get_property('cache')
+
+        if caches is not None:
+            if not isinstance(caches, list) or not all(isinstance(c, BuildFileData) for c in caches):
+                throw_property_error('cache must be a list of cache definitions')
+
+            self.cache = [StepCache().initialise(c) for c in caches]
+            names = [c.name for c in self.cache]
+
+            if len(names) != len(set(names)):
+                throw_property_error(f'Duplicate cache names in step: {names}')
 
 
 class BuildSteps(BaseFileObject):
@@ -246,21 +404,43 @@ class DockerBuild(BaseFileObject):
         self.files: List[File] = []
         self.steps: List[BuildStep] = []
         self.post_steps: List[BuildStep] = []
+        # the directory relative paths in the build file are relative to, which is the directory of the build file
+        self.directory: str = get_working_directory()
 
     def _convert_custom_commands(self):
         if self.custom_commands:
             if not os.path.isabs(self.custom_commands):
-                self.custom_commands = os.path.join(get_working_directory(), self.custom_commands)
+                self.custom_commands = os.path.join(self.directory, self.custom_commands)
 
-    def do_initialise(self, data: BuildFileData):
-        def validate_file_library(path: str):
-            if not os.path.isdir(path):
-                return f'{path} is not a directory'
+    def resolve_path(self, path: str) -> str:
+        """
+        Resolves the path relative to the directory of the build file
+        :param path: the path to resolve
+        :return: the absolute path
+        """
+        return resolve_path(path, self.directory)
+
+    def file_path(self, file: File) -> str:
+        """
+        Resolves the path of a file required by the build, which is relative to the library unless the file is not
+        relative to the library
+        :param file: the file to resolve the path of
+        :return: the absolute path of the file
+        """
+        return self.resolve_path(os.path.join(self.library, file.path) if file.relative_to_library else file.path)
+
+    def _validate_library(self, path: str):
+        if not os.path.isdir(self.resolve_path(path)):
+            return f'{path} is not a directory'
 
+    def _validate_custom_commands(self, path: str):
+        return custom_command_path_validator(self.resolve_path(path))
+
+    def do_initialise(self, data: BuildFileData):
         setters = [
             PropertySetter('image', required=True, on_error=throw_property_error),
-            PropertySetter('library', required=False, validate=validate_file_library, on_error=throw_property_error),
-            PropertySetter('custom_commands', required=False, validate=custom_command_path_validator,
+            PropertySetter('library', required=False, validate=self._validate_library, on_error=throw_property_error),
+            PropertySetter('custom_commands', required=False, validate=self._validate_custom_commands,
                            on_error=throw_property_error)
         ]
 
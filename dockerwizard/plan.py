@@ -0,0 +1,121 @@
+"""
+A module for compiling a parsed build into a plan before the build starts, so that problems with the build file are
+reported before any work is done rather than when the build reaches them
+"""
+import os
+from typing import List, Union
+
+from . import commands
+from .commands import Command
+from .errors import BuildConfigurationError, BuildError
+from .models import DockerBuild, BuildStep
+
+
+class PlanError(BuildConfigurationError):
+    """
+    An error thrown when a build fails to compile, holding every problem found in the build
+    """
+    def __init__(self, errors: List[str]):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+class PlannedStep:
+    """
+    A step of the build with the command that executes it
+    """
+    def __init__(self, index: int, step: BuildStep, command: Command, post_step: bool = False):
+        """
+        Create the planned step
+        :param index: the index of the step starting at 1
+        :param step: the step from the build file
+        :param command: the command the step executes
+        :param post_step: true if the step is a post-build step
+        """
+        self.index = index
+        self.step = step
+        self.command = command
+        self.post_step = post_step
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the step, or the default name of its command if it has no name
+        """
+        return self.step.name if self.step.name else self.command.default_name()
+
+
+class BuildPlan:
+    """
+    A build with the command of each of its steps resolved and validated
+    """
+    def __init__(self, build: DockerBuild, steps: Union[List[PlannedStep], None],
+                 post_steps: Union[List[PlannedStep], None]):
+        """
+        Create the plan
+        :param build: the build that was compiled
+        :param steps: the planned steps, or None if the steps are streamed and so could not be compiled
+        :param post_steps: the planned post-build steps, or None if they are streamed
+        """
+        self.build = build
+        self.steps = steps
+        self.post_steps = post_steps
+
+
+def _compile_steps(steps: list, post_steps: bool, errors: List[str]) -> List[PlannedStep]:
+    """
+    Resolves and validates the command of each step, adding any problems to the errors
+    """
+    planned = []
+    step_type = 'post-build step' if post_steps else 'build step'
+
+    for i, step in enumerate(steps):
+        index = i + 1
+
+        try:
+            command = commands.registry.get_command(step.command)
+        except ValueError:
+            errors.append(f'Unknown command {step.command} in {step_type} {index}')
+            continue
+        except BuildError as e:
+            errors.append(f'Failed to load command {step.command} of {step_type} {index}: {e}')
+            continue
+
+        planned_step = PlannedStep(index, step, command, post_steps)
+
+        try:
+            command.validate(step.arguments, step.named)
+        except BuildError as e:
+            errors.append(f'Invalid {step_type} {index} - {planned_step.name}: {e}')
+        except Exception as e:
+            errors.append(f'Failed to validate {step_type} {index} - {planned_step.name}: {e}')
+
+        planned.append(planned_step)
+
+    return planned
+
+
+def compile_plan(build: DockerBuild) -> BuildPlan:
+    """
+    Compiles the build into a plan. This resolves the command of every step from the registry, validates the
+    arguments of every step with its command and checks the files the build copies exist. Steps that are streamed from
+    the build file cannot be compiled ahead of time and are validated when they execute. Any custom commands the build
+    uses must be loaded before the build is compiled
+    :param build: the build to compile
+    :return: the compiled plan
+    """
+    errors = []
+
+    for file in [build.dockerfile, *build.files]:
+        path = build.file_path(file)
+
+        if not os.path.isfile(path):
+            errors.append(f'File {file.path} required by the build does not exist at {path}')
+
+    steps = _compile_steps(build.steps, False, errors) if isinstance(build.steps, list) else None
+    post_steps = _compile_steps(build.post_steps, True, errors) if isinstance(build.post_steps, list) else None
+
+    if errors:
+        raise PlanError(errors)
+
+    return BuildPlan(build, steps, post_steps)
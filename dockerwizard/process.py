@@ -1,8 +1,19 @@
 """
-An abstraction to allow execution of an external process
+An abstraction to allow execution of an external process. Processes are executed by a pluggable backend, which by
+default runs them with subprocess. The backend can instead record every execution into a cassette file, or replay the
+results of executions from a cassette without running anything, so builds can be tested and benchmarked without the
+programs they execute, e.g. Docker, git or Maven, being installed
 """
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
 from subprocess import Popen, PIPE
-from typing import Union, List
+from typing import Callable, Union, List, Dict
+
+from .const import DOCKER_WIZARD_RECORD_VAR, DOCKER_WIZARD_REPLAY_VAR, DOCKER_WIZARD_REPLAY_TIMING_VAR
 
 
 class ExecutionResult:
@@ -28,24 +39,287 @@ class ExecutionResult:
         return self.exit_code == 0
 
 
+class ExecutionBackend(ABC):
+    """
+    A backend that executes the commands of executions
+    """
+    @abstractmethod
+    def start(self, command: str, env: Union[Dict[str, str], None],
+              cwd: Union[str, None]) -> Callable[[], ExecutionResult]:
+        """
+        Starts executing the command
+        :param command: the command to execute
+        :param env: the environment variables to execute the command with, or None to inherit the environment
+        :param cwd: the directory to execute the command in, or None for the working directory of this process
+        :return: a function that waits for the command to complete and returns its result
+        """
+        pass
+
+
+class SubprocessBackend(ExecutionBackend):
+    """
+    The default backend that executes each command in a shell
+    """
+    def start(self, command: str, env: Union[Dict[str, str], None],
+              cwd: Union[str, None]) -> Callable[[], ExecutionResult]:
+        process = Popen(command, stdout=PIPE, stderr=PIPE, text=True, shell=True, env=env, cwd=cwd)
+
+        def wait() -> ExecutionResult:
+            stdout, stderr = process.communicate()
+
+            return ExecutionResult(process.returncode, stdout, stderr)
+
+        return wait
+
+
+def environment_digest(env: Union[Dict[str, str], None]) -> str:
+    """
+    Digests the variables of the environment that differ from the environment of this process, which are the variables
+    set by the build. The rest of the environment differs between machines, so it is not part of the digest
+    :param env: the environment of the execution
+    :return: the hex digest of the variables
+    """
+    variables = sorted((name, value) for name, value in (env if env else {}).items() if os.environ.get(name) != value)
+
+    return hashlib.sha256(json.dumps(variables).encode('utf-8')).hexdigest()
+
+
+# the paths replaced with placeholders in recorded commands, mapped to the names of their placeholders
+_placeholders: Dict[str, str] = {}
+_placeholders_lock = threading.Lock()
+
+
+def add_placeholder(path: str, name: str):
+    """
+    Replaces the path with the placeholder ${name} in the commands and working directories of recorded executions.
+    This is for paths that change on every run, e.g. the temporary build directory, so the executions of a later run
+    still match the recording
+    :param path: the path to replace
+    :param name: the name of the placeholder
+    :return: None
+    """
+    with _placeholders_lock:
+        _placeholders[path] = name
+
+
+def remove_placeholder(path: str):
+    """
+    Stops replacing the path with a placeholder
+    :param path: the path added with add_placeholder
+    :return: None
+    """
+    with _placeholders_lock:
+        _placeholders.pop(path, None)
+
+
+def normalise(value: Union[str, None]) -> Union[str, None]:
+    """
+    Replaces the paths that change between runs with their placeholders, i.e. the paths added with add_placeholder
+    and the cache root as ${cache}
+    :param value: the command or working directory of an execution
+    :return: the value with placeholders
+    """
+    from .cache import cache_root  # prevent circular import
+
+    if value is None:
+        return None
+
+    with _placeholders_lock:
+        placeholders = {**_placeholders, cache_root(): 'cache'}
+
+    # longer paths first, so a path inside another path gets its own placeholder
+    for path in sorted(placeholders, key=len, reverse=True):
+        if path:
+            value = value.replace(path, f'${{{placeholders[path]}}}')
+
+    return value
+
+
+class RecordingBackend(ExecutionBackend):
+    """
+    A backend that executes commands with another backend and records the command, working directory, environment
+    digest, result and duration of every execution into a cassette. The cassette is a file with a JSON object on each
+    line, which is replaced when recording starts. Paths that change between runs are recorded as placeholders
+    """
+    def __init__(self, cassette: str, backend: ExecutionBackend = None):
+        """
+        Create the backend
+        :param cassette: the path to the cassette to record into
+        :param backend: the backend that executes the commands, SubprocessBackend if not provided
+        """
+        self.cassette = cassette
+        self._backend = backend if backend else SubprocessBackend()
+        self._lock = threading.Lock()
+
+        with open(cassette, 'w'):
+            pass
+
+    def start(self, command: str, env: Union[Dict[str, str], None],
+              cwd: Union[str, None]) -> Callable[[], ExecutionResult]:
+        start = time.perf_counter()
+        execution = self._backend.start(command, env, cwd)
+
+        def wait() -> ExecutionResult:
+            result = execution()
+            record = {
+                'command': normalise(command),
+                'cwd': normalise(cwd),
+                'env': environment_digest(env),
+                'exit_code': result.exit_code,
+                'stdout': result.stdout,
+                'stderr': result.stderr,
+                'duration': time.perf_counter() - start
+            }
+
+            with self._lock, open(self.cassette, 'a') as f:
+                f.write(f'{json.dumps(record)}\n')
+
+            return result
+
+        return wait
+
+
+class ReplayBackend(ExecutionBackend):
+    """
+    A backend that executes nothing and returns the results recorded in a cassette. Each recorded execution of a
+    command is replayed once in the order it was recorded, preferring an execution recorded with the same environment
+    digest. Commands are matched with the paths that change between runs replaced by placeholders. A command with no
+    recorded executions left fails as if the command does not exist
+    """
+    def __init__(self, cassette: str, timing: bool = False):
+        """
+        Create the backend
+        :param cassette: the path to the cassette to replay
+        :param timing: if true, each execution takes as long as it took when it was recorded
+        """
+        self.cassette = cassette
+        self.timing = timing
+        self._executions: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+
+        with open(cassette, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._executions.setdefault(record['command'], []).append(record)
+
+    def _next(self, command: str, env: Union[Dict[str, str], None]) -> Union[dict, None]:
+        """
+        Removes and returns the next recorded execution of the command
+        """
+        with self._lock:
+            records = self._executions.get(normalise(command))
+
+            if not records:
+                return None
+
+            digest = environment_digest(env)
+            index = next((i for i, record in enumerate(records) if record['env'] == digest), 0)
+
+            return records.pop(index)
+
+    def start(self, command: str, env: Union[Dict[str, str], None],
+              cwd: Union[str, None]) -> Callable[[], ExecutionResult]:
+        record = self._next(command, env)
+
+        def wait() -> ExecutionResult:
+            if record is None:
+                return ExecutionResult(127, '', f'{command}: no recorded execution left in cassette {self.cassette}')
+
+            if self.timing:
+                time.sleep(record['duration'])
+
+            return ExecutionResult(record['exit_code'], record['stdout'], record['stderr'])
+
+        return wait
+
+
+_backend: Union[ExecutionBackend, None] = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend() -> ExecutionBackend:
+    """
+    Creates the backend configured by the DOCKER_WIZARD_REPLAY and DOCKER_WIZARD_RECORD environment variables
+    """
+    replay = os.environ.get(DOCKER_WIZARD_REPLAY_VAR)
+    record = os.environ.get(DOCKER_WIZARD_RECORD_VAR)
+
+    if replay:
+        timing = os.environ.get(DOCKER_WIZARD_REPLAY_TIMING_VAR, 'false').lower() in ['true', '1', 'yes']
+
+        return ReplayBackend(replay, timing)
+    elif record:
+        return RecordingBackend(record)
+    else:
+        return SubprocessBackend()
+
+
+def get_backend() -> ExecutionBackend:
+    """
+    Gets the backend executions are executed with, creating it from the environment the first time it is retrieved
+    :return: the execution backend
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+
+    return _backend
+
+
+def set_backend(backend: Union[ExecutionBackend, None]):
+    """
+    Sets the backend executions are executed with
+    :param backend: the backend, or None to create it from the environment again when it is next retrieved
+    :return: None
+    """
+    global _backend
+    _backend = backend
+
+
+def _build_context():
+    """
+    Returns the context of the running build, or None if there is no build running
+    """
+    from .context import BuildContext  # prevent circular import
+    from .errors import BuildContextError
+
+    try:
+        return BuildContext.context()
+    except BuildContextError:
+        return None
+
+
 class Execution:
     """
     Encapsulates the execution of a command
     """
-    def __init__(self, command: Union[str, List[str]]):
+    def __init__(self, command: Union[str, List[str]], env: Dict[str, str] = None, cwd: str = None):
         """
         Creates an execution object with the command to execute
         :param command: a command as a string or list of arguments
+        :param env: the environment variables to execute the command with. If None, the environment of the running
+        build and current step is used, or the environment of this process is inherited outside a build
+        :param cwd: the directory to execute the command in. If None, the working directory of the running build is
+        used, or the working directory of this process outside a build
         """
         if isinstance(command, list):
             command = ' '.join(command)
-        self._process = Popen(command, stdout=PIPE, stderr=PIPE, text=True, shell=True)
+
+        context = _build_context() if env is None or cwd is None else None
+
+        if context is not None:
+            env = env if env is not None else context.process_environment()
+            cwd = cwd if cwd is not None else context.working_directory
+
+        self._wait = get_backend().start(command, env, cwd)
 
     def execute(self) -> ExecutionResult:
         """
         Begins the execution and waits for it to complete, returning the result
         :return: the result
         """
-        stdout, stderr = self._process.communicate()
-
-        return ExecutionResult(self._process.returncode, stdout, stderr)
+        return self._wait()
@@ -0,0 +1,215 @@
+"""
+A module for making the persistent caches declared by build steps available in the build directory
+"""
+import os
+import platform
+import re
+import shutil
+import threading
+from typing import Dict
+
+from .cache import cache_directory, hash_string, hash_files, directory_size, link_tree, save_tree, \
+    CacheLock, run_quietly
+from .cli import info, warn
+from .errors import CommandError
+from .models import StepCache
+
+_KEY_VARIABLE = re.compile(r'\$\{([^}]+)}')
+
+
+def resolve_key(template: str, variables: Dict[str, str], build_directory: str,
+                environment: Dict[str, str] = None) -> str:
+    """
+    Resolves the cache key template. Variables are referenced as ${variable}, where the variable is one of the given
+    variables, env:NAME for the value of an environment variable or hash:path for the hash of a file in the build
+    directory
+    :param template: the key template
+    :param variables: the values of the named variables
+    :param build_directory: the directory hashed files are relative to
+    :param environment: the environment variables of the build, os.environ if not provided
+    :return: the resolved key
+    """
+    def replace(match) -> str:
+        variable = match.group(1)
+
+        if variable in variables:
+            return variables[variable]
+        elif variable.startswith('env:'):
+            return (os.environ if environment is None else environment).get(variable[len('env:'):], '')
+        elif variable.startswith('hash:'):
+            return hash_files([os.path.join(build_directory, variable[len('hash:'):])])
+        else:
+            raise CommandError(f'Unknown variable {variable} in cache key {template}')
+
+    return _KEY_VARIABLE.sub(replace, str(template))
+
+
+class CacheMount:
+    """
+    Makes a step cache available in the build directory before the step executes and persists it after the step
+    succeeds. Symlink and bind mounts give the step the cache entry itself, so the entry is locked for the whole step.
+    If the entry does not exist, they give the step a temporary entry instead, which only becomes the entry if the step
+    succeeds. Hardlink, reflink and copy mounts restore a copy of the entry which is saved back to the cache after the
+    step, so the entry is only locked while it is restored and saved
+    """
+    def __init__(self, cache: StepCache, build_directory: str, variables: Dict[str, str],
+                 environment: Dict[str, str] = None):
+        """
+        Create the mount for the cache
+        :param cache: the cache declared by the step
+        :param build_directory: the build directory the cache path is relative to
+        :param variables: the variables available to the key template
+        :param environment: the environment variables of the build available to the key template
+        """
+        self.cache = cache
+        self.mode = cache.mode
+        self.key = resolve_key(cache.key, {**variables, 'name': cache.name}, build_directory, environment)
+        self.root = cache_directory('steps', cache.name)
+        self.entry = os.path.join(self.root, hash_string(self.key))
+        self.target = os.path.join(build_directory, cache.path)
+        self._lock = CacheLock(self.entry)
+        # the temporary entry a symlink or bind mount of a missing entry gives the step
+        self._staging = None
+
+    def _bind(self, source: str) -> bool:
+        """
+        Bind mount the source entry on the target, returning false if bind mounts are not permitted
+        """
+        os.makedirs(self.target)
+
+        if run_quietly(['mount', '--bind', source, self.target]):
+            return True
+
+        os.rmdir(self.target)
+
+        return False
+
+    def mount(self):
+        """
+        Makes the cache available at its path in the build directory
+        :return: None
+        """
+        if os.path.lexists(self.target):
+            raise CommandError(f'Cannot mount cache {self.cache.name} at {self.cache.path} as the path already exists')
+
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        hit = os.path.isdir(self.entry)
+
+        if self.mode in ['symlink', 'bind']:
+            self._lock.acquire()
+            # another build may have saved the entry while this build waited for the lock
+            hit = os.path.isdir(self.entry)
+
+            try:
+                if not hit:
+                    # a step failing part way through must not leave an entry that the next build would hit
+                    self._staging = f'{self.entry}.tmp-{os.getpid()}-{threading.get_ident()}'
+                    shutil.rmtree(self._staging, ignore_errors=True)
+
+                source = self._staging if self._staging else self.entry
+                os.makedirs(source, exist_ok=True)
+
+                if self.mode == 'bind' and not self._bind(source):
+                    warn(f'Failed to bind mount cache {self.cache.name}, falling back to a symlink')
+                    self.mode = 'symlink'
+
+                if self.mode == 'symlink':
+                    os.symlink(source, self.target, target_is_directory=True)
+            except OSError:
+                self._discard_staging()
+                self._lock.release()
+                raise
+        else:
+            with self._lock:
+                if hit:
+                    link_tree(self.entry, self.target, self.mode)
+                else:
+                    os.makedirs(self.target)
+
+        if hit:
+            # record the use of the entry so the least recently used entries are evicted first
+            os.utime(self.entry)
+
+        info(f'Mounted cache {self.cache.name} at {self.cache.path} ({"hit" if hit else "miss"} for key {self.key})')
+
+    def _evict(self):
+        """
+        Removes the least recently used entries of the cache until it is within its maximum size. Entries locked by
+        other builds are skipped. Must be called with the entry locked
+        """
+        max_size = self.cache.max_size
+
+        if max_size is None:
+            return
+
+        entries = [os.path.join(self.root, e) for e in os.listdir(self.root)]
+        entries = [e for e in entries if os.path.isdir(e) and not os.path.islink(e) and '.tmp-' not in e]
+        sizes = {e: directory_size(e) for e in entries}
+        total = sum(sizes.values())
+        others = sorted([e for e in entries if e != self.entry], key=os.path.getmtime)
+
+        for entry in others:
+            if total <= max_size:
+                break
+
+            lock = CacheLock(entry)
+
+            if lock.acquire(blocking=False):
+                try:
+                    info(f'Evicting entry {os.path.basename(entry)} from cache {self.cache.name}')
+                    shutil.rmtree(entry, ignore_errors=True)
+                    total -= sizes[entry]
+                finally:
+                    lock.release()
+
+        if total > max_size and self.entry in sizes:
+            warn(f'Cache {self.cache.name} exceeds its maximum size of {max_size} bytes with key {self.key}, '
+                 f'discarding the entry')
+            shutil.rmtree(self.entry, ignore_errors=True)
+
+    def _discard_staging(self):
+        """
+        Removes the temporary entry given to the step, if any
+        """
+        if self._staging:
+            shutil.rmtree(self._staging, ignore_errors=True)
+            self._staging = None
+
+    def unmount(self, succeeded: bool):
+        """
+        Removes the cache from the build directory, persisting it to the cache if the step succeeded
+        :param succeeded: true if the step succeeded
+        :return: None
+        """
+        try:
+            if self.mode in ['symlink', 'bind']:
+                if self.mode == 'bind':
+                    run_quietly(['umount', self.target])
+                    os.rmdir(self.target)
+                else:
+                    os.unlink(self.target)
+
+                if self._staging and succeeded:
+                    info(f'Saving cache {self.cache.name} from {self.cache.path}')
+                    os.replace(self._staging, self.entry)
+                    self._staging = None
+            else:
+                if succeeded:
+                    self._lock.acquire()
+                    info(f'Saving cache {self.cache.name} from {self.cache.path}')
+                    save_tree(self.target, self.entry)
+
+                shutil.rmtree(self.target, ignore_errors=True)
+
+            if succeeded:
+                self._evict()
+        finally:
+            self._discard_staging()
+            self._lock.release()
+
+
+def platform_key() -> str:
+    """
+    Gets the value of the platform variable of cache keys
+    """
+    return f'{platform.system()}-{platform.machine()}'.lower()
@@ -3,7 +3,7 @@ A module to encapsulate system related tasks
 """
 import platform
 import os
-from typing import Callable, List
+from typing import Callable, Dict, List
 from enum import Enum
 
 
@@ -86,13 +86,42 @@ def docker_wizard_home():
     return var
 
 
+# the builtin commands by name, with the name of the class in the builtincommands module that implements the command
+# followed by the arguments it is created with. The commands are declared here rather than in the builtincommands
+# module so they can be registered without importing it
+BUILTIN_COMMANDS: Dict[str, tuple] = {
+    'copy': ('CopyCommand',),
+    'execute-shell': ('ExecuteSystemCommand',),
+    'set-variable': ('SetVariableCommand', False),
+    'set-secret': ('SetVariableCommand', True),
+    'set-variables': ('SetVariablesCommand',),
+    'git-clone': ('GitCloneCommand',),
+    'git-clone-many': ('GitCloneManyCommand',),
+    'execute-groovy': ('ScriptExecutorCommand', 'groovy'),
+    'execute-python': ('ScriptExecutorCommand', 'python'),
+    'create-container': ('CreateContainerCommand',),
+    'run-build-tool': ('RunBuildCommand',)
+}
+
+
+def _create_builtin(name: str):
+    """
+    Creates the builtin command with the given name, importing the builtincommands module on first use
+    """
+    from .builtincommands import builtin_factories
+    return builtin_factories()[name]()
+
+
 def register_builtins():
     """
-    Registers builtin commands
+    Registers builtin commands. The builtincommands module and its dependencies are only imported when a build first
+    uses a builtin command, so the tool starts quickly when it is run only to print information
     """
     # import here to avoid a circular import error
-    from .builtincommands import register_builtins as _register
-    _register()
+    from . import commands
+
+    for name in BUILTIN_COMMANDS:
+        commands.registry.register_factory(name, lambda n=name: _create_builtin(n))
 
 
 # We use lambdas as they allow for easy testing. i.e. we can mock docker_wizard_home and register_builtins
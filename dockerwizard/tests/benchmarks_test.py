@@ -0,0 +1,120 @@
+"""
+Tests the benchmarks with small sizes, so they keep working as the tool changes
+"""
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from unittest.mock import patch
+
+from .testing import main
+from dockerwizard import commands, workdir
+from dockerwizard.benchmarks import custom, dispatch, environment, execution, load, parse, staging, suite
+from dockerwizard.system import isWindows
+
+
+class BenchmarksTest(unittest.TestCase):
+    def setUp(self):
+        # builder_test replaces the function creating the build directory when it is imported and other tests replace
+        # the registry the benchmarks register their commands in
+        for target, value in [('create_temp_directory', workdir.create_temp_directory),
+                              ('registry', commands.registry)]:
+            patcher = patch(f'dockerwizard.builder.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_environment(self):
+        with patch.dict(os.environ, {'BENCHMARK_SET': 'previous'}):
+            os.environ.pop('BENCHMARK_UNSET', None)
+
+            with environment({'BENCHMARK_SET': 'set', 'BENCHMARK_UNSET': 'set'}):
+                self.assertEqual('set', os.environ['BENCHMARK_SET'])
+                self.assertEqual('set', os.environ['BENCHMARK_UNSET'])
+
+            self.assertEqual('previous', os.environ['BENCHMARK_SET'])
+            self.assertFalse('BENCHMARK_UNSET' in os.environ)
+
+    def test_parse(self):
+        results = parse.benchmark(5, 1)
+
+        self.assertGreater(results['parse'], 0)
+        self.assertGreater(results['build_memory'], 0)
+
+    def test_staging(self):
+        results = staging.benchmark(3, 128, 1)
+
+        self.assertGreater(results['stage'], 0)
+        self.assertGreater(results['throughput'], 0)
+
+    def test_dispatch(self):
+        self.assertGreater(dispatch.benchmark(5, 1)['build'], 0)
+        self.assertGreater(dispatch.benchmark(5, 1, checkpoints=True)['build'], 0)
+
+    def test_execution(self):
+        self.assertGreater(execution.spawn(1)['shell'], 0)
+        self.assertGreater(execution.output(1024, 1)['output'], 0)
+
+    def test_custom(self):
+        results = custom.benchmark(2, 1)
+
+        self.assertGreater(results['cold'], 0)
+        self.assertGreater(results['loaded'], 0)
+
+    def test_load(self):
+        results = load.benchmark(2, 2, 1, 0)
+
+        self.assertEqual(0, results['failed'])
+        self.assertGreater(results['builds_per_minute'], 0)
+        self.assertLessEqual(results['p50'], results['p99'])
+
+        if not isWindows():
+            self.assertEqual(0, load.benchmark(1, 1, 1, 0, engine=True)['failed'])
+
+    def test_percentile(self):
+        values = [float(value) for value in range(100, 0, -1)]
+
+        self.assertEqual(50, load.percentile(values, 50))
+        self.assertEqual(95, load.percentile(values, 95))
+        self.assertEqual(100, load.percentile(values, 100))
+        self.assertEqual(1, load.percentile(values, 0))
+        self.assertEqual(3, load.percentile([3], 99))
+
+    def test_main(self):
+        suites = {'first': lambda quick, repeat: [{'quick': quick, 'repeat': repeat}]}
+
+        with patch.dict(suite.SUITES, suites, clear=True), tempfile.TemporaryDirectory() as directory:
+            output = io.StringIO()
+
+            with redirect_stdout(output), redirect_stderr(io.StringIO()):
+                code = suite.main(['-q', '-r', '2'])
+
+            report = json.loads(output.getvalue())
+
+            self.assertEqual(0, code)
+            self.assertEqual({'first': [{'quick': True, 'repeat': 2}]}, report['results'])
+
+            for key in ['version', 'python', 'platform', 'timestamp']:
+                self.assertIn(key, report)
+
+            path = os.path.join(directory, 'results.json')
+
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                code = suite.main(['-s', 'first', '-o', path])
+
+            with open(path, 'r') as f:
+                report = json.load(f)
+
+            self.assertEqual(0, code)
+            self.assertEqual({'first': [{'quick': False, 'repeat': 3}]}, report['results'])
+
+            with patch('dockerwizard.benchmarks.suite.cli') as cli:
+                self.assertEqual(2, suite.main(['-s', 'first,second']))
+                cli.error.assert_called_with('Unknown benchmarks second, choose from first')
+                self.assertEqual(2, suite.main(['-r', '0']))
+                cli.error.assert_called_with('The number of repeats must be a positive integer, not 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,23 +2,22 @@
 This tests the builder module
 """
 import contextlib
+import os
 import unittest
-from unittest.mock import Mock
+import unittest.mock
+from unittest.mock import Mock, MagicMock
 
 import dockerwizard.errors
 from dockerwizard.process import ExecutionResult
-from .testing import main, PatchedDependencies, patch_os_path
-from dockerwizard import builtincommands
-
-old_register_builtins = builtincommands.register_builtins
-builtincommands.register_builtins = Mock()
-
+from .testing import main, PatchedDependencies
 from dockerwizard import builder
 
 old_temp_dir = builder.create_temp_directory
 builder.create_temp_directory = Mock()
 
-from dockerwizard import models, context
+from dockerwizard import models, context, buildparser
+from dockerwizard.plan import PlanError
+from dockerwizard.checkpoint import step_fingerprint
 
 base_package = 'dockerwizard.builder'
 
@@ -54,6 +53,8 @@ post_steps = [step3]
 
 working_dir = '/path/workdir'
 
+build_dir = '/path/build'
+
 
 class StubTempDir:
     def __init__(self):
@@ -99,7 +100,6 @@ class BuilderTest(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls) -> None:
-        builtincommands.register_builtins = old_register_builtins
         builder.create_temp_directory = old_temp_dir
 
     def _create_builder(self):
@@ -111,6 +111,7 @@ class BuilderTest(unittest.TestCase):
         config.files = files
         config.steps = steps
         config.post_steps = post_steps
+        config.directory = build_dir
 
         builder.create_temp_directory.return_value = StubTempDir()
         self.builder = builder.Builder(config)
@@ -121,22 +122,32 @@ class BuilderTest(unittest.TestCase):
         self.test2_command = StubCommand()
         self.test3_command = StubCommand()
 
+    def tearDown(self) -> None:
+        context.teardown()
+
     @contextlib.contextmanager
     def _patch(self) -> PatchedDependencies:
         with PatchedDependencies({
             'shutil': f'{base_package}.shutil',
-            'osPatch': f'{base_package}.os',
-            'changeDir': f'{base_package}.change_directory',
-            'changeBack': f'{base_package}.change_back',
             'info': f'{base_package}.info',
             'error': f'{base_package}.error',
+            'warn': f'{base_package}.warn',
             'registry': f'{base_package}.registry',
-            'changeLoadCustom': f'{base_package}.change_and_load_custom',
+            'loadCustom': f'{base_package}.load_custom',
             'docker': f'{base_package}.DockerClient',
             'context_init': f'{base_package}.initialise',
-            'context_teardown': f'{base_package}.teardown'
+            'context_teardown': f'{base_package}.teardown',
+            'cacheMount': f'{base_package}.CacheMount',
+            'compilePlan': f'{base_package}.compile_plan',
+            'checkpointsEnabled': f'{base_package}.checkpoints_enabled',
+            'checkpoints': f'{base_package}.Checkpoints',
+            'buildFingerprint': f'{base_package}.build_fingerprint',
+            'addPlaceholder': f'{base_package}.add_placeholder',
+            'removePlaceholder': f'{base_package}.remove_placeholder'
         }) as patched:
-            patched.osPatch.path = patch_os_path()
+            patched.checkpointsEnabled.return_value = False
+            patched.buildFingerprint.return_value = 'build'
+            patched.checkpoints.return_value.latest.return_value = 0
             patched.shutil.copy = Mock()
 
             patched.docker.build_docker_image = Mock()
@@ -166,17 +177,16 @@ class BuilderTest(unittest.TestCase):
         patched: PatchedDependencies
         with self._patch() as patched:
             patched.docker.build_docker_image.return_value = docker_build
+            build_context = self.builder._context
 
             return_val = self.builder.build()
 
             self.assertTrue(return_val)
-            patched.shutil.copy.assert_any_call(f'{library}/Dockerfile', working_dir)
-            patched.shutil.copy.assert_any_call(f'{library}/{file1.path}', working_dir)
+            patched.shutil.copy.assert_any_call(f'{build_dir}/{library}/Dockerfile', working_dir)
+            patched.shutil.copy.assert_any_call(f'{build_dir}/{library}/{file1.path}', working_dir)
             patched.shutil.copy.assert_any_call(f'{file2.path}', working_dir)
-            patched.changeLoadCustom.assert_called_with(custom_commands)
-            patched.changeDir.assert_any_call(working_dir)
-
-            patched.changeDir.assert_any_call(working_dir, not_store=True)
+            patched.loadCustom.assert_called_with(custom_commands)
+            self.assertEqual(working_dir, build_context.working_directory)
             patched.registry.get_command.assert_any_call(step1.command)
             patched.registry.get_command.assert_any_call(step2.command)
             self.assertTrue(self.test1_command.executed)
@@ -186,10 +196,12 @@ class BuilderTest(unittest.TestCase):
             self.assertEqual(step2.arguments, self.test2_command.args)
             self.assertEqual(step3.arguments, self.test3_command.args)
 
-            patched.docker.build_docker_image.assert_called_with(image)
+            patched.docker.build_docker_image.assert_called_with(image, env=unittest.mock.ANY, cwd=working_dir)
+            self.assertEqual(os.environ.get('PATH'), patched.docker.build_docker_image.call_args[1]['env'].get('PATH'))
 
             self.builder._working_directory.cleanup.assert_called()
-            patched.changeBack.assert_called()
+            patched.addPlaceholder.assert_called_with(working_dir, 'build')
+            patched.removePlaceholder.assert_called_with(working_dir)
 
             # assert info messages
             patched.info.assert_any_call('Copying Dockerfile and required files to build directory')
@@ -199,7 +211,7 @@ class BuilderTest(unittest.TestCase):
             patched.info.assert_any_call('Dockerfile and required files successfully copied to build directory')
             patched.info.assert_any_call(f'Build specified custom commands file {custom_commands}. '
                                          'Loading commands into build')
-            patched.info.assert_any_call('Changing working directory to build directory')
+            patched.info.assert_any_call('Using build directory as the working directory of the build')
             patched.info.assert_any_call('Executing build steps')
             patched.info.assert_any_call(f'Executing build step 1 - {step1.name}')
             patched.info.assert_any_call('Executing build step 2 - name')
@@ -208,7 +220,7 @@ class BuilderTest(unittest.TestCase):
             patched.info.assert_any_call(f'\tstdout')
             patched.info.assert_any_call('Executing post-build steps')
             patched.info.assert_any_call(f'Executing post-build step 1 - {step3.name}')
-            patched.info.assert_any_call('Build finished, changing back to working directory')
+            patched.info.assert_any_call('Build finished')
 
     def test_successful_build_without_custom_commands(self):
         docker_build = ExecutionResult(0, 'stdout', '')
@@ -221,7 +233,7 @@ class BuilderTest(unittest.TestCase):
             return_val = self.builder.build()
 
             self.assertTrue(return_val)
-            patched.changeLoadCustom.assert_not_called()
+            patched.loadCustom.assert_not_called()
 
     def test_failed_build_unknown_command(self):
         docker_build = ExecutionResult(0, 'stdout', '')
@@ -238,6 +250,21 @@ class BuilderTest(unittest.TestCase):
 
             self.assertTrue('Unknown command' in e.exception.message)
 
+    def test_failed_build_invalid_plan(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            patched.compilePlan.side_effect = PlanError(['Unknown command unknown in build step 1'])
+
+            return_val = self.builder.build()
+
+            self.assertFalse(return_val)
+            patched.compilePlan.assert_called_with(self.builder.config)
+            patched.shutil.copy.assert_not_called()
+            patched.docker.build_docker_image.assert_not_called()
+            self.assertFalse(self.test1_command.executed)
+            patched.error.assert_any_call('\tUnknown command unknown in build step 1')
+            patched.error.assert_any_call('See logs to see why the build failed')
+
     def test_failed_build_command_error(self):
         docker_build = ExecutionResult(0, 'stdout', '')
 
@@ -265,6 +292,217 @@ class BuilderTest(unittest.TestCase):
                                           'exit code 1')
             patched.error.assert_any_call('See logs to see why the build failed')
 
+    @contextlib.contextmanager
+    def _step_cache(self):
+        cache = models.StepCache()
+        cache.name = 'ccache'
+        cache.path = '.ccache'
+        step1.cache = [cache]
+
+        try:
+            yield cache
+        finally:
+            step1.cache = []
+
+    def test_step_caches(self):
+        docker_build = ExecutionResult(0, 'stdout', '')
+
+        patched: PatchedDependencies
+        with self._patch() as patched, self._step_cache() as cache:
+            patched.docker.build_docker_image.return_value = docker_build
+
+            self.assertTrue(self.builder.build())
+            patched.cacheMount.assert_called_once()
+            self.assertEqual((cache, working_dir), patched.cacheMount.call_args[0][:2])
+            self.assertEqual(image, patched.cacheMount.call_args[0][2]['image'])
+            self.assertEqual(step1.name, patched.cacheMount.call_args[0][2]['step'])
+            self.assertEqual(os.environ.get('PATH'), patched.cacheMount.call_args[0][3].get('PATH'))
+            patched.cacheMount.return_value.mount.assert_called_once()
+            patched.cacheMount.return_value.unmount.assert_called_once_with(True)
+
+    def test_step_caches_failed_step(self):
+        patched: PatchedDependencies
+        with self._patch() as patched, self._step_cache():
+            self.test1_command.throw_error = True
+
+            self.assertFalse(self.builder.build())
+            patched.cacheMount.return_value.unmount.assert_called_once_with(False)
+
+    def test_step_caches_failed_mount(self):
+        patched: PatchedDependencies
+        with self._patch() as patched, self._step_cache():
+            patched.cacheMount.return_value.mount.side_effect = OSError('exists')
+
+            self.assertFalse(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            patched.cacheMount.return_value.unmount.assert_not_called()
+            patched.error.assert_any_call(f'Failed to execute build step 1 - {step1.name} with error: '
+                                          f'Failed to mount step cache: exists')
+
+    def test_step_caches_invalid_mount(self):
+        patched: PatchedDependencies
+        with self._patch() as patched, self._step_cache():
+            patched.cacheMount.return_value.mount.side_effect = ValueError('Link mode invalid is not valid')
+
+            # a value error while mounting is not reported as an unknown command
+            self.assertFalse(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            patched.error.assert_any_call(f'Failed to execute build step 1 - {step1.name} with error: '
+                                          f'Failed to mount step cache: Link mode invalid is not valid')
+
+    def test_streamed_steps_closed(self):
+        docker_build = ExecutionResult(0, 'stdout', '')
+
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            patched.docker.build_docker_image.return_value = docker_build
+            post_steps = MagicMock(spec=buildparser.StepStream)
+            post_steps.__iter__.return_value = iter([])
+            self.builder.config.post_steps = post_steps
+
+            self.assertTrue(self.builder.build())
+            post_steps.close.assert_called_once()
+
+    def _checkpoint_builder(self, **kwargs):
+        self._create_builder()
+        self.builder = builder.Builder(self.builder.config, **kwargs)
+
+    def test_checkpoints(self):
+        docker_build = ExecutionResult(0, 'stdout', '')
+
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            patched.docker.build_docker_image.return_value = docker_build
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+
+            self.assertTrue(self.builder.build())
+            checkpoints.restore.assert_not_called()
+            self.assertEqual(2, checkpoints.save.call_count)
+            self.assertEqual([1, 2], [c[0][0] for c in checkpoints.save.call_args_list])
+            self.assertEqual(working_dir, checkpoints.save.call_args[0][2])
+            # the fingerprints are chained from the build fingerprint
+            first, second = [c[0][1] for c in checkpoints.save.call_args_list]
+            self.assertNotEqual(first, second)
+            # the checkpoints are cleared at the start and when the build succeeds
+            self.assertEqual(2, checkpoints.clear.call_count)
+            checkpoints.unlock.assert_called_once()
+            patched.shutil.copy.assert_called()
+
+    def test_checkpoints_locked(self):
+        docker_build = ExecutionResult(0, 'stdout', '')
+
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            patched.docker.build_docker_image.return_value = docker_build
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+            checkpoints.lock.return_value = False
+
+            self.assertTrue(self.builder.build())
+            checkpoints.save.assert_not_called()
+            checkpoints.clear.assert_not_called()
+            checkpoints.unlock.assert_not_called()
+            patched.warn.assert_called_with('Another run of the build is using its checkpoints, so no checkpoints are '
+                                            'recorded')
+
+    def test_resume_locked(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            self._checkpoint_builder(resume=True)
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+            checkpoints.lock.return_value = False
+
+            self.assertFalse(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            checkpoints.restore.assert_not_called()
+            patched.error.assert_any_call('Another run of the build is using its checkpoints, so the build cannot be '
+                                          'continued from a checkpoint')
+
+    def test_checkpoints_failed_step(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+            checkpoints.latest.return_value = 1
+            self.test2_command.throw_error = True
+
+            self.assertFalse(self.builder.build())
+            checkpoints.save.assert_called_once()
+            checkpoints.clear.assert_called_once()
+            patched.info.assert_any_call('Run the build again with --resume to continue from the step after the last '
+                                         'checkpoint')
+
+    def test_resume(self):
+        docker_build = ExecutionResult(0, 'stdout', '')
+
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            self._checkpoint_builder(resume=True)
+            patched.docker.build_docker_image.return_value = docker_build
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+            checkpoints.latest.return_value = 1
+            checkpoints.restore.return_value = {'VARIABLE': 'value'}
+            build_context = self.builder._context
+
+            self.assertTrue(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            self.assertTrue(self.test2_command.executed)
+            self.assertTrue(self.test3_command.executed)
+            patched.shutil.copy.assert_not_called()
+            # the checkpoint is restored with the fingerprint of the build up to step 1
+            checkpoints.restore.assert_called_once_with(1, step_fingerprint('build', step1), working_dir,
+                                                        build_context.environment)
+            build_context.environment.update.assert_called_with({'VARIABLE': 'value'})
+            self.assertEqual(2, checkpoints.save.call_args[0][0])
+            patched.info.assert_any_call('Resuming the build from build step 2')
+            patched.info.assert_any_call('Restoring the build from the checkpoint of build step 1')
+
+    def test_resume_out_of_date(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            self._checkpoint_builder(from_step=2)
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+            checkpoints.restore.side_effect = dockerwizard.errors.BuildConfigurationError('out of date')
+
+            self.assertFalse(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            self.assertFalse(self.test2_command.executed)
+            patched.error.assert_any_call('out of date')
+
+    def test_resume_disabled(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            self._checkpoint_builder(resume=True)
+
+            self.assertFalse(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            patched.error.assert_any_call('Checkpoints are disabled, so the build cannot be continued from a '
+                                          'checkpoint. Set DOCKER_WIZARD_CHECKPOINTS to true to record checkpoints')
+
+    def test_only(self):
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            self._checkpoint_builder(only=[2])
+            patched.checkpointsEnabled.return_value = True
+            checkpoints = patched.checkpoints.return_value
+
+            self.assertTrue(self.builder.build())
+            self.assertFalse(self.test1_command.executed)
+            self.assertTrue(self.test2_command.executed)
+            self.assertFalse(self.test3_command.executed)
+            checkpoints.restore.assert_called_once_with(1, unittest.mock.ANY, working_dir, unittest.mock.ANY)
+            checkpoints.save.assert_not_called()
+            checkpoints.clear.assert_not_called()
+            patched.docker.build_docker_image.assert_not_called()
+
+            self._checkpoint_builder(only=[3])
+            self.assertFalse(self.builder.build())
+            patched.error.assert_any_call('The build only has 2 build steps')
+
     def test_context_setup(self):
         mock_context = StubContext()
         docker_build = ExecutionResult(0, 'stdout', '')
@@ -2,11 +2,16 @@
 This tests the buildparser module
 """
 import contextlib
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, Mock
 
 from .testing import main, PatchedDependencies
 from dockerwizard import buildparser
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_PLAN_CACHE_VAR
+from dockerwizard.errors import BuildConfigurationError
 from dockerwizard.models import DockerBuild, BuildFileData
 
 base_package = 'dockerwizard.buildparser'
@@ -46,8 +51,12 @@ class BuildParserTest(unittest.TestCase):
             'yaml': f'{base_package}.yaml',
             'dockerBuild': f'{base_package}.DockerBuild',
             'propertyError': f'{base_package}.throw_property_error',
-            'openPatch': 'builtins.open'
+            'openPatch': 'builtins.open',
+            'loadPlan': f'{base_package}.load_plan',
+            'savePlan': f'{base_package}.save_plan'
         }) as patched:
+            patched.openPatch.return_value.__enter__.return_value.read.return_value = b'build:'
+            patched.loadPlan.return_value = None
             patched.dockerBuild.return_value = Mock()
             patched.dockerBuild.return_value.initialise = Mock()
 
@@ -75,14 +84,31 @@ class BuildParserTest(unittest.TestCase):
         build = DockerBuild()
         patched: PatchedDependencies
         with self._patch() as patched, patch(f'{base_package}.convert_dict_to_build_data') as convert:
-            patched.get('yaml').safe_load.return_value = test_data
+            patched.get('yaml').load.return_value = test_data
             patched.get('dockerBuild').return_value.initialise.return_value = build
 
             return_val = buildparser.YamlBuildParser().parse('file.yaml')
 
             self.assertEqual(return_val, build)
-            patched.get('yaml').safe_load.assert_called()
+            patched.get('yaml').load.assert_called_with(b'build:', Loader=buildparser._Loader)
             convert.assert_called()
+            patched.get('loadPlan').assert_called_with('file.yaml', b'build:')
+            patched.get('savePlan').assert_called_with('file.yaml', b'build:', test_data['build'], {})
+
+    def test_yaml_build_parser_cached(self):
+        build = DockerBuild()
+        patched: PatchedDependencies
+        with self._patch() as patched, patch(f'{base_package}.convert_dict_to_build_data') as convert:
+            patched.get('loadPlan').return_value = test_data['build']
+            patched.get('dockerBuild').return_value.initialise.return_value = build
+
+            return_val = buildparser.YamlBuildParser().parse('file.yaml')
+
+            # the models are built from the cached data as from the build file
+            self.assertEqual(return_val, build)
+            convert.assert_called_with(test_data['build'])
+            patched.get('yaml').load.assert_not_called()
+            patched.get('savePlan').assert_not_called()
 
     def test_yaml_build_parser_file_not_found(self):
         patched: PatchedDependencies
@@ -96,6 +122,445 @@ class BuildParserTest(unittest.TestCase):
 
     def test_get_build_parser(self):
         self.assertTrue(isinstance(buildparser.get_build_parser(), buildparser.YamlBuildParser))
+        self.assertTrue(isinstance(buildparser.get_build_parser(stream=True), buildparser.StreamingYamlBuildParser))
+
+
+class PlanCacheTest(unittest.TestCase):
+    """
+    Parses real build files to test the plan cache
+    """
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: os.path.join(self.directory.name, 'cache')})
+        self.environ.start()
+        self.file = os.path.join(self.directory.name, 'build.yaml')
+        os.makedirs(os.path.join(self.directory.name, 'library'))
+        self._write('image-1')
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def _write(self, image: str):
+        with open(self.file, 'w') as f:
+            f.write(f'build:\n  image: {image}\n  library: library\n  dockerfile:\n    path: Dockerfile\n'
+                    f'  files: []\n  steps:\n    - command: execute-shell\n      arguments: [echo]\n')
+
+    def _parse(self) -> DockerBuild:
+        with patch(f'{base_package}.info'):
+            return buildparser.YamlBuildParser().parse(self.file)
+
+    def test_plan_cached(self):
+        with patch(f'{base_package}.yaml.load', wraps=buildparser.yaml.load) as load:
+            build = self._parse()
+            cached = self._parse()
+
+            self.assertEqual(1, load.call_count)
+            self.assertIsNot(build, cached)
+            self.assertEqual('image-1', cached.image)
+            self.assertEqual(self.directory.name, os.path.realpath(cached.directory))
+            self.assertEqual(['echo'], cached.steps[0].arguments)
+
+            self._write('image-2')
+            self.assertEqual('image-2', self._parse().image)
+            self.assertEqual(2, load.call_count)
+
+    def test_plan_cache_disabled(self):
+        with patch(f'{base_package}.yaml.load', wraps=buildparser.yaml.load) as load, \
+                patch.dict(os.environ, {DOCKER_WIZARD_PLAN_CACHE_VAR: 'false'}):
+            self._parse()
+            self._parse()
+
+            self.assertEqual(2, load.call_count)
+
+    def test_cached_plan_paths_validated(self):
+        self._parse()
+        os.rmdir(os.path.join(self.directory.name, 'library'))
+
+        with self.assertRaises(BuildConfigurationError):
+            self._parse()
+
+    def test_plan_is_json(self):
+        self._parse()
+
+        with open(self.file, 'rb') as f:
+            content = f.read()
+
+        with open(buildparser._plan_file(self.file, content), 'r') as f:
+            plan = json.load(f)
+
+        self.assertEqual({}, plan['includes'])
+        self.assertEqual('image-1', plan['build']['image'])
+
+    def test_plan_not_representable(self):
+        with open(self.file, 'a') as f:
+            f.write('  created: 2024-01-01\n')
+
+        with open(self.file, 'rb') as f:
+            content = f.read()
+
+        self.assertEqual('image-1', self._parse().image)
+        # dates are not JSON, so the plan is not cached rather than loaded with a different type
+        self.assertFalse(os.path.exists(buildparser._plan_file(self.file, content)))
+
+    def test_corrupt_plan(self):
+        with open(self.file, 'rb') as f:
+            content = f.read()
+
+        with open(buildparser._plan_file(self.file, content), 'wb') as f:
+            f.write(b'corrupt')
+
+        self.assertIsNone(buildparser.load_plan(self.file, content))
+        self.assertEqual('image-1', self._parse().image)
+
+
+class StreamingBuildParserTest(unittest.TestCase):
+    """
+    Streams real build files
+    """
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, 'build.yaml')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _parse(self, contents: str) -> DockerBuild:
+        with open(self.file, 'w') as f:
+            f.write(contents)
+
+        with patch(f'{base_package}.info'):
+            return buildparser.StreamingYamlBuildParser().parse(self.file)
+
+    def test_stream(self):
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  arguments: &arguments [echo, hello]\n'
+                            '  steps:\n'
+                            '    - command: execute-shell\n'
+                            '      arguments: *arguments\n'
+                            '    - name: second\n'
+                            '      command: execute-shell\n'
+                            '  post:\n'
+                            '    - command: post-command\n'
+                            'other: value\n')
+
+        self.assertEqual('image', build.image)
+        self.assertEqual('Dockerfile', build.dockerfile.path)
+        self.assertTrue(isinstance(build.steps, buildparser.StepStream))
+
+        steps = list(build.steps)
+        self.assertEqual(['echo', 'hello'], steps[0].arguments)
+        self.assertEqual('second', steps[1].name)
+        self.assertEqual(['post-command'], [s.command for s in build.post_steps])
+
+        with self.assertRaises(BuildConfigurationError):
+            list(build.steps)
+
+    def test_steps_parsed_as_iterated(self):
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  post:\n'
+                            '    - command: post-command\n'
+                            '  steps:\n'
+                            '    - command: first\n'
+                            '    - command: second\n'
+                            '    - arguments: [no command]\n')
+
+        self.assertEqual(['post-command'], [s.command for s in build.post_steps])
+        steps = iter(build.steps)
+        self.assertEqual('first', next(steps).command)
+        self.assertEqual('second', next(steps).command)
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            next(steps)
+
+        self.assertTrue('command not found' in e.exception.message)
+
+    def test_stopped_iteration_closes_file(self):
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  steps:\n'
+                            '    - command: first\n'
+                            '    - command: second\n'
+                            '  post:\n'
+                            '    - command: post-command\n')
+        file = build.steps._stream._stream
+
+        # e.g. the first step failed, so the rest of the steps are never read
+        for step in build.steps:
+            self.assertEqual('first', step.command)
+            break
+
+        self.assertTrue(file.closed)
+
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  steps:\n'
+                            '    - command: first\n')
+        file = build.steps._stream._stream
+        self.assertFalse(file.closed)
+
+        build.steps.close()
+        self.assertTrue(file.closed)
+
+    def test_post_steps_before_steps(self):
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  steps:\n'
+                            '    - command: first\n'
+                            '  post:\n'
+                            '    - command: post-command\n')
+
+        with self.assertRaises(BuildConfigurationError):
+            list(build.post_steps)
+
+        build.steps.close()
+
+    def test_property_after_steps(self):
+        build = self._parse('build:\n'
+                            '  image: image\n'
+                            '  dockerfile:\n'
+                            '    path: Dockerfile\n'
+                            '  files: []\n'
+                            '  steps:\n'
+                            '    - command: first\n'
+                            '  other: value\n')
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            list(build.steps)
+
+        self.assertTrue('other must be defined before the steps' in e.exception.message)
+
+    def test_invalid_files(self):
+        for contents in ['', 'other: value\n', 'build: value\n', 'build:\n  steps: [\n']:
+            with self.assertRaises(BuildConfigurationError):
+                self._parse(contents)
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            buildparser.StreamingYamlBuildParser().parse(os.path.join(self.directory.name, 'missing.yaml'))
+
+        self.assertTrue('does not exist' in e.exception.message)
+
+
+class TemplatesTest(unittest.TestCase):
+    """
+    Parses real build files that include fragments and use templates
+    """
+    def setUp(self) -> None:
+        buildparser._FRAGMENTS = {}
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: os.path.join(self.directory.name, 'cache')})
+        self.environ.start()
+        self.file = self._path('build.yaml')
+        self._write('fragments/maven.yaml',
+                    'include: common.yaml\n'
+                    'templates:\n'
+                    '  maven:\n'
+                    '    parameters:\n'
+                    '      service: null\n'
+                    '      goal: package\n'
+                    '    steps:\n'
+                    '      - name: Build ${service}\n'
+                    '        command: run-build-tool\n'
+                    '        arguments: [maven, "${goal}"]\n'
+                    '        cache:\n'
+                    '          - name: m2\n'
+                    '            path: .m2\n'
+                    '            key: ${name}-${hash:pom.xml}\n'
+                    '      - template: echo\n'
+                    '        parameters:\n'
+                    '          message: built ${service}\n')
+        self._write('fragments/common.yaml',
+                    'templates:\n'
+                    '  echo:\n'
+                    '    parameters: [message]\n'
+                    '    steps:\n'
+                    '      - command: execute-shell\n'
+                    '        arguments: [echo, "${message}"]\n')
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+        buildparser._FRAGMENTS = {}
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.directory.name, path)
+
+    def _write(self, path: str, contents: str):
+        os.makedirs(os.path.dirname(self._path(path)), exist_ok=True)
+
+        with open(self._path(path), 'w') as f:
+            f.write(contents)
+
+    def _write_build(self, steps: str, header: str = '  include: fragments/maven.yaml\n'):
+        self._write('build.yaml', 'build:\n'
+                                  '  image: image\n'
+                                  '  dockerfile:\n'
+                                  '    path: Dockerfile\n'
+                                  '  files: []\n' + header +
+                                  '  steps:\n' + steps)
+
+    def _parse(self, stream: bool = False) -> DockerBuild:
+        with patch(f'{base_package}.info'):
+            return buildparser.get_build_parser(stream=stream).parse(self.file)
+
+    def test_templates(self):
+        self._write_build('    - template: maven\n'
+                          '      parameters:\n'
+                          '        service: api\n'
+                          '    - command: execute-shell\n'
+                          '    - template: maven\n'
+                          '      parameters:\n'
+                          '        service: web\n'
+                          '        goal: install\n')
+
+        for stream in [False, True]:
+            steps = list(self._parse(stream).steps)
+
+            self.assertEqual(['Build api', None, None, 'Build web', None], [s.name for s in steps])
+            self.assertEqual(['maven', 'package'], steps[0].arguments)
+            self.assertEqual('${name}-${hash:pom.xml}', steps[0].cache[0].key)
+            self.assertEqual(['echo', 'built api'], steps[1].arguments)
+            self.assertEqual(['maven', 'install'], steps[3].arguments)
+            self.assertEqual(['echo', 'built web'], steps[4].arguments)
+
+    def test_inline_templates(self):
+        self._write_build('    - template: inline\n'
+                          '      parameters:\n'
+                          '        message: hello\n',
+                          '  include: [fragments/common.yaml]\n'
+                          '  templates:\n'
+                          '    inline:\n'
+                          '      parameters: [message]\n'
+                          '      steps:\n'
+                          '        - template: echo\n'
+                          '          parameters:\n'
+                          '            message: ${message} world\n')
+
+        self.assertEqual(['echo', 'hello world'], self._parse().steps[0].arguments)
+
+    def test_parameter_types(self):
+        self._write_build('    - template: clone\n'
+                          '      parameters:\n'
+                          '        depth: 1\n'
+                          '        shallow: true\n',
+                          '  templates:\n'
+                          '    clone:\n'
+                          '      parameters: [depth, shallow]\n'
+                          '      steps:\n'
+                          '        - command: git-clone\n'
+                          '          arguments: [url]\n'
+                          '          named: {depth: "${depth}", label: "depth ${depth}", sparse: "${shallow}"}\n'
+                          '        - command: execute-shell\n'
+                          '          arguments: [bash, -c, "echo $$ $HOME ${HOME} $${depth} ${depth}"]\n')
+
+        steps = self._parse().steps
+
+        # a string that is only a reference keeps the type of the parameter
+        self.assertEqual({'depth': 1, 'label': 'depth 1', 'sparse': True}, steps[0].named)
+        # only references to parameters are substituted, so shell syntax is left as written
+        self.assertEqual(['bash', '-c', 'echo $$ $HOME ${HOME} $1 1'], steps[1].arguments)
+
+    def test_fragments_memoised(self):
+        self._write_build('    - template: echo\n'
+                          '      parameters:\n'
+                          '        message: hello\n')
+
+        with patch.dict(os.environ, {DOCKER_WIZARD_PLAN_CACHE_VAR: 'false'}), \
+                patch(f'{base_package}.yaml.load', wraps=buildparser.yaml.load) as load:
+            self._parse()
+            self.assertEqual(3, load.call_count)
+            self._parse()
+            self.assertEqual(4, load.call_count)
+
+            self._write('fragments/common.yaml', 'templates:\n'
+                                                 '  echo:\n'
+                                                 '    parameters: [message]\n'
+                                                 '    steps:\n'
+                                                 '      - command: changed\n')
+            self.assertEqual('changed', self._parse().steps[0].command)
+            self.assertEqual(6, load.call_count)
+
+    def test_plan_invalidated_by_include(self):
+        self._write_build('    - template: echo\n'
+                          '      parameters:\n'
+                          '        message: hello\n')
+
+        self.assertEqual('execute-shell', self._parse().steps[0].command)
+
+        self._write('fragments/common.yaml', 'templates:\n'
+                                             '  echo:\n'
+                                             '    parameters: [message]\n'
+                                             '    steps:\n'
+                                             '      - command: changed\n')
+
+        self.assertEqual('changed', self._parse().steps[0].command)
+
+    def test_template_errors(self):
+        for steps, error in [
+            ('    - template: unknown\n', 'Unknown template unknown'),
+            ('    - template: maven\n', 'requires parameters'),
+            ('    - template: echo\n      parameters: {message: a, other: b}\n', 'does not have parameters'),
+            ('    - template: echo\n      command: other\n', 'can only have template and parameters'),
+        ]:
+            self._write_build(steps)
+
+            with self.assertRaises(BuildConfigurationError) as e:
+                self._parse()
+
+            self.assertTrue(error in e.exception.message, e.exception.message)
+
+    def test_recursive_templates(self):
+        self._write_build('    - template: loop\n',
+                          '  templates:\n'
+                          '    loop:\n'
+                          '      steps:\n'
+                          '        - template: loop\n')
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._parse()
+
+        self.assertTrue('uses itself' in e.exception.message)
+
+    def test_include_errors(self):
+        self._write('fragments/common.yaml', 'include: maven.yaml\n')
+        self._write_build('    - command: execute-shell\n')
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._parse()
+
+        self.assertTrue('includes itself' in e.exception.message)
+
+        self._write_build('    - command: execute-shell\n', '  include: missing.yaml\n')
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._parse()
+
+        self.assertTrue('does not exist' in e.exception.message)
+
+        self._write('fragments/common.yaml', 'steps: []\n')
+        self._write_build('    - command: execute-shell\n')
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._parse()
+
+        self.assertTrue('can only contain include and templates' in e.exception.message)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,385 @@
+"""
+Tests the buildtools module
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from .testing import main, PatchedDependencies
+from dockerwizard import buildtools
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
+from dockerwizard.errors import CommandError
+from dockerwizard.process import ExecutionResult
+
+base_package = 'dockerwizard.buildtools'
+
+
+class BuildToolTestCase(unittest.TestCase):
+    """
+    A base test case that points the cache directory to a temporary directory
+    """
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.directory.name, 'cache')
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: self.cache})
+        self.environ.start()
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+
+    @contextlib.contextmanager
+    def _patch(self) -> PatchedDependencies:
+        with PatchedDependencies({
+            'info': f'{base_package}.info'
+        }) as patched:
+            yield patched
+
+
+class MavenToolTest(BuildToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.MavenTool()
+
+    def test_validate_named_args(self):
+        self.tool.validate_named_args({'goals': ['install']})
+
+        with self.assertRaises(CommandError) as e:
+            self.tool.validate_named_args({'arguments': ['-X']})
+
+        self.assertEqual('Named argument goals not provided', e.exception.message)
+
+    def test_get_args(self):
+        self.assertEqual(['mvn', 'clean', 'install'], self.tool.get_args({'goals': ['clean', 'install']}))
+
+        repository = os.path.join(self.cache, 'maven', 'repository')
+        args = self.tool.get_args({
+            'goals': ['install'],
+            'arguments': ['-DskipTests'],
+            'cache': True,
+            'offline': True,
+            'threads': '1C',
+            'batch': True
+        })
+
+        self.assertEqual(['mvn', '-B', '-o', '-T', '1C', f'-Dmaven.repo.local={repository}', '-DskipTests',
+                          'install'], args)
+        self.assertTrue(os.path.isdir(repository))
+
+    def test_cache_savings_report(self):
+        named = {'goals': ['install'], 'cache': True}
+        result = ExecutionResult(0, '', '')
+
+        with self._patch() as patched:
+            self.assertEqual({}, self.tool.before_execution({'goals': ['install']}))
+
+            state = self.tool.before_execution(named)
+            self.assertTrue(state['cold'])
+            self.tool.after_execution(named, state, result, 10.0)
+            patched.info.assert_called_with('Maven repository cache populated in 10.00s. Subsequent builds will '
+                                            'resolve dependencies from the cache')
+
+            state = self.tool.before_execution(named)
+            self.assertFalse(state['cold'])
+            self.tool.after_execution(named, state, result, 4.0)
+            patched.info.assert_called_with('Maven repository cache saved approximately 6.00s of dependency '
+                                            'resolution (10.00s uncached, 4.00s cached)')
+
+            # another project sharing the populated repository records a baseline of its own
+            other = {'goals': ['package'], 'cache': True}
+            state = self.tool.before_execution(other)
+            self.assertTrue(state['cold'])
+            self.tool.after_execution(other, state, result, 6.0)
+
+            state = self.tool.before_execution(other)
+            self.assertFalse(state['cold'])
+            self.tool.after_execution(other, state, result, 2.0)
+            patched.info.assert_called_with('Maven repository cache saved approximately 4.00s of dependency '
+                                            'resolution (6.00s uncached, 2.00s cached)')
+
+    def test_cache_failed_baseline(self):
+        named = {'goals': ['install'], 'cache': True}
+
+        with self._patch() as patched:
+            # a failed build is not a baseline, so the next build is still cold
+            state = self.tool.before_execution(named)
+            self.tool.after_execution(named, state, ExecutionResult(1, '', 'error'), 1.0)
+            patched.info.assert_not_called()
+
+            self.assertTrue(self.tool.before_execution(named)['cold'])
+
+
+class MvndToolTest(BuildToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.MvndTool()
+
+    def test_get_args(self):
+        self.assertEqual(['mvnd', 'clean', 'install'], self.tool.get_args({'goals': ['clean', 'install']}))
+
+        storage = os.path.join(self.cache, 'mvnd', 'daemons', 'team')
+        args = self.tool.get_args({
+            'goals': ['install'],
+            'threads': 4,
+            'daemon': False,
+            'idle_timeout': 300,
+            'isolation': 'team'
+        })
+
+        self.assertEqual(['mvnd', '-Dmvnd.noDaemon=true', '-Dmvnd.idleTimeout=300s',
+                          f'-Dmvnd.daemonStorage={storage}', '-T', '4', 'install'], args)
+
+    def test_invalid_idle_timeout(self):
+        with self.assertRaises(CommandError) as e:
+            self.tool.validate_named_args({'goals': ['install'], 'idle_timeout': 'long'})
+
+        self.assertTrue('idle_timeout must be a positive number of seconds' in e.exception.message)
+
+
+class GradleToolTest(BuildToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.GradleTool()
+
+    def test_get_args(self):
+        self.assertEqual(['gradle', '--daemon', 'build'], self.tool.get_args({'tasks': ['build']}))
+        self.assertEqual([os.path.join('.', 'gradlew'), '--no-daemon', '-Dorg.gradle.daemon.idletimeout=60000',
+                          '--offline', 'clean', 'build'],
+                         self.tool.get_args({
+                             'tasks': ['clean', 'build'],
+                             'arguments': ['--offline'],
+                             'wrapper': True,
+                             'daemon': False,
+                             'idle_timeout': 60
+                         }))
+
+        with self.assertRaises(CommandError) as e:
+            self.tool.validate_named_args({})
+
+        self.assertEqual('Named argument tasks not provided', e.exception.message)
+
+    def test_get_env(self):
+        self.assertIsNone(self.tool.get_env({'tasks': ['build']}))
+        self.assertEqual({'GRADLE_USER_HOME': os.path.join(self.cache, 'gradle', 'daemons', 'team')},
+                         self.tool.get_env({'tasks': ['build'], 'isolation': 'team'}))
+
+
+class ProjectToolTestCase(BuildToolTestCase):
+    """
+    A base test case that runs the tool from a temporary project directory
+    """
+    def setUp(self) -> None:
+        super().setUp()
+        self.old_cwd = os.getcwd()
+        self.workdir = os.path.join(self.directory.name, 'workdir')
+        os.makedirs(self.workdir)
+        os.chdir(self.workdir)
+
+    def tearDown(self) -> None:
+        os.chdir(self.old_cwd)
+        super().tearDown()
+
+    @staticmethod
+    def _write(path: str, contents: str):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(path, 'w') as f:
+            f.write(contents)
+
+
+class NpmToolTest(ProjectToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.NpmTool()
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._write('package-lock.json', '{"lockfileVersion": 2}')
+
+    @staticmethod
+    def _install():
+        os.makedirs(os.path.join('node_modules', 'module'))
+
+        with open(os.path.join('node_modules', 'module', 'index.js'), 'w') as f:
+            f.write('module.exports = {}')
+
+    def test_get_args(self):
+        self.assertEqual(['npm', 'install'], self.tool.get_args({'arguments': ['install']}))
+
+        with self.assertRaises(CommandError):
+            self.tool.validate_named_args({})
+
+        with self.assertRaises(CommandError) as e:
+            self.tool.validate_named_args({'arguments': ['ci'], 'link': 'symlink'})
+
+        self.assertTrue('Named argument link must be one of' in e.exception.message)
+
+    def test_get_env(self):
+        self.assertIsNone(self.tool.get_env({'arguments': ['ci']}))
+        self.assertEqual({'npm_config_cache': os.path.join(self.cache, 'npm', 'cache')},
+                         self.tool.get_env({'arguments': ['ci'], 'cache': True}))
+
+    def test_snapshot(self):
+        named = {'arguments': ['ci', '--no-audit'], 'snapshot': True}
+        result = ExecutionResult(0, '', '')
+
+        with self._patch():
+            self.assertEqual({}, self.tool.before_execution({'arguments': ['ci']}))
+            self.assertEqual({}, self.tool.before_execution({'arguments': ['install', 'lodash'], 'snapshot': True}))
+
+            state = self.tool.before_execution(named)
+            self.assertFalse(state.get('skip'))
+            NpmToolTest._install()
+            self.tool.after_execution(named, state, result, 1.0)
+            self.assertTrue(os.path.isfile(os.path.join(state['snapshot'], 'module', 'index.js')))
+
+            shutil.rmtree('node_modules')
+            state = self.tool.before_execution(named)
+            self.assertTrue(state.get('skip'))
+            self.assertTrue(os.path.isfile(os.path.join('node_modules', 'module', 'index.js')))
+
+            # a changed lock file is a different snapshot
+            shutil.rmtree('node_modules')
+
+            with open('package-lock.json', 'w') as f:
+                f.write('{"lockfileVersion": 3}')
+
+            state = self.tool.before_execution(named)
+            self.assertFalse(state.get('skip'))
+            self.assertFalse(os.path.isdir('node_modules'))
+
+    def test_snapshot_working_directory(self):
+        named = {'arguments': ['ci'], 'snapshot': True}
+        result = ExecutionResult(0, '', '')
+
+        with self._patch():
+            state = self.tool.before_execution(named)
+            NpmToolTest._install()
+            self.tool.after_execution(named, state, result, 1.0)
+            shutil.rmtree('node_modules')
+
+            # the project is found from the working directory of the build rather than of the process
+            os.chdir(self.old_cwd)
+            state = self.tool.before_execution(named, self.workdir)
+            self.assertTrue(state.get('skip'))
+            self.assertTrue(os.path.isfile(os.path.join(self.workdir, 'node_modules', 'module', 'index.js')))
+
+
+class PipToolTest(ProjectToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.PipTool()
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._write('requirements.txt', 'requests==2.31.0')
+
+    def test_get_args(self):
+        self.assertEqual(['pip', 'install', '-r', 'requirements.txt'],
+                         self.tool.get_args({'arguments': ['install', '-r', 'requirements.txt']}))
+
+        named = {'arguments': ['wheel', '-r', 'requirements.txt'], 'cache': True}
+        args = self.tool.get_args(named)
+        self.assertEqual(['pip', 'wheel', '--find-links'], args[:3])
+        self.assertEqual(['-r', 'requirements.txt'], args[4:])
+        self.assertTrue(args[3].startswith(os.path.join(self.cache, 'pip', 'wheelhouse')))
+
+        # the wheelhouse is keyed by the requirements
+        self._write('requirements.txt', 'requests==2.32.0')
+        self.assertNotEqual(args[3], self.tool.get_args(named)[3])
+
+        with self.assertRaises(CommandError):
+            self.tool.validate_named_args({})
+
+    def test_get_env(self):
+        self.assertIsNone(self.tool.get_env({'arguments': ['install']}))
+        self.assertEqual({'PIP_CACHE_DIR': os.path.join(self.cache, 'pip', 'cache')},
+                         self.tool.get_env({'arguments': ['install'], 'cache': True}))
+
+    def test_wheelhouse(self):
+        named = {'arguments': ['wheel', '-r', 'requirements.txt', '-w', 'wheels'], 'cache': True}
+        self._write(os.path.join('wheels', 'requests-2.31.0-py3-none-any.whl'), 'wheel')
+        self._write(os.path.join('wheels', 'README'), 'not a wheel')
+
+        state = self.tool.before_execution(named)
+        self.tool.after_execution(named, state, ExecutionResult(0, '', ''), 1.0)
+        wheelhouse = self.tool.get_args(named)[3]
+
+        self.assertEqual(['requests-2.31.0-py3-none-any.whl'], os.listdir(wheelhouse))
+
+        # only pip wheel fills the wheelhouse
+        shutil.rmtree(wheelhouse)
+        named['arguments'][0] = 'download'
+        self.tool.after_execution(named, state, ExecutionResult(0, '', ''), 1.0)
+        self.assertFalse(os.path.isdir(wheelhouse))
+
+
+class GoToolTest(BuildToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.GoTool()
+
+    def test_get_args(self):
+        self.assertEqual(['go', 'build', './...'], self.tool.get_args({'arguments': ['build', './...']}))
+
+        with self.assertRaises(CommandError):
+            self.tool.validate_named_args({})
+
+    def test_get_env(self):
+        self.assertIsNone(self.tool.get_env({'arguments': ['build']}))
+        self.assertEqual({
+            'GOCACHE': os.path.join(self.cache, 'go', 'build'),
+            'GOMODCACHE': os.path.join(self.cache, 'go', 'mod')
+        }, self.tool.get_env({'arguments': ['build'], 'cache': True}))
+
+
+class CargoToolTest(ProjectToolTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.tool = buildtools.CargoTool()
+
+    def setUp(self) -> None:
+        super().setUp()
+        self._write('Cargo.lock', 'version = 3')
+
+    def test_get_args(self):
+        self.assertEqual(['cargo', 'build', '--release'], self.tool.get_args({'arguments': ['build', '--release']}))
+
+        with self.assertRaises(CommandError) as e:
+            self.tool.validate_named_args({'arguments': ['build'], 'link': 'symlink'})
+
+        self.assertTrue('Named argument link must be one of' in e.exception.message)
+
+    def test_get_env(self):
+        self.assertIsNone(self.tool.get_env({'arguments': ['build']}))
+        self.assertEqual({'CARGO_HOME': os.path.join(self.cache, 'cargo', 'home')},
+                         self.tool.get_env({'arguments': ['build'], 'cache': True}))
+
+    def test_snapshot(self):
+        named = {'arguments': ['build'], 'snapshot': True, 'link': 'copy'}
+        result = ExecutionResult(0, '', '')
+
+        with self._patch():
+            self.assertEqual({}, self.tool.before_execution({'arguments': ['build']}))
+
+            state = self.tool.before_execution(named)
+            self.assertFalse(state.get('skip'))
+            self._write(os.path.join('target', 'release', 'app'), 'binary')
+            self.tool.after_execution(named, state, result, 1.0)
+            self.assertTrue(os.path.isfile(os.path.join(state['snapshot'], 'release', 'app')))
+
+            # the target directory is restored but cargo still runs to build any changed sources
+            shutil.rmtree('target')
+            state = self.tool.before_execution(named)
+            self.assertFalse(state.get('skip'))
+            self.assertTrue(os.path.isfile(os.path.join('target', 'release', 'app')))
+
+
+if __name__ == '__main__':
+    main()
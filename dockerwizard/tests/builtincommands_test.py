@@ -13,9 +13,10 @@ from dockerwizard.context import BuildContext
 from dockerwizard.models import BuildStep
 from dockerwizard.process import ExecutionResult
 from .testing import main, PatchedDependencies
-from dockerwizard import builtincommands, commands
+from dockerwizard import argparser, builtincommands, commands, system
 from dockerwizard.builtincommands import CopyCommand, ExecuteSystemCommand, SetVariableCommand, \
-    SetVariablesCommand, GitCloneCommand, ScriptExecutorCommand, CreateContainerCommand, RunBuildCommand
+    SetVariablesCommand, GitCloneCommand, GitCloneManyCommand, ScriptExecutorCommand, CreateContainerCommand, \
+    RunBuildCommand
 from dockerwizard.errors import CommandError
 
 
@@ -47,11 +48,12 @@ class CopyCommandTest(unittest.TestCase):
         with self._patch() as patched:
             patched.get('osDirMock').return_value = False
             self.command.execute(args)
-            patched.get('shutilCopy').assert_called_with(source, dest, follow_symlinks=True)
+            patched.get('shutilCopy').assert_called_with(os.path.abspath(source), os.path.abspath(dest),
+                                                         follow_symlinks=True)
 
             patched.get('osDirMock').return_value = True
             self.command.execute(args)
-            patched.get('shutilCopyTree').assert_called_with(source, dest)
+            patched.get('shutilCopyTree').assert_called_with(os.path.abspath(source), os.path.abspath(dest))
 
     def test_invalid_args(self):
         args = ['source']
@@ -67,6 +69,8 @@ class ExecuteSystemCommandTest(unittest.TestCase):
     OLD_EXECUTION = None
     OLD_MODULE = None
     LAST_CALLED_ARGS = None
+    LAST_CALLED_ENV = None
+    LAST_CALLED_CWD = None
 
     def __init__(self, methodName):
         super().__init__(methodName)
@@ -75,8 +79,10 @@ class ExecuteSystemCommandTest(unittest.TestCase):
         self.executionMock = ExecuteSystemCommandTest.EXECUTION_MOCK
 
         class ExecutionStub:
-            def __init__(self, args):
+            def __init__(self, args, env=None, cwd=None):
                 ExecuteSystemCommandTest.LAST_CALLED_ARGS = args
+                ExecuteSystemCommandTest.LAST_CALLED_ENV = env
+                ExecuteSystemCommandTest.LAST_CALLED_CWD = cwd
                 self.args = args
                 self.executed = False
 
@@ -111,6 +117,27 @@ class ExecuteSystemCommandTest(unittest.TestCase):
             self.executionMock.stdout = 'Test stdout'
             self.command.execute(args)
 
+    def test_build_environment(self):
+        context = BuildContext()
+        context.environment.set('BUILD_VAR', 'build')
+        context.current_step = BuildStep()
+        context.current_step.environment = {'STEP_VAR': 'step'}
+
+        with self._patch(), unittest.mock.patch(f'{base_package}.AbstractCommand.build_context',
+                                                new_callable=unittest.mock.PropertyMock) as property_mock:
+            property_mock.return_value = context
+            self.executionMock.is_healthy.return_value = True
+            self.executionMock.stdout = 'Test stdout'
+            self.command.execute(['env'])
+
+            env = ExecuteSystemCommandTest.LAST_CALLED_ENV
+            self.assertEqual('build', env['BUILD_VAR'])
+            self.assertEqual('step', env['STEP_VAR'])
+            self.assertEqual(os.environ.get('PATH'), env.get('PATH'))
+            self.assertFalse('BUILD_VAR' in os.environ)
+            # the step overlay does not modify the build environment
+            self.assertFalse('STEP_VAR' in context.environment)
+
     def test_execution_failed(self):
         with self._patch():
             args = ['ls', '-l']
@@ -172,23 +199,24 @@ class SetVariableCommandTest(unittest.TestCase):
         name = 'name'
         value = 'value'
         args = [name, value]
-        old_environ = os.environ
-        builtincommands.environ = {}
+        context = BuildContext()
 
-        with self._patch() as patched:
+        with self._patch() as patched, unittest.mock.patch(f'{base_package}.AbstractCommand.build_context',
+                                                           new_callable=unittest.mock.PropertyMock) as property_mock:
+            property_mock.return_value = context
             self.command.execute(args)
-            self.assertTrue(name in builtincommands.os.environ and builtincommands.os.environ[name] == value)
+            self.assertEqual(value, context.environment.get(name))
+            self.assertFalse(name in os.environ)
             patched.get('info').assert_called_with(f'Setting variable {name} with value {value}')
 
             self.command.secret = True
             self.command.execute(args)
-            self.assertTrue(name in builtincommands.os.environ and builtincommands.os.environ[name] == value)
+            self.assertEqual(value, context.environment.get(name))
             patched.get('info').assert_called_with(f'Setting secret variable {name}')
+            self.assertEqual([name], context.environment.secrets())
 
             self.command.secret = False
 
-        os.environ = old_environ
-
     def test_invalid_execution(self):
         args = ['name']
 
@@ -210,15 +238,17 @@ class SetVariablesCommandTest(unittest.TestCase):
         name = 'name'
         value = 'value'
         composed = f'{name}={value}'
-        args = [composed]
-
-        old_environ = os.environ
-        builtincommands.environ = {}
+        args = [composed, 'other=value2']
+        context = BuildContext()
 
-        self.command.execute(args)
-        self.assertTrue(name in builtincommands.os.environ and builtincommands.os.environ[name] == value)
+        with unittest.mock.patch(f'{base_package}.AbstractCommand.build_context',
+                                 new_callable=unittest.mock.PropertyMock) as property_mock:
+            property_mock.return_value = context
+            self.command.execute(args)
 
-        os.environ = old_environ
+        self.assertEqual(value, context.environment.get(name))
+        self.assertEqual('value2', context.environment.get('other'))
+        self.assertFalse(name in os.environ)
 
     def test_invalid_execution(self):
         name = 'name spaces'
@@ -245,6 +275,14 @@ class SetVariablesCommandTest(unittest.TestCase):
 
         self.assertTrue('The set-variables command requires at least 1 arguments' in e.exception.message)
 
+    def test_validate(self):
+        self.command.validate(['name=value'], {})
+
+        with self.assertRaises(CommandError) as e:
+            self.command.validate(['name spaces=value'], {})
+
+        self.assertTrue('Names of variables cannot contain spaces' in e.exception.message)
+
 
 class StubbedExecution:
     def __init__(self, mock):
@@ -262,11 +300,22 @@ class GitCloneCommandTest(unittest.TestCase):
     @contextlib.contextmanager
     def _patch(self) -> PatchedDependencies:
         with PatchedDependencies({
-            'execution': f'{base_package}.Execution',
+            'execution': 'dockerwizard.git.Execution',
             'info': f'{base_package}.info'
         }) as patched:
             yield patched
 
+    @contextlib.contextmanager
+    def _patch_context(self, named: dict):
+        with unittest.mock.patch(f'{base_package}.AbstractCommand.build_context',
+                                 new_callable=unittest.mock.PropertyMock) as property_mock:
+            context = BuildContext()
+            context.current_step = BuildStep()
+            context.current_step.named = named
+            property_mock.return_value = context
+
+            yield context
+
     def test_initialisation(self):
         self.assertEqual(self.command.name, 'git-clone')
 
@@ -283,7 +332,8 @@ class GitCloneCommandTest(unittest.TestCase):
             self.command.execute(args)
             patched.get('info').assert_any_call(f'Cloning Git repository {repo}')
             patched.get('info').assert_any_call(f'Git clone completed successfully')
-            patched.get('execution').assert_called_with(['git', 'clone', repo])
+            patched.get('execution').assert_called_with(['git', 'clone', repo], env=unittest.mock.ANY,
+                                                        cwd=os.getcwd())
 
             args = [repo, 'dest']
 
@@ -294,7 +344,8 @@ class GitCloneCommandTest(unittest.TestCase):
             self.command.execute(args)
             patched.get('info').assert_any_call(f'Cloning Git repository {repo} into dest')
             patched.get('info').assert_any_call(f'Git clone completed successfully')
-            patched.get('execution').assert_called_with(['git', 'clone', repo, 'dest'])
+            patched.get('execution').assert_called_with(['git', 'clone', repo, 'dest'], env=unittest.mock.ANY,
+                                                        cwd=os.getcwd())
 
     def test_failed_git_clone(self):
         repo = 'test-repo'
@@ -311,6 +362,76 @@ class GitCloneCommandTest(unittest.TestCase):
 
             self.assertTrue('git clone with error stderr' in e.exception.message)
 
+    def test_named_arguments(self):
+        repo = 'test-repo'
+        named = {
+            'branch': 'main',
+            'depth': 1,
+            'filter': 'blob:none',
+            'sparse': True
+        }
+
+        with self._patch() as patched, self._patch_context(named) as context:
+            mocked_result = Mock()
+            mocked_result.exit_code = 0
+            patched.get('execution').return_value = StubbedExecution(mocked_result)
+            context.environment.set('GIT_SSH_COMMAND', 'ssh -i key')
+
+            self.command.execute([repo, 'dest'])
+            patched.get('execution').assert_called_with(['git', 'clone', '--branch', 'main', '--depth', '1',
+                                                         '--filter=blob:none', '--sparse', repo, 'dest'],
+                                                        env=context.process_environment(),
+                                                        cwd=context.working_directory)
+            self.assertEqual('ssh -i key', patched.get('execution').call_args[1]['env']['GIT_SSH_COMMAND'])
+
+    def test_sparse_paths(self):
+        repo = 'https://host/path/test-repo.git'
+
+        with self._patch() as patched, self._patch_context({'sparse': ['src', 'docs']}) as context:
+            mocked_result = Mock()
+            mocked_result.exit_code = 0
+            patched.get('execution').return_value = StubbedExecution(mocked_result)
+
+            self.command.execute([repo])
+            env = context.process_environment()
+            cwd = context.working_directory
+            patched.get('execution').assert_any_call(['git', 'clone', '--sparse', repo], env=env, cwd=cwd)
+            patched.get('execution').assert_called_with(['git', '-C', 'test-repo', 'sparse-checkout', 'set', 'src',
+                                                         'docs'], env=env, cwd=cwd)
+
+    def test_mirror(self):
+        repo = 'test-repo'
+
+        with self._patch() as patched, self._patch_context({'mirror': True}) as context, \
+                unittest.mock.patch(f'{base_package}.GitClient.update_mirror') as update_mirror, \
+                unittest.mock.patch(f'{base_package}.GitClient.mirror_path') as mirror_path:
+            mocked_result = Mock()
+            mocked_result.exit_code = 0
+            update_mirror.return_value = mocked_result
+            mirror_path.return_value = '/cache/git/mirrors/hash'
+            patched.get('execution').return_value = StubbedExecution(mocked_result)
+
+            self.command.execute([repo])
+            update_mirror.assert_called_with(repo, env=context.process_environment(), cwd=context.working_directory)
+            patched.get('execution').assert_called_with(['git', 'clone', '--reference', '/cache/git/mirrors/hash',
+                                                         '--dissociate', repo], env=context.process_environment(),
+                                                        cwd=context.working_directory)
+
+            mocked_result.exit_code = 1
+            mocked_result.stderr = 'stderr'
+
+            with self.assertRaises(CommandError) as e:
+                self.command.execute([repo])
+
+            self.assertTrue('git mirror update with error stderr' in e.exception.message)
+
+    def test_invalid_depth(self):
+        with self._patch(), self._patch_context({'depth': 0}):
+            with self.assertRaises(CommandError) as e:
+                self.command.execute(['test-repo'])
+
+            self.assertTrue('depth must be a positive integer' in e.exception.message)
+
     def test_invalid_execution(self):
         args = []
         with self.assertRaises(CommandError) as e:
@@ -318,6 +439,113 @@ class GitCloneCommandTest(unittest.TestCase):
 
         self.assertTrue('The git-clone command requires at least 1 arguments' in e.exception.message)
 
+    def test_validate(self):
+        self.command.validate(['test-repo'], {'depth': 1})
+
+        with self.assertRaises(CommandError) as e:
+            self.command.validate(['test-repo'], {'depth': 0})
+
+        self.assertTrue('depth must be a positive integer' in e.exception.message)
+
+
+class GitCloneManyCommandTest(unittest.TestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.command = GitCloneManyCommand()
+
+    @contextlib.contextmanager
+    def _patch(self, named: dict) -> PatchedDependencies:
+        with PatchedDependencies({
+            'clone': f'{base_package}.GitCloneCommand.clone',
+            'info': f'{base_package}.info',
+            'error': f'{base_package}.error'
+        }) as patched, unittest.mock.patch(f'{base_package}.AbstractCommand.build_context',
+                                           new_callable=unittest.mock.PropertyMock) as property_mock:
+            context = BuildContext()
+            context.current_step = BuildStep()
+            context.current_step.named = named
+            property_mock.return_value = context
+
+            yield patched
+
+    def test_initialisation(self):
+        self.assertEqual(self.command.name, 'git-clone-many')
+
+    def test_successful_execution(self):
+        named = {
+            'jobs': 2,
+            'depth': 1,
+            'repositories': [
+                'repo2',
+                {
+                    'url': 'repo3',
+                    'target': 'target3',
+                    'branch': 'develop',
+                    'depth': 5
+                }
+            ]
+        }
+
+        with self._patch(named) as patched:
+            self.command.execute(['repo1'])
+
+            clone = patched.get('clone')
+            self.assertEqual(3, clone.call_count)
+            env = self.command.build_context.process_environment()
+            cwd = self.command.build_context.working_directory
+            clone.assert_any_call('repo1', None, {'depth': 1}, env, cwd)
+            clone.assert_any_call('repo2', None, {'depth': 1}, env, cwd)
+            clone.assert_any_call('repo3', 'target3', {'depth': 5, 'branch': 'develop'}, env, cwd)
+            patched.get('info').assert_any_call('Cloning 3 Git repositories with up to 2 concurrent clones')
+            patched.get('info').assert_any_call('Git clone summary:')
+            patched.get('error').assert_not_called()
+
+    def test_failed_execution(self):
+        def clone(url, target, options, env, cwd):
+            if url == 'repo2':
+                raise CommandError('clone failed')
+
+        with self._patch({}) as patched:
+            patched.get('clone').side_effect = clone
+
+            with self.assertRaises(CommandError) as e:
+                self.command.execute(['repo1', 'repo2'])
+
+            self.assertEqual('Failed to clone Git repositories: repo2', e.exception.message)
+            self.assertEqual(2, patched.get('clone').call_count)
+            self.assertTrue('FAILURE repo2' in patched.get('error').call_args[0][0])
+            self.assertTrue('clone failed' in patched.get('error').call_args[0][0])
+
+    def test_invalid_arguments(self):
+        with self._patch({}):
+            with self.assertRaises(CommandError) as e:
+                self.command.execute([])
+
+            self.assertTrue('requires at least 1 repository' in e.exception.message)
+
+        with self._patch({'repositories': [{'target': 'target'}]}):
+            with self.assertRaises(CommandError) as e:
+                self.command.execute([])
+
+            self.assertTrue('must be a URL or contain a url' in e.exception.message)
+
+        with self._patch({'jobs': 0}):
+            with self.assertRaises(CommandError) as e:
+                self.command.execute(['repo'])
+
+            self.assertTrue('jobs must be a positive integer' in e.exception.message)
+
+    def test_validate(self):
+        self.command.validate(['repo'], {'repositories': [{'url': 'other', 'depth': 1}]})
+
+        for named, message in [({}, 'requires at least 1 repository'),
+                               ({'repositories': [{'url': 'other', 'depth': 0}]}, 'depth must be a positive integer'),
+                               ({'jobs': 0}, 'jobs must be a positive integer')]:
+            with self.assertRaises(CommandError) as e:
+                self.command.validate([] if not named else ['repo'], named)
+
+            self.assertTrue(message in e.exception.message)
+
 
 class ScriptExecutorCommandTest(unittest.TestCase):
     def __init__(self, methodName):
@@ -348,7 +576,7 @@ class ScriptExecutorCommandTest(unittest.TestCase):
 
             self.command.execute(args)
 
-            patched.get('execution').assert_called_with(['python', args[0]])
+            patched.get('execution').assert_called_with(['python', args[0]], env=None, cwd=os.getcwd())
             patched.get('execution').return_value.execute.assert_called()
             patched.get('info').assert_any_call('Command "python script.py" completed successfully with the following '
                                                 'output')
@@ -366,7 +594,7 @@ class ScriptExecutorCommandTest(unittest.TestCase):
 
             self.assertTrue('Python interpreter failed with stderr: failed and exit code: 1' in e.exception.message)
 
-            patched.get('execution').assert_called_with(['python', args[0]])
+            patched.get('execution').assert_called_with(['python', args[0]], env=None, cwd=os.getcwd())
             patched.get('execution').return_value.execute.assert_called()
 
     def test_invalid_args(self):
@@ -385,6 +613,14 @@ class ScriptExecutorCommandTest(unittest.TestCase):
 
         self.assertTrue('needs the name of a .py script' in e.exception.message)
 
+    def test_validate(self):
+        self.command.validate(['-u', 'script.py'], {})
+
+        with self.assertRaises(CommandError) as e:
+            self.command.validate(['script.sh'], {})
+
+        self.assertTrue('needs the name of a .py script' in e.exception.message)
+
 
 class CreateContainerCommandTest(unittest.TestCase):
     def __init__(self, methodName):
@@ -411,7 +647,8 @@ class CreateContainerCommandTest(unittest.TestCase):
             patched.get('docker').create_docker_container.return_value = result
             self.command.execute(args)
 
-            patched.get('docker').create_docker_container.assert_called_with('test-image', 'test-container', [])
+            patched.get('docker').create_docker_container.assert_called_with('test-image', 'test-container', [], env=None,
+                                                                             cwd=os.getcwd())
             patched.get('info').assert_called_with('Container test-container created successfully from image '
                                                    'test-image with hash hash')
 
@@ -424,7 +661,8 @@ class CreateContainerCommandTest(unittest.TestCase):
             self.command.execute(args)
 
             patched.get('docker').create_docker_container.assert_called_with('test-image', 'test-container',
-                                                                             ['-p', '8080:8080', '--network=host'])
+                                                                             ['-p', '8080:8080', '--network=host'],
+                                                                             env=None, cwd=os.getcwd())
             patched.get('info').assert_called_with('Container test-container created successfully from image '
                                                    'test-image with hash hash')
 
@@ -440,7 +678,8 @@ class CreateContainerCommandTest(unittest.TestCase):
 
             self.assertTrue('Failed to create Docker container test-container from image '
                             'test-image with error: failed and exit code: 1' == e.exception.message)
-            patched.get('docker').create_docker_container.assert_called_with('test-image', 'test-container', [])
+            patched.get('docker').create_docker_container.assert_called_with('test-image', 'test-container', [], env=None,
+                                                                             cwd=os.getcwd())
 
     def test_invalid_args(self):
         args = []
@@ -498,12 +737,14 @@ class RunBuildCommandTest(unittest.TestCase):
             patched.get('execution').return_value.execute.return_value = test_execution
 
             self.command.execute(['maven'])
-            patched.get('execution').assert_any_call(['mvn', 'clean', 'install'])
+            patched.get('execution').assert_any_call(['mvn', 'clean', 'install'], env=context.process_environment(),
+                                                     cwd=context.working_directory)
 
             named['arguments'] = ['-DskipTests']
 
             self.command.execute(['maven'])
-            patched.get('execution').assert_any_call(['mvn', '-DskipTests', 'clean', 'install'])
+            patched.get('execution').assert_any_call(['mvn', '-DskipTests', 'clean', 'install'], env=context.process_environment(),
+                                                     cwd=context.working_directory)
 
             named['goals'] = None
             with self.assertRaises(CommandError) as e:
@@ -511,6 +752,27 @@ class RunBuildCommandTest(unittest.TestCase):
 
             self.assertTrue('Named argument goals not provided' in e.exception.message)
 
+    def test_mvn_build_accelerated(self):
+        named = {
+            'goals': ['install'],
+            'offline': True,
+            'threads': 4,
+            'batch': True
+        }
+
+        with self._patch() as val:
+            patched = val[0]
+            property_mock = val[1]
+            context = RunBuildCommandTest._mock_build_context()
+            context.current_step = RunBuildCommandTest._create_build_step(named)
+            property_mock.return_value = context
+            test_execution = ExecutionResult(0, '', '')
+            patched.get('execution').return_value.execute.return_value = test_execution
+
+            self.command.execute(['maven'])
+            patched.get('execution').assert_any_call(['mvn', '-B', '-o', '-T', '4', 'install'], env=context.process_environment(),
+                                                     cwd=context.working_directory)
+
     def test_npm_build(self):
         named = {
             'arguments': ['install']
@@ -526,7 +788,38 @@ class RunBuildCommandTest(unittest.TestCase):
             patched.get('execution').return_value.execute.return_value = test_execution
 
             self.command.execute(['npm'])
-            patched.get('execution').assert_any_call(['npm', 'install'])
+            patched.get('execution').assert_any_call(['npm', 'install'], env=context.process_environment(),
+                                                     cwd=context.working_directory)
+
+    def test_npm_build_cached(self):
+        named = {
+            'arguments': ['ci'],
+            'cache': True,
+            'snapshot': True
+        }
+
+        with self._patch() as val, unittest.mock.patch('dockerwizard.buildtools.NpmTool.before_execution') as before, \
+                unittest.mock.patch('dockerwizard.buildtools.cache_directory') as cache_directory:
+            patched = val[0]
+            property_mock = val[1]
+            context = RunBuildCommandTest._mock_build_context()
+            context.current_step = RunBuildCommandTest._create_build_step(named)
+            property_mock.return_value = context
+            test_execution = ExecutionResult(0, '', '')
+            patched.get('execution').return_value.execute.return_value = test_execution
+            cache_directory.return_value = '/cache/npm/cache'
+            before.return_value = {}
+
+            self.command.execute(['npm'])
+            env = patched.get('execution').call_args[1]['env']
+            self.assertEqual('/cache/npm/cache', env['npm_config_cache'])
+            self.assertEqual(os.environ.get('PATH'), env.get('PATH'))
+
+            # a restored snapshot skips the install
+            patched.get('execution').reset_mock()
+            before.return_value = {'skip': True}
+            self.command.execute(['npm'])
+            patched.get('execution').assert_not_called()
 
     def test_build_unknown_tool(self):
         with self.assertRaises(CommandError) as e:
@@ -540,6 +833,19 @@ class RunBuildCommandTest(unittest.TestCase):
 
         self.assertTrue('requires 1 arguments' in e.exception.message)
 
+    def test_validate(self):
+        self.command.validate(['maven'], {'goals': ['package']})
+
+        with self.assertRaises(CommandError) as e:
+            self.command.validate(['unknown'], {})
+
+        self.assertTrue('Build tool unknown not currently supported' in e.exception.message)
+
+        with self.assertRaises(CommandError) as e:
+            self.command.validate(['gradle'], {})
+
+        self.assertTrue('Named argument tasks not provided' in e.exception.message)
+
 
 class RegisterBuiltinTest(unittest.TestCase):
     @classmethod
@@ -554,6 +860,7 @@ class RegisterBuiltinTest(unittest.TestCase):
             'setVar': f'{base_package}.SetVariableCommand',
             'setVars': f'{base_package}.SetVariablesCommand',
             'gitClone': f'{base_package}.GitCloneCommand',
+            'gitCloneMany': f'{base_package}.GitCloneManyCommand',
             'scriptExecutor': f'{base_package}.ScriptExecutorCommand',
             'createContainer': f'{base_package}.CreateContainerCommand'
         }) as patched:
@@ -562,18 +869,34 @@ class RegisterBuiltinTest(unittest.TestCase):
     def test_register_builtins(self):
         patched: PatchedDependencies
         with self._patch() as patched:
-            builtincommands.register_builtins()
+            system.register_builtins()
+
+            # commands are only created when first retrieved
+            patched.copy.assert_not_called()
+            patched.setVar.assert_not_called()
+            self.assertEqual(['copy', 'execute-shell', 'set-variable', 'set-secret', 'set-variables', 'git-clone',
+                              'git-clone-many', 'execute-groovy', 'execute-python', 'create-container',
+                              'run-build-tool'], [n for n in commands.registry.names()
+                                                  if n in builtincommands.builtin_factories()])
 
-            patched.copy.assert_called()
+            for name in commands.registry.names():
+                if name != 'run-build-tool':
+                    commands.registry.get_command(name)
+
+            patched.copy.assert_called_once()
             patched.execute.assert_called()
             patched.setVar.assert_any_call(True)
             patched.setVar.assert_any_call(False)
             patched.setVars.assert_called()
             patched.gitClone.assert_called()
+            patched.gitCloneMany.assert_called()
             patched.scriptExecutor.assert_any_call('python')
             patched.scriptExecutor.assert_any_call('groovy')
             patched.createContainer.assert_called()
 
+            commands.registry.get_command('copy')
+            patched.copy.assert_called_once()
+
 
 class BuiltinHelpTest(unittest.TestCase):
     """
@@ -602,7 +925,7 @@ class BuiltinHelpTest(unittest.TestCase):
     def test_builtins_help_action(self):
         parser = Mock()
         parser.exit = Mock()
-        action = builtincommands.BuiltinsHelpAction([''], '')
+        action = argparser.BuiltinsHelpAction([''], '')
 
         with self._patch() as patched:
             action(parser, argparse.Namespace(), [''])
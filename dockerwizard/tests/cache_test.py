@@ -0,0 +1,218 @@
+"""
+Tests the cache module
+"""
+import errno
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from .testing import main
+from dockerwizard import cache, process
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
+from dockerwizard.system import isWindows
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_cache_root(self):
+        with patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: self.directory.name}):
+            self.assertEqual(self.directory.name, cache.cache_root())
+
+        with patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: ''}):
+            self.assertEqual(os.path.join(os.path.expanduser('~'), '.docker-wizard', 'cache'), cache.cache_root())
+
+    def test_cache_directory(self):
+        with patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: self.directory.name}):
+            path = cache.cache_directory('git', 'mirrors')
+            self.assertEqual(os.path.join(self.directory.name, 'git', 'mirrors'), path)
+            self.assertTrue(os.path.isdir(path))
+
+            path = cache.cache_directory('maven', create=False)
+            self.assertFalse(os.path.isdir(path))
+
+    def test_hash_string(self):
+        self.assertEqual(cache.hash_string('value'), cache.hash_string('value'))
+        self.assertNotEqual(cache.hash_string('value'), cache.hash_string('value1'))
+
+    def test_hash_files(self):
+        path = os.path.join(self.directory.name, 'package-lock.json')
+        missing = cache.hash_files([path])
+
+        with open(path, 'w') as f:
+            f.write('content')
+
+        key = cache.hash_files([path])
+        self.assertNotEqual(missing, key)
+        self.assertEqual(key, cache.hash_files([path]))
+        self.assertNotEqual(key, cache.hash_files([path], 'Linux'))
+
+        with open(path, 'w') as f:
+            f.write('changed')
+
+        self.assertNotEqual(key, cache.hash_files([path]))
+
+    def _create_tree(self) -> str:
+        source = os.path.join(self.directory.name, 'source')
+        os.makedirs(os.path.join(source, 'nested'))
+
+        with open(os.path.join(source, 'nested', 'file.txt'), 'w') as f:
+            f.write('content')
+
+        return source
+
+    def test_link_tree(self):
+        source = self._create_tree()
+
+        for mode in cache.LINK_MODES:
+            destination = os.path.join(self.directory.name, mode)
+            cache.link_tree(source, destination, mode)
+
+            with open(os.path.join(destination, 'nested', 'file.txt'), 'r') as f:
+                self.assertEqual('content', f.read())
+
+        self.assertTrue(os.path.samefile(os.path.join(source, 'nested', 'file.txt'),
+                                         os.path.join(self.directory.name, 'hardlink', 'nested', 'file.txt')))
+        self.assertFalse(os.path.samefile(os.path.join(source, 'nested', 'file.txt'),
+                                          os.path.join(self.directory.name, 'copy', 'nested', 'file.txt')))
+
+        with self.assertRaises(ValueError):
+            cache.link_tree(source, os.path.join(self.directory.name, 'invalid'), 'invalid')
+
+    def test_reflink_not_replayed(self):
+        source = self._create_tree()
+        destination = os.path.join(self.directory.name, 'reflink')
+        backend = MagicMock()
+        process.set_backend(backend)
+
+        try:
+            with patch('dockerwizard.cache.run_quietly') as run:
+                run.return_value = False
+                cache.link_tree(source, destination, 'reflink')
+
+            # the copy is made directly, not by the execution backend of the build
+            backend.start.assert_not_called()
+            self.assertEqual(not isWindows(), run.called)
+            self.assertTrue(os.path.isfile(os.path.join(destination, 'nested', 'file.txt')))
+        finally:
+            process.set_backend(None)
+
+    def test_run_quietly(self):
+        self.assertTrue(cache.run_quietly([sys.executable, '-c', 'print("output")']))
+        self.assertFalse(cache.run_quietly([sys.executable, '-c', 'import sys; sys.exit(1)']))
+        self.assertFalse(cache.run_quietly([os.path.join(self.directory.name, 'missing')]))
+
+    def test_save_tree(self):
+        source = self._create_tree()
+        destination = os.path.join(self.directory.name, 'saved')
+        os.makedirs(os.path.join(destination, 'stale'))
+
+        cache.save_tree(source, destination)
+
+        self.assertTrue(os.path.isfile(os.path.join(destination, 'nested', 'file.txt')))
+        self.assertFalse(os.path.isdir(os.path.join(destination, 'stale')))
+        self.assertEqual(['saved', 'source'], sorted(os.listdir(self.directory.name)))
+
+    def test_cache_lock(self):
+        path = os.path.join(self.directory.name, 'entry')
+        events = []
+
+        def locked():
+            with cache.CacheLock(path):
+                events.append('thread')
+
+        with cache.CacheLock(path) as lock:
+            self.assertEqual(f'{path}.lock', lock.path)
+            thread = threading.Thread(target=locked)
+            thread.start()
+            thread.join(0.2)
+            # the thread must block while the lock is held
+            events.append('main')
+
+        thread.join()
+
+        self.assertEqual(['main', 'thread'], events)
+
+    def test_cache_lock_non_blocking(self):
+        path = os.path.join(self.directory.name, 'entry')
+        lock = cache.CacheLock(path)
+
+        with cache.CacheLock(path):
+            self.assertFalse(lock.acquire(blocking=False))
+
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_cache_lock_failed(self):
+        path = os.path.join(self.directory.name, 'entry')
+        lock_function = 'dockerwizard.cache.msvcrt.locking' if isWindows() else 'dockerwizard.cache.fcntl.flock'
+        executed = []
+
+        with patch(lock_function) as patched:
+            patched.side_effect = OSError(errno.ENOLCK, 'No locks available')
+
+            # the block never executes without the lock
+            with self.assertRaises(OSError) as e:
+                with cache.CacheLock(path):
+                    executed.append(True)
+
+            self.assertEqual([], executed)
+            self.assertEqual(f'{path}.lock', e.exception.filename)
+            self.assertFalse(cache.CacheLock(path).acquire(blocking=False))
+
+    def test_cache_lock_windows(self):
+        path = os.path.join(self.directory.name, 'entry')
+        errors = [OSError(errno.EDEADLOCK, 'Resource deadlock avoided'), None, None]
+
+        def locking(fileno, mode, size):
+            error = errors.pop(0)
+
+            if error is not None:
+                raise error
+
+        with patch('dockerwizard.cache.isWindows', return_value=True), \
+                patch('dockerwizard.cache.msvcrt', create=True) as msvcrt, \
+                patch('dockerwizard.cache.time') as patched_time:
+            msvcrt.locking.side_effect = locking
+
+            # a lock held elsewhere is retried after backing off
+            lock = cache.CacheLock(path)
+            self.assertTrue(lock.acquire())
+            patched_time.sleep.assert_called_once()
+            lock.release()
+
+            # any other error is raised instead of retried
+            msvcrt.locking.reset_mock()
+            msvcrt.locking.side_effect = OSError(errno.EBADF, 'Bad file descriptor')
+
+            with self.assertRaises(OSError) as e:
+                cache.CacheLock(path).acquire()
+
+            self.assertEqual(errno.EBADF, e.exception.errno)
+            self.assertEqual(1, msvcrt.locking.call_count)
+
+    def test_parse_size(self):
+        self.assertEqual(100, cache.parse_size(100))
+        self.assertEqual(100, cache.parse_size('100'))
+        self.assertEqual(512 * 1024, cache.parse_size('512K'))
+        self.assertEqual(500 * 1024 ** 2, cache.parse_size('500MB'))
+        self.assertEqual(int(1.5 * 1024 ** 3), cache.parse_size('1.5g'))
+
+        for size in ['large', '0', -1, True]:
+            with self.assertRaises(ValueError):
+                cache.parse_size(size)
+
+    def test_directory_size(self):
+        source = self._create_tree()
+        self.assertEqual(len('content'), cache.directory_size(source))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Tests the check module
+"""
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from .testing import main
+from dockerwizard import check
+from dockerwizard import commands
+from dockerwizard.const import DOCKER_WIZARD_HOME_VAR, DOCKER_WIZARD_PLAN_CACHE_VAR
+from dockerwizard.system import register_builtins
+
+valid_build = """
+build:
+  image: image
+  dockerfile:
+    path: Dockerfile
+  files: []
+  steps:
+    - command: execute-shell
+      arguments: [echo, hello]
+"""
+
+invalid_build = """
+build:
+  image: image
+  dockerfile:
+    path: Dockerfile
+  files: []
+  steps:
+    - command: unknown
+    - command: git-clone
+"""
+
+custom_build = """
+build:
+  image: image
+  dockerfile:
+    path: Dockerfile
+  files: []
+  custom_commands: commands.yaml
+  steps:
+    - command: custom
+"""
+
+commands_file = """
+commands:
+  - file: command.py
+    class: CustomCommand
+    name: custom
+"""
+
+command_file = """
+from dockerwizard.commands import AbstractCommand
+
+
+class CustomCommand(AbstractCommand):
+    def __init__(self):
+        super().__init__('custom', 0)
+
+    def default_name(self):
+        return 'Custom'
+
+    def _execute(self, args, named):
+        pass
+"""
+
+
+class CheckTest(unittest.TestCase):
+    def setUp(self) -> None:
+        register_builtins()
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_HOME_VAR: self.directory.name,
+                                               DOCKER_WIZARD_PLAN_CACHE_VAR: 'false'})
+        self.environ.start()
+
+        for directory, build in [('valid', valid_build), ('invalid', invalid_build), ('custom', custom_build)]:
+            self._write(os.path.join(directory, 'build.yaml'), build)
+            self._write(os.path.join(directory, 'Dockerfile'), 'FROM scratch')
+
+        self._write(os.path.join('custom', 'commands.yaml'), commands_file)
+        self._write(os.path.join('custom', 'command.py'), command_file)
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def _write(self, path: str, content: str):
+        path = self._path(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _path(self, *paths: str) -> str:
+        return os.path.join(self.directory.name, *paths)
+
+    def test_find_build_files(self):
+        files = check.find_build_files([self._path('**', 'build.yaml'), self._path('valid', 'build.yaml'),
+                                        self._path('missing.yaml'), self._path('*.txt')])
+
+        self.assertEqual([self._path('custom', 'build.yaml'), self._path('invalid', 'build.yaml'),
+                          self._path('missing.yaml'), self._path('valid', 'build.yaml')], files)
+
+    def test_check_file(self):
+        result = check.check_file(self._path('valid', 'build.yaml'))
+
+        self.assertTrue(result['valid'])
+        self.assertEqual([], result['errors'])
+        self.assertEqual(self._path('valid', 'build.yaml'), result['file'])
+
+        result = check.check_file(self._path('invalid', 'build.yaml'))
+
+        self.assertFalse(result['valid'])
+        self.assertEqual(2, len(result['errors']))
+        self.assertEqual('Unknown command unknown in build step 1', result['errors'][0])
+
+        result = check.check_file(self._path('missing.yaml'))
+
+        self.assertFalse(result['valid'])
+        self.assertEqual([f'Build file {self._path("missing.yaml")} does not exist'], result['errors'])
+
+    def test_check_file_custom_commands(self):
+        result = check.check_file(self._path('custom', 'build.yaml'))
+
+        self.assertTrue(result['valid'], result['errors'])
+        # the custom commands of the build file are not left registered
+        self.assertFalse('custom' in commands.registry.names())
+
+        result = check.check_file(self._path('valid', 'build.yaml'), self._path('missing.yaml'))
+
+        self.assertFalse(result['valid'])
+        self.assertEqual([f'Custom commands file {self._path("missing.yaml")} not found'], result['errors'])
+
+    def test_check_files_parallel(self):
+        files = check.find_build_files([self._path('**', 'build.yaml')])
+        expected = [check.check_file(file) for file in files]
+        results = check.check_files(files, jobs=2)
+
+        self.assertEqual([(result['file'], result['valid'], result['errors']) for result in expected],
+                         [(result['file'], result['valid'], result['errors']) for result in results])
+
+    def test_main(self):
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            code = check.main([self._path('valid', 'build.yaml'), self._path('invalid', 'build.yaml'), '-j', '1'])
+
+        result = json.loads(output.getvalue())
+
+        self.assertEqual(1, code)
+        self.assertFalse(result['valid'])
+        self.assertEqual(2, result['checked'])
+        self.assertEqual(1, result['invalid'])
+        self.assertEqual([self._path('invalid', 'build.yaml'), self._path('valid', 'build.yaml')],
+                         [file['file'] for file in result['files']])
+
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            code = check.main([self._path('valid', 'build.yaml')])
+
+        self.assertEqual(0, code)
+        self.assertTrue(json.loads(output.getvalue())['valid'])
+
+        with patch('dockerwizard.check.cli') as cli:
+            self.assertEqual(2, check.main([self._path('valid', 'build.yaml'), '-j', '0']))
+            cli.error.assert_called_with('The number of jobs must be a positive integer, not 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Tests the checkpoint module
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from .testing import main
+from dockerwizard import checkpoint
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_CHECKPOINTS_VAR
+from dockerwizard.errors import BuildConfigurationError
+from dockerwizard.models import DockerBuild, BuildStep
+
+
+def _step(command: str, *args) -> BuildStep:
+    step = BuildStep()
+    step.command = command
+    step.arguments = list(args)
+
+    return step
+
+
+class CheckpointFunctionsTest(unittest.TestCase):
+    def test_checkpoints_enabled(self):
+        with patch.dict(os.environ, {DOCKER_WIZARD_CHECKPOINTS_VAR: 'true'}):
+            self.assertTrue(checkpoint.checkpoints_enabled())
+
+        with patch.dict(os.environ, {DOCKER_WIZARD_CHECKPOINTS_VAR: 'false'}):
+            self.assertFalse(checkpoint.checkpoints_enabled())
+
+        with patch.dict(os.environ):
+            os.environ.pop(DOCKER_WIZARD_CHECKPOINTS_VAR, None)
+            self.assertFalse(checkpoint.checkpoints_enabled())
+
+    def test_parse_steps(self):
+        self.assertEqual([3], checkpoint.parse_steps('3'))
+        self.assertEqual([1, 3, 4, 5], checkpoint.parse_steps('1, 3-5,4'))
+
+        for value in ['0', 'a', '3-1', '1-2-3', '']:
+            with self.assertRaises(BuildConfigurationError):
+                checkpoint.parse_steps(value)
+
+    def test_step_fingerprint(self):
+        step = _step('command', 'arg')
+        fingerprint = checkpoint.step_fingerprint('build', step)
+
+        self.assertEqual(fingerprint, checkpoint.step_fingerprint('build', _step('command', 'arg')))
+        self.assertNotEqual(fingerprint, checkpoint.step_fingerprint('other', step))
+        self.assertNotEqual(fingerprint, checkpoint.step_fingerprint('build', _step('command', 'other')))
+
+
+class CheckpointsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: os.path.join(self.directory.name, 'cache')})
+        self.environ.start()
+        self.build_directory = self._path('build')
+        os.makedirs(os.path.join(self.build_directory, 'directory'))
+        self._write('file.txt', 'file')
+        self._write(os.path.join('directory', 'nested.txt'), 'nested')
+
+        build = DockerBuild()
+        build.directory = self.directory.name
+        build.image = 'image'
+        self.build = build
+        self.checkpoints = checkpoint.Checkpoints(build)
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+
+    def _path(self, *paths: str) -> str:
+        return os.path.join(self.directory.name, *paths)
+
+    def _write(self, path: str, content: str, directory: str = None):
+        with open(os.path.join(directory if directory else self.build_directory, path), 'w') as f:
+            f.write(content)
+
+    def _read(self, path: str, directory: str) -> str:
+        with open(os.path.join(directory, path), 'r') as f:
+            return f.read()
+
+    def _restore(self, index: int, fingerprint: str) -> str:
+        restored = self._path(f'restored-{index}')
+        os.makedirs(restored)
+        self.checkpoints.restore(index, fingerprint, restored)
+
+        return restored
+
+    def test_save_and_restore(self):
+        self.assertEqual(0, self.checkpoints.latest())
+
+        self.checkpoints.save(1, 'first', self.build_directory, {'VARIABLE': 'value'})
+        self._write('file.txt', 'changed')
+        self.checkpoints.save(2, 'second', self.build_directory, {})
+
+        self.assertEqual([1, 2], self.checkpoints.indices())
+        self.assertEqual(2, self.checkpoints.latest())
+
+        first = self.checkpoints.load(1)
+        second = self.checkpoints.load(2)
+        self.assertEqual({'VARIABLE': 'value'}, first.environment)
+        self.assertEqual('first', first.fingerprint)
+
+        # unchanged files are hard linked to the previous snapshot and changed files are copied
+        nested = os.path.join('directory', 'nested.txt')
+        self.assertTrue(os.path.samefile(os.path.join(first.snapshot, nested), os.path.join(second.snapshot, nested)))
+        self.assertFalse(os.path.samefile(os.path.join(first.snapshot, 'file.txt'),
+                                          os.path.join(second.snapshot, 'file.txt')))
+
+        restored = self._path('restored')
+        os.makedirs(restored)
+
+        self.assertEqual({'VARIABLE': 'value'}, self.checkpoints.restore(1, 'first', restored))
+        self.assertEqual('file', self._read('file.txt', restored))
+        self.assertEqual('nested', self._read(nested, restored))
+
+        restored = self._restore(2, 'second')
+        self.assertEqual('changed', self._read('file.txt', restored))
+
+        # modifying a restored file does not modify the snapshot
+        self._write(nested, 'modified', restored)
+        self.assertEqual('nested', self._read(nested, first.snapshot))
+
+    def test_restore_errors(self):
+        self.checkpoints.save(1, 'first', self.build_directory, {})
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._restore(2, 'second')
+
+        self.assertEqual('There is no checkpoint of build step 2 to continue the build from', e.exception.message)
+
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._restore(1, 'changed')
+
+        self.assertTrue('out of date' in e.exception.message)
+
+    def test_secrets(self):
+        self.checkpoints.save(1, 'first', self.build_directory, {'VARIABLE': 'value'}, ['TOKEN'])
+
+        with open(os.path.join(self.checkpoints.directory, '1', checkpoint.CHECKPOINT_FILE), 'r') as f:
+            self.assertFalse('TOKEN' in json.load(f)['environment'])
+
+        self.assertEqual(['TOKEN'], self.checkpoints.load(1).secrets)
+
+        # the checkpoint is only restored if the secrets are set again
+        with self.assertRaises(BuildConfigurationError) as e:
+            self._restore(1, 'first')
+
+        self.assertEqual('The build set the secrets TOKEN before build step 2, which are not saved in checkpoints. '
+                         'Set them in the environment to continue the build from the checkpoint', e.exception.message)
+
+        restored = self._path('restored')
+        os.makedirs(restored)
+
+        self.assertEqual({'VARIABLE': 'value'}, self.checkpoints.restore(1, 'first', restored, {'TOKEN': 'secret'}))
+
+    def test_lock(self):
+        other = checkpoint.Checkpoints(self.build)
+
+        self.assertTrue(self.checkpoints.lock())
+        self.assertFalse(other.lock())
+
+        self.checkpoints.unlock()
+
+        self.assertTrue(other.lock())
+        other.unlock()
+
+    def test_save_replaces_later_checkpoints(self):
+        for index in [1, 2, 3]:
+            self.checkpoints.save(index, str(index), self.build_directory, {})
+
+        self.checkpoints.save(2, 'rerun', self.build_directory, {})
+
+        self.assertEqual([1, 2], self.checkpoints.indices())
+        self.assertEqual('rerun', self.checkpoints.load(2).fingerprint)
+
+        self.checkpoints.clear()
+
+        self.assertEqual([], self.checkpoints.indices())
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 Tests the commands module
 """
 import unittest
+from unittest.mock import Mock, patch
 
 from .testing import main
 from dockerwizard import commands
@@ -33,6 +34,67 @@ class CommandRegistryTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.registry.get_command('not-found')
 
+    def test_register_factory(self):
+        name = 'name'
+        command = StubCommand()
+        factory = Mock()
+        factory.return_value = command
+        self.registry.register_factory(name, factory)
+
+        factory.assert_not_called()
+        self.assertTrue(name in self.registry.names())
+        self.assertEqual(command, self.registry.get_command(name))
+        self.assertEqual(command, self.registry.get_command(name))
+        factory.assert_called_once()
+
+        factory = Mock()
+        factory.side_effect = RuntimeError('error')
+        self.registry.register_factory('failing', factory)
+
+        with self.assertRaises(CommandError) as e:
+            self.registry.get_command('failing')
+
+        self.assertEqual('Failed to create command failing: error', e.exception.message)
+
+    def test_scope(self):
+        command = StubCommand()
+        self.registry.register('name', command)
+
+        with self.registry.scope() as registry:
+            registry.register('scoped', StubCommand())
+            registry.register('name', StubCommand())
+            self.assertTrue('scoped' in registry.names())
+
+        self.assertFalse('scoped' in self.registry.names())
+        self.assertEqual(command, self.registry.get_command('name'))
+
+    def test_entry_points(self):
+        class StubEntryPoint:
+            def __init__(self, name: str):
+                self.name = name
+                self.load = Mock()
+                self.load.return_value = StubCommand
+
+        plugin = StubEntryPoint('plugin')
+        builtin = StubEntryPoint('builtin')
+        command = StubCommand()
+        self.registry.register('builtin', command)
+
+        with patch('importlib.metadata.entry_points') as entry_points:
+            entry_points.return_value = [plugin, builtin]
+
+            self.assertTrue(isinstance(self.registry.get_command('plugin'), StubCommand))
+            entry_points.assert_called_once_with(group=commands.ENTRY_POINT_GROUP)
+            # installed entry points do not replace registered commands
+            self.assertEqual(command, self.registry.get_command('builtin'))
+            builtin.load.assert_not_called()
+
+            with self.assertRaises(ValueError):
+                self.registry.get_command('not-found')
+
+            # the entry points are only looked up once
+            entry_points.assert_called_once()
+
 
 class AbstractCommandStub(commands.AbstractCommand):
     def __init__(self, name: str, num_args_required: int, at_least: bool = False, max_num: int = -1,
@@ -120,5 +182,22 @@ class AbstractCommandTest(unittest.TestCase):
         self.assertTrue('An unknown error was thrown' in e.exception.message)
 
 
+    def test_validate(self):
+        command = AbstractCommandStub('test', 2)
+        command._validate = Mock()
+
+        command.validate([1, 2], {'key': 'value'})
+        command._validate.assert_called_with([1, 2], {'key': 'value'})
+        self.assertFalse(command.executed)
+
+        command._validate.reset_mock()
+
+        with self.assertRaises(CommandError) as e:
+            command.validate([1], {})
+
+        self.assertTrue('requires 2 arguments' in e.exception.message)
+        command._validate.assert_not_called()
+
+
 if __name__ == '__main__':
     main()
@@ -1,18 +1,23 @@
 """
 Tests the context module
 """
+import asyncio
 import contextlib
+import os
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 from dockerwizard.errors import BuildContextError
 from .testing import main
-from dockerwizard.context import BuildContext, initialise, teardown
+from dockerwizard.context import BuildContext, initialise, activate, propagate, teardown
 from dockerwizard.models import DockerBuild, BuildStep
 
 
 class BuildContextTest(unittest.TestCase):
-    def setUp(self) -> None:
-        BuildContext._INSTANCE = None
+    def tearDown(self) -> None:
+        teardown()
 
     def test_properties(self):
         context = BuildContext()
@@ -28,15 +33,62 @@ class BuildContextTest(unittest.TestCase):
         self.assertEqual(config, context.config)
         self.assertEqual(step, context.current_step)
 
+    def test_environment(self):
+        with patch.dict(os.environ, {'BASE_VAR': 'base'}):
+            context = BuildContext()
+
+        self.assertEqual('base', context.environment.get('BASE_VAR'))
+        context.environment.set('BUILD_VAR', 'build')
+        self.assertFalse('BUILD_VAR' in os.environ)
+        # each build has its own environment
+        self.assertFalse('BUILD_VAR' in BuildContext().environment)
+
+    def test_process_environment(self):
+        context = BuildContext()
+        context.environment.set('VAR', 'build')
+        self.assertEqual('build', context.process_environment()['VAR'])
+
+        context.current_step = BuildStep()
+        context.current_step.environment = {'VAR': 'step', 'STEP_VAR': 1}
+        env = context.process_environment({'EXTRA_VAR': 'extra'})
+
+        self.assertEqual('step', env['VAR'])
+        self.assertEqual('1', env['STEP_VAR'])
+        self.assertEqual('extra', env['EXTRA_VAR'])
+        self.assertEqual('build', context.environment.get('VAR'))
+        self.assertFalse('STEP_VAR' in context.environment)
+
+    def test_working_directory(self):
+        context = BuildContext()
+        self.assertEqual(os.getcwd(), context.working_directory)
+
+        context.working_directory = '/path/build'
+        self.assertEqual('/path/build', context.working_directory)
+        self.assertEqual('/path/build/file.txt', context.resolve_path('file.txt'))
+        self.assertEqual('/path/file.txt', context.resolve_path('../file.txt'))
+        self.assertEqual('/file.txt', context.resolve_path('/file.txt'))
+
+        cwd = os.getcwd()
+        context.change_directory('dir1')
+        self.assertEqual('/path/build/dir1', context.working_directory)
+        context.change_directory('/path/dir2', not_store=True)
+        self.assertEqual('/path/dir2', context.working_directory)
+        context.change_back()
+        self.assertEqual('/path/build', context.working_directory)
+        context.change_back()
+        self.assertEqual('/path/build', context.working_directory)
+        # the working directory of the process is never changed
+        self.assertEqual(cwd, os.getcwd())
+
     def test_initialise(self):
         instance = initialise()
         self.assertIsNotNone(instance)
-        self.assertEqual(instance, BuildContext._INSTANCE)
+        self.assertEqual(instance, BuildContext.context())
 
     def test_context(self):
-        initialise()
-        self.assertEqual(BuildContext.context(), BuildContext._INSTANCE)
-        BuildContext._INSTANCE = None
+        context = initialise()
+        self.assertEqual(BuildContext.context(), context)
+        teardown()
 
         with self.assertRaises(BuildContextError):
             BuildContext.context()
@@ -47,8 +99,120 @@ class BuildContextTest(unittest.TestCase):
 
         teardown()
 
-        self.assertIsNone(BuildContext._INSTANCE)
+        with self.assertRaises(BuildContextError):
+            BuildContext.context()
+
+    def test_concurrent_builds(self):
+        barrier = threading.Barrier(2)
+        results = {}
+
+        def build(name: str):
+            context = initialise()
+            step = BuildStep()
+            step.name = name
+            context.current_step = step
+            # wait for the other build to set its step before reading the context back
+            barrier.wait()
+            results[name] = (BuildContext.context() is context, BuildContext.context().current_step.name)
+            teardown()
+
+        threads = [threading.Thread(target=build, args=(name,)) for name in ['build1', 'build2']]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({'build1': (True, 'build1'), 'build2': (True, 'build2')}, results)
+
+    def test_concurrent_tasks(self):
+        async def build(name: str):
+            context = initialise()
+            context.current_step = BuildStep()
+            context.current_step.name = name
+            await asyncio.sleep(0)
+            result = BuildContext.context() is context, BuildContext.context().current_step.name
+            teardown()
+
+            return result
+
+        async def run():
+            return await asyncio.gather(build('build1'), build('build2'))
+
+        self.assertEqual([(True, 'build1'), (True, 'build2')], asyncio.run(run()))
+
+    def test_activate(self):
+        context = initialise()
+        other = initialise()
+        self.assertIs(other, BuildContext.context())
+
+        activate(context)
+        self.assertIs(context, BuildContext.context())
+
+        teardown(other)
+        teardown(context)
+
+    def test_thread_without_context(self):
+        context = initialise()
+
+        def get_context():
+            results = []
+
+            def target():
+                try:
+                    results.append(BuildContext.context())
+                except BuildContextError:
+                    results.append(None)
+
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+
+            return results[0]
+
+        # the context is not inherited by the thread and its build is not running yet
+        self.assertIsNone(get_context())
+
+        # with only one build running, a thread that does not inherit the context gets the context of the build
+        activate(context)
+        self.assertIs(context, get_context())
+
+        # with more than one build running, the build of the thread is ambiguous
+        other = initialise()
+        activate(other)
+        self.assertIsNone(get_context())
+
+        teardown(other)
+        self.assertIs(context, get_context())
+        teardown(context)
+
+    def test_propagate(self):
+        context = initialise()
+        context.current_step = BuildStep()
+        context.current_step.name = 'parent'
+        other = initialise()
+        activate(context)
+
+        def step(name: str):
+            current = BuildContext.context()
+            current.current_step = BuildStep()
+            current.current_step.name = name
+            barrier.wait()
+
+            return current is context, current.current_step.name
+
+        barrier = threading.Barrier(2)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(propagate(step), ['step1', 'step2']))
+
+        self.assertEqual([(True, 'step1'), (True, 'step2')], results)
+        # steps set by the tasks are not seen by the caller
+        self.assertEqual('parent', context.current_step.name)
 
+        teardown(other)
+        teardown(context)
 
 if __name__ == '__main__':
     main()
@@ -2,15 +2,20 @@
 Tests the custom commands module
 """
 import contextlib
+import os
+import sys
+import tempfile
 import unittest
 from unittest.mock import patch
 
 from .testing import main, PatchedDependencies, patch_os_path
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
 from dockerwizard.commands import AbstractCommand
-from dockerwizard import customcommands
+from dockerwizard import commands, customcommands
 from dockerwizard.errors import BuildConfigurationError
 
 base_package = 'dockerwizard.customcommands'
+load_module = customcommands._load_module
 
 workdir = '/path/workdir'
 commands_path = f'{workdir}/custom-commands.yaml'
@@ -24,6 +29,16 @@ test_command = {
     ]
 }
 
+test_named_command = {
+    'commands': [
+        {
+            'file': 'custom.py',
+            'class': 'TestCustomCommand',
+            'name': 'test-command'
+        }
+    ]
+}
+
 test_invalid_command = {
     'commands': [
         {
@@ -42,9 +57,18 @@ class StubbedCommand(AbstractCommand):
         pass
 
 
+class NamedStubbedCommand(AbstractCommand):
+    def __init__(self):
+        super().__init__('test-command', 0)
+
+    def _execute(self, args: list):
+        pass
+
+
 class StubbedModule:
-    def __init__(self, return_none: bool = False):
+    def __init__(self, return_none: bool = False, command=None):
         self._none = return_none
+        self._command = command if command else StubbedCommand
 
     def _execute(self, args: list):
         pass
@@ -53,7 +77,7 @@ class StubbedModule:
         if self._none:
             raise AttributeError
         else:
-            return StubbedCommand
+            return self._command
 
 
 class CustomCommandsTests(unittest.TestCase):
@@ -63,13 +87,11 @@ class CustomCommandsTests(unittest.TestCase):
     @contextlib.contextmanager
     def _patch(self) -> PatchedDependencies:
         with PatchedDependencies({
-            'importlib': f'{base_package}.importlib',
+            'loadModule': f'{base_package}._load_module',
             'yaml': f'{base_package}.yaml',
             'sysPatch': f'{base_package}.sys',
             'osPatch': f'{base_package}.os',
             'getWorkDir': f'{base_package}.get_working_directory',
-            'changeDir': f'{base_package}.change_directory',
-            'changeBack': f'{base_package}.change_back',
             'openPatch': 'builtins.open'
         }) as patched:
             patched.osPatch.path = patch_os_path()
@@ -80,26 +102,51 @@ class CustomCommandsTests(unittest.TestCase):
         patched: PatchedDependencies
         with self._patch() as patched:
             patched.get('yaml').safe_load.return_value = test_command
-            patched.get('osPatch').path.isfile.return_value = True
-            patched.get('osPatch').path.isabs.return_value = False
             patched.get('osPatch').path.dirname.return_value = workdir
-            patched.get('osPatch').path.basename.return_value = 'custom.py'
-            patched.get('getWorkDir').return_value = workdir
-            patched.get('sysPatch').path = []
-            patched.get('importlib').import_module.return_value = StubbedModule()
+            patched.get('loadModule').return_value = StubbedModule()
 
-            customcommands.load_custom('custom-commands.yaml')
+            customcommands.load_custom(commands_path)
 
+            patched.get('openPatch').assert_called_with(commands_path, 'r')
             patched.get('yaml').safe_load.assert_called()
-            patched.get('osPatch').path.isfile.assert_called()
-            patched.get('osPatch').path.isabs.assert_called()
-            patched.get('getWorkDir').assert_called()
-            patched.get('importlib').import_module.assert_called()
+            patched.get('loadModule').assert_called_with('custom.py', workdir)
+            patched.get('getWorkDir').assert_not_called()
+
+    def test_load_custom_named(self):
+        old_registry = commands.registry
+        commands.registry = commands.CommandRegistry()
+
+        try:
+            patched: PatchedDependencies
+            with self._patch() as patched:
+                patched.get('yaml').safe_load.return_value = test_named_command
+                patched.get('osPatch').path.dirname.return_value = workdir
+                patched.get('loadModule').return_value = StubbedModule(command=NamedStubbedCommand)
+
+                customcommands.load_custom(commands_path)
+
+                # the command is only imported when first used
+                patched.get('loadModule').assert_not_called()
+                self.assertTrue(isinstance(commands.registry.get_command('test-command'), NamedStubbedCommand))
+                patched.get('loadModule').assert_called_with(f'{workdir}/custom.py', workdir)
+
+                patched.get('yaml').safe_load.return_value = {
+                    'commands': [{**test_named_command['commands'][0], 'name': 'other-name'}]
+                }
+                customcommands.load_custom(commands_path)
+
+                with self.assertRaises(BuildConfigurationError) as e:
+                    commands.registry.get_command('other-name')
+
+                self.assertTrue('is declared with the name other-name' in e.exception.message)
+        finally:
+            commands.registry = old_registry
 
     def test_load_custom_not_file(self):
         patched: PatchedDependencies
-        with self._patch() as patched:
+        with self._patch() as patched, patch(f'{base_package}._execute_module') as execute:
             patched.get('yaml').safe_load.return_value = test_command
+            patched.get('loadModule').side_effect = load_module
             patched.get('osPatch').path.isfile.return_value = False
             patched.get('osPatch').path.isabs.return_value = False
 
@@ -108,14 +155,13 @@ class CustomCommandsTests(unittest.TestCase):
 
             patched.get('yaml').safe_load.assert_called()
             patched.get('osPatch').path.isfile.assert_called()
-            patched.get('osPatch').path.isabs.assert_not_called()
-            patched.get('getWorkDir').assert_not_called()
-            patched.get('importlib').import_module.assert_not_called()
+            execute.assert_not_called()
 
     def test_load_custom_not_py_file(self):
         patched: PatchedDependencies
-        with self._patch() as patched:
+        with self._patch() as patched, patch(f'{base_package}._execute_module') as execute:
             patched.get('yaml').safe_load.return_value = test_invalid_command
+            patched.get('loadModule').side_effect = load_module
             patched.get('osPatch').path.isfile.return_value = True
             patched.get('osPatch').path.isabs.return_value = False
 
@@ -124,18 +170,13 @@ class CustomCommandsTests(unittest.TestCase):
 
             patched.get('yaml').safe_load.assert_called()
             patched.get('osPatch').path.isfile.assert_called()
-            patched.get('osPatch').path.isabs.assert_not_called()
-            patched.get('getWorkDir').assert_not_called()
-            patched.get('importlib').import_module.assert_not_called()
+            execute.assert_not_called()
 
     def test_change_and_load_custom(self):
-        patched: PatchedDependencies
-        with self._patch() as patched, patch(f'{base_package}.load_custom') as custom:
+        with patch(f'{base_package}.load_custom') as custom:
             customcommands.change_and_load_custom(commands_path)
 
-            patched.get('changeDir').assert_called_with(workdir)
-            custom.assert_called_with('custom-commands.yaml')
-            patched.get('changeBack').assert_called()
+            custom.assert_called_with(commands_path)
 
     def test_custom_command_path_validator(self):
         patched: PatchedDependencies
@@ -164,5 +205,114 @@ class CustomCommandsTests(unittest.TestCase):
             self.assertTrue('is not a file' in customcommands.custom_command_path_validator('custom'))
 
 
+class CustomModuleCacheTest(unittest.TestCase):
+    """
+    Loads custom command modules from real files to test the module cache
+    """
+    def setUp(self) -> None:
+        customcommands._LOADED_MODULES = {}
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.directory.name, 'cache')
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: self.cache})
+        self.environ.start()
+        self.module = os.path.join(self.directory.name, 'commands', 'custom_module_cache_test.py')
+        self._write(os.path.join(self.directory.name, 'commands', 'custom_module_cache_helper.py'), 'VALUE = 1\n')
+        self._write(self.module, 'from custom_module_cache_helper import VALUE\n'
+                                 'from dockerwizard.commands import AbstractCommand\n\n\n'
+                                 'class CacheTestCommand(AbstractCommand):\n'
+                                 '    def __init__(self):\n'
+                                 '        super().__init__("cache-test-command", 0)\n\n'
+                                 '    def _execute(self, args):\n'
+                                 '        pass\n')
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+        customcommands._LOADED_MODULES = {}
+        sys.modules.pop('custom_module_cache_helper', None)
+
+    @staticmethod
+    def _write(path: str, contents: str, mtime: int = None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'w') as f:
+            f.write(contents)
+
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+
+    def test_module_cached(self):
+        module = customcommands._load_module(self.module)
+        self.assertEqual(1, module.VALUE)
+        self.assertEqual('custom_module_cache_test', module.__name__)
+        self.assertFalse('custom_module_cache_test' in sys.modules)
+        self.assertFalse(os.path.dirname(self.module) in sys.path)
+
+        # a relative path to the same file shares the load
+        self.assertIs(module, customcommands._load_module('custom_module_cache_test.py',
+                                                          os.path.dirname(self.module)))
+
+        # touching the file without changing it does not reload it
+        os.utime(self.module, ns=(1, 1))
+        self.assertIs(module, customcommands._load_module(self.module))
+
+        with open(self.module, 'a') as f:
+            f.write('\nCHANGED = True\n')
+
+        reloaded = customcommands._load_module(self.module)
+        self.assertIsNot(module, reloaded)
+        self.assertTrue(reloaded.CHANGED)
+
+    def test_bytecode_cached(self):
+        module = customcommands._load_module(self.module)
+        self.assertEqual(1, len(os.listdir(os.path.join(self.cache, 'custom-commands'))))
+
+        customcommands._LOADED_MODULES = {}
+
+        with patch(f'{base_package}.compile', create=True) as compile_patch:
+            reloaded = customcommands._load_module(self.module)
+            compile_patch.assert_not_called()
+
+        self.assertIsNot(module, reloaded)
+        self.assertTrue(issubclass(reloaded.CacheTestCommand, AbstractCommand))
+
+    def test_bytecode_cache_unusable(self):
+        # the cache root is a file, so no cache directory can be created in it
+        self._write(self.cache, 'file')
+
+        module = customcommands._load_module(self.module)
+
+        self.assertEqual(1, module.VALUE)
+        self.assertTrue(os.path.isfile(self.cache))
+
+    def test_create_custom(self):
+        old_registry = commands.registry
+        commands.registry = commands.CommandRegistry()
+
+        try:
+            command = customcommands._create_custom(self.module, 'CacheTestCommand')
+            self.assertEqual('cache-test-command', command.name)
+            self.assertIs(command, commands.registry.get_command('cache-test-command'))
+
+            with self.assertRaises(BuildConfigurationError) as e:
+                customcommands._create_custom(self.module, 'Missing')
+
+            self.assertTrue('Class Missing does not exist' in e.exception.message)
+
+            with self.assertRaises(BuildConfigurationError) as e:
+                customcommands._create_custom(self.module, 'VALUE')
+
+            self.assertTrue('does not extend AbstractCommand' in e.exception.message)
+        finally:
+            commands.registry = old_registry
+
+    def test_load_module_not_python_file(self):
+        with self.assertRaises(BuildConfigurationError):
+            customcommands._load_module(os.path.join(self.directory.name, 'missing.py'))
+
+        with self.assertRaises(BuildConfigurationError):
+            customcommands._load_module('custom_module_cache_helper', os.path.dirname(self.module))
+
+
 if __name__ == '__main__':
     main()
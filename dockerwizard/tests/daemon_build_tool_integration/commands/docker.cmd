@@ -0,0 +1,5 @@
+@echo off
+
+call python %~dp0\docker %*
+
+exit /b %ERRORLEVEL%
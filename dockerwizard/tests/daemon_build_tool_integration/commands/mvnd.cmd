@@ -0,0 +1,5 @@
+@echo off
+
+call python %~dp0\mvnd %*
+
+exit /b %ERRORLEVEL%
@@ -0,0 +1,29 @@
+"""
+Verifies that the daemon build tools are run with their daemon options
+"""
+import it
+
+
+class PostVerifyScript(it.PostVerificationTestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_exists(self):
+        self.assertIsNotNone(self.stdout)
+
+        outputs = [
+            'Command "mvnd -Dmvnd.idleTimeout=600s clean install" completed successfully',
+            'mvnd built',
+            'Command "gradle --daemon -Dorg.gradle.daemon.idletimeout=600000 clean build" completed successfully',
+            'gradle built'
+        ]
+
+        for output in outputs:
+            self.assertTrue(output in self.stdout)
+
+        self.assertTrue(self.stderr == '')
+        self.assertEqual(0, self.exit_code)
+
+
+if __name__ == '__main__':
+    it.main()
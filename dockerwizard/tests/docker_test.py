@@ -2,9 +2,12 @@
 This tests the docker module
 """
 import contextlib
+import os
+import tempfile
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
 from dockerwizard.process import ExecutionResult
 from .testing import main, PatchedDependencies
 
@@ -40,12 +43,13 @@ class DockerClientTest(unittest.TestCase):
 
             return_val = DockerClient.build_docker_image(tag)
 
-            patched.get('execution').assert_any_call(['docker', 'build', '--tag', tag, '.'])
+            patched.get('execution').assert_any_call(['docker', 'build', '--tag', tag, '.'], env=None, cwd=None)
             self.assertEqual(return_val, result)
 
-            return_val = DockerClient.build_docker_image(tag, workdir)
+            return_val = DockerClient.build_docker_image(tag, workdir, env={'DOCKER_BUILDKIT': '1'}, cwd='/build')
 
-            patched.get('execution').assert_any_call(['docker', 'build', '--tag', tag, workdir])
+            patched.get('execution').assert_any_call(['docker', 'build', '--tag', tag, workdir],
+                                                     env={'DOCKER_BUILDKIT': '1'}, cwd='/build')
             self.assertEqual(return_val, result)
 
     def test_create_docker_container(self):
@@ -59,15 +63,68 @@ class DockerClientTest(unittest.TestCase):
 
             return_val = DockerClient.create_docker_container(tag, name, [])
 
-            patched.get('execution').assert_any_call(['docker', 'run', '-d', '--name', name, tag])
+            patched.get('execution').assert_any_call(['docker', 'run', '-d', '--name', name, tag], env=None, cwd=None)
             self.assertEqual(return_val, result)
 
             return_val = DockerClient.create_docker_container(tag, name, extra_args)
 
             patched.get('execution').assert_any_call(['docker', 'run', '-d', '--name', name, '-p', '8080:8080',
-                                                      '--network=host', tag])
+                                                      '--network=host', tag], env=None, cwd=None)
             self.assertEqual(return_val, result)
 
 
+    def test_version(self):
+        with tempfile.TemporaryDirectory() as directory, self._patch() as patched, \
+                patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: directory}), \
+                patch(f'{base_package}.shutil.which') as which:
+            executable = os.path.join(directory, 'bin', 'docker')
+            os.makedirs(os.path.dirname(executable))
+
+            with open(executable, 'w') as f:
+                f.write('')
+
+            which.return_value = executable
+            self.execute_mock.return_value = ExecutionResult(0, 'Docker version 24.0.0\n', '')
+
+            self.assertEqual('Docker version 24.0.0', DockerClient.version())
+            patched.get('execution').assert_called_once_with(['docker', '--version'])
+
+            # the version is cached until the executable changes
+            self.assertEqual('Docker version 24.0.0', DockerClient.version())
+            patched.get('execution').assert_called_once()
+
+            os.utime(executable, ns=(1, 1))
+            self.execute_mock.return_value = ExecutionResult(0, 'Docker version 25.0.0', '')
+            self.assertEqual('Docker version 25.0.0', DockerClient.version())
+            self.assertEqual(2, patched.get('execution').call_count)
+
+            os.utime(executable, ns=(2, 2))
+            self.execute_mock.return_value = ExecutionResult(1, '', 'error')
+            self.assertIsNone(DockerClient.version())
+
+            # docker is not executed if it is not installed
+            which.return_value = None
+            self.assertIsNone(DockerClient.version())
+            self.assertEqual(3, patched.get('execution').call_count)
+
+    def test_version_cache_unusable(self):
+        with tempfile.TemporaryDirectory() as directory, self._patch() as patched, \
+                patch(f'{base_package}.shutil.which') as which:
+            # the cache root is a file, so no cache directory can be created in it
+            cache = os.path.join(directory, 'cache')
+
+            with open(cache, 'w') as f:
+                f.write('')
+
+            which.return_value = cache
+            self.execute_mock.return_value = ExecutionResult(0, 'Docker version 24.0.0\n', '')
+
+            with patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: cache}):
+                self.assertEqual('Docker version 24.0.0', DockerClient.version())
+                self.assertEqual('Docker version 24.0.0', DockerClient.version())
+
+            self.assertEqual(2, patched.get('execution').call_count)
+
+
 if __name__ == '__main__':
     main()
@@ -4,7 +4,8 @@ This tests the entrypoint module
 import argparse
 import contextlib
 import unittest
-from unittest.mock import MagicMock
+import unittest.mock
+from unittest.mock import MagicMock, patch
 
 from dockerwizard.const import CUSTOM_COMMANDS
 from .testing import main, PatchedDependencies, patch_os_path, test_join
@@ -25,12 +26,12 @@ class EntrypointTest(unittest.TestCase):
             'argParse': f'{base_package}.parse',
             'changeBack': f'{base_package}.change_back',
             'workingDirectory': f'{base_package}.get_working_directory',
-            'buildParser': f'{base_package}.get_build_parser',
-            'builder': f'{base_package}.Builder',
+            'buildParser': 'dockerwizard.buildparser.get_build_parser',
+            'builder': 'dockerwizard.builder.Builder',
             'wizardHome': f'{base_package}.docker_wizard_home',
             'osPatched': f'{base_package}.os',
-            'loadCustom': f'{base_package}.load_custom',
-            'customPathValidator': f'{base_package}.custom_command_path_validator',
+            'loadCustom': 'dockerwizard.customcommands.load_custom',
+            'customPathValidator': 'dockerwizard.customcommands.custom_command_path_validator',
             'timing': f'{base_package}.timing',
             'cli': f'{base_package}.cli'
         }) as patched:
@@ -60,6 +61,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_no_custom(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = None
         args.file = 'file.yaml'
 
@@ -82,13 +87,68 @@ class EntrypointTest(unittest.TestCase):
 
             patched.get('initPatch').assert_called()
             patched.get('loadCustom').assert_not_called()
+            patched.get('buildParser').assert_called_with(stream=False)
             patched.get('buildParser').return_value.parse.assert_called_with(test_join(workdir, 'file.yaml'))
             patched.get('builder').return_value.build.assert_called()
             patched.get('cli').info.assert_any_call('Duration: time')
             patched.get('cli').info.assert_any_call('BUILD SUCCEEDED')
 
+            args.stream = True
+            entrypoint.main()
+            patched.get('buildParser').assert_called_with(stream=True)
+
+    def test_entrypoint_step_selection(self):
+        args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
+        args.custom = None
+        args.file = 'file.yaml'
+
+        patched: PatchedDependencies
+        with self._patch() as patched:
+            EntrypointTest._default_patch_values(patched)
+
+            patched.get('argParse').return_value = args
+            patched.get('osPatched').path.isfile.return_value = True
+            patched.get('builder').return_value.build.return_value = True
+
+            entrypoint.main()
+            patched.get('builder').assert_called_with(unittest.mock.ANY, resume=False)
+
+            args.resume = True
+            entrypoint.main()
+            patched.get('builder').assert_called_with(unittest.mock.ANY, resume=True)
+
+            args.resume = False
+            args.from_step = '3'
+            entrypoint.main()
+            patched.get('builder').assert_called_with(unittest.mock.ANY, from_step=3)
+
+            args.from_step = None
+            args.only = '1,3-4'
+            entrypoint.main()
+            patched.get('builder').assert_called_with(unittest.mock.ANY, only=[1, 3, 4])
+
+            for resume, from_step, only, message in [
+                (True, '2', None, 'Only one of --resume, --from-step and --only can be given'),
+                (False, 'x', None, 'x is not a step number'),
+                (False, None, '4-2', '4-2 is not a list of step numbers or ranges, e.g. 1,3-5')
+            ]:
+                args.resume, args.from_step, args.only = resume, from_step, only
+
+                with self.assertRaises(SystemExit):
+                    entrypoint.main()
+
+                patched.get('cli').error.assert_called_with(message)
+
     def test_entrypoint_custom(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = 'commands.yaml'
         args.workdir = workdir
         args.file = 'file.yaml'
@@ -111,6 +171,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_build_file_in_work_dir(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = 'commands.yaml'
         args.file = None
 
@@ -130,6 +194,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_custom_not_found(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = 'commands.yaml'
         args.file = 'file.yaml'
 
@@ -152,6 +220,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_custom_validation_error(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = 'commands.yaml'
         args.file = 'file.yaml'
 
@@ -175,6 +247,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_custom_in_workdir(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = None
         args.file = f'{workdir}/test/file.yaml'
 
@@ -203,6 +279,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_build_file_not_found(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = None
         args.file = 'file.yaml'
 
@@ -224,6 +304,10 @@ class EntrypointTest(unittest.TestCase):
 
     def test_entrypoint_build_failed(self):
         args = argparse.Namespace()
+        args.stream = False
+        args.resume = False
+        args.from_step = None
+        args.only = None
         args.custom = None
         args.file = 'file.yaml'
 
@@ -244,6 +328,21 @@ class EntrypointTest(unittest.TestCase):
             patched.get('builder').return_value.build.assert_called()
             patched.get('cli').error.assert_any_call('BUILD FAILED')
 
+    def test_entrypoint_check(self):
+        patched: PatchedDependencies
+        with self._patch() as patched, \
+                patch('dockerwizard.check.main') as check, \
+                patch('sys.argv', ['docker-wizard', 'check', 'build.yaml', '-j', '2']):
+            check.return_value = 1
+
+            with self.assertRaises(SystemExit) as e:
+                entrypoint.main()
+
+            self.assertEqual(1, e.exception.code)
+            check.assert_called_with(['build.yaml', '-j', '2'])
+            patched.get('argParse').assert_not_called()
+            patched.get('builder').assert_not_called()
+
 
 if __name__ == '__main__':
     main()
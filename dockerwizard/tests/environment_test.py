@@ -0,0 +1,71 @@
+"""
+Tests the environment module
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+from .testing import main
+from dockerwizard.environment import BuildEnvironment
+
+
+class BuildEnvironmentTest(unittest.TestCase):
+    def test_base(self):
+        with patch.dict(os.environ, {'BASE_VAR': 'base'}):
+            environment = BuildEnvironment()
+
+        self.assertEqual('base', environment.get('BASE_VAR'))
+        self.assertTrue('BASE_VAR' in environment)
+
+        environment = BuildEnvironment({'VAR': 'value'})
+        self.assertEqual({'VAR': 'value'}, environment.to_dict())
+        self.assertIsNone(environment.get('PATH'))
+        self.assertEqual('default', environment.get('PATH', 'default'))
+
+    def test_set(self):
+        environment = BuildEnvironment({})
+        environment.set('VAR', 'value')
+        environment.update({'VAR2': 2, 'VAR3': 'value3'})
+
+        self.assertEqual({'VAR': 'value', 'VAR2': '2', 'VAR3': 'value3'}, environment.to_dict())
+        self.assertFalse('VAR' in os.environ)
+
+    def test_changed(self):
+        environment = BuildEnvironment({'VAR': 'value'})
+        self.assertEqual({}, environment.changed())
+
+        environment.set('NEW', 1)
+        environment.update({'VAR': 'changed'})
+
+        self.assertEqual({'NEW': '1', 'VAR': 'changed'}, environment.changed())
+
+    def test_secrets(self):
+        environment = BuildEnvironment({})
+        environment.set('VAR', 'value')
+        environment.set('TOKEN', 'secret', secret=True)
+        environment.set('OTHER', 'secret', secret=True)
+
+        self.assertEqual(['OTHER', 'TOKEN'], environment.secrets())
+        self.assertEqual({'VAR': 'value', 'TOKEN': 'secret', 'OTHER': 'secret'}, environment.changed())
+        self.assertEqual({'VAR': 'value'}, environment.changed(secrets=False))
+
+        # setting a secret again as a variable makes it a variable
+        environment.set('OTHER', 'value')
+
+        self.assertEqual(['TOKEN'], environment.secrets())
+        self.assertEqual({'VAR': 'value', 'OTHER': 'value'}, environment.changed(secrets=False))
+
+    def test_to_dict(self):
+        environment = BuildEnvironment({'VAR': 'value'})
+        variables = environment.to_dict({'VAR': 'overlay', 'OTHER': True})
+
+        self.assertEqual({'VAR': 'overlay', 'OTHER': 'True'}, variables)
+        self.assertEqual({'VAR': 'value'}, environment.to_dict())
+
+        # the returned dictionary is a copy
+        variables['NEW'] = 'new'
+        self.assertFalse('NEW' in environment)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Tests the fakedocker package
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from .testing import main
+from dockerwizard import process
+from dockerwizard.docker import DockerClient
+from dockerwizard.fakedocker.client import EngineClient, EngineError, DOCKER_HOST_VAR
+from dockerwizard.fakedocker.engine import FakeEngine, parse_dockerfile
+from dockerwizard.fakedocker.program import write_program
+from dockerwizard.system import isWindows
+
+
+@unittest.skipIf(isWindows(), 'the fake engine listens on a Unix socket')
+class FakeDockerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.context = os.path.join(self.directory, 'context')
+        os.mkdir(self.context)
+        self._write('Dockerfile', 'FROM scratch\nCOPY file.txt /\n')
+        self._write('file.txt', 'content')
+        self.engine = FakeEngine(os.path.join(self.directory, 'engine.sock'))
+        self.engine.start()
+        self.addCleanup(self.engine.stop)
+        self.client = EngineClient(self.engine.socket_path)
+
+    def _write(self, name: str, content: str):
+        with open(os.path.join(self.context, name), 'w') as f:
+            f.write(content)
+
+    def test_parse_dockerfile(self):
+        content = '# comment\nFROM scratch\n\nRUN echo \\\n  hello\nCOPY a /a\n'
+
+        self.assertEqual(['FROM scratch', 'RUN echo hello', 'COPY a /a'], parse_dockerfile(content))
+
+    def test_build(self):
+        self.assertTrue(self.client.ping())
+        self.engine.latency['build'] = 0.2
+        start = time.perf_counter()
+        progress = list(self.client.build(self.context, ['image']))
+        duration = time.perf_counter() - start
+
+        self.assertGreaterEqual(duration, 0.2)
+        self.assertEqual({'stream': 'Step 1/2 : FROM scratch\n'}, progress[0])
+        self.assertEqual({'stream': 'Successfully tagged image:latest\n'}, progress[-1])
+        image_id = next(message['aux']['ID'] for message in progress if 'aux' in message)
+        self.assertEqual(['image:latest'], self.client.inspect_image('image')['RepoTags'])
+
+        # an unchanged context uses the cached image without the latency of a build
+        start = time.perf_counter()
+        progress = list(self.client.build(self.context, ['image:2']))
+
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertIn({'stream': ' ---> Using cache\n'}, progress)
+        self.assertEqual(image_id, self.client.inspect_image('image:2')['Id'])
+
+        self._write('file.txt', 'changed')
+        list(self.client.build(self.context, ['image']))
+
+        self.assertNotEqual(image_id, self.client.inspect_image('image')['Id'])
+        self.assertEqual(['image:2'], self.client.inspect_image(image_id)['RepoTags'])
+        self.assertEqual(2, len(self.client.images()))
+
+    def test_build_errors(self):
+        os.remove(os.path.join(self.context, 'file.txt'))
+
+        self.assertEqual('COPY failed: file not found in build context: file.txt',
+                         list(self.client.build(self.context, ['image']))[-1]['error'])
+
+        self._write('Dockerfile', 'RUN echo\n')
+        self.assertEqual('the Dockerfile must begin with FROM', list(self.client.build(self.context, []))[-1]['error'])
+
+        with self.assertRaises(EngineError) as e:
+            list(self.client.build(self.context, [], 'missing.Dockerfile'))
+
+        self.assertEqual(500, e.exception.status)
+        self.assertEqual([], self.client.images())
+
+    def test_containers(self):
+        list(self.client.build(self.context, ['image']))
+        container = self.client.create_container('image', 'name', ['echo'], {'KEY': 'value'})
+        details = self.client.inspect_container('name')
+
+        self.assertEqual(container, details['Id'])
+        self.assertEqual({'Status': 'created', 'Running': False}, details['State'])
+        self.assertEqual(['KEY=value'], details['Config']['Env'])
+
+        self.client.start_container(container[:12])
+        self.assertTrue(self.client.inspect_container(container)['State']['Running'])
+
+        with self.assertRaises(EngineError) as e:
+            self.client.create_container('image', 'name')
+
+        self.assertEqual(409, e.exception.status)
+
+        with self.assertRaises(EngineError) as e:
+            self.client.create_container('missing')
+
+        self.assertEqual(404, e.exception.status)
+
+    def test_events(self):
+        list(self.client.build(self.context, ['image']))
+        self.client.tag('image', 'repository/image', 'tag')
+
+        events = list(self.client.events(until=time.time()))
+
+        self.assertEqual([('image', 'tag', 'image:latest'), ('image', 'tag', 'repository/image:tag')],
+                         [(event['Type'], event['Action'], event['Actor']['Attributes']['name']) for event in events])
+
+        streamed = []
+        started = threading.Event()
+
+        def listen():
+            started.set()
+
+            for event in self.client.events(since=time.time()):
+                streamed.append(event['Action'])
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+        started.wait()
+        time.sleep(0.2)
+        self.client.create_container('image', 'name')
+        time.sleep(0.2)
+        self.engine.stop()
+        listener.join(5)
+
+        self.assertFalse(listener.is_alive())
+        self.assertEqual(['create'], streamed)
+
+    def test_failures(self):
+        list(self.client.build(self.context, ['image']))
+        self.engine.fail_next('create')
+
+        with self.assertRaises(EngineError) as e:
+            self.client.create_container('image')
+
+        self.assertEqual(500, e.exception.status)
+        self.assertEqual('injected failure of create', e.exception.message)
+        self.client.create_container('image')
+
+        self.engine.failures['build'] = 1
+        self._write('file.txt', 'changed')
+        progress = list(self.client.build(self.context, ['image']))
+
+        self.assertEqual('injected failure of build at step 1', progress[-1]['error'])
+
+        with self.assertRaises(ValueError):
+            FakeEngine(self.engine.socket_path, latency={'unknown': 1})
+
+    def test_program(self):
+        path = write_program(os.path.join(self.directory, 'bin'))
+        backend = process.get_backend()
+        process.set_backend(process.SubprocessBackend())
+        self.addCleanup(process.set_backend, backend)
+
+        with patch.dict(os.environ, {'PATH': os.pathsep.join([path, os.environ.get('PATH', '')]),
+                                     DOCKER_HOST_VAR: self.engine.docker_host}):
+            result = DockerClient.build_docker_image('image', cwd=self.context)
+
+            self.assertTrue(result.is_healthy())
+            self.assertIn('Successfully tagged image:latest', result.stdout)
+
+            result = DockerClient.create_docker_container('image', 'name', ['-e', 'KEY=value'])
+
+            self.assertTrue(result.is_healthy())
+            self.assertEqual(['KEY=value'], self.client.inspect_container(result.stdout.strip())['Config']['Env'])
+
+            result = DockerClient.create_docker_container('missing', 'other', [])
+
+            self.assertEqual(125, result.exit_code)
+            self.assertIn('No such image: missing', result.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+This tests the git module
+"""
+import contextlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
+from dockerwizard.process import ExecutionResult
+from .testing import main, PatchedDependencies
+
+from dockerwizard import git
+from dockerwizard.git import GitClient
+
+
+base_package = 'dockerwizard.git'
+
+
+class GitClientTest(unittest.TestCase):
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.execute_mock = None
+
+    @contextlib.contextmanager
+    def _patch(self) -> PatchedDependencies:
+        with PatchedDependencies({
+            'execution': f'{base_package}.Execution',
+            'lock': f'{base_package}.CacheLock',
+            'cacheDirectory': f'{base_package}.cache_directory'
+        }) as patched:
+            self.execute_mock = Mock()
+            self.execute_mock.return_value = ExecutionResult(0, '', '')
+            patched.get('execution').return_value = Mock()
+            patched.get('execution').return_value.execute = self.execute_mock
+            patched.get('cacheDirectory').return_value = '/cache/git/mirrors'
+
+            yield patched
+
+    def test_repository_name(self):
+        self.assertEqual('repo', git.repository_name('https://github.com/user/repo.git'))
+        self.assertEqual('repo', git.repository_name('https://github.com/user/repo/'))
+        self.assertEqual('repo', git.repository_name('git@github.com:repo.git'))
+        self.assertEqual('repo', git.repository_name('/path/to/repo'))
+
+    def test_clone(self):
+        with self._patch() as patched:
+            GitClient.clone('url')
+            patched.get('execution').assert_called_with(['git', 'clone', 'url'], env=None, cwd=None)
+
+            GitClient.clone('url', 'target', branch='main', depth=1, filter_spec='blob:none', sparse=True,
+                            reference='/mirror', submodules=True, jobs=4, env={'GIT_TERMINAL_PROMPT': '0'})
+            patched.get('execution').assert_called_with(['git', 'clone', '--branch', 'main', '--depth', '1',
+                                                         '--filter=blob:none', '--sparse', '--reference', '/mirror',
+                                                         '--dissociate', '--recurse-submodules',
+                                                         '--shallow-submodules', '--jobs', '4', 'url', 'target'],
+                                                        env={'GIT_TERMINAL_PROMPT': '0'}, cwd=None)
+
+    def test_update_mirror(self):
+        mirror = f'/cache/git/mirrors/{git.hash_string("url")}'
+
+        with self._patch() as patched, patch(f'{base_package}.os.path.isfile') as isfile:
+            isfile.return_value = False
+            GitClient.update_mirror('url')
+            patched.get('execution').assert_called_with(['git', 'clone', '--mirror', '--quiet', 'url', mirror],
+                                                        env=None, cwd=None)
+            patched.get('lock').assert_called_with(mirror)
+
+            isfile.return_value = True
+            GitClient.update_mirror('url')
+            patched.get('execution').assert_called_with(['git', '-C', mirror, 'fetch', '--prune', '--quiet',
+                                                         'origin'], env=None, cwd=None)
+
+    def test_sparse_checkout(self):
+        with self._patch() as patched:
+            GitClient.sparse_checkout('repo', ['src', 'docs'])
+            patched.get('execution').assert_called_with(['git', '-C', 'repo', 'sparse-checkout', 'set', 'src',
+                                                         'docs'], env=None, cwd=None)
+
+
+@unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+class GitClientFileRemoteTest(unittest.TestCase):
+    """
+    Runs the git client against a real repository served from the file system
+    """
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.old_cwd = os.getcwd()
+        self.old_cache = os.environ.get(DOCKER_WIZARD_CACHE_VAR)
+        os.environ[DOCKER_WIZARD_CACHE_VAR] = os.path.join(self.directory.name, 'cache')
+
+        source = os.path.join(self.directory.name, 'source')
+        os.makedirs(os.path.join(source, 'src'))
+
+        with open(os.path.join(source, 'README'), 'w') as f:
+            f.write('readme')
+
+        with open(os.path.join(source, 'src', 'main.py'), 'w') as f:
+            f.write('print("hello")')
+
+        for command in [['init', '--quiet'], ['add', '.'],
+                        ['-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '--quiet', '-m', 'init']]:
+            subprocess.run(['git', '-C', source] + command, check=True, capture_output=True)
+
+        self.url = f'file://{source}'
+        self.workdir = os.path.join(self.directory.name, 'workdir')
+        os.makedirs(self.workdir)
+        os.chdir(self.workdir)
+
+    def tearDown(self) -> None:
+        os.chdir(self.old_cwd)
+
+        if self.old_cache is None:
+            os.environ.pop(DOCKER_WIZARD_CACHE_VAR)
+        else:
+            os.environ[DOCKER_WIZARD_CACHE_VAR] = self.old_cache
+
+        self.directory.cleanup()
+
+    def test_clone_with_mirror(self):
+        self.assertTrue(GitClient.update_mirror(self.url).is_healthy())
+        mirror = GitClient.mirror_path(self.url)
+        self.assertTrue(os.path.isfile(os.path.join(mirror, 'HEAD')))
+
+        # second update fetches into the existing mirror
+        self.assertTrue(GitClient.update_mirror(self.url).is_healthy())
+
+        result = GitClient.clone(self.url, 'clone', depth=1, reference=mirror)
+        self.assertTrue(result.is_healthy(), result.stderr)
+        self.assertTrue(os.path.isfile(os.path.join(self.workdir, 'clone', 'src', 'main.py')))
+        # dissociated clones must not depend on the mirror
+        self.assertFalse(os.path.isfile(os.path.join(self.workdir, 'clone', '.git', 'objects', 'info',
+                                                     'alternates')))
+
+    def test_sparse_clone(self):
+        result = GitClient.clone(self.url, 'sparse', sparse=True)
+        self.assertTrue(result.is_healthy(), result.stderr)
+        self.assertTrue(os.path.isfile(os.path.join(self.workdir, 'sparse', 'README')))
+        self.assertFalse(os.path.isdir(os.path.join(self.workdir, 'sparse', 'src')))
+
+        self.assertTrue(GitClient.sparse_checkout('sparse', ['src']).is_healthy())
+        self.assertTrue(os.path.isfile(os.path.join(self.workdir, 'sparse', 'src', 'main.py')))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,18 @@
 """
-An integration test runner by running dockerwizard from a specification file
+An integration test runner by running dockerwizard from a specification file. Each test runs in a scratch copy of its
+directory with its own environment variables, so in glob mode the tests can run in parallel worker processes
 """
 import argparse
+import io
 import platform
+import shutil
 import subprocess
 import sys
-from typing import List, Set
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Dict, List
 import glob
 import yaml
 import os
@@ -17,16 +24,24 @@ TEST_RETURN_CODE = 'DOCKER_BUILD_TEST_CODE'
 
 ARGUMENTS_BASE = 'MOCK_PROGRAM_ARGS_'
 OUTPUT_BASE = 'MOCK_PROGRAM_OUTPUT_'
+ENVS_DIRECTORY = 'MOCK_PROGRAM_ENVS_DIRECTORY'
 TEST_BUILD_FILE = 'build_test.yaml'
 
 DOCKER_WIZARD_HOME = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir,
                                                   os.path.pardir))
 os.environ['DOCKER_WIZARD_HOME'] = DOCKER_WIZARD_HOME
 
+# the files written by previous runs of a test in its directory, which are not copied into its scratch copy
+_OUTPUT_FILES = ['stdout.txt', 'stderr.txt', '*_envs.yaml', TEST_BUILD_FILE, '__pycache__']
+
 
 class EnvironmentVariableTracker:
-    def __init__(self):
-        self.environ = os.environ
+    """
+    Tracks the environment variables set for a test in its own copy of the environment, which is passed to the
+    processes of the test, so tests running at the same time do not see each other's variables
+    """
+    def __init__(self, environ: Dict[str, str] = None):
+        self.environ = dict(os.environ) if environ is None else environ
         self.set_envs = set()
 
     def set(self, key: str, value: str):
@@ -35,13 +50,24 @@ class EnvironmentVariableTracker:
 
     def clear(self):
         for key in self.set_envs:
-            self.environ.pop(key)
+            self.environ.pop(key, None)
+
+        self.set_envs.clear()
 
 
 class _SkipTest(RuntimeError):
     pass
 
 
+class _TestFailure(RuntimeError):
+    """
+    Raised when a test fails with the exit code of the failure
+    """
+    def __init__(self, code: int):
+        super().__init__(code)
+        self.code = code
+
+
 class IntegrationRunnerProgram(IntegrationProgram):
     """
     A program that can run an integration test
@@ -54,6 +80,11 @@ class IntegrationRunnerProgram(IntegrationProgram):
         parser.add_argument('-g', '--glob', action='store_true', help='If specified, the directory argument'
                                                                       ' is treated as a glob to execute multiple'
                                                                       ' integration tests')
+        parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                            help='The number of worker processes running tests in parallel in glob mode. Defaults to'
+                                 ' the number of CPUs')
+        parser.add_argument('-s', '--slowest', type=int, default=5,
+                            help='The number of slowest tests to report after the tests ran')
         parser.add_argument('directory', help='The directory of the integration test')
 
     @staticmethod
@@ -72,7 +103,7 @@ class IntegrationRunnerProgram(IntegrationProgram):
                 if not skip:
                     print(f'Spec file {spec} is not a file', file=sys.stderr)
                     IntegrationRunnerProgram._print_failed(directory)
-                    sys.exit(2)
+                    raise _TestFailure(2)
                 else:
                     raise _SkipTest
 
@@ -81,7 +112,7 @@ class IntegrationRunnerProgram(IntegrationProgram):
             if not skip:
                 print(f'{directory} is not a directory', file=sys.stderr)
                 IntegrationRunnerProgram._print_failed(directory)
-                sys.exit(1)
+                raise _TestFailure(1)
             else:
                 raise _SkipTest
 
@@ -91,11 +122,11 @@ class IntegrationRunnerProgram(IntegrationProgram):
 
         if programs:
             for program in programs:
-                file = program.get('file')
+                file = os.path.join(directory, program.get('file'))
                 if not os.path.isfile(file):
                     print(f'Mock program {file} does not exist', file=sys.stderr)
                     IntegrationRunnerProgram._print_failed(directory)
-                    sys.exit(3)
+                    raise _TestFailure(3)
 
         args = spec.get('args')
 
@@ -153,55 +184,42 @@ class IntegrationRunnerProgram(IntegrationProgram):
 
         return IntegrationRunnerProgram._prepare_build_file(build_file, mock_programs)
 
-    @staticmethod
-    def _clean_envs_files(directory: str):
-        files = glob.glob(os.path.join(directory, '*_envs.yaml'))
-
-        for file in files:
-            os.remove(file)
-
     @staticmethod
     def _execute_post(process, post, directory, directory_name, envs: EnvironmentVariableTracker):
         envs.set(TEST_RETURN_CODE, f'{process.returncode}')
-        clean_files = process.returncode == 0
-        process = subprocess.Popen(['python', post], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        process = subprocess.Popen(['python', post], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   cwd=directory, env=envs.environ)
         stdout, stderr = process.communicate()
 
         if process.returncode != 0:
             print(f'{post} failed with stdout: {stdout}, stderr: {stderr} and return code {process.returncode}',
                   file=sys.stderr)
             print_formatted_command_output(directory_name, 'Integration Test', False)
-            sys.exit(4)
+            raise _TestFailure(4)
         else:
             print(f'Post execution verification file {post} executed successfully')
 
-        if clean_files:
-            os.remove('stdout.txt')
-            os.remove('stderr.txt')
-            IntegrationRunnerProgram._clean_envs_files(directory)
-
     @staticmethod
     def _check_build(process, stdout, stderr, directory_name):
         if process.returncode != 0:
             print(f'Build failed with stdout: {stdout}, stderr: {stderr} and return code {process.returncode}',
                   file=sys.stderr)
             print_formatted_command_output(directory_name, 'Integration Test', False)
-            sys.exit(5)
+            raise _TestFailure(5)
 
     @staticmethod
-    def _execute_build_and_post(args: List[str], old_path: str, directory: str, build_file: str,
-                                envs: EnvironmentVariableTracker):
+    def _execute_build_and_post(args: List[str], directory: str, build_file: str, envs: EnvironmentVariableTracker):
         directory_name = os.path.basename(directory)
         print(f'Executing integration test {directory_name}')
         print(f'Starting docker-wizard with command-line {args}')
-        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=directory,
+                                   env=envs.environ)
         stdout, stderr = process.communicate()
-        os.environ['PATH'] = old_path
         os.remove(build_file)
         post = os.path.join(directory, 'post.py')
 
-        IntegrationRunnerProgram._write('stdout.txt', stdout)
-        IntegrationRunnerProgram._write('stderr.txt', stderr)
+        IntegrationRunnerProgram._write(os.path.join(directory, 'stdout.txt'), stdout)
+        IntegrationRunnerProgram._write(os.path.join(directory, 'stderr.txt'), stderr)
 
         IntegrationRunnerProgram._check_build(process, stdout, stderr, directory_name)
 
@@ -211,10 +229,10 @@ class IntegrationRunnerProgram(IntegrationProgram):
             print_formatted_command_output(directory_name, 'Integration Test', True)
 
     @staticmethod
-    def _prepare_build(path: str, directory: str, mock_programs: list, spec_args: str,
-                       envs: EnvironmentVariableTracker):
+    def _prepare_build(directory: str, mock_programs: list, spec_args: str, envs: EnvironmentVariableTracker):
         program_args = {}
         program_output = {}
+        path = envs.environ['PATH']
 
         if mock_programs:
             for program in mock_programs:
@@ -230,7 +248,7 @@ class IntegrationRunnerProgram(IntegrationProgram):
                 program_args[filename] = file_args if file_args else None
                 program_output[filename] = file_output if file_output else None
 
-            os.environ['PATH'] = path
+            envs.set('PATH', path)
 
         wizard_script = 'docker-wizard.cmd' if platform.system().lower() == 'windows' else 'docker-wizard'
         args: List[str] = [os.path.join(DOCKER_WIZARD_HOME, 'bin', wizard_script)]
@@ -242,21 +260,17 @@ class IntegrationRunnerProgram(IntegrationProgram):
         build_file = IntegrationRunnerProgram._find_and_create_build_file(directory, args, mock_programs)
 
         envs.set('DOCKER_WIZARD_DISABLE_COLOR', 'True')
+        envs.set(ENVS_DIRECTORY, directory)
 
         return args, build_file
 
     @staticmethod
-    def _execute_spec(spec, envs):
-        directory = os.getcwd()
-        old_path = os.environ['PATH']
-        new_path = old_path
-
+    def _execute_spec(spec, directory, envs):
         mock_programs = spec.get('mock_programs')
 
-        args, build_file = IntegrationRunnerProgram._prepare_build(new_path, directory, mock_programs,
-                                                                   spec.get('args'), envs)
+        args, build_file = IntegrationRunnerProgram._prepare_build(directory, mock_programs, spec.get('args'), envs)
 
-        IntegrationRunnerProgram._execute_build_and_post(args, old_path, directory, build_file, envs)
+        IntegrationRunnerProgram._execute_build_and_post(args, directory, build_file, envs)
 
     @staticmethod
     def _parse_spec(spec_file: str):
@@ -264,32 +278,130 @@ class IntegrationRunnerProgram(IntegrationProgram):
             return yaml.safe_load(stream)
 
     @staticmethod
-    def _execute(directory: str, glob_part: bool, envs: EnvironmentVariableTracker):
+    def _copy_to_scratch(directory: str, scratch: str, envs: EnvironmentVariableTracker) -> str:
+        """
+        Copies the test directory into the scratch directory of the test, which also holds the cache of the builds of
+        the test, so the test does not write to its directory or share a cache with other tests
+        """
+        copy = os.path.join(scratch, os.path.basename(directory))
+        shutil.copytree(directory, copy, symlinks=True, ignore=shutil.ignore_patterns(*_OUTPUT_FILES))
+        envs.set('DOCKER_WIZARD_CACHE', os.path.join(scratch, 'cache'))
+
+        return copy
+
+    @staticmethod
+    def _execute(directory: str, glob_part: bool, envs: EnvironmentVariableTracker, scratch: str):
         if directory.endswith('/'):
             directory = directory[:-1]
 
         directory = IntegrationRunnerProgram._validate_directory(directory, skip=glob_part)
         spec = IntegrationRunnerProgram._parse_spec(os.path.join(directory, 'spec.yaml'))
-        previous_dir = os.getcwd()
-        os.chdir(directory)
         IntegrationRunnerProgram._validate_spec(spec, directory)
-        IntegrationRunnerProgram._execute_spec(spec, envs)
-        os.chdir(previous_dir)
+        copy = IntegrationRunnerProgram._copy_to_scratch(directory, scratch, envs)
+        IntegrationRunnerProgram._execute_spec(spec, copy, envs)
+
+    @staticmethod
+    def _run_test(test: str, glob_part: bool, scratch: str, capture: bool) -> dict:
+        """
+        Runs the test with its own environment in the scratch directory, which is removed unless the test fails
+        :param test: the directory of the test
+        :param glob_part: true if the test was matched by a glob, so it is skipped if it is not a test
+        :param scratch: the scratch directory of the test, which must not exist
+        :param capture: true to capture the output of the test and return it rather than print it
+        :return: the result of the test
+        """
+        envs = EnvironmentVariableTracker()
+        output = io.StringIO() if capture else None
+        result = {'test': test, 'name': os.path.basename(test.rstrip('/')), 'status': 'passed', 'code': 0}
+        start = time.perf_counter()
+        os.makedirs(scratch)
+
+        try:
+            with redirect_stdout(output or sys.stdout), redirect_stderr(output or sys.stderr):
+                try:
+                    IntegrationRunnerProgram._execute(test, glob_part, envs, scratch)
+                except _SkipTest:
+                    print(f'Warning: {test} does not contain a spec.yaml file, skipping...')
+                    result['status'] = 'skipped'
+                except _TestFailure as e:
+                    result['status'] = 'failed'
+                    result['code'] = e.code
+
+                    # the scratch copy of a failed test is kept to see why it failed, if it was copied
+                    if os.listdir(scratch):
+                        print(f'The scratch copy of {result["name"]} is kept in {scratch}', file=sys.stderr)
+        finally:
+            envs.clear()
+
+        if result['status'] != 'failed' or not os.listdir(scratch):
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        result['duration'] = time.perf_counter() - start
+        result['output'] = output.getvalue() if capture else ''
+
+        return result
+
+    @staticmethod
+    def _print_summary(results: List[dict], duration: float, jobs: int, slowest: int):
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in ['passed', 'failed', 'skipped']}
+        ran = [result for result in results if result['status'] != 'skipped']
+
+        print('\nIntegration Test Results')
+        print('========================')
+
+        for result in sorted(results, key=lambda r: r['name']):
+            code = f' (exit code {result["code"]})' if result['status'] == 'failed' else ''
+            print(f'{result["status"].upper():<8} {result["name"]:<50} {result["duration"]:>7.2f}s{code}')
+
+        if ran and slowest > 0:
+            print('\nSlowest tests:')
+
+            for result in sorted(ran, key=lambda r: -r['duration'])[:slowest]:
+                print(f'  {result["duration"]:>7.2f}s {result["name"]}')
+
+        print(f'\n{counts["passed"]} passed, {counts["failed"]} failed, {counts["skipped"]} skipped in '
+              f'{duration:.2f}s with {jobs} worker{"s" if jobs != 1 else ""}')
 
     def run(self, args: argparse.Namespace):
         do_glob = args.glob
         directory = args.directory
-        tests = [directory] if not do_glob else glob.glob(directory)
+        tests = [directory] if not do_glob else sorted(glob.glob(directory))
 
         if len(tests) == 0:
             print('No tests found, exiting...')
+            return
+
+        jobs = max(1, min(args.jobs, len(tests)))
+        root = tempfile.mkdtemp(prefix='docker-wizard-its-')
+        scratches = [os.path.join(root, str(index)) for index in range(len(tests))]
+        start = time.perf_counter()
+
+        if jobs == 1:
+            results = [IntegrationRunnerProgram._run_test(test, do_glob, scratch, False)
+                       for test, scratch in zip(tests, scratches)]
         else:
-            for test in tests:
-                envs = EnvironmentVariableTracker()
+            results = []
 
-                try:
-                    IntegrationRunnerProgram._execute(test, glob_part=do_glob, envs=envs)
-                except _SkipTest:
-                    print(f'Warning: {test} does not contain a spec.yaml file, skipping...')
-                finally:
-                    envs.clear()
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(IntegrationRunnerProgram._run_test, test, do_glob, scratch, True)
+                           for test, scratch in zip(tests, scratches)]
+
+                # the output of each test is printed in one piece when it finishes, so outputs do not interleave
+                for future in as_completed(futures):
+                    result = future.result()
+                    print(result['output'], end='', file=sys.stderr if result['status'] == 'failed' else sys.stdout,
+                          flush=True)
+                    results.append(result)
+
+        if do_glob:
+            IntegrationRunnerProgram._print_summary(results, time.perf_counter() - start, jobs, args.slowest)
+
+        if not os.listdir(root):
+            os.rmdir(root)
+
+        failed = [result for result in sorted(results, key=lambda r: tests.index(r['test']))
+                  if result['status'] == 'failed']
+
+        if failed:
+            sys.exit(failed[0]['code'])
@@ -12,6 +12,7 @@ import yaml
 BASENAME = os.path.basename(__file__).upper()
 ARGS = f'MOCK_PROGRAM_ARGS_{BASENAME}'
 OUTPUT = f'MOCK_PROGRAM_OUTPUT_{BASENAME}'
+ENVS_DIRECTORY = 'MOCK_PROGRAM_ENVS_DIRECTORY'
 
 # these will get substituted by mockproggen.py if provided in arguments
 PARSED_ARGS = "$ARGS"
@@ -51,9 +52,13 @@ def get_program_output():
 
 def _write_envs():
     """
-    Writes the environment variables the program was called with to yaml file
+    Writes the environment variables the program was called with to yaml file. The file is written to the directory in
+    MOCK_PROGRAM_ENVS_DIRECTORY if set, e.g. by the runner to the scratch copy of the test, else the test directory
     """
-    file = os.path.join(os.environ.get('DOCKER_WIZARD_HOME'), 'dockerwizard', 'tests', TEST,  f'{BASENAME}_envs.yaml')
+    directory = os.environ.get(ENVS_DIRECTORY)
+    directory = directory if directory else os.path.join(os.environ.get('DOCKER_WIZARD_HOME'), 'dockerwizard', 'tests',
+                                                         TEST)
+    file = os.path.join(directory, f'{BASENAME}_envs.yaml')
 
     with open(file, 'w') as f:
         yaml.safe_dump(dict(os.environ), f)
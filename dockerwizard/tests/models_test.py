@@ -116,6 +116,48 @@ class BuildObjectsTest(unittest.TestCase):
         validate.assert_not_called()
         on_error.assert_not_called()
 
+    def test_schema(self):
+        validate = Mock()
+        on_error = Mock()
+
+        target = StubBuildFileObject('tag', 'key', 'key1')
+        schema = models.Schema([
+            models.PropertySetter('key', required=True, validate=validate, on_error=on_error),
+            models.PropertySetter('key1', on_error=on_error)
+        ])
+
+        validate.return_value = None
+        schema.apply(test_data, target)
+
+        validate.assert_called_with('value')
+        self.assertEqual(target.key, 'value')
+        self.assertIs(target.key1, test_data.get_property('key1'))
+        on_error.assert_not_called()
+
+        validate.return_value = 'Not valid'
+        target = StubBuildFileObject('tag', 'key', 'key1')
+        schema.apply(test_data, target)
+        on_error.assert_called_with('Not valid')
+        self.assertEqual(target.key, 'value')
+        on_error.reset_mock()
+
+        schema.apply(models.BuildFileData({}), target)
+        on_error.assert_called_once_with('key not found')
+
+        schema = models.Schema([models.PropertySetter('not_exists')])
+
+        with self.assertRaises(ValueError) as e:
+            schema.apply(test_data, target)
+
+        self.assertTrue('Property not_exists is not valid' in e.exception.args)
+
+    def test_slots(self):
+        for model in [models.File(), models.StepCache(), models.BuildStep()]:
+            self.assertFalse(hasattr(model, '__dict__'))
+
+        with self.assertRaises(TypeError):
+            test_data.data['key'] = 'value'
+
     def test_throw_property_error(self):
         with self.assertRaises(BuildConfigurationError) as e:
             models.throw_property_error('error')
@@ -206,6 +248,85 @@ class BuildStepTest(unittest.TestCase):
         with self.assertRaises(BuildConfigurationError):
             build_step.initialise(data)
 
+    def test_build_step_nested_named(self):
+        data = models.BuildFileData({
+            'command': 'test-command',
+            'named': models.BuildFileData({
+                'key': 'value',
+                'nested': models.BuildFileData({
+                    'key1': 'value1'
+                }),
+                'list': [models.BuildFileData({'key2': 'value2'}), 'value3']
+            })
+        })
+
+        build_step = models.BuildStep().initialise(data)
+
+        self.assertEqual({
+            'key': 'value',
+            'nested': {
+                'key1': 'value1'
+            },
+            'list': [{'key2': 'value2'}, 'value3']
+        }, build_step.named)
+
+
+    def test_build_step_environment(self):
+        data = models.BuildFileData({
+            'command': 'execute-shell',
+            'environment': models.BuildFileData({'CC': 'clang', 'JOBS': 4})
+        })
+        build_step = models.BuildStep().initialise(data)
+
+        self.assertEqual({'CC': 'clang', 'JOBS': 4}, build_step.environment)
+
+        for environment in [['CC=clang'], models.BuildFileData({'CC': ['clang']})]:
+            with self.assertRaises(BuildConfigurationError):
+                models.BuildStep().initialise(models.BuildFileData({
+                    'command': 'execute-shell',
+                    'environment': environment
+                }))
+
+    def test_build_step_cache(self):
+        data = models.BuildFileData({
+            'command': 'execute-shell',
+            'cache': [
+                models.BuildFileData({'name': 'ccache', 'path': '.ccache'}),
+                models.BuildFileData({'name': 'sdk', 'path': 'sdk', 'key': 'sdk-${platform}', 'max_size': '1G',
+                                      'mode': 'copy'})
+            ]
+        })
+        build_step = models.BuildStep().initialise(data)
+
+        self.assertEqual(['ccache', 'sdk'], [c.name for c in build_step.cache])
+        self.assertEqual('${name}', build_step.cache[0].key)
+        self.assertIsNone(build_step.cache[0].max_size)
+        self.assertEqual('symlink', build_step.cache[0].mode)
+        self.assertEqual('sdk-${platform}', build_step.cache[1].key)
+        self.assertEqual(1024 ** 3, build_step.cache[1].max_size)
+        self.assertEqual('copy', build_step.cache[1].mode)
+
+    def test_build_step_cache_errors(self):
+        caches = [
+            {'path': '.ccache'},
+            {'name': 'ccache', 'path': '/ccache'},
+            {'name': 'ccache', 'path': '../ccache'},
+            {'name': 'ccache', 'path': '.ccache', 'mode': 'volume'},
+            {'name': 'ccache', 'path': '.ccache', 'max_size': 'large'}
+        ]
+
+        for cache in caches:
+            with self.assertRaises(BuildConfigurationError):
+                models.BuildStep().initialise(models.BuildFileData({
+                    'command': 'execute-shell',
+                    'cache': [models.BuildFileData(cache)]
+                }))
+
+        for cache in ['ccache', [models.BuildFileData({'name': 'ccache', 'path': 'a'}),
+                                 models.BuildFileData({'name': 'ccache', 'path': 'b'})]]:
+            with self.assertRaises(BuildConfigurationError):
+                models.BuildStep().initialise(models.BuildFileData({'command': 'execute-shell', 'cache': cache}))
+
 
 class BuildStepsTest(unittest.TestCase):
     def test_build_steps(self):
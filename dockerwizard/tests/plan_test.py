@@ -0,0 +1,94 @@
+"""
+Tests the plan module
+"""
+import unittest
+from unittest.mock import Mock
+
+from .testing import main, PatchedDependencies
+from dockerwizard import plan
+from dockerwizard.errors import CommandError
+from dockerwizard.models import DockerBuild, BuildStep, File
+
+base_package = 'dockerwizard.plan'
+
+
+def _step(command: str, *args, name: str = None) -> BuildStep:
+    step = BuildStep()
+    step.name = name
+    step.command = command
+    step.arguments = list(args)
+
+    return step
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.build = DockerBuild()
+        self.build.directory = '/build'
+        self.build.library = 'library'
+        self.build.dockerfile.path = 'Dockerfile'
+        file = File()
+        file.path = '/absolute/file.txt'
+        file.relative_to_library = False
+        self.build.files = [file]
+        self.command = Mock()
+        self.command.default_name.return_value = 'default'
+
+    def _compile(self, commands: dict = None, files: list = None):
+        with PatchedDependencies({
+            'registry': f'{base_package}.commands.registry',
+            'isfile': 'os.path.isfile'
+        }) as patched:
+            commands = commands if commands is not None else {'command': self.command}
+            files = files if files is not None else ['/build/library/Dockerfile', '/absolute/file.txt']
+
+            def get_command(name: str):
+                if name not in commands:
+                    raise ValueError(name)
+
+                return commands[name]
+
+            patched.registry.get_command.side_effect = get_command
+            patched.isfile.side_effect = lambda path: path in files
+
+            return plan.compile_plan(self.build)
+
+    def test_compile_plan(self):
+        self.build.steps = [_step('command', 'arg', name='first'), _step('command')]
+        self.build.post_steps = [_step('command')]
+
+        compiled = self._compile()
+
+        self.assertEqual([1, 2], [s.index for s in compiled.steps])
+        self.assertEqual(['first', 'default'], [s.name for s in compiled.steps])
+        self.assertTrue(compiled.post_steps[0].post_step)
+        self.command.validate.assert_any_call(['arg'], {})
+        self.assertEqual(3, self.command.validate.call_count)
+
+    def test_streamed_steps(self):
+        self.build.steps = iter([_step('unknown')])
+
+        compiled = self._compile()
+
+        self.assertIsNone(compiled.steps)
+        self.assertEqual([], compiled.post_steps)
+
+    def test_invalid_plan(self):
+        self.build.steps = [_step('unknown'), _step('command', name='invalid'), _step('failing')]
+        self.build.post_steps = [_step('command')]
+        self.command.validate.side_effect = [CommandError('wrong arguments'), None]
+
+        with self.assertRaises(plan.PlanError) as e:
+            self._compile({'command': self.command}, files=['/absolute/file.txt'])
+
+        self.assertEqual([
+            'File Dockerfile required by the build does not exist at /build/library/Dockerfile',
+            'Unknown command unknown in build step 1',
+            'Invalid build step 2 - invalid: wrong arguments',
+            'Unknown command failing in build step 3'
+        ], e.exception.errors)
+        self.assertTrue('wrong arguments' in e.exception.message)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,17 @@
 """
 This tests the process package
 """
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
 from .testing import main
 from dockerwizard import process
+from dockerwizard.commands import AbstractCommand
+from dockerwizard.context import initialise, activate, teardown
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_RECORD_VAR, DOCKER_WIZARD_REPLAY_VAR, DOCKER_WIZARD_REPLAY_TIMING_VAR
 
 
 class ProcessTest(unittest.TestCase):
@@ -27,12 +33,25 @@ class ProcessTest(unittest.TestCase):
             # test with string
             command = 'ls -l'
             process.Execution(command)
-            patched.assert_any_call(command, stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True)
+            patched.assert_any_call(command, stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True,
+                                    env=None, cwd=None)
 
             # test with list
             command = ['ls', '-l']
             process.Execution(command)
-            patched.assert_any_call('ls -l', stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True)
+            patched.assert_any_call('ls -l', stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True,
+                                    env=None, cwd=None)
+
+            # test with environment
+            env = {'KEY': 'value'}
+            process.Execution(command, env=env)
+            patched.assert_any_call('ls -l', stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True,
+                                    env=env, cwd=None)
+
+            # test with working directory
+            process.Execution(command, cwd='/build')
+            patched.assert_any_call('ls -l', stdout=process.PIPE, stderr=process.PIPE, text=True, shell=True,
+                                    env=None, cwd='/build')
 
     def test_execution_execute(self):
         mocked_popen = MagicMock()
@@ -52,5 +71,195 @@ class ProcessTest(unittest.TestCase):
             self.assertEqual(result.stderr, expected.stderr)
 
 
+class StubBackend(process.ExecutionBackend):
+    def __init__(self):
+        self.started = []
+
+    def start(self, command, env, cwd):
+        self.started.append((command, env, cwd))
+
+        return lambda: process.ExecutionResult(0, f'{command} output', '')
+
+
+class BackendTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cassette = os.path.join(self.directory.name, 'cassette.jsonl')
+
+    def tearDown(self) -> None:
+        process.set_backend(None)
+        self.directory.cleanup()
+
+    def _records(self) -> list:
+        with open(self.cassette, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    def test_set_backend(self):
+        backend = StubBackend()
+        process.set_backend(backend)
+
+        result = process.Execution(['ls', '-l'], env={'KEY': 'value'}, cwd='/build').execute()
+
+        self.assertEqual('ls -l output', result.stdout)
+        self.assertEqual([('ls -l', {'KEY': 'value'}, '/build')], backend.started)
+
+    def test_backend_from_environment(self):
+        with open(self.cassette, 'w'):
+            pass
+
+        for environment, backend_type in [({}, process.SubprocessBackend),
+                                          ({DOCKER_WIZARD_RECORD_VAR: self.cassette}, process.RecordingBackend),
+                                          ({DOCKER_WIZARD_REPLAY_VAR: self.cassette}, process.ReplayBackend)]:
+            process.set_backend(None)
+
+            with patch.dict(os.environ, environment):
+                for name in {DOCKER_WIZARD_RECORD_VAR, DOCKER_WIZARD_REPLAY_VAR} - set(environment):
+                    os.environ.pop(name, None)
+
+                self.assertTrue(isinstance(process.get_backend(), backend_type))
+
+        process.set_backend(None)
+
+        with patch.dict(os.environ, {DOCKER_WIZARD_REPLAY_VAR: self.cassette, DOCKER_WIZARD_REPLAY_TIMING_VAR: 'true'}):
+            self.assertTrue(process.get_backend().timing)
+
+    def test_record(self):
+        stub = StubBackend()
+        process.set_backend(process.RecordingBackend(self.cassette, stub))
+
+        process.Execution(['docker', 'build'], env={**os.environ, 'VARIABLE': 'value'}, cwd='/build').execute()
+        process.Execution('git clone').execute()
+
+        records = self._records()
+
+        self.assertEqual(2, len(records))
+        self.assertEqual('docker build', records[0]['command'])
+        self.assertEqual('/build', records[0]['cwd'])
+        self.assertEqual('docker build output', records[0]['stdout'])
+        self.assertEqual(0, records[0]['exit_code'])
+        self.assertTrue(records[0]['duration'] >= 0)
+        # only the variables that differ from the environment of the process are digested
+        self.assertEqual(process.environment_digest({'VARIABLE': 'value'}), records[0]['env'])
+        self.assertNotEqual(records[0]['env'], records[1]['env'])
+        self.assertEqual(process.environment_digest(None), records[1]['env'])
+
+    def test_record_and_replay(self):
+        process.set_backend(process.RecordingBackend(self.cassette))
+
+        first = process.Execution('echo first && echo error >&2').execute()
+        process.Execution('exit 3').execute()
+
+        process.set_backend(process.ReplayBackend(self.cassette))
+
+        with patch('dockerwizard.process.Popen') as popen:
+            replayed = process.Execution('echo first && echo error >&2').execute()
+            failed = process.Execution('exit 3').execute()
+            missing = process.Execution('exit 3').execute()
+
+            popen.assert_not_called()
+
+        self.assertEqual((first.exit_code, first.stdout, first.stderr),
+                         (replayed.exit_code, replayed.stdout, replayed.stderr))
+        self.assertEqual('first\n', replayed.stdout)
+        self.assertEqual(3, failed.exit_code)
+        self.assertEqual(127, missing.exit_code)
+        self.assertTrue('no recorded execution left' in missing.stderr)
+
+    def test_replay_environment_and_timing(self):
+        with open(self.cassette, 'w') as f:
+            for stdout, env in [('first', {}), ('second', {'VARIABLE': 'value'})]:
+                f.write(json.dumps({'command': 'command', 'cwd': None, 'env': process.environment_digest(env),
+                                    'exit_code': 0, 'stdout': stdout, 'stderr': '', 'duration': 0.5}) + '\n')
+
+        process.set_backend(process.ReplayBackend(self.cassette, timing=True))
+
+        with patch('dockerwizard.process.time') as patched_time:
+            result = process.Execution('command', env={'VARIABLE': 'value'}).execute()
+            patched_time.sleep.assert_called_with(0.5)
+
+        self.assertEqual('second', result.stdout)
+        self.assertEqual('first', process.Execution('command').execute().stdout)
+
+    def test_replay_placeholders(self):
+        cache = os.path.join(self.directory.name, 'cache')
+
+        with patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: cache}):
+            process.add_placeholder('/tmp/first', 'build')
+            process.set_backend(process.RecordingBackend(self.cassette, StubBackend()))
+
+            try:
+                process.Execution(['cp', f'{cache}/steps', '/tmp/first/dir'], cwd='/tmp/first/dir').execute()
+            finally:
+                process.remove_placeholder('/tmp/first')
+
+            record = self._records()[0]
+            self.assertEqual('cp ${cache}/steps ${build}/dir', record['command'])
+            self.assertEqual('${build}/dir', record['cwd'])
+
+            # a later run with a different build directory matches the recording
+            process.add_placeholder('/tmp/second', 'build')
+            process.set_backend(process.ReplayBackend(self.cassette))
+
+            try:
+                result = process.Execution(['cp', f'{cache}/steps', '/tmp/second/dir'], cwd='/tmp/second/dir').execute()
+            finally:
+                process.remove_placeholder('/tmp/second')
+
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual('/tmp/second/dir', process.normalise('/tmp/second/dir'))
+
+
+class ExecutingCommand(AbstractCommand):
+    def __init__(self):
+        super().__init__('executing-command', 0)
+
+    def _execute(self, args: list):
+        process.Execution(['pwd']).execute()
+
+
+class BuildExecutionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.backend = StubBackend()
+        process.set_backend(self.backend)
+
+    def tearDown(self) -> None:
+        process.set_backend(None)
+        teardown()
+
+    def test_build_working_directory(self):
+        context = initialise()
+        activate(context)
+        context.working_directory = '/build'
+
+        ExecutingCommand().execute([])
+
+        self.assertEqual('/build', self.backend.started[0][2])
+
+        # an explicit working directory is kept
+        process.Execution(['pwd'], cwd='/other').execute()
+        self.assertEqual('/other', self.backend.started[1][2])
+
+        teardown(context)
+        process.Execution(['pwd']).execute()
+        self.assertIsNone(self.backend.started[2][2])
+
+    def test_build_environment(self):
+        context = initialise()
+        activate(context)
+        context.environment.set('FOO', 'bar')
+
+        ExecutingCommand().execute([])
+
+        self.assertEqual('bar', self.backend.started[0][1]['FOO'])
+
+        # an explicit environment is kept
+        process.Execution(['pwd'], env={'OTHER': 'value'}).execute()
+        self.assertEqual({'OTHER': 'value'}, self.backend.started[1][1])
+
+        teardown(context)
+        process.Execution(['pwd']).execute()
+        self.assertIsNone(self.backend.started[2][1])
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,70 @@
+"""
+Tests the import time of the tool when it is run only to print information, using python -X importtime
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from .testing import main
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR, DOCKER_WIZARD_HOME_VAR
+
+# the root of the project containing the dockerwizard package
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the modules only needed to run a build, which must not be imported to print the version
+build_modules = ['yaml', 'dockerwizard.builder', 'dockerwizard.buildparser', 'dockerwizard.builtincommands',
+                 'dockerwizard.customcommands', 'dockerwizard.models', 'dockerwizard.buildtools',
+                 'concurrent.futures']
+
+# the budget for the cumulative import time of the entrypoint in microseconds. This is well above the expected time so
+# the test only fails if a heavy import is added to the startup path, not because of a slow machine
+import_budget = 250000
+
+
+class StartupTest(unittest.TestCase):
+    @staticmethod
+    def _import_times(*args: str) -> dict:
+        """
+        Runs the tool with the arguments and returns the cumulative import time of each module in microseconds
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                DOCKER_WIZARD_HOME_VAR: project_root,
+                DOCKER_WIZARD_CACHE_VAR: directory,
+                'PYTHONPATH': project_root
+            }
+            script = f'import sys; sys.argv = {["docker-wizard", *args]}; ' \
+                     'from dockerwizard import entrypoint; entrypoint.main()'
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=env, cwd=directory,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+        if result.returncode != 0:
+            raise AssertionError(f'docker-wizard {" ".join(args)} failed with {result.stderr}')
+
+        times = {}
+
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, module = line[len('import time:'):].split('|')
+
+                if cumulative.strip().isdigit():
+                    times[module.strip()] = int(cumulative.strip())
+
+        return times
+
+    def test_version_import_time(self):
+        times = StartupTest._import_times('-v')
+
+        self.assertTrue('dockerwizard.entrypoint' in times)
+
+        for module in build_modules:
+            self.assertFalse(module in times, f'{module} is imported when printing the version')
+
+        self.assertLess(times['dockerwizard.entrypoint'], import_budget)
+
+
+if __name__ == '__main__':
+    main()
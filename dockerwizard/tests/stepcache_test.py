@@ -0,0 +1,200 @@
+"""
+Tests the stepcache module
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from .testing import main, PatchedDependencies
+from dockerwizard import stepcache, models
+from dockerwizard.const import DOCKER_WIZARD_CACHE_VAR
+from dockerwizard.errors import CommandError
+
+base_package = 'dockerwizard.stepcache'
+
+
+def _create_cache(mode: str = 'symlink', key: str = '${name}', max_size: int = None) -> models.StepCache:
+    cache = models.StepCache()
+    cache.name = 'ccache'
+    cache.path = os.path.join('cache', '.ccache')
+    cache.key = key
+    cache.mode = mode
+    cache.max_size = max_size
+
+    return cache
+
+
+class StepCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.build_directory = os.path.join(self.directory.name, 'build')
+        os.makedirs(self.build_directory)
+        self.environ = patch.dict(os.environ, {DOCKER_WIZARD_CACHE_VAR: os.path.join(self.directory.name, 'cache')})
+        self.environ.start()
+
+    def tearDown(self) -> None:
+        self.environ.stop()
+        self.directory.cleanup()
+
+    @contextlib.contextmanager
+    def _patch(self) -> PatchedDependencies:
+        with PatchedDependencies({
+            'info': f'{base_package}.info',
+            'warn': f'{base_package}.warn'
+        }) as patched:
+            yield patched
+
+    def _mount(self, cache: models.StepCache) -> stepcache.CacheMount:
+        return stepcache.CacheMount(cache, self.build_directory, {'image': 'image', 'platform': 'linux'})
+
+    def _write(self, mount: stepcache.CacheMount, name: str, contents: str = 'object'):
+        with open(os.path.join(mount.target, name), 'w') as f:
+            f.write(contents)
+
+    def test_resolve_key(self):
+        with open(os.path.join(self.build_directory, 'deps.lock'), 'w') as f:
+            f.write('lock')
+
+        with patch.dict(os.environ, {'COMPILER': 'gcc'}):
+            key = stepcache.resolve_key('${name}-${env:COMPILER}-${hash:deps.lock}', {'name': 'ccache'},
+                                        self.build_directory)
+
+        self.assertTrue(key.startswith('ccache-gcc-'))
+        self.assertEqual(len('ccache-gcc-') + 64, len(key))
+        self.assertEqual('static', stepcache.resolve_key('static', {}, self.build_directory))
+        self.assertEqual('clang', stepcache.resolve_key('${env:COMPILER}', {}, self.build_directory,
+                                                        {'COMPILER': 'clang'}))
+
+        with self.assertRaises(CommandError) as e:
+            stepcache.resolve_key('${unknown}', {}, self.build_directory)
+
+        self.assertEqual('Unknown variable unknown in cache key ${unknown}', e.exception.message)
+
+    def test_symlink_mount(self):
+        with self._patch() as patched:
+            mount = self._mount(_create_cache())
+            mount.mount()
+
+            self.assertTrue(os.path.islink(mount.target))
+            self._write(mount, 'object.o')
+            patched.info.assert_any_call(f'Mounted cache ccache at {mount.cache.path} (miss for key ccache)')
+
+            # the entry is locked while the step uses it
+            self.assertFalse(stepcache.CacheLock(mount.entry).acquire(blocking=False))
+
+            mount.unmount(True)
+
+            self.assertFalse(os.path.lexists(mount.target))
+            self.assertTrue(os.path.isfile(os.path.join(mount.entry, 'object.o')))
+            lock = stepcache.CacheLock(mount.entry)
+            self.assertTrue(lock.acquire(blocking=False))
+            lock.release()
+
+            mount = self._mount(_create_cache())
+            mount.mount()
+            self.assertTrue(os.path.isfile(os.path.join(mount.target, 'object.o')))
+            mount.unmount(True)
+            patched.info.assert_any_call(f'Mounted cache ccache at {mount.cache.path} (hit for key ccache)')
+
+    def test_symlink_mount_failed(self):
+        for mode in ['symlink', 'bind']:
+            with self._patch(), patch(f'{base_package}.run_quietly') as run:
+                run.return_value = False
+                mount = self._mount(_create_cache(mode=mode))
+                mount.mount()
+
+                # the step writes to a temporary entry, so a failed step does not leave an entry to hit
+                self.assertFalse(os.path.exists(mount.entry))
+                self._write(mount, 'partial.o')
+                mount.unmount(False)
+
+                self.assertFalse(os.path.exists(mount.entry))
+                self.assertEqual([], [e for e in os.listdir(mount.root) if not e.endswith('.lock')])
+
+                mount = self._mount(_create_cache(mode=mode))
+                mount.mount()
+                self._write(mount, 'object.o')
+                mount.unmount(True)
+
+                self.assertEqual(['object.o'], os.listdir(mount.entry))
+
+                # a failed step on a hit keeps the entry
+                mount = self._mount(_create_cache(mode=mode))
+                mount.mount()
+                mount.unmount(False)
+
+                self.assertTrue(os.path.isfile(os.path.join(mount.entry, 'object.o')))
+                shutil.rmtree(mount.entry)
+
+    def test_copy_mount(self):
+        with self._patch():
+            mount = self._mount(_create_cache(mode='copy', key='${name}-${platform}'))
+            mount.mount()
+
+            self.assertFalse(os.path.islink(mount.target))
+            self.assertTrue(os.path.isdir(mount.target))
+            self._write(mount, 'sdk.tar')
+            mount.unmount(True)
+
+            self.assertFalse(os.path.exists(mount.target))
+            self.assertTrue(os.path.isfile(os.path.join(mount.entry, 'sdk.tar')))
+
+            # a failed step does not persist its changes
+            mount = self._mount(_create_cache(mode='copy', key='${name}-${platform}'))
+            mount.mount()
+            self.assertTrue(os.path.isfile(os.path.join(mount.target, 'sdk.tar')))
+            self._write(mount, 'partial.tar')
+            mount.unmount(False)
+
+            self.assertFalse(os.path.exists(os.path.join(mount.entry, 'partial.tar')))
+
+    def test_mount_existing_path(self):
+        mount = self._mount(_create_cache())
+        os.makedirs(mount.target)
+
+        with self.assertRaises(CommandError):
+            mount.mount()
+
+    def test_bind_mount_fallback(self):
+        with self._patch() as patched, patch(f'{base_package}.run_quietly') as run:
+            run.return_value = False
+            mount = self._mount(_create_cache(mode='bind'))
+            mount.mount()
+
+            self.assertEqual('symlink', mount.mode)
+            self.assertTrue(os.path.islink(mount.target))
+            patched.warn.assert_called_with('Failed to bind mount cache ccache, falling back to a symlink')
+            run.assert_called_once_with(['mount', '--bind', mount._staging, mount.target])
+            mount.unmount(True)
+
+    def test_max_size(self):
+        with self._patch() as patched:
+            for key, size in [('old', 4), ('new', 4), ('current', 4)]:
+                mount = self._mount(_create_cache(key=key, max_size=10))
+                mount.mount()
+                self._write(mount, 'file', 'x' * size)
+                mount.unmount(True)
+
+                if key == 'new':
+                    os.utime(mount.entry, (0, 0))
+
+            # the least recently used entry is evicted to bring the cache within its maximum size
+            self.assertFalse(os.path.isdir(os.path.join(mount.root, stepcache.hash_string('new'))))
+            self.assertTrue(os.path.isdir(os.path.join(mount.root, stepcache.hash_string('old'))))
+            self.assertTrue(os.path.isdir(mount.entry))
+
+            mount = self._mount(_create_cache(key='large', max_size=10))
+            mount.mount()
+            self._write(mount, 'file', 'x' * 20)
+            mount.unmount(True)
+
+            self.assertFalse(os.path.isdir(mount.entry))
+            patched.warn.assert_called_with('Cache ccache exceeds its maximum size of 10 bytes with key large, '
+                                            'discarding the entry')
+
+
+if __name__ == '__main__':
+    main()
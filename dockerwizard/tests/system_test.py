@@ -112,6 +112,31 @@ class SystemTest(unittest.TestCase):
             patched.get('docker_home').assert_called()
             patched.get('register_builtins').assert_called()
 
+    def test_builtin_command_names(self):
+        from dockerwizard.builtincommands import builtin_factories
+        factories = builtin_factories()
+
+        self.assertEqual(list(system.BUILTIN_COMMANDS), list(factories))
+
+        for name, factory in factories.items():
+            self.assertEqual(name, factory().name)
+
+    def test_register_builtins(self):
+        with PatchedDependencies({
+            'registry': 'dockerwizard.commands.registry',
+            'create_builtin': 'dockerwizard.system._create_builtin'
+        }) as patched:
+            registry = patched.get('registry')
+            system.register_builtins()
+
+            registered = [c.args[0] for c in registry.register_factory.call_args_list]
+            self.assertEqual(list(system.BUILTIN_COMMANDS), registered)
+            patched.get('create_builtin').assert_not_called()
+
+            factory = registry.register_factory.call_args_list[0].args[1]
+            factory()
+            patched.get('create_builtin').assert_called_with('copy')
+
 
 if __name__ == '__main__':
     main()
@@ -32,10 +32,9 @@ class VersioningTest(unittest.TestCase):
             'platform': f'{base_package}.platform',
             'info': f'{base_package}.info',
             'error': f'{base_package}.error',
-            'execution': f'{base_package}.Execution'
+            'docker': f'{base_package}.DockerClient'
         }) as patched:
             platform = patched.platform
-            execution = patched.execution
 
             platform.python_version = Mock()
             platform.python_version.return_value = python_version
@@ -46,27 +45,19 @@ class VersioningTest(unittest.TestCase):
             platform.processor = Mock()
             platform.processor.return_value = processor
 
-            execution.return_value = Mock()
-            execution.return_value.execute = Mock()
-            execution.return_value.execute.return_value = Mock()
-            execution.return_value.execute.return_value.is_healthy = Mock()
+            patched.docker.version = Mock()
 
             yield patched
 
     def test_healthy_version_action(self):
         patched: PatchedDependencies
         with self._patch() as patched:
-            docker_mock = patched.get('execution').return_value.execute.return_value
-            docker_mock.is_healthy.return_value = True
-            docker_mock.stdout = docker_version
+            patched.get('docker').version.return_value = docker_version
 
             parser = Mock()
             namespace = Mock()
             values = Mock()
 
-            execution = patched.get('execution')
-            execution.return_value.execute.return_value.is_healthy.return_value = True
-
             versioning.VersionAction([''], '')(parser, namespace, values)
 
             info = patched.get('info')
@@ -74,9 +65,7 @@ class VersioningTest(unittest.TestCase):
             info.assert_any_call(f'{versioning.DOCKER_WIZARD_CMD_NAME} version {docker_wizard_version}')
             info.assert_any_call(f'DOCKER_WIZARD_HOME: {docker_wizard_home}')
 
-            execution.assert_called_with(['docker', '--version'])
-            execution.return_value.execute.assert_called()
-            execution.return_value.execute.return_value.is_healthy.assert_called()
+            patched.get('docker').version.assert_called()
 
             info.assert_any_call(f'Docker Installation: {docker_version}')
             info.assert_any_call(f'Python Version: {python_version}, OS: {system}, Version: {release}, '
@@ -87,16 +76,12 @@ class VersioningTest(unittest.TestCase):
     def test_version_action_no_docker(self):
         patched: PatchedDependencies
         with self._patch() as patched:
-            docker_mock = patched.get('execution').return_value.execute.return_value
-            docker_mock.is_healthy.return_value = False
+            patched.get('docker').version.return_value = None
 
             parser = Mock()
             namespace = Mock()
             values = Mock()
 
-            execution = patched.get('execution')
-            execution.return_value.execute.return_value.is_healthy.return_value = False
-
             versioning.VersionAction([''], '')(parser, namespace, values)
 
             patched.get('error').assert_called_with('Failed to retrieve Docker version '
@@ -7,6 +7,7 @@ from unittest.mock import Mock
 
 from .testing import main, PatchedDependencies
 from dockerwizard import workdir
+from dockerwizard.context import initialise, teardown
 
 base_package = 'dockerwizard.workdir'
 
@@ -91,6 +92,35 @@ class WorkdirTest(unittest.TestCase):
             self.assertEqual(current_dir, new_dir)
             os.chdir.assert_not_called()
 
+    def test_change_directory_in_build(self):
+        context = initialise()
+
+        try:
+            context.working_directory = working_dir
+
+            patched: PatchedDependencies
+            with self._patch() as patched:
+                os = patched.get('os')
+                os.path = __import__('os').path
+                os.chdir = Mock()
+
+                workdir.change_directory(new_dir)
+                self.assertEqual(new_dir, workdir.get_working_directory())
+                self.assertEqual(f'{new_dir}/file', workdir.resolve_path('file'))
+
+                workdir.change_back()
+                self.assertEqual(working_dir, workdir.get_working_directory())
+
+                os.chdir.assert_not_called()
+                os.getcwd.assert_not_called()
+        finally:
+            teardown()
+
+    def test_resolve_path(self):
+        self.assertEqual('/path/to/file', workdir.resolve_path('/path/to/file', working_dir))
+        self.assertEqual(f'{working_dir}/file', workdir.resolve_path('file', working_dir))
+        self.assertEqual('/path/to/file', workdir.resolve_path('../file', working_dir))
+
     def test_create_temp_directory(self):
         temp_file = 'file'
         patched: PatchedDependencies
@@ -6,7 +6,7 @@ import platform
 
 from .cli import info, error
 from .const import DOCKER_WIZARD_CMD_NAME, VERSION, DOCKER_WIZARD_HOME
-from .process import Execution
+from .docker import DockerClient
 
 
 class VersionAction(argparse.Action):
@@ -21,12 +21,12 @@ class VersionAction(argparse.Action):
         """
         Gets the docker version and prints an error if it can't be retrieved
         """
-        result = Execution(['docker', '--version']).execute()
+        version = DockerClient.version()
 
-        if not result.is_healthy():
+        if version is None:
             error('Failed to retrieve Docker version information (Docker may not be installed)')
         else:
-            info(f'Docker Installation: {result.stdout.strip()}')
+            info(f'Docker Installation: {version}')
 
     @staticmethod
     def _print_os_info():
@@ -1,15 +1,32 @@
 """
-This module provides working directory management as an abstraction to the functions provided by the os module
+This module provides working directory management as an abstraction to the functions provided by the os module.
+
+While a build is running, the working directory is the working directory of the build context rather than the working
+directory of the process, so changing directory during a build never calls os.chdir and builds running at the same time
+do not affect each other. Outside a build, these functions change the working directory of the process
 """
 import os
 from collections import deque
 import tempfile
 
 
-# the previous working directories
+# the previous working directories of the process
 _previous_directories = deque()
 
 
+def _current_context():
+    """
+    Returns the current build context or None if there is no build running
+    """
+    from .context import BuildContext  # prevent circular import
+    from .errors import BuildContextError
+
+    try:
+        return BuildContext.context()
+    except BuildContextError:
+        return None
+
+
 def _change_directory(directory: str):
     os.chdir(directory)
 
@@ -21,9 +38,14 @@ def change_directory(directory: str, not_store: bool = False):
     :param not_store: if true, the current working directory isn't added to the stack of maintained previous directories
     :return: None
     """
-    if not not_store:
-        _previous_directories.append(get_working_directory())
-    _change_directory(directory)
+    context = _current_context()
+
+    if context is not None:
+        context.change_directory(directory, not_store)
+    else:
+        if not not_store:
+            _previous_directories.append(get_working_directory())
+        _change_directory(directory)
 
 
 def change_back():
@@ -31,7 +53,11 @@ def change_back():
     Change back to the most previous working directory after a call to change_directory has been made
     :return: None
     """
-    if len(_previous_directories) != 0:
+    context = _current_context()
+
+    if context is not None:
+        context.change_back()
+    elif len(_previous_directories) != 0:
         _change_directory(_previous_directories.pop())
 
 
@@ -40,7 +66,22 @@ def get_working_directory():
     Gets the current working directory
     :return: current working directory
     """
-    return os.getcwd()
+    context = _current_context()
+
+    return context.working_directory if context is not None else os.getcwd()
+
+
+def resolve_path(path: str, directory: str = None) -> str:
+    """
+    Resolves the path relative to the directory
+    :param path: the path to resolve. If absolute, it is returned as is
+    :param directory: the directory relative paths are resolved against, the current working directory if not provided
+    :return: the absolute path
+    """
+    if os.path.isabs(path):
+        return path
+
+    return os.path.normpath(os.path.join(directory if directory else get_working_directory(), path))
 
 
 def create_temp_directory():